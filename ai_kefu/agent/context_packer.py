@@ -0,0 +1,287 @@
+"""
+Budget-driven context packing for Qwen calls.
+
+Instead of sending every message in ``session.messages``, the packer fits
+the prompt into ``settings.context_token_budget``:
+
+1. The system prompt and the current interaction (new user message, or the
+   messages since the last user message when continuing after tool calls,
+   prefixed with the per-call context block) are always sent, and so are
+   the last ``settings.context_min_recent_turns`` past turns.
+2. Older turns are added newest-first while they fit. An assistant message
+   with tool_calls and its tool responses are kept or dropped together, so
+   the sequence stays valid for the API. With a budget of 0 (the default)
+   nothing is dropped.
+3. Oversized tool results (e.g. the full ``check_availability`` device list)
+   are elided before counting. Past turns get a tighter limit than the tool
+   results of the current interaction, which the model still needs to answer.
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from ai_kefu.config.constants import MessageRole
+from ai_kefu.agent.prompt_layout import with_context
+from ai_kefu.config.settings import settings
+from ai_kefu.llm.tokenizer import count_message_tokens, count_tokens
+from ai_kefu.models.session import Message
+from ai_kefu.utils.logging import logger
+
+# Marker appended to elided tool results so the model knows data was cut
+_ELIDED_SUFFIX = "…[已截断，原始约 {tokens} tokens]"
+
+
+def _json_default(o: Any) -> str:
+    return o.isoformat() if hasattr(o, "isoformat") else str(o)
+
+
+def message_to_qwen(msg: Message) -> Dict[str, Any]:
+    """Convert a session user / assistant / tool Message to the Qwen message dict."""
+    if msg.role == MessageRole.ASSISTANT:
+        msg_dict: Dict[str, Any] = {"role": "assistant", "content": msg.content}
+        if msg.tool_calls:
+            msg_dict["tool_calls"] = [
+                {
+                    "id": tc.id,
+                    "type": "function",
+                    "function": {
+                        "name": tc.name,
+                        "arguments": json.dumps(tc.args, ensure_ascii=False, default=_json_default),
+                    },
+                }
+                for tc in msg.tool_calls
+            ]
+        return msg_dict
+    if msg.role == MessageRole.TOOL:
+        return {"role": "tool", "content": msg.content, "tool_call_id": msg.tool_call_id}
+    return {"role": "user", "content": msg.content}
+
+
+# ============================================================
+# Tool result elision
+# ============================================================
+
+def _shrink(value: Any, keep_items: int, max_str: int) -> Any:
+    """Recursively cut long lists / strings inside a JSON value."""
+    if isinstance(value, dict):
+        return {k: _shrink(v, keep_items, max_str) for k, v in value.items()}
+    if isinstance(value, list):
+        head = [_shrink(v, keep_items, max_str) for v in value[:keep_items]]
+        if len(value) > keep_items:
+            head.append(f"…省略 {len(value) - keep_items} 项")
+        return head
+    if isinstance(value, str) and len(value) > max_str:
+        return value[:max_str] + "…"
+    return value
+
+
+def elide_tool_result(content: str, max_tokens: int) -> str:
+    """
+    Shrink a tool result to roughly ``max_tokens``.
+
+    JSON results keep their structure with long lists cut to the first few
+    items; other text is truncated. Results already within the limit are
+    returned unchanged.
+    """
+    tokens = count_tokens(content or "")
+    if max_tokens <= 0 or tokens <= max_tokens:
+        return content
+
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        data = None
+
+    if isinstance(data, (dict, list)):
+        for keep_items, max_str in ((5, 200), (3, 120), (1, 60)):
+            shrunk = json.dumps(_shrink(data, keep_items, max_str), ensure_ascii=False)
+            if count_tokens(shrunk) <= max_tokens:
+                return shrunk
+        content = shrunk
+
+    # Plain truncation, proportional to the token overshoot
+    ratio = max_tokens / max(count_tokens(content), 1)
+    cut = max(int(len(content) * ratio * 0.9), 1)
+    return content[:cut] + _ELIDED_SUFFIX.format(tokens=tokens)
+
+
+# ============================================================
+# Packing
+# ============================================================
+
+@dataclass
+class PackResult:
+    """Messages to send plus accounting for logging / turn metadata."""
+    messages: List[Dict[str, Any]]
+    prompt_tokens: int
+    budget_tokens: int
+    dropped_messages: int = 0
+    elided_tool_results: int = 0
+    over_budget: bool = False
+    sections: Dict[str, int] = field(default_factory=dict)
+
+
+def _group_units(messages: List[Message]) -> List[List[Message]]:
+    """Split messages into units that must be kept or dropped together."""
+    units: List[List[Message]] = []
+    for msg in messages:
+        if msg.role not in (MessageRole.USER, MessageRole.ASSISTANT, MessageRole.TOOL):
+            continue
+        if msg.role == MessageRole.TOOL:
+            if units and units[-1][0].role == MessageRole.ASSISTANT and units[-1][0].tool_calls:
+                units[-1].append(msg)
+            # else: orphan tool response (its assistant was summarised away) — drop it
+            continue
+        units.append([msg])
+    return units
+
+
+def _unit_to_qwen(unit: List[Message], tool_limit: int) -> Tuple[List[Dict[str, Any]], int]:
+    dicts = []
+    elided = 0
+    for msg in unit:
+        d = message_to_qwen(msg)
+        if msg.role == MessageRole.TOOL:
+            shortened = elide_tool_result(d["content"], tool_limit)
+            if shortened is not d["content"]:
+                elided += 1
+                d["content"] = shortened
+        dicts.append(d)
+    return dicts, elided
+
+
+def pack_context(
+    system_prompt: str,
+    history: List[Message],
+    new_user_message: Optional[Message] = None,
+    *,
+    tools_tokens: int = 0,
+    budget_tokens: Optional[int] = None,
+    reserve_tokens: Optional[int] = None,
+    tool_result_max_tokens: Optional[int] = None,
+    current_tool_result_max_tokens: Optional[int] = None,
+    context_block: str = "",
+    min_recent_turns: Optional[int] = None,
+) -> PackResult:
+    """
+    Build the Qwen message list for one call within a token budget.
+
+    Args:
+        system_prompt: Fully rendered system prompt (incl. item slot / summary)
+        history: Session messages already persisted
+        new_user_message: The new user message, or None for a tool-continuation call
+        tools_tokens: Tokens used by the function definitions sent alongside
+        budget_tokens: Total budget for prompt + completion; 0 or less keeps
+            the whole history (only tool results are elided)
+        reserve_tokens: Tokens reserved for the completion (default: qwen_max_tokens)
+        tool_result_max_tokens: Limit per tool result in past turns
+        current_tool_result_max_tokens: Limit per tool result in the current interaction
+        context_block: Per-call context (dates / item slot / summary) placed in
+            front of the user message of the current interaction
+        min_recent_turns: Past turns (each starting at a user message) kept
+            even when they do not fit the budget
+
+    Returns:
+        PackResult with the messages to send and token accounting
+    """
+    budget = budget_tokens if budget_tokens is not None else settings.context_token_budget
+    reserve = reserve_tokens if reserve_tokens is not None else settings.qwen_max_tokens
+    past_limit = (
+        tool_result_max_tokens if tool_result_max_tokens is not None
+        else settings.context_tool_result_max_tokens
+    )
+    current_limit = (
+        current_tool_result_max_tokens if current_tool_result_max_tokens is not None
+        else settings.context_current_tool_result_max_tokens
+    )
+    min_turns = min_recent_turns if min_recent_turns is not None else settings.context_min_recent_turns
+
+    # Split history into past turns and the in-progress interaction
+    if new_user_message is not None:
+        past, current = history, []
+    else:
+        last_user = max(
+            (i for i, m in enumerate(history) if m.role == MessageRole.USER), default=0
+        )
+        past, current = history[:last_user], history[last_user:]
+
+    system = {"role": "system", "content": system_prompt}
+    elided = 0
+
+    current_dicts: List[Dict[str, Any]] = []
+    for unit in _group_units(current):
+        dicts, n = _unit_to_qwen(unit, current_limit)
+        current_dicts.extend(dicts)
+        elided += n
+    if new_user_message is not None:
+        current_dicts.append(message_to_qwen(new_user_message))
+    if context_block:
+        for d in current_dicts:
+            if d["role"] == "user":
+                d["content"] = with_context(d["content"], context_block)
+                break
+
+    system_tokens = count_message_tokens(system)
+    current_tokens = sum(count_message_tokens(d) for d in current_dicts)
+    mandatory = system_tokens + current_tokens + tools_tokens
+    available = budget - reserve - mandatory if budget > 0 else float("inf")
+
+    kept_units: List[Tuple[List[Dict[str, Any]], int, int]] = []
+    history_tokens = 0
+    past_units = _group_units(past)
+    dropped = 0
+
+    # Units from the start of the last ``min_turns`` turns on are kept regardless of budget
+    protected_from = len(past_units)
+    turns = 0
+    for idx in range(len(past_units) - 1, -1, -1):
+        if turns >= min_turns:
+            break
+        if past_units[idx][0].role == MessageRole.USER:
+            turns += 1
+            protected_from = idx
+
+    for idx in range(len(past_units) - 1, -1, -1):
+        dicts, n = _unit_to_qwen(past_units[idx], past_limit)
+        unit_tokens = sum(count_message_tokens(d) for d in dicts)
+        if idx < protected_from and history_tokens + unit_tokens > available:
+            dropped = sum(len(u) for u in past_units[: idx + 1])
+            break
+        kept_units.append((dicts, unit_tokens, n))
+        history_tokens += unit_tokens
+
+    # Start the kept window at a user message, not mid-turn
+    while kept_units and kept_units[-1][0][0]["role"] != "user":
+        dicts, unit_tokens, _ = kept_units.pop()
+        history_tokens -= unit_tokens
+        dropped += len(dicts)
+    elided += sum(n for _, _, n in kept_units)
+
+    messages = [system]
+    for dicts, _, _ in reversed(kept_units):
+        messages.extend(dicts)
+    messages.extend(current_dicts)
+
+    prompt_tokens = mandatory + history_tokens
+    result = PackResult(
+        messages=messages,
+        prompt_tokens=prompt_tokens,
+        budget_tokens=budget,
+        dropped_messages=dropped,
+        elided_tool_results=elided,
+        over_budget=available < 0,
+        sections={
+            "system": system_tokens,
+            "tools": tools_tokens,
+            "history": history_tokens,
+            "current": current_tokens,
+            "reserve": reserve,
+        },
+    )
+    if result.over_budget:
+        logger.warning(
+            f"Context over budget: mandatory={mandatory} tokens + reserve={reserve} "
+            f"> budget={budget} (keeping only the last {min_turns} turns of history)"
+        )
+    return result
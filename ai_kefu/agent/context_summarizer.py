@@ -9,6 +9,8 @@ history without exceeding the context window.
 import json
 from typing import List, Dict, Any, Optional
 from ai_kefu.llm.qwen_client import call_qwen_fast
+from ai_kefu.llm.tokenizer import count_message_tokens
+from ai_kefu.agent.context_packer import message_to_qwen
 from ai_kefu.models.session import Session, Message
 from ai_kefu.config.constants import MessageRole
 from ai_kefu.config.settings import settings
@@ -38,9 +40,10 @@ CONTEXT_SUMMARY_PROMPT = """你是一个对话摘要助手。请将以下客服
 
 def estimate_message_tokens(messages: List[Message]) -> int:
     """
-    Rough estimation of token count for a list of messages.
-    Chinese characters ≈ 1.5 tokens each, English words ≈ 1 token.
-    This is a rough heuristic, not exact.
+    Estimate the prompt token count for a list of messages.
+
+    Uses the same tokenizer-backed counting as the context packer, on the
+    messages as they are sent to Qwen (tool results as tool messages).
     
     Args:
         messages: List of Message objects
@@ -48,18 +51,7 @@ def estimate_message_tokens(messages: List[Message]) -> int:
     Returns:
         Estimated token count
     """
-    total_chars = 0
-    for msg in messages:
-        total_chars += len(msg.content or "")
-        if msg.tool_calls:
-            for tc in msg.tool_calls:
-                total_chars += len(json.dumps(tc.args, ensure_ascii=False))
-                if tc.result:
-                    total_chars += len(json.dumps(tc.result, ensure_ascii=False, default=str))
-    
-    # Rough estimate: ~1.5 tokens per Chinese char, ~0.75 tokens per English char
-    # Use a middle ground of ~1.2 tokens per char
-    return int(total_chars * 1.2)
+    return sum(count_message_tokens(message_to_qwen(msg)) for msg in messages)
 
 
 def should_summarize(session: Session, max_message_tokens: int = 4000) -> bool:
@@ -3,13 +3,23 @@ Agent executor - Main orchestrator for Plan-Action-Check loop.
 T043 - AgentExecutor with run() and stream() methods.
 """
 
+import time
 import uuid
 import threading
 from datetime import datetime
-from typing import Optional, AsyncGenerator
+from typing import Callable, Optional, AsyncGenerator, Tuple
 from ai_kefu.agent.types import AgentConfig
 from ai_kefu.agent.turn import execute_turn
 from ai_kefu.agent.context_summarizer import should_summarize, summarize_context, apply_summary_to_session
+from ai_kefu.agent.history_summary import (
+    RollingSummary,
+    fold_history_summary,
+    fold_lines,
+    history_lines,
+    needs_full_refresh,
+    render_chat_summary,
+    render_user_summary,
+)
 from ai_kefu.agent.skill_selector import detect_skills, get_active_tool_names
 from ai_kefu.models.session import Session, AgentState
 from ai_kefu.storage.session_store import SessionStore
@@ -19,6 +29,8 @@ from ai_kefu.services.loop_detection import check_tool_loop
 from ai_kefu.config.constants import SessionStatus, TerminateReason, TOOL_COMPLETE_TASK, MessageRole
 from ai_kefu.config.settings import settings
 from ai_kefu.utils.logging import logger, log_agent_complete
+from ai_kefu.utils.profiling import Profile, profile_interaction
+from ai_kefu.utils.tracing import start_span
 from ai_kefu.utils.errors import (
     MaxTurnsExceededError,
     LoopDetectedError,
@@ -208,6 +220,57 @@ class AgentExecutor:
         Returns:
             Dict with response
         """
+        # Generate a unique interaction_id for this user-message processing
+        # All turns within this run() belong to the same interaction
+        interaction_id = str(uuid.uuid4())
+        chat_id = (context or {}).get("conversation_id")
+        with start_span("agent.run", {"chat_id": chat_id}) as span:
+            with profile_interaction() as profiler:
+                result = self._run(query, session_id, user_id, context, interaction_id)
+            result["interaction_id"] = interaction_id
+            span.set_attributes(
+                session_id=result.get("session_id"),
+                turns=result.get("turn_counter"),
+                error=result.get("error"),
+                profiled=profiler is not None,
+            )
+            if profiler is not None:
+                self._save_profile(profiler.profile(), interaction_id, result.get("session_id"), chat_id)
+            return result
+
+    def _save_profile(
+        self,
+        profile: Profile,
+        interaction_id: str,
+        session_id: Optional[str],
+        chat_id: Optional[str],
+    ) -> None:
+        """Store a sampled profile under the run's interaction_id (non-fatal)."""
+        logger.info(
+            f"[profiling] interaction_id={interaction_id}: {len(profile.samples)} samples "
+            f"over {profile.duration_ms:.0f}ms"
+        )
+        if not self.conversation_store:
+            return
+        self.conversation_store.save_profile(
+            interaction_id=interaction_id,
+            speedscope=profile.to_speedscope(),
+            sample_count=len(profile.samples),
+            duration_ms=int(profile.duration_ms),
+            interval_ms=settings.profile_interval_ms,
+            session_id=session_id,
+            chat_id=chat_id,
+        )
+
+    def _run(
+        self,
+        query: str,
+        session_id: Optional[str],
+        user_id: Optional[str],
+        context: Optional[dict],
+        interaction_id: str,
+    ) -> dict:
+        """Body of ``run``, inside its ``agent.run`` span."""
         start_time = datetime.utcnow()
         
         # Load or create session
@@ -287,9 +350,6 @@ class AgentExecutor:
         is_first_turn = True
         last_turn_metadata = {}
 
-        # Generate a unique interaction_id for this user-message processing
-        # All turns within this run() belong to the same interaction
-        interaction_id = str(uuid.uuid4())
         local_turn_counter = 0
 
         # ============================================================
@@ -333,13 +393,14 @@ class AgentExecutor:
                 # Execute turn
                 # First turn: add user message
                 # Subsequent turns: continue with tool results
-                turn_result = execute_turn(
-                    session=session,
-                    user_message=query,
-                    tools_registry=self.tools_registry,
-                    is_tool_continue=not is_first_turn,
-                    active_skill_tools=active_skill_tools,
-                )
+                with start_span("agent.turn", {"turn": session.turn_counter + 1}):
+                    turn_result = execute_turn(
+                        session=session,
+                        user_message=query,
+                        tools_registry=self.tools_registry,
+                        is_tool_continue=not is_first_turn,
+                        active_skill_tools=active_skill_tools,
+                    )
                 
                 is_first_turn = False
                 
@@ -837,6 +898,7 @@ class AgentExecutor:
         is_returning_customer: bool,
         fingerprint: dict,
         ttl: int = 3600,
+        rolling: Optional[RollingSummary] = None,
     ):
         """
         Cache history summary in Redis.
@@ -849,6 +911,8 @@ class AgentExecutor:
             ttl: Redis key TTL in seconds (default 3600 / 1 hour).
                  Use a shorter value (e.g. 1800) for API-sourced summaries
                  whose message count can change more frequently.
+            rolling: Rolling summary state (digest + high-water mark) that
+                 lets the next load fold in only the new messages
         """
         try:
             import json
@@ -856,7 +920,8 @@ class AgentExecutor:
             cache_data = json.dumps({
                 "summary": summary,
                 "is_returning_customer": is_returning_customer,
-                "fingerprint": fingerprint
+                "fingerprint": fingerprint,
+                "rolling": rolling.model_dump() if rolling else None,
             }, ensure_ascii=False)
             self.session_store.client.setex(cache_key, ttl, cache_data)
             logger.debug(f"Cached history summary for chat_id={chat_id} (ttl={ttl}s)")
@@ -896,6 +961,7 @@ class AgentExecutor:
         is_returning_customer: bool,
         fingerprint: dict,
         ttl: int = 3600,
+        rolling: Optional[RollingSummary] = None,
     ):
         """
         Cache a cross-conversation history summary in Redis.
@@ -906,6 +972,7 @@ class AgentExecutor:
             is_returning_customer: Whether user is a returning customer
             fingerprint: Dict identifying the data version
             ttl: Redis key TTL in seconds (default 3600 / 1 hour)
+            rolling: Rolling summary state (see _set_cached_summary)
         """
         try:
             import json
@@ -914,6 +981,7 @@ class AgentExecutor:
                 "summary": summary,
                 "is_returning_customer": is_returning_customer,
                 "fingerprint": fingerprint,
+                "rolling": rolling.model_dump() if rolling else None,
             }, ensure_ascii=False)
             self.session_store.client.setex(cache_key, ttl, cache_data)
             logger.debug(f"Cached user history summary for user_id={user_id} (ttl={ttl}s)")
@@ -937,72 +1005,111 @@ class AgentExecutor:
 
         self._load_history_as_context_from_mysql(session, chat_id)
 
-    def _compress_mysql_messages_by_time_proximity(self, messages: list) -> str:
-        """
-        Apply tiered time-proximity compression to a list of ConversationMessage objects
-        (as returned by ConversationStore.get_conversation_history_by_user_id).
-
-        Tiers (same thresholds as the Xianyu API variant):
-        - Last 20 messages  → verbatim   (highest signal)
-        - Messages 20–60    → LLM-summarized as 【近期对话摘要】
-        - Messages 60+      → LLM-summarized as 【早期对话摘要】
-
-        Returns:
-            Formatted multi-section string, or "" if no usable text.
-        """
-        RECENT_WINDOW = 20
-        MIDTERM_WINDOW = 40
-
-        def _extract_line(msg) -> Optional[str]:
-            content = (msg.message_content or "").strip()
-            if not content:
-                return None
-            # Strip debug prefix for readability
-            if content.startswith("【调试】"):
-                content = content[4:]
-            msg_type = msg.message_type
-            type_str = msg_type.value if hasattr(msg_type, 'value') else str(msg_type)
-            if type_str == "user":
-                return f"用户: {content}"
-            elif type_str == "seller":
-                return f"客服: {content}"
+    def _rolling_state(self, cached: Optional[dict]) -> Optional[RollingSummary]:
+        """Rolling summary state from a cache entry (None for entries written before it existed)."""
+        if not cached or not cached.get("rolling"):
+            return None
+        try:
+            return RollingSummary.model_validate(cached["rolling"])
+        except Exception as e:
+            logger.debug(f"Ignoring unreadable rolling summary state: {e}")
             return None
 
-        lines = [t for m in messages if (t := _extract_line(m))]
+    def _summarize_or_fold(self, previous: str, lines: list, is_returning_customer: bool) -> Optional[str]:
+        """First summary of ``lines``, or ``lines`` folded into ``previous`` (one light-model call)."""
+        if not previous:
+            return self._summarize_history("\n".join(lines), is_returning_customer=is_returning_customer)
+        return fold_history_summary(previous, lines, is_returning_customer)
 
-        if not lines:
-            return ""
+    def _roll_history_summary(
+        self,
+        cached: Optional[dict],
+        fingerprint: dict,
+        label: str,
+        fetch_after: Callable[[int, int], list],
+        fetch_window: Callable[[], list],
+        verbatim_limit: int,
+        keep_recent: int,
+    ) -> Optional[Tuple[RollingSummary, bool]]:
+        """
+        Bring a cached rolling summary up to date with MySQL.
 
-        recent = lines[-RECENT_WINDOW:]
-        midterm = lines[-(RECENT_WINDOW + MIDTERM_WINDOW):-RECENT_WINDOW]
-        early = lines[:-(RECENT_WINDOW + MIDTERM_WINDOW)]
+        Messages past the high-water mark are folded into the cached state
+        when ``needs_full_refresh`` allows it; otherwise the state is rebuilt
+        from ``fetch_window()`` (the newest page of history).
 
-        parts = []
+        Args:
+            cached: Redis cache entry whose fingerprint no longer matches (or None)
+            fingerprint: Current fingerprint, for logging
+            label: ``chat_id=…`` / ``user_id=…`` for log lines
+            fetch_after: ``(after_id, limit) -> messages`` with id > after_id
+            fetch_window: Loads the messages for a full rebuild
+            verbatim_limit: Lines kept verbatim before anything is summarized
+            keep_recent: Newest lines kept verbatim next to the digest
 
-        if early:
-            early_text = "\n".join(early)
-            early_summary = (
-                self._summarize_history(early_text)
-                or f"（早期对话 {len(early)} 条，已省略）"
+        Returns:
+            (state, is_returning_customer), or None when there is no usable history
+        """
+        state = self._rolling_state(cached)
+        is_returning_customer = bool(cached and cached.get("is_returning_customer"))
+
+        new_rows = []
+        if state is not None and state.high_water_id:
+            new_rows = fetch_after(state.high_water_id, settings.history_summary_fold_max + 1)
+        reason = needs_full_refresh(state, len(new_rows))
+
+        if reason is None:
+            lines, paid, high_water_id = history_lines(new_rows)
+            is_returning_customer = is_returning_customer or paid
+            summarized = False
+
+            def summarize(previous: str, overflow: list) -> Optional[str]:
+                nonlocal summarized
+                summarized = True
+                return self._summarize_or_fold(previous, overflow, is_returning_customer)
+
+            state = fold_lines(
+                state, lines,
+                summarize=summarize,
+                verbatim_limit=verbatim_limit,
+                keep_recent=keep_recent,
             )
-            parts.append(f"【早期对话摘要】\n{early_summary}")
-
-        if midterm:
-            mid_text = "\n".join(midterm)
-            mid_summary = (
-                self._summarize_history(mid_text)
-                or f"（中期对话 {len(midterm)} 条，已省略）"
+            state.high_water_id = max(state.high_water_id, high_water_id)
+            # Only LLM folds let the digest drift; verbatim-only appends don't count
+            if summarized:
+                state.folds += 1
+            logger.info(
+                f"[summary_fold] Added {len(new_rows)} new msgs to history summary for {label} "
+                f"({'fold ' + str(state.folds) if summarized else 'verbatim only'}, "
+                f"high_water_id={state.high_water_id})"
             )
-            parts.append(f"【近期对话摘要】\n{mid_summary}")
+            return state, is_returning_customer
 
-        parts.append(f"【最新对话记录（{len(recent)} 条）】\n" + "\n".join(recent))
-
-        return "\n\n".join(parts)
+        logger.info(
+            f"[cache_miss] Rebuilding history summary for {label} ({reason}; "
+            f"count={fingerprint['message_count']}, last={fingerprint['last_message_at']})"
+        )
+        history = fetch_window()
+        if not history:
+            return None
+        lines, paid, high_water_id = history_lines(history)
+        # A payment that has scrolled out of the window still counts
+        is_returning_customer = is_returning_customer or paid
+        if not lines:
+            logger.debug(f"[history] No extractable text from {len(history)} messages for {label}")
+            return None
+        state = fold_lines(
+            RollingSummary(high_water_id=high_water_id, refreshed_at=time.time()), lines,
+            summarize=lambda previous, overflow: self._summarize_or_fold(previous, overflow, is_returning_customer),
+            verbatim_limit=verbatim_limit,
+            keep_recent=keep_recent,
+        )
+        return state, is_returning_customer
 
     def _load_user_history_as_context(self, session: Session, user_id: Optional[str]):
         """
         Load ALL conversation history for a buyer (across every chat_id) and inject
-        a time-proximity-compressed summary into the session context.
+        a rolling summary into the session context.
 
         This supplements the per-chat context already loaded by
         _load_history_as_context, giving the LLM visibility into the buyer's full
@@ -1010,8 +1117,9 @@ class AgentExecutor:
 
         Strategy:
         1. Lightweight fingerprint check → Redis cache lookup
-        2. On cache miss: fetch up to 100 messages by user_id from MySQL,
-           apply tiered compression, cache result
+        2. On fingerprint change: fold the messages past the cached high-water
+           mark into the cached digest (newest 20 lines stay verbatim); rebuild
+           from the newest 100 messages when a full refresh is due
         3. Merge with any existing context_summary already in the session
 
         Args:
@@ -1038,46 +1146,35 @@ class AgentExecutor:
                     f"{len(user_summary)} chars, returning_customer={is_returning_customer}"
                 )
             else:
-                # Step 3: Cache miss — load & compress
-                logger.info(
-                    f"[user_cache_miss] Generating cross-conversation summary for user_id={user_id} "
-                    f"(count={fingerprint['message_count']}, last={fingerprint['last_message_at']})"
-                )
-                history = self.conversation_store.get_conversation_history_by_user_id(
-                    user_id=user_id,
-                    limit=100,
-                )
-                if not history:
-                    return
-
-                # Detect returning customer
-                is_returning_customer = any(
-                    "我已付款，等待你发货" in (msg.message_content or "")
-                    for msg in history
+                # Step 3: fold new messages into the rolling summary (or rebuild it)
+                rolled = self._roll_history_summary(
+                    cached,
+                    fingerprint,
+                    label=f"user_id={user_id}",
+                    fetch_after=lambda after_id, limit: self.conversation_store.get_messages_after_id(
+                        after_id, user_id=user_id, limit=limit
+                    ),
+                    fetch_window=lambda: self.conversation_store.get_conversation_history_by_user_id(
+                        user_id=user_id,
+                        limit=100,
+                        offset=max(0, fingerprint["message_count"] - 100),
+                    ),
+                    verbatim_limit=20,
+                    keep_recent=20,
                 )
-
-                summary_body = self._compress_mysql_messages_by_time_proximity(history)
-                if not summary_body:
-                    logger.debug(
-                        f"[user_history] No extractable text from {len(history)} messages "
-                        f"for user_id={user_id}"
-                    )
+                if rolled is None:
                     return
-
-                returning_tag = (
-                    "【老客户】该用户之前有过付款记录。"
-                    if is_returning_customer
-                    else "【新客户】该用户暂无历史付款记录。"
-                )
-                user_summary = f"{returning_tag}\n\n{summary_body}"
+                state, is_returning_customer = rolled
+                user_summary = render_user_summary(state, is_returning_customer)
 
                 # Cache for subsequent sessions
                 self._set_cached_user_summary(
-                    user_id, user_summary, is_returning_customer, fingerprint
+                    user_id, user_summary, is_returning_customer, fingerprint,
+                    ttl=settings.history_summary_ttl, rolling=state,
                 )
                 logger.info(
-                    f"[user_history] Loaded {len(history)} msgs for user_id={user_id}, "
-                    f"summary={len(user_summary)} chars, returning_customer={is_returning_customer}"
+                    f"[user_history] Summary for user_id={user_id}: {len(user_summary)} chars, "
+                    f"returning_customer={is_returning_customer}"
                 )
 
             # Step 4: Merge into session context
@@ -1107,8 +1204,11 @@ class AgentExecutor:
         """
         Load conversation history from MySQL and inject as context summary.
 
-        Uses Redis cache to avoid repeated LLM summarization calls.
-        Cache is invalidated when message count or last message timestamp changes.
+        Uses a Redis-cached rolling summary to avoid repeated LLM summarization.
+        While the fingerprint (message count + last timestamp) is unchanged the
+        cached summary is reused as is. When it changes, only the messages past
+        the cached high-water mark are folded in; the summary is rebuilt from
+        the newest 50 messages when a full refresh is due.
 
         This ensures that when a Redis session expires and a new one is created,
         the LLM still has context about previous conversations with this user.
@@ -1141,90 +1241,46 @@ class AgentExecutor:
                 )
                 return
             
-            # Step 3: Cache miss - load full history and generate summary
-            logger.info(f"[cache_miss] Generating history summary for chat_id={chat_id} "
-                        f"(fingerprint: count={fingerprint['message_count']}, last={fingerprint['last_message_at']})")
-            
-            # Load recent conversation history from MySQL
-            history = self.conversation_store.get_conversation_history(
-                chat_id=chat_id,
-                limit=50  # Get last 50 messages for summarization
+            # Step 3: Fold new messages into the rolling summary (or rebuild it).
+            # Histories of up to 10 lines are used verbatim without an LLM call.
+            rolled = self._roll_history_summary(
+                cached,
+                fingerprint,
+                label=f"chat_id={chat_id}",
+                fetch_after=lambda after_id, limit: self.conversation_store.get_messages_after_id(
+                    after_id, chat_id=chat_id, limit=limit
+                ),
+                fetch_window=lambda: self.conversation_store.get_conversation_history(
+                    chat_id=chat_id,
+                    limit=50,  # Last 50 messages for summarization
+                    offset=max(0, fingerprint["message_count"] - 50),
+                ),
+                verbatim_limit=10,
+                keep_recent=0,
             )
-            
-            if not history:
+            if rolled is None:
                 logger.debug(f"No conversation history found for chat_id={chat_id}")
                 return
-            
-            # Build a readable conversation text from MySQL records
-            conversation_lines = []
-            # 检测是否老客户：历史对话中是否出现过 "[我已付款，等待你发货]"
-            is_returning_customer = False
-            for msg in history:
-                msg_type = msg.message_type
-                content = msg.message_content or ""
-                
-                # Skip empty messages
-                if not content.strip():
-                    continue
-                
-                # 检测付款记录（闲鱼系统消息或用户消息中包含付款标记）
-                if "我已付款，等待你发货" in content:
-                    is_returning_customer = True
-                
-                # Clean up debug markers for readability
-                if content.startswith("【调试】"):
-                    content = content[4:]
-                
-                if isinstance(msg_type, str):
-                    type_str = msg_type
-                else:
-                    type_str = msg_type.value if hasattr(msg_type, 'value') else str(msg_type)
-                
-                if type_str == "user":
-                    conversation_lines.append(f"用户: {content}")
-                elif type_str == "seller":
-                    conversation_lines.append(f"客服: {content}")
-            
-            if not conversation_lines:
-                return
+            state, is_returning_customer = rolled
             
             # 将老客户标记存入 session context
             session.context["is_returning_customer"] = is_returning_customer
             if is_returning_customer:
                 logger.info(f"chat_id={chat_id}: 检测到老客户（历史对话中有付款记录）")
             
-            # Build context summary directly (for short histories) 
-            # or call LLM to summarize (for long histories)
-            conversation_text = "\n".join(conversation_lines)
-            
-            # 在摘要前附加老客户标记
-            returning_customer_tag = "【老客户】该用户之前有过付款记录。" if is_returning_customer else "【新客户】该用户暂无历史付款记录。"
-            
-            if len(conversation_lines) <= 10:
-                # Short history: use as-is
-                summary = f"{returning_customer_tag}\n\n以下是与该用户之前的对话记录：\n{conversation_text}"
-            else:
-                # Longer history: call LLM to summarize
-                summary = self._summarize_history(conversation_text, is_returning_customer=is_returning_customer)
-                if not summary:
-                    # Fallback: use last few messages as context
-                    recent_lines = conversation_lines[-10:]
-                    summary = f"{returning_customer_tag}\n\n以下是与该用户最近的对话记录：\n" + "\n".join(recent_lines)
-                else:
-                    # 确保摘要中包含老客户标记
-                    if returning_customer_tag not in summary:
-                        summary = f"{returning_customer_tag}\n\n{summary}"
-            
             # Inject into session context
+            summary = render_chat_summary(state, is_returning_customer)
             session.context["context_summary"] = summary
             logger.info(
                 f"Loaded conversation history for chat_id={chat_id}: "
-                f"{len(history)} records, summary {len(summary)} chars, "
-                f"returning_customer={is_returning_customer}"
+                f"summary {len(summary)} chars, returning_customer={is_returning_customer}"
             )
             
-            # Step 4: Cache the result for future requests
-            self._set_cached_summary(chat_id, summary, is_returning_customer, fingerprint)
+            # Step 4: Cache the result (and rolling state) for future requests
+            self._set_cached_summary(
+                chat_id, summary, is_returning_customer, fingerprint,
+                ttl=settings.history_summary_ttl, rolling=state,
+            )
             
         except Exception as e:
             logger.warning(
@@ -0,0 +1,218 @@
+"""
+Rolling summaries of a buyer's MySQL conversation history.
+
+When a session is (re)built, the executor injects a summary of the earlier
+conversation into ``session.context["context_summary"]``. Each summary is
+kept in Redis as a ``RollingSummary``. Besides the text, it records a
+high-water mark: the ``conversations.id`` of the newest row already
+included. A returning buyer usually has only a few new rows since then, so
+only those rows are folded into the existing digest, in one small LLM call.
+The old approach re-read up to 100 rows and re-summarized all of them.
+
+Folding repeatedly lets the digest drift, so a full rebuild from MySQL
+still happens when ``needs_full_refresh`` asks for one:
+
+- after ``history_summary_refresh_folds`` incremental folds
+- after ``history_summary_refresh_seconds`` since the last rebuild
+- when more than ``history_summary_fold_max`` rows arrived at once
+- when the last fold fell back to verbatim lines
+"""
+
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel, Field
+
+from ai_kefu.config.settings import settings
+from ai_kefu.utils.logging import logger
+
+# Seller-side payment notice; any occurrence marks the buyer as returning
+PAID_MARKER = "我已付款，等待你发货"
+
+RETURNING_CUSTOMER_TAG = "【老客户】该用户之前有过付款记录。"
+NEW_CUSTOMER_TAG = "【新客户】该用户暂无历史付款记录。"
+
+HISTORY_FOLD_PROMPT = """以下是与该用户之前对话的摘要，以及摘要之后新增的对话。请把新增对话合并进摘要，输出一份更新后的完整摘要。
+
+要求：
+1. 摘要开头必须标注客户类型：{returning_tag}
+2. 保留关键信息：用户的核心需求、已确认的订单/租赁信息、价格、日期等
+3. 以新增对话为准更新对话状态：当前进展到哪一步、还有哪些待确认的事项
+4. 保留用户偏好和情绪倾向
+5. 去掉冗余的寒暄、重复的信息
+6. 使用第三人称描述（"用户"、"客服"）
+7. 控制在 200 字以内
+
+之前的摘要：
+{previous_summary}
+
+新增对话：
+{new_lines}
+
+请输出更新后的上下文摘要："""
+
+
+class RollingSummary(BaseModel):
+    """Summary state of one chat or one buyer, stored in Redis."""
+
+    digest: str = Field(default="", description="LLM summary of every line folded so far")
+    recent: List[str] = Field(default_factory=list, description="Lines kept verbatim, newest last")
+    high_water_id: int = Field(default=0, description="conversations.id of the newest row included")
+    folds: int = Field(default=0, description="Incremental folds since the last full refresh")
+    refreshed_at: float = Field(default=0.0, description="time.time() of the last full refresh")
+    stale: bool = Field(default=False, description="Last fold failed; rebuild on next load")
+
+
+def returning_tag(is_returning_customer: bool) -> str:
+    return RETURNING_CUSTOMER_TAG if is_returning_customer else NEW_CUSTOMER_TAG
+
+
+def history_lines(messages: Sequence) -> Tuple[List[str], bool, int]:
+    """
+    Render ConversationMessage rows as ``用户: …`` / ``客服: …`` lines.
+
+    Returns:
+        (lines, is_returning_customer, high_water_id). Empty and non-user/seller
+        rows produce no line but still count towards the high-water mark.
+    """
+    lines: List[str] = []
+    is_returning_customer = False
+    high_water_id = 0
+    for msg in messages:
+        if msg.id is not None:
+            high_water_id = max(high_water_id, msg.id)
+        content = (msg.message_content or "").strip()
+        if not content:
+            continue
+        if PAID_MARKER in content:
+            is_returning_customer = True
+        # Strip debug prefix for readability
+        if content.startswith("【调试】"):
+            content = content[4:]
+        msg_type = msg.message_type
+        type_str = msg_type.value if hasattr(msg_type, "value") else str(msg_type)
+        if type_str == "user":
+            lines.append(f"用户: {content}")
+        elif type_str == "seller":
+            lines.append(f"客服: {content}")
+    return lines, is_returning_customer, high_water_id
+
+
+def needs_full_refresh(state: Optional[RollingSummary], new_count: int, now: Optional[float] = None) -> Optional[str]:
+    """Why the state must be rebuilt from MySQL instead of folded, or None when folding is fine."""
+    if state is None or not state.high_water_id:
+        return "no rolling state"
+    if state.stale:
+        return "last fold failed"
+    if new_count == 0:
+        # Fingerprint changed but nothing is past the mark: rows were edited or removed
+        return "no rows past high-water mark"
+    if new_count > settings.history_summary_fold_max:
+        return f"{new_count} new rows > fold max {settings.history_summary_fold_max}"
+    if state.folds >= settings.history_summary_refresh_folds:
+        return f"{state.folds} folds since last refresh"
+    now = time.time() if now is None else now
+    if now - state.refreshed_at >= settings.history_summary_refresh_seconds:
+        return "refresh interval elapsed"
+    return None
+
+
+def fold_lines(
+    state: RollingSummary,
+    lines: List[str],
+    summarize: Callable[[str, List[str]], Optional[str]],
+    verbatim_limit: int,
+    keep_recent: int,
+) -> RollingSummary:
+    """
+    Append ``lines`` to ``state`` and fold whatever no longer fits verbatim.
+
+    While there is no digest and at most ``verbatim_limit`` lines, everything
+    stays verbatim and no LLM call is made. Past that, all but the last
+    ``keep_recent`` lines are folded into the digest with a single
+    ``summarize(previous_digest, overflow)`` call. If that call fails, the
+    newest lines are kept verbatim and the state is marked stale, so the next
+    load rebuilds it.
+    """
+    combined = state.recent + lines
+    if not state.digest and len(combined) <= verbatim_limit:
+        state.recent = combined
+        return state
+
+    split = len(combined) - keep_recent if keep_recent else len(combined)
+    overflow, kept = combined[:split], combined[split:]
+    if not overflow:
+        state.recent = kept
+        return state
+
+    digest = summarize(state.digest, overflow)
+    if digest:
+        state.digest = digest
+        state.recent = kept
+    else:
+        state.recent = combined[-max(verbatim_limit, keep_recent, 1):]
+        state.stale = True
+    return state
+
+
+def _untagged(digest: str) -> str:
+    """``digest`` without its customer tag; the renderers prepend the current one."""
+    return digest.replace(RETURNING_CUSTOMER_TAG, "").replace(NEW_CUSTOMER_TAG, "").strip()
+
+
+def render_chat_summary(state: RollingSummary, is_returning_customer: bool) -> str:
+    """Per-chat ``context_summary``: the digest, or the verbatim lines of a short history."""
+    if not state.digest:
+        return (
+            f"{returning_tag(is_returning_customer)}\n\n以下是与该用户之前的对话记录：\n"
+            + "\n".join(state.recent)
+        )
+    summary = f"{returning_tag(is_returning_customer)}\n\n{_untagged(state.digest)}"
+    if state.recent:
+        summary += "\n\n以下是之后的最新对话记录：\n" + "\n".join(state.recent)
+    return summary
+
+
+def render_user_summary(state: RollingSummary, is_returning_customer: bool) -> str:
+    """Cross-conversation ``context_summary``: digest of older lines plus the newest lines verbatim."""
+    parts = [returning_tag(is_returning_customer)]
+    if state.digest:
+        parts.append(f"【历史对话摘要】\n{_untagged(state.digest)}")
+    if state.recent:
+        parts.append(f"【最新对话记录（{len(state.recent)} 条）】\n" + "\n".join(state.recent))
+    return "\n\n".join(parts)
+
+
+def fold_history_summary(previous_summary: str, new_lines: List[str], is_returning_customer: bool) -> Optional[str]:
+    """
+    Merge ``new_lines`` into an existing summary with the light model.
+
+    Returns:
+        The updated summary, or None if the call failed
+    """
+    from ai_kefu.llm.qwen_client import call_qwen_fast
+
+    prompt = HISTORY_FOLD_PROMPT.format(
+        returning_tag=returning_tag(is_returning_customer),
+        previous_summary=previous_summary,
+        new_lines="\n".join(new_lines),
+    )
+    try:
+        response = call_qwen_fast(
+            messages=[
+                {"role": "system", "content": "你是一个专业的对话摘要助手。"},
+                {"role": "user", "content": prompt},
+            ],
+            tools=None,
+            max_tokens=300,
+            temperature=0.3,
+            model=settings.model_name_light,
+        )
+        summary = (response["choices"][0]["message"].get("content") or "").strip()
+        if summary:
+            logger.info(f"Folded {len(new_lines)} lines into history summary: {len(summary)} chars")
+            return summary
+        return None
+    except Exception as e:
+        logger.warning(f"Failed to fold history summary: {e}")
+        return None
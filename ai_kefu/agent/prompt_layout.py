@@ -0,0 +1,161 @@
+"""
+Prefix-cache-friendly prompt assembly.
+
+DashScope (like other providers) reuses the KV cache for the longest prompt
+prefix it has seen before. The chat template renders the system message
+first and appends the tool schemas to it, followed by the conversation, so
+anything that changes in the system message also invalidates the cached
+tool schemas and history.
+
+The layout therefore orders content from most to least stable:
+
+1. Static policy: the system prompt template with every date-dependent line
+   removed. It only changes when the prompt itself is edited.
+2. Tool schemas, in canonical (name) order, so the same skill set always
+   serialises identically.
+3. Conversation history, unchanged from previous calls.
+4. Per-call context (today's date lines, the item slot and the context
+   summary), sent as a block in front of the latest user message.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# Template variables filled by render_system_prompt()
+DATE_VARIABLES = ("today_str", "today_date", "current_year", "current_month")
+
+_DATE_VAR_RE = re.compile(r"(?<!\{)\{(" + "|".join(DATE_VARIABLES) + r")\}(?!\})")
+_HEADING_RE = re.compile(r"^#{1,6}\s")
+
+CONTEXT_HEADER = "【当前上下文】"
+MESSAGE_HEADER = "【买家消息】"
+
+# Appended to the static section so the model knows where the moved lines went
+CONTEXT_POINTER = f"\n\n当前日期、当前商品信息和之前的对话摘要在买家最新消息前的{CONTEXT_HEADER}中提供。"
+
+
+@dataclass(frozen=True)
+class PromptLayout:
+    """System prompt split by how often each part changes."""
+    static: str
+    daily: str = ""
+    session: str = ""
+
+    @property
+    def context_block(self) -> str:
+        """Per-call context that is placed in front of the latest user message."""
+        parts = [p for p in (self.daily, self.session) if p]
+        return "\n\n".join(parts)
+
+
+def _unescape(text: str) -> str:
+    """Undo str.format escaping ({{ }}) in lines that have no variables."""
+    try:
+        return text.format()
+    except (IndexError, KeyError, ValueError):
+        return text
+
+
+def _drop_empty_sections(lines: List[str]) -> List[str]:
+    """Remove headings left without any content after date lines were moved."""
+    result: List[str] = []
+    for i, line in enumerate(lines):
+        if _HEADING_RE.match(line):
+            rest = lines[i + 1:]
+            nxt = next((l for l in rest if l.strip()), None)
+            if nxt is None or _HEADING_RE.match(nxt):
+                continue
+        result.append(line)
+    return result
+
+
+@lru_cache(maxsize=16)
+def split_template(template: str) -> Tuple[str, str]:
+    """
+    Split a system prompt template into its static and date-dependent parts.
+
+    Args:
+        template: Template using {today_str} / {today_date} / {current_year} / {current_month}
+
+    Returns:
+        (static_text, daily_template): static text is fully rendered; the daily
+        template holds the lines with date variables, in their original order
+    """
+    static_lines: List[str] = []
+    daily_lines: List[str] = []
+    for line in template.splitlines():
+        if _DATE_VAR_RE.search(line):
+            daily_lines.append(line.strip())
+        else:
+            static_lines.append(line)
+
+    static = "\n".join(_drop_empty_sections(static_lines))
+    static = re.sub(r"\n{3,}", "\n\n", _unescape(static)).strip()
+    if daily_lines:
+        static += CONTEXT_POINTER
+    return static, "\n".join(daily_lines)
+
+
+def render_daily(daily_template: str, now: Optional[datetime] = None) -> str:
+    """Fill the date variables of the daily lines."""
+    if not daily_template:
+        return ""
+    now = now or datetime.now()
+    body = daily_template.format(
+        today_str=now.strftime("%Y年%m月%d日"),
+        today_date=now.strftime("%Y-%m-%d"),
+        current_year=now.year,
+        current_month=now.month,
+    )
+    return f"## 当前日期\n{body}"
+
+
+def build_prompt_layout(
+    template: str,
+    *,
+    item_slot: str = "",
+    context_summary: str = "",
+    now: Optional[datetime] = None,
+) -> PromptLayout:
+    """
+    Assemble the prompt layout for one turn.
+
+    Args:
+        template: System prompt template (DB ``rental_system`` or code default)
+        item_slot: Rendered "当前商品信息" section, if any
+        context_summary: Summary of earlier conversation, if any
+        now: Clock override for tests
+
+    Returns:
+        PromptLayout
+    """
+    static, daily_template = split_template(template)
+    session_parts = []
+    if item_slot:
+        session_parts.append(item_slot)
+    if context_summary:
+        session_parts.append(
+            "## 之前的对话上下文摘要\n"
+            "以下是与该用户之前对话的摘要，请基于此理解用户需求的完整上下文：\n"
+            f"{context_summary}"
+        )
+    return PromptLayout(
+        static=static,
+        daily=render_daily(daily_template, now),
+        session="\n\n".join(session_parts),
+    )
+
+
+def with_context(content: str, context_block: str) -> str:
+    """Prefix a user message with the per-call context block."""
+    if not context_block:
+        return content
+    return f"{CONTEXT_HEADER}\n{context_block}\n\n{MESSAGE_HEADER}\n{content}"
+
+
+def canonical_tools(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Order tool schemas by name so a given tool set always serialises the same."""
+    return sorted(tools, key=lambda t: t.get("function", {}).get("name", ""))
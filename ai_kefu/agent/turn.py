@@ -10,10 +10,16 @@ from ai_kefu.agent.types import TurnResult
 from ai_kefu.models.session import Session, Message, ToolCall
 from ai_kefu.config.constants import MessageRole, ToolCallStatus
 from ai_kefu.llm.qwen_client import call_qwen, call_qwen_fast
+from ai_kefu.llm.tokenizer import count_tools_tokens
+from ai_kefu.agent.context_packer import PackResult, pack_context
+from ai_kefu.agent.prompt_layout import PromptLayout, build_prompt_layout, canonical_tools
 from ai_kefu.tools.tool_registry import ToolRegistry
 from ai_kefu.utils.logging import logger, log_turn_start, log_turn_end, log_tool_call, log_tool_result
-from ai_kefu.prompts.rental_system_prompt import get_rental_system_prompt, render_system_prompt
+from ai_kefu.utils.metrics import CONFIDENCE_GUARD
+from ai_kefu.utils.tracing import start_span
+from ai_kefu.prompts.rental_system_prompt import get_rental_system_prompt_template
 from ai_kefu.storage.prompt_store import PromptStore
+from ai_kefu.storage.config_cache import ConfigCache, TOPIC_PROMPTS, get_invalidation_bus
 from ai_kefu.config.settings import settings
 
 
@@ -67,13 +73,19 @@ def validate_message_sequence(messages: List[Dict[str, Any]], *, auto_fix: bool
                 # Collect all tool_call_ids that need responses
                 for tc in tool_calls:
                     pending_tool_call_ids.add(tc["id"])
-                logger.debug(f"Message[{i}] (assistant): added {len(tool_calls)} pending tool_call_ids: {pending_tool_call_ids}")
+                logger.debug(
+                    "Message[{}] (assistant): added {} pending tool_call_ids: {}",
+                    i, len(tool_calls), pending_tool_call_ids,
+                )
         
         elif role == "tool":
             tool_call_id = msg.get("tool_call_id")
             if tool_call_id in pending_tool_call_ids:
                 pending_tool_call_ids.remove(tool_call_id)
-                logger.debug(f"Message[{i}] (tool): resolved tool_call_id={tool_call_id}, remaining: {pending_tool_call_ids}")
+                logger.debug(
+                    "Message[{}] (tool): resolved tool_call_id={}, remaining: {}",
+                    i, tool_call_id, pending_tool_call_ids,
+                )
             else:
                 if auto_fix:
                     logger.warning(
@@ -179,7 +191,8 @@ def execute_turn(
         session: Current session
         user_message: User's message (only used if is_tool_continue=False)
         tools_registry: Tool registry
-        system_prompt: System prompt (if None, uses default with current date)
+        system_prompt: System prompt template (if None, loads the active template;
+            date variables are rendered into the per-call context block)
         is_tool_continue: If True, don't add new user message (for tool result continuation)
         active_skill_tools: Optional set of tool names to expose to the LLM.
             When provided only those tools are included in the Qwen request,
@@ -188,16 +201,19 @@ def execute_turn(
     Returns:
         TurnResult with turn execution results
     """
-    # Use default system prompt with current date if not provided
+    # Use default system prompt template if not provided (dates are filled
+    # into the per-call context block, not the system message)
     if system_prompt is None:
         _t0 = datetime.utcnow()
-        system_prompt = _load_system_prompt()
+        with start_span("agent.load_system_prompt"):
+            system_prompt = _load_system_prompt_template()
         _t1 = datetime.utcnow()
-        logger.info(f"[perf] _load_system_prompt: {int((_t1 - _t0).total_seconds() * 1000)}ms")
+        logger.info(f"[perf] _load_system_prompt_template: {int((_t1 - _t0).total_seconds() * 1000)}ms")
     
-    # Inject item info into system prompt if available (fixed context slot)
+    # Item info as a fixed context slot (part of the per-call context block)
     # This is prefetched once at session start so the LLM knows the exact
     # product title / price / model without asking the buyer.
+    item_slot = ""
     item_info = session.context.get("item_info")
     if item_info and item_info.get("success"):
         import re as _re
@@ -228,14 +244,17 @@ def execute_turn(
         if location:
             item_slot_lines.append(f"所在地：{location}")
         item_slot = "\n".join(item_slot_lines)
-        system_prompt = system_prompt + f"\n\n{item_slot}"
-        logger.info(f"Injected item_info (item_id={item_info.get('item_id', '')}) into system prompt")
+        logger.info(f"Injected item_info (item_id={item_info.get('item_id', '')}) into context block")
 
-    # Inject context summary into system prompt if available
+    # Context summary also goes into the per-call context block
     context_summary = session.context.get("context_summary", "")
     if context_summary:
-        system_prompt = system_prompt + f"\n\n## 之前的对话上下文摘要\n以下是与该用户之前对话的摘要，请基于此理解用户需求的完整上下文：\n{context_summary}"
-        logger.info(f"Injected context summary ({len(context_summary)} chars) into system prompt")
+        logger.info(f"Injected context summary ({len(context_summary)} chars) into context block")
+
+    # Most-stable-first layout: static policy → tools → history → per-call context
+    layout = build_prompt_layout(
+        system_prompt, item_slot=item_slot, context_summary=context_summary
+    )
     
     start_time = datetime.utcnow()
     turn_counter = session.turn_counter + 1
@@ -245,7 +264,16 @@ def execute_turn(
     try:
         new_messages = []
         
+        # Get tools in Qwen format — filtered to active skill group if provided
+        tools = canonical_tools(tools_registry.to_qwen_format(skill_names=active_skill_tools))
+        logger.info(
+            f"Tools for this turn: {len(tools)} "
+            f"({'filtered: ' + repr(active_skill_tools) if active_skill_tools is not None else 'all'})"
+        )
+        
         # Add user message only if this is not a tool continuation turn
+        # (for tool continuation the tool results are already in session.messages)
+        user_msg = None
         if not is_tool_continue:
             user_msg = Message(
                 role=MessageRole.USER,
@@ -253,61 +281,42 @@ def execute_turn(
                 timestamp=datetime.utcnow()
             )
             new_messages.append(user_msg)
-            
-            # Build message history with new user message
-            messages = _build_message_history(session, user_msg, system_prompt)
-        else:
-            # For tool continuation, build message history without adding new user message
-            # The tool results are already in session.messages
-            messages = [{"role": "system", "content": system_prompt}]
-            
-            # Add all historical messages (including recent tool results)
-            for msg in session.messages:
-                if msg.role == MessageRole.USER:
-                    messages.append({"role": "user", "content": msg.content})
-                elif msg.role == MessageRole.ASSISTANT:
-                    msg_dict = {"role": "assistant", "content": msg.content}
-                    if msg.tool_calls:
-                        msg_dict["tool_calls"] = [
-                            {
-                                "id": tc.id,
-                                "type": "function",
-                                "function": {
-                                    "name": tc.name,
-                                    "arguments": json_serialize(tc.args)
-                                }
-                            }
-                            for tc in msg.tool_calls
-                        ]
-                    messages.append(msg_dict)
-                elif msg.role == MessageRole.TOOL:
-                    messages.append({
-                        "role": "tool",
-                        "content": msg.content,
-                        "tool_call_id": msg.tool_call_id
-                    })
+        
+        # Build message history within the token budget
+        pack = _build_message_history(session, user_msg, layout, tools)
+        messages = pack.messages
         
         # Validate message sequence (auto_fix removes orphan tool messages
         # that may result from context summarisation trimming)
         is_valid, error_msg = validate_message_sequence(messages, auto_fix=True)
         if not is_valid:
-            logger.error(f"Invalid message sequence: {error_msg}")
-            logger.error(f"Full message history: {json.dumps([{'role': m.get('role'), 'has_tool_calls': 'tool_calls' in m, 'tool_call_id': m.get('tool_call_id')} for m in messages], indent=2)}")
+            logger.error(
+                "Invalid message sequence: {} (roles: {})",
+                error_msg, ",".join(str(m.get("role")) for m in messages),
+            )
+            logger.opt(lazy=True).debug("Full message history: {}", lambda: json.dumps(
+                [
+                    {"role": m.get("role"), "has_tool_calls": "tool_calls" in m, "tool_call_id": m.get("tool_call_id")}
+                    for m in messages
+                ],
+                indent=2,
+            ))
             raise ValueError(f"Invalid message sequence: {error_msg}")
         
-        # Get tools in Qwen format — filtered to active skill group if provided
-        tools = tools_registry.to_qwen_format(skill_names=active_skill_tools)
-        logger.info(
-            f"Tools for this turn: {len(tools)} "
-            f"({'filtered: ' + repr(active_skill_tools) if active_skill_tools is not None else 'all'})"
-        )
-        
         # Call Qwen API
         logger.info(f"Calling Qwen API for turn {turn_counter}")
         _t_qwen_start = datetime.utcnow()
         response = call_qwen(messages=messages, tools=tools if tools else None)
         _t_qwen_end = datetime.utcnow()
-        logger.info(f"[perf] call_qwen: {int((_t_qwen_end - _t_qwen_start).total_seconds() * 1000)}ms")
+        qwen_ms = int((_t_qwen_end - _t_qwen_start).total_seconds() * 1000)
+        logger.info(f"[perf] call_qwen: {qwen_ms}ms")
+        usage = response.get("usage") or {}
+        logger.info(
+            f"[usage] turn {turn_counter}: prompt_tokens={usage.get('prompt_tokens')} "
+            f"(estimated {pack.prompt_tokens}), cached_tokens={usage.get('cached_tokens')}, "
+            f"completion_tokens={usage.get('completion_tokens')}, "
+            f"latency={qwen_ms}ms"
+        )
         
         # Capture LLM input/output for debugging
         llm_input_snapshot = [dict(m) for m in messages]  # Shallow copy of messages sent to LLM
@@ -360,6 +369,7 @@ def execute_turn(
             )
             if confidence_percent < confidence_threshold_percent:
                 response_suppressed = True
+                CONFIDENCE_GUARD.inc(outcome="suppressed")
                 logger.warning(
                     f"【置信度抑制】Low-confidence response suppressed: confidence={confidence_percent}%, "
                     f"threshold={confidence_threshold_percent}%, "
@@ -367,6 +377,8 @@ def execute_turn(
                 )
                 # 不清空 response_text，保留原始回复用于日志和调试
                 # 通过 metadata.response_suppressed 标记，由上层 executor 决定是否替换为兜底回复
+            else:
+                CONFIDENCE_GUARD.inc(outcome="passed")
 
         # Create assistant message
         assistant_msg = Message(
@@ -521,6 +533,14 @@ def execute_turn(
                 "turn_counter": turn_counter,
                 "confidence_percent": confidence_percent,
                 "response_suppressed": response_suppressed,
+                "usage": usage,
+                "llm_latency_ms": qwen_ms,
+                "context": {
+                    "estimated_prompt_tokens": pack.prompt_tokens,
+                    "budget_tokens": pack.budget_tokens,
+                    "dropped_messages": pack.dropped_messages,
+                    "elided_tool_results": pack.elided_tool_results,
+                },
             },
             llm_input=llm_input_snapshot,
             llm_output=llm_output_snapshot
@@ -541,59 +561,36 @@ def execute_turn(
 
 def _build_message_history(
     session: Session,
-    new_user_message: Message,
-    system_prompt: str
-) -> List[Dict[str, Any]]:
+    new_user_message: Optional[Message],
+    layout: PromptLayout,
+    tools: Optional[List[Dict[str, Any]]] = None,
+) -> PackResult:
     """
-    Build message history for Qwen API.
+    Build message history for Qwen API within the configured token budget.
     
     Args:
         session: Current session
-        new_user_message: New user message
-        system_prompt: System prompt
+        new_user_message: New user message, or None for a tool-continuation turn
+        layout: Prompt layout (static system prompt + per-call context block)
+        tools: Tool definitions sent with the call (counted against the budget)
         
     Returns:
-        List of messages in Qwen format
+        PackResult whose ``messages`` are in Qwen format
     """
-    messages = [
-        {"role": "system", "content": system_prompt}
-    ]
-    
-    logger.debug(f"Building message history from {len(session.messages)} session messages")
-    
-    # Add historical messages
-    for idx, msg in enumerate(session.messages):
-        logger.debug(f"Processing session message {idx}: role={msg.role}, has_tool_calls={hasattr(msg, 'tool_calls') and msg.tool_calls is not None}, tool_call_id={getattr(msg, 'tool_call_id', None)}")
-        
-        if msg.role == MessageRole.USER:
-            messages.append({"role": "user", "content": msg.content})
-        elif msg.role == MessageRole.ASSISTANT:
-            msg_dict = {"role": "assistant", "content": msg.content}
-            if msg.tool_calls:
-                msg_dict["tool_calls"] = [
-                    {
-                        "id": tc.id,
-                        "type": "function",
-                        "function": {
-                            "name": tc.name,
-                            "arguments": json_serialize(tc.args)
-                        }
-                    }
-                    for tc in msg.tool_calls
-                ]
-            messages.append(msg_dict)
-        elif msg.role == MessageRole.TOOL:
-            messages.append({
-                "role": "tool",
-                "content": msg.content,
-                "tool_call_id": msg.tool_call_id
-            })
-    
-    # Add new user message
-    logger.debug(f"Adding new user message: {new_user_message.content[:50]}")
-    messages.append({"role": "user", "content": new_user_message.content})
-    
-    return messages
+    pack = pack_context(
+        layout.static,
+        session.messages,
+        new_user_message,
+        tools_tokens=count_tools_tokens(tools),
+        context_block=layout.context_block,
+    )
+    logger.info(
+        "Packed context: {} messages, ~{} tokens (budget {}, sections={}), "
+        "dropped {} old messages, elided {} tool results",
+        len(pack.messages), pack.prompt_tokens, pack.budget_tokens, pack.sections,
+        pack.dropped_messages, pack.elided_tool_results,
+    )
+    return pack
 
 
 # ============================================================
@@ -604,11 +601,6 @@ def _build_message_history(
 # Cached PromptStore instance (lazy init)
 _prompt_store_instance: PromptStore = None
 
-# System prompt cache: (rendered_prompt, cached_at_timestamp)
-import time as _time
-_system_prompt_cache: tuple = (None, 0.0)
-_SYSTEM_PROMPT_CACHE_TTL = 300  # 5 minutes – prompt changes are rare
-
 
 def _get_prompt_store() -> PromptStore:
     """Get or create PromptStore singleton."""
@@ -624,43 +616,49 @@ def _get_prompt_store() -> PromptStore:
     return _prompt_store_instance
 
 
-def _load_system_prompt() -> str:
+def _fetch_system_prompt_template() -> str:
     """
-    Load system prompt: try database first, fallback to code.
-    Results are cached in-memory for up to _SYSTEM_PROMPT_CACHE_TTL seconds
-    to avoid a MySQL round-trip on every turn.
-    
-    1. Check in-memory cache (TTL-based)
-    2. Try loading active 'rental_system' prompt from DB
-    3. If found, render template variables (dates)
-    4. If not found or DB error, use code default
-    
+    Load the system prompt template: try database first, fallback to code.
+
+    1. Try loading active 'rental_system' prompt from DB
+    2. If not found or DB error, use code default template
+
     Returns:
-        Rendered system prompt string
+        System prompt template string
     """
-    global _system_prompt_cache
-    
-    cached_prompt, cached_at = _system_prompt_cache
-    now = _time.monotonic()
-    
-    if cached_prompt is not None and (now - cached_at) < _SYSTEM_PROMPT_CACHE_TTL:
-        logger.debug("Using cached system prompt (%.1fs old)", now - cached_at)
-        return cached_prompt
-    
-    rendered = None
     try:
         store = _get_prompt_store()
         prompt = store.get_active("rental_system")
         if prompt and prompt.content:
             logger.info("Loaded system prompt from database (rental_system)")
-            rendered = render_system_prompt(prompt.content)
+            return prompt.content
     except Exception as e:
         logger.warning(f"Failed to load system prompt from DB, using code default: {e}")
-    
-    if rendered is None:
-        # Fallback to code default
-        logger.info("Using code-default system prompt")
-        rendered = get_rental_system_prompt()
-    
-    _system_prompt_cache = (rendered, now)
-    return rendered
+
+    logger.info("Using code-default system prompt")
+    return get_rental_system_prompt_template()
+
+
+# System prompt template cache: reloaded in the background every
+# config_refresh_interval seconds, and immediately when /prompts is edited in
+# any worker (see storage.config_cache).
+_system_prompt_cache: ConfigCache[str] = ConfigCache(
+    "system_prompt", _fetch_system_prompt_template, settings.config_refresh_interval
+)
+get_invalidation_bus().subscribe(TOPIC_PROMPTS, _system_prompt_cache.invalidate)
+
+
+def _load_system_prompt_template() -> str:
+    """
+    Cached system prompt template (see _fetch_system_prompt_template).
+
+    Only the first call in a process waits for MySQL; later calls return the
+    cached template while reloads happen in the background.
+
+    Date variables are left unrendered; build_prompt_layout() moves them
+    out of the system message so it stays byte-identical across days.
+
+    Returns:
+        System prompt template string
+    """
+    return _system_prompt_cache.get()
@@ -7,6 +7,8 @@ from ai_kefu.storage.session_store import SessionStore
 from ai_kefu.storage.knowledge_store import KnowledgeStore
 from ai_kefu.storage.prompt_store import PromptStore
 from ai_kefu.storage.ignore_pattern_store import IgnorePatternStore
+from ai_kefu.storage.eval_store import EvalStore
+from ai_kefu.storage.config_cache import TOPIC_IGNORE_PATTERNS, get_invalidation_bus
 from ai_kefu.xianyu_interceptor.conversation_store import ConversationStore
 from ai_kefu.xianyu_interceptor.session_mapper import SessionMapper, MemorySessionMapper, RedisSessionMapper
 from ai_kefu.xianyu_interceptor.manual_mode import ManualModeManager
@@ -19,6 +21,7 @@ _knowledge_store: Optional[KnowledgeStore] = None
 _conversation_store: Optional[ConversationStore] = None
 _prompt_store: Optional[PromptStore] = None
 _ignore_pattern_store: Optional[IgnorePatternStore] = None
+_eval_store: Optional[EvalStore] = None
 _xianyu_session_mapper: Optional[SessionMapper] = None
 _manual_mode_manager: Optional[ManualModeManager] = None
 
@@ -68,7 +71,8 @@ def get_conversation_store() -> ConversationStore:
             port=settings.mysql_port,
             user=settings.mysql_user,
             password=settings.mysql_password,
-            database=settings.mysql_database
+            database=settings.mysql_database,
+            read_timeout=settings.db_read_timeout,
         )
     return _conversation_store
 
@@ -108,9 +112,30 @@ def get_ignore_pattern_store() -> IgnorePatternStore:
             password=settings.mysql_password,
             database=settings.mysql_database
         )
+        get_invalidation_bus().subscribe(TOPIC_IGNORE_PATTERNS, _ignore_pattern_store.invalidate_cache)
     return _ignore_pattern_store
 
 
+def get_eval_store() -> EvalStore:
+    """
+    Dependency: Get EvalStore instance.
+
+    Returns:
+        EvalStore singleton
+    """
+    global _eval_store
+    if _eval_store is None:
+        _eval_store = EvalStore(
+            host=settings.mysql_host,
+            port=settings.mysql_port,
+            user=settings.mysql_user,
+            password=settings.mysql_password,
+            database=settings.mysql_database,
+            read_timeout=settings.db_read_timeout,
+        )
+    return _eval_store
+
+
 def get_xianyu_session_mapper() -> SessionMapper:
     """
     Dependency: Get Xianyu SessionMapper singleton.
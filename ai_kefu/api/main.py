@@ -3,18 +3,27 @@ FastAPI application main entry point.
 """
 
 import asyncio
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 from ai_kefu.config.settings import settings
 from ai_kefu.utils.logging import setup_logging, logger
+from ai_kefu.utils import loop_monitor as loop_monitor_module
+from ai_kefu.utils.loop_monitor import LoopLagMonitor
+from ai_kefu.storage.db_executor import DBTimeoutError, shutdown_db_executor
+from ai_kefu.storage.config_cache import TOPIC_SETTINGS, get_invalidation_bus
+from ai_kefu.utils.metrics import HTTP_REQUEST_SECONDS
+from ai_kefu.utils.tracing import TRACE_ID_HEADER, TRACEPARENT_HEADER, configure_tracing, start_span
 from typing import AsyncGenerator
 from pathlib import Path
 
 
 # Setup logging
 setup_logging()
+configure_tracing("api")
 
 
 @asynccontextmanager
@@ -27,6 +36,19 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
     logger.info("Starting AI Customer Service Agent...")
     logger.info(f"Configuration: Model={settings.model_name}, Port={settings.api_port}")
     
+    if settings.enable_loop_monitor:
+        loop_monitor_module.loop_monitor = LoopLagMonitor(
+            interval=settings.loop_lag_interval,
+            threshold_ms=settings.loop_lag_threshold_ms,
+        )
+        loop_monitor_module.loop_monitor.start()
+    
+    # Cross-worker config invalidation (prompts / ignore patterns / settings)
+    bus = get_invalidation_bus()
+    bus.subscribe(TOPIC_SETTINGS, settings_routes.sync_shared_settings)
+    await asyncio.to_thread(settings_routes.sync_shared_settings)
+    bus.start()
+    
     try:
         yield
     except asyncio.CancelledError:
@@ -36,6 +58,17 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
     
     # Shutdown
     logger.info("Shutting down AI Customer Service Agent...")
+    if loop_monitor_module.loop_monitor is not None:
+        await loop_monitor_module.loop_monitor.stop()
+        loop_monitor_module.loop_monitor = None
+    bus.stop()
+    shutdown_db_executor()
+    try:
+        # Stop the Xianyu provider background loop (no-op if never started)
+        from ai_kefu.xianyu_provider.runtime import shutdown_runtime
+        shutdown_runtime()
+    except ImportError:
+        pass
 
 
 # Create FastAPI app
@@ -56,6 +89,71 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def track_in_flight_requests(request: Request, call_next):
+    """Register in-flight requests so event-loop stalls can name them."""
+    monitor = loop_monitor_module.loop_monitor
+    if monitor is None:
+        return await call_next(request)
+    request_id = id(request)
+    monitor.track_request(request_id, f"{request.method} {request.url.path}")
+    try:
+        return await call_next(request)
+    finally:
+        monitor.untrack_request(request_id)
+
+
+@app.middleware("http")
+async def observe_request_duration(request: Request, call_next):
+    """Request latency histogram, labelled by route template (bounded cardinality)."""
+    started = time.perf_counter()
+    status = "500"
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", None) or "unmatched",
+            status=status,
+        )
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Open the server span of a request, continuing the caller's trace when it
+    sent a ``traceparent`` header (the interceptor relay does). Plain GETs
+    without one (UI polling, static files) are not traced.
+    """
+    traceparent = request.headers.get(TRACEPARENT_HEADER)
+    if not settings.tracing_enabled or (request.method == "GET" and not traceparent):
+        return await call_next(request)
+    span = start_span(
+        f"api.{request.method} {request.url.path}",
+        {"method": request.method, "path": request.url.path},
+        traceparent=traceparent,
+    )
+    try:
+        response = await call_next(request)
+    except Exception as e:
+        span.end(e)
+        raise
+    span.set_attribute("status_code", response.status_code)
+    response.headers[TRACE_ID_HEADER] = span.trace_id
+    span.end()
+    return response
+
+
+@app.exception_handler(DBTimeoutError)
+async def db_timeout_handler(request: Request, exc: DBTimeoutError):
+    """Slow queries fail fast with 504 instead of holding the request open."""
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
 # Health check endpoint (will be replaced by routes)
 @app.get("/")
 async def root():
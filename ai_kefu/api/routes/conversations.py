@@ -5,11 +5,14 @@ Provides endpoints for viewing and searching conversation records
 including AI debug mode responses and agent turn-level LLM I/O.
 """
 
+import asyncio
 from datetime import datetime
 from typing import Optional
 from fastapi import APIRouter, Query, HTTPException
 from pydantic import BaseModel
 from ai_kefu.api.dependencies import get_conversation_store
+from ai_kefu.storage.db_executor import DBTimeoutError, run_db
+from ai_kefu.utils.similarity import score_pairs
 
 
 router = APIRouter()
@@ -42,7 +45,7 @@ async def get_recent_conversations(
     """
     try:
         store = get_conversation_store()
-        result = store.get_recent_conversations(limit=limit, offset=offset, date=date)
+        result = await run_db(store.get_recent_conversations, limit=limit, offset=offset, date=date)
         
         for item in result['items']:
             for key in ('first_message_at', 'last_message_at'):
@@ -50,6 +53,8 @@ async def get_recent_conversations(
                     item[key] = item[key].isoformat()
         
         return result
+    except DBTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch conversations: {str(e)}")
 
@@ -61,13 +66,15 @@ async def get_conversation_stats():
     """
     try:
         store = get_conversation_store()
-        stats = store.get_conversation_stats()
+        stats = await run_db(store.get_conversation_stats)
         
         for key in ('earliest_message', 'latest_message'):
             if stats.get(key) and isinstance(stats[key], datetime):
                 stats[key] = stats[key].isoformat()
         
         return stats
+    except DBTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch stats: {str(e)}")
 
@@ -81,14 +88,17 @@ async def search_messages(
     has_agent_response: Optional[bool] = Query(None, description="Filter AI responses"),
     debug_only: bool = Query(False, description="Only show debug mode responses"),
     limit: int = Query(50, ge=1, le=200, description="Page size"),
-    offset: int = Query(0, ge=0, description="Pagination offset")
+    offset: int = Query(0, ge=0, description="Pagination offset (deprecated, use cursor)"),
+    cursor: Optional[str] = Query(None, description="Keyset cursor (next_cursor of the previous page)"),
 ):
     """
     Search messages with various filters.
+    Keyword results are ranked by relevance (ngram full-text index);
+    page through them with ``cursor``.
     """
     try:
         store = get_conversation_store()
-        result = store.search_messages(
+        result = await run_db(store.search_messages,
             keyword=keyword,
             start_time=start_time,
             end_time=end_time,
@@ -96,7 +106,8 @@ async def search_messages(
             has_agent_response=has_agent_response,
             debug_only=debug_only,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor,
         )
         
         for item in result['items']:
@@ -105,6 +116,8 @@ async def search_messages(
                     item[key] = item[key].isoformat()
         
         return result
+    except DBTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to search messages: {str(e)}")
 
@@ -123,13 +136,15 @@ async def get_recent_turns(
     """
     try:
         store = get_conversation_store()
-        result = store.get_recent_turns(limit=limit, offset=offset)
+        result = await run_db(store.get_recent_turns, limit=limit, offset=offset)
         
         for item in result['items']:
             if item.get('created_at') and isinstance(item['created_at'], datetime):
                 item['created_at'] = item['created_at'].isoformat()
         
         return result
+    except DBTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch turns: {str(e)}")
 
@@ -146,7 +161,7 @@ async def get_session_turns(
     """
     try:
         store = get_conversation_store()
-        turns = store.get_turns_by_session(
+        turns = await run_db(store.get_turns_by_session,
             session_id=session_id,
             limit=limit,
             offset=offset
@@ -166,6 +181,8 @@ async def get_session_turns(
         }
     except HTTPException:
         raise
+    except DBTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch session turns: {str(e)}")
 
@@ -180,13 +197,15 @@ async def save_turn_review(turn_id: int, body: TurnReviewRequest):
         raise HTTPException(status_code=422, detail="rating must be 1 (thumbs up) or -1 (thumbs down)")
     try:
         store = get_conversation_store()
-        row_id = store.save_turn_review(
+        row_id = await run_db(store.save_turn_review,
             agent_turn_id=turn_id,
             session_id=body.session_id,
             rating=body.rating,
             comment=body.comment,
         )
         return {"ok": True, "id": row_id}
+    except DBTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save turn review: {str(e)}")
 
@@ -199,7 +218,7 @@ async def get_turn_reviews(session_id: str):
     """
     try:
         store = get_conversation_store()
-        reviews = store.get_turn_reviews_by_session(session_id)
+        reviews = await run_db(store.get_turn_reviews_by_session, session_id)
         for r in reviews:
             for key in ('created_at', 'updated_at'):
                 if r.get(key) and isinstance(r[key], datetime):
@@ -207,6 +226,8 @@ async def get_turn_reviews(session_id: str):
         # Build a lookup dict  {agent_turn_id: review}
         reviews_by_turn = {r['agent_turn_id']: r for r in reviews}
         return {"session_id": session_id, "reviews": reviews_by_turn}
+    except DBTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch turn reviews: {str(e)}")
 
@@ -224,13 +245,15 @@ async def save_conversation_review(chat_id: str, body: ReviewRequest):
         raise HTTPException(status_code=422, detail="rating must be 1 (thumbs up) or -1 (thumbs down)")
     try:
         store = get_conversation_store()
-        row_id = store.save_review(
+        row_id = await run_db(store.save_review,
             chat_id=chat_id,
             rating=body.rating,
             comment=body.comment,
             session_id=body.session_id,
         )
         return {"ok": True, "id": row_id}
+    except DBTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save review: {str(e)}")
 
@@ -242,12 +265,14 @@ async def get_conversation_reviews(chat_id: str):
     """
     try:
         store = get_conversation_store()
-        reviews = store.get_reviews_by_chat(chat_id)
+        reviews = await run_db(store.get_reviews_by_chat, chat_id)
         for r in reviews:
             for key in ('created_at', 'updated_at'):
                 if r.get(key) and isinstance(r[key], datetime):
                     r[key] = r[key].isoformat()
         return {"chat_id": chat_id, "reviews": reviews}
+    except DBTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch reviews: {str(e)}")
 
@@ -264,7 +289,7 @@ async def get_conversation_detail(
     """
     try:
         store = get_conversation_store()
-        messages = store.get_conversation_history(
+        messages = await run_db(store.get_conversation_history,
             chat_id=chat_id,
             limit=limit,
             offset=offset
@@ -291,7 +316,7 @@ async def get_conversation_detail(
         turns_by_session = {}
         for sid in session_ids:
             try:
-                turns = store.get_turns_by_session(sid)
+                turns = await run_db(store.get_turns_by_session, sid)
                 for turn in turns:
                     if turn.get('created_at') and isinstance(turn['created_at'], datetime):
                         turn['created_at'] = turn['created_at'].isoformat()
@@ -304,7 +329,7 @@ async def get_conversation_detail(
         # agent_turns directly by chat_id so we can still show the AI reasoning.
         if not turns_by_session:
             try:
-                extra = store.get_turns_by_chat_id(chat_id)
+                extra = await run_db(store.get_turns_by_chat_id, chat_id)
                 for sid, turns in extra.items():
                     for turn in turns:
                         if turn.get('created_at') and isinstance(turn['created_at'], datetime):
@@ -321,48 +346,37 @@ async def get_conversation_detail(
         }
     except HTTPException:
         raise
+    except DBTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch conversation: {str(e)}")
 
 # ─── AI Evaluation / Comparison ──────────────────────────────────
 
-def _jaccard_similarity(text_a: str, text_b: str) -> float:
+def _next_reply_indexes(msg_list: list) -> list:
     """
-    Calculate Jaccard similarity based on character bigrams.
-    Returns value between 0.0 and 1.0.
+    For every position i, the index of the first human seller reply and the
+    first AI seller reply after i (None when there is none), in one reverse
+    pass instead of two forward scans per user message.
     """
-    if not text_a or not text_b:
-        return 0.0
-    
-    def bigrams(text: str) -> set:
-        text = text.strip()
-        return {text[i:i+2] for i in range(len(text) - 1)} if len(text) >= 2 else {text}
-    
-    set_a = bigrams(text_a)
-    set_b = bigrams(text_b)
-    
-    intersection = len(set_a & set_b)
-    union = len(set_a | set_b)
-    return intersection / union if union > 0 else 0.0
-
-
-def _length_ratio(text_a: str, text_b: str) -> float:
-    """
-    Calculate length ratio (shorter / longer).
-    Returns value between 0.0 and 1.0.
-    """
-    if not text_a or not text_b:
-        return 0.0
-    la, lb = len(text_a.strip()), len(text_b.strip())
-    if max(la, lb) == 0:
-        return 1.0
-    return min(la, lb) / max(la, lb)
+    next_human = next_ai = None
+    result = [(None, None)] * len(msg_list)
+    for i in range(len(msg_list) - 1, -1, -1):
+        result[i] = (next_human, next_ai)
+        msg = msg_list[i]
+        if msg['message_type'] == 'seller':
+            if msg.get('agent_response'):
+                next_ai = i
+            else:
+                next_human = i
+    return result
 
 
 @router.post("/{chat_id}/compare")
 async def compare_replies(
     chat_id: str,
     message_id: Optional[int] = Query(None, description="Specific message ID to compare (if multiple)"),
+    embeddings: bool = Query(False, description="Also score embedding cosine similarity (calls the embedding API)"),
 ):
     """
     AI evaluation: Compare human reply with AI reply for a conversation.
@@ -375,7 +389,7 @@ async def compare_replies(
     """
     try:
         store = get_conversation_store()
-        messages = store.get_conversation_history(chat_id=chat_id)
+        messages = await run_db(store.get_conversation_history, chat_id=chat_id)
         
         if not messages:
             raise HTTPException(status_code=404, detail=f"No messages found for chat_id: {chat_id}")
@@ -386,48 +400,28 @@ async def compare_replies(
             msg_dict = msg.model_dump()
             msg_list.append(msg_dict)
         
-        # Find the user message and corresponding human/AI replies
+        # Pair each user message with the next human reply (seller message
+        # without agent_response) and the next AI reply (with agent_response)
         comparisons = []
+        next_replies = _next_reply_indexes(msg_list)
         
         for i, msg in enumerate(msg_list):
             if msg['message_type'] != 'user':
                 continue
             
-            user_message = msg['message_content']
-            user_msg_id = msg.get('id')
-            
-            # Find corresponding human reply (seller message without agent_response)
-            human_reply = None
-            human_reply_id = None
-            for j in range(i + 1, len(msg_list)):
-                if msg_list[j]['message_type'] == 'seller' and not msg_list[j].get('agent_response'):
-                    human_reply = msg_list[j]['message_content']
-                    human_reply_id = msg_list[j].get('id')
-                    break
-            
-            # Find corresponding AI reply (seller message with agent_response)
-            ai_reply = None
-            ai_reply_id = None
-            for j in range(i + 1, len(msg_list)):
-                if msg_list[j]['message_type'] == 'seller' and msg_list[j].get('agent_response'):
-                    ai_reply = msg_list[j]['message_content']
-                    ai_reply_id = msg_list[j].get('id')
-                    break
+            human_idx, ai_idx = next_replies[i]
+            human_reply = msg_list[human_idx]['message_content'] if human_idx is not None else None
+            ai_reply = msg_list[ai_idx]['message_content'] if ai_idx is not None else None
             
             # Only create comparison if we have both human and AI replies
             if human_reply and ai_reply:
-                similarity = _jaccard_similarity(human_reply, ai_reply)
-                length_ratio = _length_ratio(human_reply, ai_reply)
-                
                 comparisons.append({
-                    'user_msg_id': user_msg_id,
-                    'user_message': user_message,
-                    'human_reply_id': human_reply_id,
+                    'user_msg_id': msg.get('id'),
+                    'user_message': msg['message_content'],
+                    'human_reply_id': msg_list[human_idx].get('id'),
                     'human_reply': human_reply,
-                    'ai_reply_id': ai_reply_id,
+                    'ai_reply_id': msg_list[ai_idx].get('id'),
                     'ai_reply': ai_reply,
-                    'similarity': round(similarity, 4),
-                    'length_ratio': round(length_ratio, 4),
                     'length_human': len(human_reply.strip()),
                     'length_ai': len(ai_reply.strip()),
                 })
@@ -440,6 +434,17 @@ async def compare_replies(
                 'comparisons': []
             }
         
+        # All pairs scored in one vectorized batch; each distinct reply is encoded once
+        human_replies = [c['human_reply'] for c in comparisons]
+        ai_replies = [c['ai_reply'] for c in comparisons]
+        if embeddings:
+            scores = await asyncio.to_thread(score_pairs, human_replies, ai_replies, True)
+        else:
+            scores = score_pairs(human_replies, ai_replies)
+        for metric, values in scores.items():
+            for comparison, value in zip(comparisons, values):
+                comparison[metric] = round(value, 4) if value is not None else None
+        
         return {
             'chat_id': chat_id,
             'status': 'ok',
@@ -449,5 +454,7 @@ async def compare_replies(
     
     except HTTPException:
         raise
+    except DBTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to compare replies: {str(e)}")
@@ -3,14 +3,19 @@ Ignore patterns management API routes.
 CRUD endpoints for managing message patterns that should be skipped by AI agent.
 """
 
+import asyncio
+
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Literal, Optional, List
 from datetime import datetime
 
 from ai_kefu.storage.ignore_pattern_store import IgnorePatternStore, IgnorePattern
 from ai_kefu.api.dependencies import get_ignore_pattern_store
 from ai_kefu.utils.logging import logger
+from ai_kefu.storage.db_executor import DBTimeoutError, run_db
+from ai_kefu.storage.config_cache import TOPIC_IGNORE_PATTERNS, publish_invalidation
+from ai_kefu.storage.pattern_matcher import MATCH_REGEX, validate_regex
 
 
 router = APIRouter()
@@ -20,11 +25,15 @@ router = APIRouter()
 # Request/Response Models
 # ============================================================
 
+MatchType = Literal["exact", "contains", "regex"]
+
+
 class IgnorePatternCreateRequest(BaseModel):
     """Create ignore pattern request."""
     pattern: str = Field(..., min_length=1, max_length=500, description="要忽略的消息内容")
     description: Optional[str] = Field(None, max_length=500, description="描述说明")
     active: bool = Field(default=True, description="是否启用")
+    match_type: MatchType = Field(default="exact", description="匹配方式: exact 精确 / contains 包含 / regex 正则")
 
 
 class IgnorePatternUpdateRequest(BaseModel):
@@ -32,6 +41,7 @@ class IgnorePatternUpdateRequest(BaseModel):
     pattern: Optional[str] = Field(None, min_length=1, max_length=500)
     description: Optional[str] = None
     active: Optional[bool] = None
+    match_type: Optional[MatchType] = None
 
 
 class IgnorePatternResponse(BaseModel):
@@ -40,6 +50,7 @@ class IgnorePatternResponse(BaseModel):
     pattern: str
     description: Optional[str]
     active: bool
+    match_type: str
     created_at: Optional[datetime]
     updated_at: Optional[datetime]
 
@@ -63,21 +74,26 @@ async def create_ignore_pattern(
 ):
     """Create a new ignore pattern."""
     try:
+        _validate_pattern(request.pattern, request.match_type)
         pattern = IgnorePattern(
             pattern=request.pattern,
             description=request.description,
-            active=request.active
+            active=request.active,
+            match_type=request.match_type
         )
-        result = store.create(pattern)
+        result = await run_db(store.create, pattern)
         if not result:
             raise HTTPException(
                 status_code=409,
                 detail=f"Pattern already exists: '{request.pattern}'"
             )
+        await _broadcast_pattern_change()
         return _to_response(result)
 
     except HTTPException:
         raise
+    except DBTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error creating ignore pattern: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -92,8 +108,8 @@ async def list_ignore_patterns(
 ):
     """List all ignore patterns."""
     try:
-        items = store.list_all(active_only=active_only, limit=limit, offset=offset)
-        total = store.count(active_only=active_only)
+        items = await run_db(store.list_all, active_only=active_only, limit=limit, offset=offset)
+        total = await run_db(store.count, active_only=active_only)
 
         return IgnorePatternListResponse(
             total=total,
@@ -102,6 +118,8 @@ async def list_ignore_patterns(
             limit=limit
         )
 
+    except DBTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error listing ignore patterns: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -114,13 +132,15 @@ async def get_ignore_pattern(
 ):
     """Get ignore pattern by ID."""
     try:
-        pattern = store.get(pattern_id)
+        pattern = await run_db(store.get, pattern_id)
         if not pattern:
             raise HTTPException(status_code=404, detail=f"Pattern not found: {pattern_id}")
         return _to_response(pattern)
 
     except HTTPException:
         raise
+    except DBTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error getting ignore pattern: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -141,14 +161,30 @@ async def update_ignore_pattern(
             updates['description'] = request.description
         if request.active is not None:
             updates['active'] = request.active
-
-        result = store.update(pattern_id, updates)
+        if request.match_type is not None:
+            updates['match_type'] = request.match_type
+
+        if request.pattern is not None or request.match_type is not None:
+            match_type = request.match_type
+            pattern = request.pattern
+            if match_type is None or pattern is None:
+                current = await run_db(store.get, pattern_id)
+                if not current:
+                    raise HTTPException(status_code=404, detail=f"Pattern not found: {pattern_id}")
+                match_type = match_type or current.match_type
+                pattern = pattern if pattern is not None else current.pattern
+            _validate_pattern(pattern, match_type)
+
+        result = await run_db(store.update, pattern_id, updates)
         if not result:
             raise HTTPException(status_code=404, detail=f"Pattern not found: {pattern_id}")
+        await _broadcast_pattern_change()
         return _to_response(result)
 
     except HTTPException:
         raise
+    except DBTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error updating ignore pattern: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -161,13 +197,16 @@ async def delete_ignore_pattern(
 ):
     """Delete ignore pattern."""
     try:
-        success = store.delete(pattern_id)
+        success = await run_db(store.delete, pattern_id)
         if not success:
             raise HTTPException(status_code=404, detail=f"Pattern not found: {pattern_id}")
+        await _broadcast_pattern_change()
         return {"success": True, "message": f"Pattern {pattern_id} deleted"}
 
     except HTTPException:
         raise
+    except DBTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error deleting ignore pattern: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -180,16 +219,19 @@ async def toggle_ignore_pattern(
 ):
     """Toggle ignore pattern active status."""
     try:
-        pattern = store.get(pattern_id)
+        pattern = await run_db(store.get, pattern_id)
         if not pattern:
             raise HTTPException(status_code=404, detail=f"Pattern not found: {pattern_id}")
 
-        result = store.update(pattern_id, {'active': not pattern.active})
+        result = await run_db(store.update, pattern_id, {'active': not pattern.active})
+        await _broadcast_pattern_change()
         new_status = "启用" if result.active else "禁用"
         return {"success": True, "message": f"Pattern {pattern_id} 已{new_status}", "active": result.active}
 
     except HTTPException:
         raise
+    except DBTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error toggling ignore pattern: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -199,6 +241,19 @@ async def toggle_ignore_pattern(
 # Helper
 # ============================================================
 
+async def _broadcast_pattern_change() -> None:
+    """Reload the ignore-pattern cache in the other API workers."""
+    await asyncio.to_thread(publish_invalidation, TOPIC_IGNORE_PATTERNS)
+
+
+def _validate_pattern(pattern: str, match_type: str) -> None:
+    """Reject regex rules that do not compile (they would never fire)."""
+    if match_type == MATCH_REGEX:
+        error = validate_regex(pattern)
+        if error:
+            raise HTTPException(status_code=422, detail=f"Invalid regex '{pattern}': {error}")
+
+
 def _to_response(pattern: IgnorePattern) -> IgnorePatternResponse:
     """Convert IgnorePattern to response model."""
     return IgnorePatternResponse(
@@ -206,6 +261,7 @@ def _to_response(pattern: IgnorePattern) -> IgnorePatternResponse:
         pattern=pattern.pattern,
         description=pattern.description,
         active=pattern.active,
+        match_type=pattern.match_type,
         created_at=pattern.created_at,
         updated_at=pattern.updated_at
     )
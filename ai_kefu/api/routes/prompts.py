@@ -3,6 +3,8 @@ System prompt management API routes.
 CRUD endpoints for system prompts with version management.
 """
 
+import asyncio
+
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
 from typing import Optional, List
@@ -12,6 +14,8 @@ from ai_kefu.storage.prompt_store import PromptStore, SystemPrompt
 from ai_kefu.api.dependencies import get_prompt_store
 from ai_kefu.utils.logging import logger
 from ai_kefu.prompts.rental_system_prompt import get_rental_system_prompt_template
+from ai_kefu.storage.db_executor import DBTimeoutError, run_db
+from ai_kefu.storage.config_cache import TOPIC_PROMPTS, publish_invalidation
 
 
 router = APIRouter()
@@ -77,14 +81,17 @@ async def create_prompt(
             active=request.active
         )
 
-        result = prompt_store.create(prompt)
+        result = await run_db(prompt_store.create, prompt)
         if not result:
             raise HTTPException(status_code=500, detail="Failed to create system prompt")
 
+        await _broadcast_prompt_change()
         return _to_response(result)
 
     except HTTPException:
         raise
+    except DBTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error creating prompt: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -99,8 +106,8 @@ async def list_prompts(
 ):
     """List system prompts with optional filtering."""
     try:
-        items = prompt_store.list_all(prompt_key=prompt_key, limit=limit, offset=offset)
-        total = prompt_store.count(prompt_key=prompt_key)
+        items = await run_db(prompt_store.list_all, prompt_key=prompt_key, limit=limit, offset=offset)
+        total = await run_db(prompt_store.count, prompt_key=prompt_key)
 
         return PromptListResponse(
             total=total,
@@ -109,6 +116,8 @@ async def list_prompts(
             limit=limit
         )
 
+    except DBTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error listing prompts: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -121,7 +130,7 @@ async def get_active_prompt(
 ):
     """Get the active system prompt for a given key."""
     try:
-        prompt = prompt_store.get_active(prompt_key)
+        prompt = await run_db(prompt_store.get_active, prompt_key)
         if not prompt:
             raise HTTPException(
                 status_code=404,
@@ -131,6 +140,8 @@ async def get_active_prompt(
 
     except HTTPException:
         raise
+    except DBTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error getting active prompt: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -143,13 +154,15 @@ async def get_prompt(
 ):
     """Get system prompt by ID."""
     try:
-        prompt = prompt_store.get(prompt_id)
+        prompt = await run_db(prompt_store.get, prompt_id)
         if not prompt:
             raise HTTPException(status_code=404, detail=f"Prompt not found: {prompt_id}")
         return _to_response(prompt)
 
     except HTTPException:
         raise
+    except DBTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error getting prompt: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -173,14 +186,17 @@ async def update_prompt(
         if request.active is not None:
             updates['active'] = request.active
 
-        result = prompt_store.update(prompt_id, updates)
+        result = await run_db(prompt_store.update, prompt_id, updates)
         if not result:
             raise HTTPException(status_code=404, detail=f"Prompt not found: {prompt_id}")
 
+        await _broadcast_prompt_change()
         return _to_response(result)
 
     except HTTPException:
         raise
+    except DBTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error updating prompt: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -193,14 +209,17 @@ async def delete_prompt(
 ):
     """Delete system prompt."""
     try:
-        success = prompt_store.delete(prompt_id)
+        success = await run_db(prompt_store.delete, prompt_id)
         if not success:
             raise HTTPException(status_code=404, detail=f"Prompt not found: {prompt_id}")
 
+        await _broadcast_prompt_change()
         return {"success": True, "message": f"Prompt {prompt_id} deleted"}
 
     except HTTPException:
         raise
+    except DBTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error deleting prompt: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -213,14 +232,17 @@ async def activate_prompt(
 ):
     """Set a prompt as the active version for its key."""
     try:
-        success = prompt_store.set_active(prompt_id)
+        success = await run_db(prompt_store.set_active, prompt_id)
         if not success:
             raise HTTPException(status_code=404, detail=f"Prompt not found: {prompt_id}")
 
+        await _broadcast_prompt_change()
         return {"success": True, "message": f"Prompt {prompt_id} is now active"}
 
     except HTTPException:
         raise
+    except DBTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error activating prompt: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -253,7 +275,7 @@ async def initialize_default_prompts(
         ]
 
         for item in defaults:
-            existing = prompt_store.get_active(item["prompt_key"])
+            existing = await run_db(prompt_store.get_active, item["prompt_key"])
             if existing:
                 skipped += 1
                 continue
@@ -265,10 +287,12 @@ async def initialize_default_prompts(
                 description=item["description"],
                 active=item["active"]
             )
-            result = prompt_store.create(prompt)
+            result = await run_db(prompt_store.create, prompt)
             if result:
                 initialized += 1
 
+        if initialized:
+            await _broadcast_prompt_change()
         message = f"初始化完成：新增 {initialized} 条，跳过 {skipped} 条"
         return {
             "initialized": initialized,
@@ -276,6 +300,8 @@ async def initialize_default_prompts(
             "message": message
         }
 
+    except DBTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Init defaults error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -285,6 +311,11 @@ async def initialize_default_prompts(
 # Helper
 # ============================================================
 
+async def _broadcast_prompt_change() -> None:
+    """Reload the cached system prompt in every API worker."""
+    await asyncio.to_thread(publish_invalidation, TOPIC_PROMPTS)
+
+
 def _to_response(prompt: SystemPrompt) -> PromptResponse:
     """Convert SystemPrompt to response model."""
     return PromptResponse(
@@ -1,14 +1,35 @@
 """
 Settings API routes — expose and update runtime configuration.
 
-GET  /settings        → current (non-sensitive) settings snapshot
-PATCH /settings       → update mutable runtime flags (e.g. enable_ai_reply)
+GET    /settings            → current (non-sensitive) settings snapshot
+PATCH  /settings            → update mutable runtime flags (e.g. enable_ai_reply);
+                              ?persist=true keeps them across restarts
+GET    /settings/overrides  → runtime overrides currently stored in Redis
+DELETE /settings/overrides  → clear all overrides (or ?field=... for one) and
+                              fall back to the .env / default values
+
+Patched values are also stored in Redis and broadcast on the config
+invalidation bus, so every API worker applies them (and workers started
+later pick them up in sync_shared_settings):
+
+- by default in ``config:settings_overrides:temp``, which expires
+  ``settings_override_ttl`` seconds after the last PATCH, so a restart after
+  that falls back to .env
+- with ``persist=true`` in ``config:settings_overrides`` without a TTL. These
+  win over .env on every API start until cleared with DELETE /settings/overrides
+
+The overrides applied at startup are logged with their .env / default value.
 """
 
+import asyncio
+import json
+
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 from ai_kefu.config.settings import settings
+from ai_kefu.storage.config_cache import TOPIC_SETTINGS, get_invalidation_bus
+from ai_kefu.utils.logging import logger
 
 router = APIRouter()
 
@@ -60,26 +81,166 @@ async def get_settings():
     )
 
 
+_OVERRIDES_KEY = "config:settings_overrides"
+_TEMP_OVERRIDES_KEY = "config:settings_overrides:temp"
+
+# .env / default values of the patchable fields, restored when an override is cleared
+_BASELINE = {field: getattr(settings, field) for field in SettingsPatch.model_fields}
+
+
+def _apply_overrides(overrides: Dict[str, Any]) -> None:
+    for field, value in overrides.items():
+        if field in SettingsPatch.model_fields:
+            setattr(settings, field, value)
+
+
+def _restore_baseline(fields) -> None:
+    for field in fields:
+        if field in _BASELINE:
+            setattr(settings, field, _BASELINE[field])
+
+
+def _decode(stored: Dict[str, str]) -> Dict[str, Any]:
+    overrides = {}
+    for field, raw in stored.items():
+        try:
+            overrides[field] = json.loads(raw)
+        except ValueError:
+            logger.warning(f"Ignoring malformed settings override {field}={raw!r}")
+    return overrides
+
+
+def _read_overrides() -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """(persistent, temporary) overrides stored in Redis, or None when they cannot be read."""
+    bus = get_invalidation_bus()
+    if not bus.redis_url:
+        return None
+    try:
+        pipe = bus.get_client().pipeline()
+        pipe.hgetall(_OVERRIDES_KEY)
+        pipe.hgetall(_TEMP_OVERRIDES_KEY)
+        persistent, temporary = pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to read shared settings overrides: {e}")
+        return None
+    return _decode(persistent), _decode(temporary)
+
+
+def sync_shared_settings(version: Optional[int] = None) -> None:
+    """
+    Apply the runtime overrides shared through Redis (bus callback / startup).
+
+    Fields without an override go back to their .env / default value, so a
+    DELETE in one worker also clears the field in the others.
+    """
+    stored = _read_overrides()
+    if stored is None:
+        return
+    persistent, temporary = stored
+    overrides = {**persistent, **temporary}
+    _restore_baseline(set(_BASELINE) - set(overrides))
+    _apply_overrides(overrides)
+    if overrides:
+        logger.info("Applied shared settings overrides: " + ", ".join(
+            f"{field}={value!r} ({'persistent' if field in persistent else 'temporary'}, "
+            f".env/default {_BASELINE.get(field)!r})"
+            for field, value in sorted(overrides.items())
+        ))
+
+
+def _share_overrides(overrides: Dict[str, Any], persist: bool) -> None:
+    bus = get_invalidation_bus()
+    if bus.redis_url:
+        # A field lives in exactly one of the two hashes: the last PATCH decides which
+        key, other = (
+            (_OVERRIDES_KEY, _TEMP_OVERRIDES_KEY) if persist
+            else (_TEMP_OVERRIDES_KEY, _OVERRIDES_KEY)
+        )
+        try:
+            pipe = bus.get_client().pipeline(transaction=True)
+            pipe.hset(key, mapping={k: json.dumps(v) for k, v in overrides.items()})
+            pipe.hdel(other, *overrides)
+            if not persist:
+                pipe.expire(_TEMP_OVERRIDES_KEY, settings.settings_override_ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to share settings overrides, only this worker is updated: {e}")
+            return
+    bus.publish(TOPIC_SETTINGS)
+
+
 @router.patch("/", response_model=SettingsResponse)
-async def patch_settings(patch: SettingsPatch):
-    """Update mutable runtime settings (takes effect immediately, not persisted across restarts)."""
-    if patch.enable_ai_reply is not None:
-        settings.enable_ai_reply = patch.enable_ai_reply
-    if patch.toggle_keywords is not None:
-        settings.toggle_keywords = patch.toggle_keywords
-    if patch.suppress_keywords is not None:
-        settings.suppress_keywords = patch.suppress_keywords
-    if patch.suppress_duration is not None:
-        settings.suppress_duration = patch.suppress_duration
-    if patch.manual_mode_timeout is not None:
-        settings.manual_mode_timeout = patch.manual_mode_timeout
-    if patch.log_level is not None:
-        settings.log_level = patch.log_level
-    if patch.enable_confidence_guard is not None:
-        settings.enable_confidence_guard = patch.enable_confidence_guard
+async def patch_settings(patch: SettingsPatch, persist: bool = False):
+    """
+    Update mutable runtime settings.
+
+    Takes effect immediately in every API worker. The overrides live in
+    Redis (not in .env). By default they expire ``settings_override_ttl``
+    seconds after the last PATCH; with ``persist=true`` they survive
+    restarts and keep winning over .env until cleared with
+    DELETE /settings/overrides. Either way they are lost if Redis is flushed.
+    """
     if patch.response_confidence_threshold is not None:
         if not (0.0 <= patch.response_confidence_threshold <= 1.0):
             raise HTTPException(status_code=422, detail="response_confidence_threshold must be between 0 and 1")
-        settings.response_confidence_threshold = patch.response_confidence_threshold
 
+    overrides = patch.model_dump(exclude_none=True)
+    _apply_overrides(overrides)
+    if overrides:
+        await asyncio.to_thread(_share_overrides, overrides, persist)
+
+    return await get_settings()
+
+
+def _clear_overrides(fields) -> None:
+    bus = get_invalidation_bus()
+    if bus.redis_url:
+        try:
+            client = bus.get_client()
+            if fields:
+                pipe = client.pipeline(transaction=True)
+                pipe.hdel(_OVERRIDES_KEY, *fields)
+                pipe.hdel(_TEMP_OVERRIDES_KEY, *fields)
+                pipe.execute()
+            else:
+                client.delete(_OVERRIDES_KEY, _TEMP_OVERRIDES_KEY)
+        except Exception as e:
+            logger.warning(f"Failed to clear shared settings overrides, only this worker is reset: {e}")
+            return
+    bus.publish(TOPIC_SETTINGS)
+
+
+@router.get("/overrides")
+async def get_overrides():
+    """
+    List the runtime overrides stored in Redis, next to the .env / default
+    value each one replaces and whether it survives restarts.
+    """
+    stored = await asyncio.to_thread(_read_overrides)
+    persistent, temporary = stored or ({}, {})
+    return {
+        "shared": stored is not None,
+        "overrides": {
+            field: {
+                "value": value,
+                "default": _BASELINE.get(field),
+                "persistent": field in persistent,
+            }
+            for field, value in sorted({**persistent, **temporary}.items())
+        },
+    }
+
+
+@router.delete("/overrides")
+async def delete_overrides(field: Optional[str] = None):
+    """
+    Clear runtime overrides (all of them, or only ``field``) and go back to
+    the .env / default values in every API worker.
+    """
+    if field is not None and field not in SettingsPatch.model_fields:
+        raise HTTPException(status_code=422, detail=f"Unknown settings field: {field}")
+    fields = [field] if field else list(SettingsPatch.model_fields)
+    _restore_baseline(fields)
+    await asyncio.to_thread(_clear_overrides, [field] if field else [])
+    logger.info(f"Cleared settings overrides: {field or 'all'}")
     return await get_settings()
@@ -3,10 +3,18 @@ System and health check endpoints.
 """
 
 from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
 from ai_kefu.api.models import HealthCheckResponse
 from ai_kefu.storage.session_store import SessionStore
 from ai_kefu.storage.knowledge_store import KnowledgeStore
 from ai_kefu.llm.qwen_client import check_qwen_api
+from ai_kefu.llm.cache_metrics import prefix_cache_metrics
+from ai_kefu.llm.embeddings import embedding_cache_info
+from ai_kefu.storage.db_executor import db_executor_stats
+from ai_kefu.storage.config_cache import get_invalidation_bus
+from ai_kefu.utils import loop_monitor as loop_monitor_module
+from ai_kefu.utils.logging import log_stats
+from ai_kefu.utils.metrics import CONTENT_TYPE, REGISTRY
 from ai_kefu.api.dependencies import get_session_store, get_knowledge_store
 from datetime import datetime
 
@@ -14,6 +22,55 @@ from datetime import datetime
 router = APIRouter()
 
 
+def _loop_lag_ms() -> float:
+    monitor = loop_monitor_module.loop_monitor
+    return monitor.stats()["last_lag_ms"] if monitor is not None else 0.0
+
+
+def _in_flight_requests() -> float:
+    monitor = loop_monitor_module.loop_monitor
+    return monitor.stats()["in_flight_requests"] if monitor is not None else 0.0
+
+
+# Scrape-time gauges: read from the components that already keep these numbers
+REGISTRY.gauge("ai_kefu_db_pool_workers", "DB thread pool size").set_function(
+    lambda: db_executor_stats()["workers"]
+)
+REGISTRY.gauge("ai_kefu_db_pool_in_flight", "DB calls running or queued on the DB pool").set_function(
+    lambda: db_executor_stats()["in_flight"]
+)
+REGISTRY.gauge("ai_kefu_db_pool_queue_depth", "DB calls waiting for a free DB pool worker").set_function(
+    lambda: max(0, db_executor_stats()["in_flight"] - db_executor_stats()["workers"])
+)
+REGISTRY.counter("ai_kefu_db_pool_timeouts", "DB calls that hit the DB pool timeout").set_function(
+    lambda: db_executor_stats()["timeouts"]
+)
+REGISTRY.counter("ai_kefu_embedding_cache_hits", "Query embedding LRU cache hits").set_function(
+    lambda: embedding_cache_info().hits
+)
+REGISTRY.counter("ai_kefu_embedding_cache_misses", "Query embedding LRU cache misses").set_function(
+    lambda: embedding_cache_info().misses
+)
+REGISTRY.gauge("ai_kefu_embedding_cache_size", "Entries in the query embedding LRU cache").set_function(
+    lambda: embedding_cache_info().currsize
+)
+REGISTRY.gauge("ai_kefu_event_loop_lag_ms", "Last measured event-loop lag (0 when the monitor is off)").set_function(
+    _loop_lag_ms
+)
+REGISTRY.gauge("ai_kefu_http_requests_in_flight", "Requests currently being served").set_function(
+    _in_flight_requests
+)
+REGISTRY.counter("ai_kefu_log_dropped_console", "Log lines dropped because the console queue was full").set_function(
+    lambda: log_stats().get("dropped_console", 0)
+)
+REGISTRY.counter("ai_kefu_log_dropped_file", "Log lines dropped because the file queue was full").set_function(
+    lambda: log_stats().get("dropped_file", 0)
+)
+REGISTRY.counter("ai_kefu_log_suppressed_repeats", "Repeated INFO/DEBUG log lines dropped by the rate limiter").set_function(
+    lambda: log_stats()["suppressed_repeats"]
+)
+
+
 @router.get("/health", response_model=HealthCheckResponse)
 async def health_check(
     session_store: SessionStore = Depends(get_session_store),
@@ -59,3 +116,44 @@ async def health_check(
         checks=checks,
         timestamp=datetime.utcnow()
     )
+
+
+@router.get("/llm/cache-stats")
+async def llm_cache_stats():
+    """
+    Provider prefix-cache statistics for Qwen calls since process start.
+    
+    Returns:
+        Prompt / cached token totals and prefix hit rate, per call kind and model
+    """
+    return prefix_cache_metrics.snapshot()
+
+
+@router.get("/runtime/stats")
+async def runtime_stats():
+    """
+    Event-loop lag and DB thread pool statistics.
+    
+    Returns:
+        ``loop``: heartbeat lag / stall counts (None if the monitor is disabled)
+        ``db``: DB pool call counts, timeouts and durations
+        ``config``: config invalidation bus state
+    """
+    monitor = loop_monitor_module.loop_monitor
+    return {
+        "loop": monitor.stats() if monitor is not None else None,
+        "db": db_executor_stats(),
+        "config": get_invalidation_bus().stats(),
+    }
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus text exposition of this worker's metrics.
+    
+    Returns:
+        Latency histograms (HTTP, inbound-to-reply, LLM by model, tools),
+        guard / ignore / manual-mode counters, DB pool and cache gauges
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
@@ -17,10 +17,11 @@ Business logic handled here:
 """
 
 import asyncio
+import time
 from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header
 from pydantic import BaseModel, Field
 
 from ai_kefu.api.dependencies import (
@@ -34,8 +35,21 @@ from ai_kefu.xianyu_interceptor.conversation_models import ConversationMessage,
 from ai_kefu.xianyu_interceptor.session_mapper import SessionMapper
 from ai_kefu.xianyu_interceptor.manual_mode import ManualModeManager
 from ai_kefu.storage.ignore_pattern_store import IgnorePatternStore
+from ai_kefu.storage.db_executor import run_db
 from ai_kefu.config.settings import settings
 from ai_kefu.utils.logging import logger
+from ai_kefu.utils.metrics import (
+    AGENT_RUNS_IN_FLIGHT,
+    IGNORED_MESSAGES,
+    INBOUND_REPLY_SECONDS,
+    MANUAL_MODE_SKIPS,
+)
+from ai_kefu.utils.profiling import (
+    PROFILE_HEADER,
+    parse_profile_header,
+    request_profiling,
+    reset_profiling,
+)
 
 
 router = APIRouter()
@@ -90,10 +104,13 @@ async def update_cookies(req: UpdateCookiesRequest):
     if not req.cookies_str or req.cookies_str.strip() == "your_cookies_here":
         return UpdateCookiesResponse(success=False, message="Empty or placeholder cookies")
     try:
-        from ai_kefu.xianyu_provider import init_provider
+        from ai_kefu.xianyu_provider import init_provider, wrap_with_cache
         from ai_kefu.xianyu_provider.goofish_provider import GoofishProvider
-        provider = GoofishProvider(cookies_str=req.cookies_str)
-        init_provider(provider)
+        provider = GoofishProvider(
+            cookies_str=req.cookies_str,
+            pool_size=settings.xianyu_provider_max_workers,
+        )
+        init_provider(wrap_with_cache(provider))
         user_id = provider.my_user_id
         settings.xianyu_cookie = req.cookies_str
         logger.info(f"[update-cookies] GoofishProvider re-initialized, user_id={user_id}")
@@ -173,7 +190,7 @@ async def _log_message(
             created_at=datetime.now(),
         )
 
-        await asyncio.to_thread(conversation_store.save_message, conversation_msg)
+        await run_db(conversation_store.save_message, conversation_msg)
 
         logger.debug(
             f"Logged message: chat_id={req.chat_id}, type={message_type}, manual={is_manual_mode}"
@@ -197,6 +214,10 @@ async def _record_order_detail(
 
     try:
         from ai_kefu.tools.xianyu import get_order_detail, get_item_info
+        from ai_kefu.xianyu_provider import invalidate_order_cache
+
+        # 拍下 / 付款卡片意味着订单状态刚刚变化，丢弃可能过期的缓存
+        invalidate_order_cache(order_id)
 
         logger.info(
             f"[record_order_detail] 拉取订单详情: "
@@ -241,7 +262,7 @@ async def _record_order_detail(
                     f"[record_order_detail] 补全 item_title 失败: item_id={req.item_id}, error={_e}"
                 )
 
-        await asyncio.to_thread(
+        await run_db(
             conversation_store.save_order_detail,
             chat_id=req.chat_id,
             user_id=req.user_id,
@@ -389,7 +410,7 @@ async def _handle_order_placed(
     )
 
     try:
-        history = await asyncio.to_thread(
+        history = await run_db(
             conversation_store.get_conversation_history,
             chat_id=req.chat_id,
             limit=50,
@@ -497,13 +518,17 @@ async def _process_with_agent(
             f"[agent] ▶ executor.run: chat_id={req.chat_id}, "
             f"session_id={agent_session_id}, query={req.content!r}"
         )
-        agent_result = await asyncio.to_thread(
-            executor.run,
-            query=req.content or "",
-            session_id=agent_session_id,
-            user_id=req.user_id,
-            context=ctx,
-        )
+        AGENT_RUNS_IN_FLIGHT.inc()
+        try:
+            agent_result = await asyncio.to_thread(
+                executor.run,
+                query=req.content or "",
+                session_id=agent_session_id,
+                user_id=req.user_id,
+                context=ctx,
+            )
+        finally:
+            AGENT_RUNS_IN_FLIGHT.dec()
 
         response_text: str = agent_result.get("response", "")
         metadata: dict = agent_result.get("metadata", {})
@@ -616,6 +641,7 @@ async def xianyu_inbound(
     ignore_pattern_store: IgnorePatternStore = Depends(get_ignore_pattern_store),
     session_mapper: SessionMapper = Depends(get_xianyu_session_mapper),
     manual_mode_manager: ManualModeManager = Depends(get_manual_mode_manager),
+    x_profile: Optional[str] = Header(None, alias=PROFILE_HEADER),
 ):
     """
     Receive a decoded Xianyu message from the interceptor relay, apply all
@@ -623,7 +649,15 @@ async def xianyu_inbound(
 
     The interceptor sends the message here and, if reply is non-null, sends
     it back to the buyer via WebSocket.
+
+    ``X-Profile: 1`` samples the agent run's call stacks into
+    agent_turn_profiles (``X-Profile: 0`` opts out of the sampled rate).
+    Only ``AgentExecutor.run`` is profiled, not the async steps of this
+    route (see utils/profiling.py).
     """
+    received = time.perf_counter()
+    # 采样剖析开关，经 asyncio.to_thread 的 context 传到 AgentExecutor.run
+    profiling_token = request_profiling(parse_profile_header(x_profile))
     try:
         logger.info(
             f"[xianyu/inbound] ▶ chat_id={req.chat_id}, user_id={req.user_id}, "
@@ -632,10 +666,14 @@ async def xianyu_inbound(
         )
 
         # ── Ignore pattern check ─────────────────────────────────────────────
-        if req.content and ignore_pattern_store.should_ignore(req.content):
+        # 缓存未加载成功时 match() 会同步查 MySQL，放到 DB 线程池里，不阻塞事件循环
+        ignored = await run_db(ignore_pattern_store.match, req.content) if req.content else None
+        if ignored:
+            IGNORED_MESSAGES.inc(match_type=ignored.rule.match_type)
             logger.info(
                 f"[xianyu/inbound] ✋ ignored by pattern: chat_id={req.chat_id}, "
-                f"content='{req.content[:50]}'"
+                f"rule_id={ignored.rule.id}, match_type={ignored.rule.match_type}, "
+                f"pattern={ignored.rule.pattern!r}, content='{req.content[:50]}'"
             )
             return XianyuInboundResponse(reply=None)
 
@@ -718,11 +756,13 @@ async def xianyu_inbound(
 
         # ── Manual mode check ────────────────────────────────────────────────
         if manual_mode_manager.is_manual_mode(req.chat_id):
+            MANUAL_MODE_SKIPS.inc(reason="manual_mode")
             logger.info(f"[xianyu/inbound] 🤚 manual mode active, skipping AI: chat_id={req.chat_id}")
             return XianyuInboundResponse(reply=None)
 
         # ── AI suppression check ─────────────────────────────────────────────
         if manual_mode_manager.is_suppressed(req.chat_id):
+            MANUAL_MODE_SKIPS.inc(reason="suppressed")
             remaining = manual_mode_manager.get_suppress_remaining(req.chat_id)
             logger.info(
                 f"[xianyu/inbound] 🔇 AI suppressed, remaining {remaining}s: chat_id={req.chat_id}"
@@ -751,6 +791,9 @@ async def xianyu_inbound(
             session_mapper=session_mapper,
             conversation_store=conversation_store,
         )
+        INBOUND_REPLY_SECONDS.observe(
+            time.perf_counter() - received, outcome="replied" if reply else "no_reply"
+        )
 
         logger.info(
             f"[xianyu/inbound] ✅ done: chat_id={req.chat_id}, "
@@ -759,5 +802,8 @@ async def xianyu_inbound(
         return XianyuInboundResponse(reply=reply)
 
     except Exception as e:
+        INBOUND_REPLY_SECONDS.observe(time.perf_counter() - received, outcome="error")
         logger.error(f"[xianyu/inbound] Unhandled error: {e}", exc_info=True)
         return XianyuInboundResponse(reply=None)
+    finally:
+        reset_profiling(profiling_token)
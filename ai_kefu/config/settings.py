@@ -20,10 +20,20 @@ class Settings(BaseSettings):
     qwen_temperature: float = 0.3
     qwen_top_p: float = 0.9
     qwen_max_tokens: int = 256
+
+    # Token accounting / context packing
+    qwen_tokenizer_path: str = ""  # HuggingFace tokenizer.json 路径（Qwen）；为空时使用启发式估算
+    context_token_budget: int = 0  # 单次主模型调用的 prompt + completion token 预算；0 = 不裁剪历史。设置时按模型上下文窗口取值（如 qwen-plus 131072），系统提示 + 工具定义已占约 8k
+    context_min_recent_turns: int = 4  # 无论是否超预算，始终保留最近 N 轮对话（每轮以用户消息开始）
+    context_tool_result_max_tokens: int = 300  # 历史轮次中单条工具结果的 token 上限（超出截断）
+    context_current_tool_result_max_tokens: int = 1500  # 本轮工具结果的 token 上限
     
     # Redis Configuration
     redis_url: str = "redis://localhost:6379"
     redis_session_ttl: int = 86400  # 24 hours (Redis LRU handles memory pressure)
+    config_pubsub_enabled: bool = True  # 通过 Redis pub/sub 向所有 worker 广播 prompt / 忽略规则 / 设置的变更
+    config_refresh_interval: float = 300.0  # 配置缓存的后台兜底刷新间隔（秒），漏收广播时最多延迟这么久
+    settings_override_ttl: int = 86400  # PATCH /settings 未带 persist=true 时，覆盖值在 Redis 的保留时间（秒）
     
     # Chroma Configuration
     chroma_persist_path: str = str(Path(__file__).parent.parent / "chroma_data")
@@ -35,6 +45,17 @@ class Settings(BaseSettings):
     mysql_password: str = ""
     mysql_database: str = "xianyu_conversations"
 
+    # DB thread pool (blocking pymysql calls from async routes run here)
+    db_pool_workers: int = 8  # DB 线程池大小（与 asyncio 默认线程池隔离）
+    db_query_timeout: float = 15.0  # 路由等待单次 DB 调用的超时（秒），0 = 不限
+    db_read_timeout: int = 30  # pymysql socket 读写超时（秒），兜底释放卡住的 DB 线程
+    turn_archive_after_days: int = 30  # agent_turns 超过该天数的记录移入按月分区的 agent_turns_archive（scripts/archive_turns.py）
+
+    # Event-loop lag monitor
+    enable_loop_monitor: bool = True
+    loop_lag_interval: float = 0.5  # 心跳间隔（秒）
+    loop_lag_threshold_ms: float = 200.0  # 事件循环被阻塞超过该值时告警并打印阻塞栈
+
     # API Service Configuration
     api_host: str = "0.0.0.0"
     api_port: int = 8000
@@ -47,6 +68,12 @@ class Settings(BaseSettings):
     turn_timeout_seconds: int = 100  # Agent 单轮超时（需小于 interceptor 的 120s）
     loop_detection_threshold: int = 5
     enable_loop_detection: bool = True
+
+    # 历史对话滚动摘要（新会话从 MySQL 加载历史时，只把上次摘要之后的新消息合并进去）
+    history_summary_ttl: int = 604800  # 滚动摘要在 Redis 的保留时间（秒），默认 7 天，老客户回访时仍可增量合并
+    history_summary_fold_max: int = 40  # 单次增量合并的新消息上限，超出则从最近的历史全量重建
+    history_summary_refresh_folds: int = 8  # 连续增量合并该次数后全量重建一次，避免摘要逐步失真
+    history_summary_refresh_seconds: int = 86400  # 距上次全量重建超过该秒数时全量重建
     
     # Rental Business API Configuration
     rental_api_base_url: str
@@ -55,6 +82,10 @@ class Settings(BaseSettings):
     # Logging Configuration
     log_level: str = "INFO"
     log_format: str = "json"  # json or text
+    log_dir: str = ""  # 日志文件目录，为空时写到 ai_kefu/logs
+    log_queue_size: int = 10000  # 每个异步日志 sink 的队列上限，满了丢弃并计数，不阻塞调用方
+    log_rate_limit_burst: int = 50  # 同一行日志 (调用点+内容完全相同) 每个窗口最多输出条数，WARNING 及以上不限；0 = 不限
+    log_rate_limit_window: float = 10.0  # 限流窗口（秒）
 
     # Confidence guard configuration
     enable_confidence_guard: bool = True
@@ -74,6 +105,15 @@ class Settings(BaseSettings):
     # Interceptor browser cookie (env var COOKIES_STR, set by the interceptor's .env).
     # Used as a fallback source for xianyu_cookie when XIANYU_COOKIE is not explicitly set.
     cookies_str: str = ""
+    # Xianyu provider runtime (后台常驻事件循环 + 复用 HTTP 连接池)
+    xianyu_provider_timeout: float = 30.0      # 单次 provider 调用的等待上限（秒）
+    xianyu_provider_max_workers: int = 4       # 执行同步 HTTP 请求的线程数 / 连接池大小
+    # Xianyu provider 查询缓存（商品 / 买家 / 订单），TTL 单位秒
+    xianyu_cache_enabled: bool = True
+    xianyu_cache_item_ttl: float = 600.0       # 商品标题/价格基本不变
+    xianyu_cache_buyer_ttl: float = 300.0
+    xianyu_cache_order_ttl: float = 60.0       # 订单状态变化时另有显式失效
+    xianyu_cache_negative_ttl: float = 30.0    # 失败结果的负缓存
 
     @model_validator(mode="after")
     def _fill_xianyu_cookie_from_cookies_str(self) -> "Settings":
@@ -99,6 +139,29 @@ class Settings(BaseSettings):
     # Eval mock configuration (for check_availability)
     eval_mock_availability: bool = False
     eval_mock_availability_available_ratio: float = 0.80
+
+    # 批处理脚本（eval_replay / analyze_llm_quality）调用 LLM 的共享限速，0 = 不限
+    script_llm_rps: float = 0.0  # 每秒请求数上限
+    script_llm_tpm: int = 0  # 每分钟 token 上限（按 prompt + max_tokens 预扣，返回后按实际用量结算）
+
+    # LLM / embedding 调用录制回放（llm/recorder.py）：off | record | replay
+    llm_record_mode: str = "off"
+    llm_record_dir: str = str(Path(__file__).parent.parent / "testcases" / "llm_recordings")
+    llm_replay_latency_ms: float = 0.0  # 回放时每次调用的固定模拟延迟
+    llm_replay_jitter_ms: float = 0.0  # 额外随机延迟上限（按请求哈希取种子，可复现）
+    llm_replay_on_miss: str = "stub"  # 回放时未录制的请求: stub 返回确定性占位回复 | error 抛错
+
+    # 链路追踪：拦截器 → /xianyu/inbound → Agent → 工具 / LLM 的 span，写入 JSONL
+    # (traces_<服务名>_<日期>.jsonl，用 scripts/trace_view.py 查看)
+    tracing_enabled: bool = True
+    tracing_dir: str = ""  # 为空时写到 ai_kefu/logs
+
+    # 采样剖析（utils/profiling.py）：对单次 AgentExecutor.run 按固定间隔采样调用栈，
+    # 结果按 interaction_id 存入 agent_turn_profiles，用 scripts/export_profile.py 导出。
+    # /xianyu/inbound 带请求头 X-Profile: 1 时强制采样，X-Profile: 0 时跳过
+    profile_sample_rate: float = 0.0  # 未带请求头时被采样的 run 比例 (0~1)，0 = 仅按请求头
+    profile_interval_ms: float = 5.0  # 采样间隔（毫秒）
+    profile_max_samples: int = 30000  # 单次 run 最多采样数，超过后停止采样
     
     model_config = SettingsConfigDict(
         env_file=str(Path(__file__).parent.parent / ".env"),
@@ -0,0 +1,83 @@
+"""
+Provider prefix-cache metrics for Qwen calls.
+
+DashScope reports ``usage.prompt_tokens_details.cached_tokens`` for prompts
+whose prefix was served from its context cache. The counters here aggregate
+those numbers per call kind (call_qwen / call_qwen_fast) and model so the
+prefix hit rate can be watched via ``GET /llm/cache-stats``.
+"""
+
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+
+class PrefixCacheMetrics:
+    """Thread-safe counters of prompt tokens vs cached prompt tokens."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._reset_counters()
+
+    def _reset_counters(self) -> None:
+        self._calls: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._calls_with_hit: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._prompt_tokens: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._cached_tokens: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._latency_ms: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    def record(
+        self,
+        kind: str,
+        model: str,
+        prompt_tokens: Optional[int],
+        cached_tokens: Optional[int],
+        latency_ms: int = 0,
+    ) -> None:
+        """Record one call. Calls without usage information are ignored."""
+        if not prompt_tokens:
+            return
+        key = (kind, model)
+        with self._lock:
+            self._calls[key] += 1
+            self._prompt_tokens[key] += prompt_tokens
+            self._cached_tokens[key] += cached_tokens or 0
+            self._latency_ms[key] += latency_ms
+            if cached_tokens:
+                self._calls_with_hit[key] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per kind/model totals plus the token-weighted prefix hit rate."""
+        with self._lock:
+            by_call = []
+            for key in sorted(self._calls):
+                kind, model = key
+                calls = self._calls[key]
+                prompt = self._prompt_tokens[key]
+                cached = self._cached_tokens[key]
+                by_call.append({
+                    "kind": kind,
+                    "model": model,
+                    "calls": calls,
+                    "calls_with_cache_hit": self._calls_with_hit[key],
+                    "prompt_tokens": prompt,
+                    "cached_tokens": cached,
+                    "prefix_hit_rate": round(cached / prompt, 4) if prompt else 0.0,
+                    "avg_latency_ms": round(self._latency_ms[key] / calls, 1) if calls else 0.0,
+                })
+            total_prompt = sum(self._prompt_tokens.values())
+            total_cached = sum(self._cached_tokens.values())
+        return {
+            "prompt_tokens": total_prompt,
+            "cached_tokens": total_cached,
+            "prefix_hit_rate": round(total_cached / total_prompt, 4) if total_prompt else 0.0,
+            "by_call": by_call,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._reset_counters()
+
+
+# Process-wide instance fed by qwen_client
+prefix_cache_metrics = PrefixCacheMetrics()
@@ -7,6 +7,7 @@ Migrated from dashscope SDK to openai SDK (2026-04-25) — same reason as qwen_c
   - openai SDK via compatible-mode endpoint has no such restriction
 
 Performance: LRU cache for query embeddings to avoid redundant API calls.
+Calls go through llm.recorder when record/replay is enabled.
 """
 
 from openai import OpenAI
@@ -16,10 +17,14 @@ from tenacity import (
     wait_exponential,
     retry_if_exception_type
 )
+import time
 from functools import lru_cache
 from typing import List, Tuple, Optional
 from ai_kefu.config.settings import settings
 from ai_kefu.config.constants import QWEN_API_RETRY_ATTEMPTS, QWEN_API_RETRY_DELAY
+from ai_kefu.llm.recorder import KIND_EMBEDDING, get_llm_recorder, stub_embedding
+from ai_kefu.utils.metrics import LLM_CALL_SECONDS
+from ai_kefu.utils.tracing import start_span
 import logging
 
 logger = logging.getLogger(__name__)
@@ -45,14 +50,27 @@ def _get_client() -> OpenAI:
 )
 def _call_embedding_api(text: str) -> List[float]:
     """Raw embedding API call (with retry). Not cached."""
-    client = _get_client()
-    response = client.embeddings.create(
-        model="text-embedding-v3",
-        input=text,
-        dimensions=1024,
-        encoding_format="float",
-    )
-    return response.data[0].embedding
+    request = {"model": "text-embedding-v3", "input": text, "dimensions": 1024}
+
+    def _live() -> List[float]:
+        response = _get_client().embeddings.create(**request, encoding_format="float")
+        return response.data[0].embedding
+
+    with start_span("llm.embedding", {"chars": len(text)}):
+        recorder = get_llm_recorder()
+        started = time.monotonic()
+        outcome = "error"
+        try:
+            if recorder is not None:
+                embedding = recorder.call(KIND_EMBEDDING, request, _live, lambda: stub_embedding(text))
+            else:
+                embedding = _live()
+            outcome = "ok"
+            return embedding
+        finally:
+            LLM_CALL_SECONDS.observe(
+                time.monotonic() - started, kind="embedding", model=request["model"], outcome=outcome
+            )
 
 
 # LRU cache for query embeddings — queries repeat often (e.g. "押金政策", "归还地址").
@@ -83,6 +101,11 @@ def generate_embedding(text: str, task_type: str = "retrieval_document") -> List
     return list(cached)
 
 
+def embedding_cache_info():
+    """Hits, misses and size of the query embedding LRU cache (for /metrics)."""
+    return _cached_embedding.cache_info()
+
+
 def generate_embeddings_batch(texts: List[str], task_type: str = "retrieval_document") -> List[List[float]]:
     """
     Generate embeddings for multiple texts (batch processing).
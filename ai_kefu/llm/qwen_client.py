@@ -18,6 +18,12 @@ from tenacity import (
 )
 from typing import List, Dict, Any, Optional
 from ai_kefu.config.settings import settings
+from ai_kefu.llm.cache_metrics import prefix_cache_metrics
+from ai_kefu.llm.recorder import KIND_CHAT, chat_request_key, get_llm_recorder, stub_chat_response
+from ai_kefu.llm.tokenizer import count_messages_tokens, count_tools_tokens
+from ai_kefu.utils.metrics import LLM_CALL_SECONDS
+from ai_kefu.utils.rate_limiter import get_llm_rate_limiter
+from ai_kefu.utils.tracing import start_span
 from ai_kefu.config.constants import (
     QWEN_API_RETRY_ATTEMPTS,
     QWEN_API_RETRY_DELAY,
@@ -25,6 +31,7 @@ from ai_kefu.config.constants import (
     QWEN_API_TIMEOUT
 )
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -96,7 +103,84 @@ def _completion_to_dict(completion) -> Dict[str, Any]:
             for tc in msg.tool_calls
         ]
     
-    return {"choices": [{"message": message_dict}]}
+    result: Dict[str, Any] = {"choices": [{"message": message_dict}]}
+    usage = getattr(completion, "usage", None)
+    if usage is not None:
+        result["usage"] = {
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+            "total_tokens": usage.total_tokens,
+        }
+        # 百炼上下文缓存命中的 prompt token 数
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) if details is not None else None
+        result["usage"]["cached_tokens"] = cached or 0
+    return result
+
+
+def _log_usage(kind: str, model: str, started: float, result: Dict[str, Any]) -> None:
+    """记录单次调用的 token 用量、缓存命中与耗时。"""
+    usage = result.get("usage") or {}
+    duration_ms = int((time.monotonic() - started) * 1000)
+    prefix_cache_metrics.record(
+        kind, model, usage.get("prompt_tokens"), usage.get("cached_tokens"), duration_ms
+    )
+    logger.info(
+        f"{kind} model={model} prompt_tokens={usage.get('prompt_tokens')} "
+        f"cached_tokens={usage.get('cached_tokens')} "
+        f"completion_tokens={usage.get('completion_tokens')} "
+        f"duration={duration_ms}ms"
+    )
+
+
+def _create_completion(client: OpenAI, kind: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    发起一次非流式调用并记录用量。
+
+    脚本通过 configure_llm_rate_limit 配置了限速时，先按估算 token
+    (prompt + tools + max_tokens) 在共享令牌桶中排队，返回后按实际用量结算。
+    开启录制/回放（settings.llm_record_mode）时经由 llm.recorder 处理。
+    每次调用（含 tenacity 重试的每一次）记一个 llm.<kind> span。
+    """
+    with start_span(f"llm.{kind}", {"model": kwargs["model"], "tools": bool(kwargs.get("tools"))}) as span:
+        limiter = get_llm_rate_limiter()
+        reserved = 0
+        if limiter is not None:
+            reserved = (
+                count_messages_tokens(kwargs["messages"])
+                + count_tools_tokens(kwargs.get("tools"))
+                + kwargs["max_tokens"]
+            )
+            span.set_attribute("rate_limit_wait_ms", round(limiter.acquire(reserved) * 1000, 1))
+
+        def _live() -> Dict[str, Any]:
+            return _completion_to_dict(client.chat.completions.create(**kwargs))
+
+        recorder = get_llm_recorder()
+        started = time.monotonic()
+        try:
+            if recorder is not None:
+                result = recorder.call(
+                    KIND_CHAT, chat_request_key(kwargs), _live, lambda: stub_chat_response(kwargs)
+                )
+            else:
+                result = _live()
+        except Exception:
+            if limiter is not None:
+                limiter.settle(reserved, 0)  # 失败的调用不计 token
+            LLM_CALL_SECONDS.observe(time.monotonic() - started, kind=kind, model=kwargs["model"], outcome="error")
+            raise
+        LLM_CALL_SECONDS.observe(time.monotonic() - started, kind=kind, model=kwargs["model"], outcome="ok")
+        usage = result.get("usage") or {}
+        if limiter is not None:
+            limiter.settle(reserved, usage.get("total_tokens"))
+        span.set_attributes(
+            prompt_tokens=usage.get("prompt_tokens"),
+            cached_tokens=usage.get("cached_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+        )
+        _log_usage(kind, kwargs["model"], started, result)
+        return result
 
 
 @retry(
@@ -154,8 +238,7 @@ def call_qwen(
     if tools:
         kwargs["tools"] = tools
     
-    completion = client.chat.completions.create(**kwargs)
-    return _completion_to_dict(completion)
+    return _create_completion(client, "call_qwen", kwargs)
 
 
 def call_qwen_fast(
@@ -211,8 +294,7 @@ def call_qwen_fast(
     if tools:
         kwargs["tools"] = tools
     
-    completion = fast_client.chat.completions.create(**kwargs)
-    return _completion_to_dict(completion)
+    return _create_completion(fast_client, "call_qwen_fast", kwargs)
 
 
 @retry(
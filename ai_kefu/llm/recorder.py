@@ -0,0 +1,245 @@
+"""
+Record / replay layer for LLM and embedding calls.
+
+Modes (``settings.llm_record_mode``):
+- ``off``: calls go to DashScope unchanged (default, zero overhead)
+- ``record``: calls go to DashScope and each (request, response) pair is
+  saved under ``llm_record_dir``
+- ``replay``: nothing leaves the process. Recorded responses are served,
+  optionally after a synthetic delay. A request that was never recorded
+  gets a deterministic stub reply, or raises when ``llm_replay_on_miss`` is
+  ``error``.
+
+Recordings are keyed by a canonical hash of the request: the model, the
+messages, the tools and the sampling parameters, serialized with sorted
+keys. Each pair is one JSON file, ``<dir>/<kind>/<hash[:2]>/<hash>.json``,
+so recordings can be diffed and shared, and concurrent writers never share
+a file.
+
+Replay makes ``AgentExecutor.run`` reproducible offline for benchmarks
+(``scripts/benchmark_agent.py``) and for debugging a recorded conversation.
+"""
+
+import hashlib
+import json
+import os
+import random
+import struct
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from ai_kefu.config.settings import settings
+
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+KIND_CHAT = "chat"
+KIND_EMBEDDING = "embedding"
+
+# Request fields that change the response (timeouts, stream flags etc. don't)
+_CHAT_KEY_FIELDS = ("model", "messages", "tools", "temperature", "top_p", "max_tokens", "response_format")
+
+STUB_REPLY = "好的，我帮您看一下~"
+STUB_SCORE = "90"
+
+
+class ReplayMissError(LookupError):
+    """A replayed request has no recording and stubs are disabled."""
+
+
+def request_hash(kind: str, request: Dict[str, Any]) -> str:
+    """Canonical hash of a request: sorted keys, compact separators."""
+    canonical = json.dumps(
+        {"kind": kind, "request": request},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def chat_request_key(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """The part of chat.completions.create kwargs that identifies a request."""
+    return {k: kwargs[k] for k in _CHAT_KEY_FIELDS if kwargs.get(k) is not None}
+
+
+def stub_embedding(text: str, dimensions: int = 1024) -> List[float]:
+    """Deterministic unit vector derived from the text."""
+    values: List[float] = []
+    counter = 0
+    while len(values) < dimensions:
+        block = hashlib.sha256(f"{counter}:{text}".encode("utf-8")).digest()
+        values.extend(v / 2**31 for v in struct.unpack("<8i", block))
+        counter += 1
+    values = values[:dimensions]
+    norm = sum(v * v for v in values) ** 0.5 or 1.0
+    return [v / norm for v in values]
+
+
+def stub_chat_response(request: Dict[str, Any]) -> Dict[str, Any]:
+    """A plain assistant reply, shaped like qwen_client._completion_to_dict output."""
+    prompt_chars = sum(len(str(m.get("content") or "")) for m in request.get("messages") or [])
+    content = STUB_REPLY
+    # Short tool-less calls are scorers (the confidence guard): answer with a
+    # passing score so stubbed runs take the normal reply path
+    if not request.get("tools") and (request.get("max_tokens") or 0) and request["max_tokens"] <= 32:
+        content = STUB_SCORE
+    return {
+        "choices": [{"message": {"role": "assistant", "content": content}}],
+        "usage": {
+            "prompt_tokens": prompt_chars // 2,
+            "completion_tokens": len(content),
+            "total_tokens": prompt_chars // 2 + len(content),
+            "cached_tokens": 0,
+        },
+    }
+
+
+class LLMRecorder:
+    """
+    Records or replays calls of one process.
+
+    Args:
+        mode: ``record`` or ``replay``
+        directory: Root directory of the recordings
+        latency_ms: Fixed delay added to every replayed call
+        jitter_ms: Extra delay in ``[0, jitter_ms)``. It is seeded by the
+            request hash, so a given request always sleeps the same time.
+        recorded_latency: Sleep the duration measured when recording instead
+        on_miss: ``stub`` or ``error`` for unrecorded requests in replay mode
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        directory: str,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        recorded_latency: bool = False,
+        on_miss: str = "stub",
+    ):
+        if mode not in (MODE_RECORD, MODE_REPLAY):
+            raise ValueError(f"Unknown LLM record mode: {mode!r}")
+        self.mode = mode
+        self.directory = directory
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.recorded_latency = recorded_latency
+        self.on_miss = on_miss
+        self._lock = threading.Lock()
+        # metrics
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+    def _path(self, kind: str, digest: str) -> str:
+        return os.path.join(self.directory, kind, digest[:2], f"{digest}.json")
+
+    def _load(self, kind: str, digest: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(kind, digest), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save(self, kind: str, digest: str, entry: Dict[str, Any]) -> None:
+        path = self._path(kind, digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+
+    def _sleep(self, digest: str, recorded_ms: Optional[float]) -> None:
+        delay_ms = self.latency_ms
+        if self.recorded_latency and recorded_ms:
+            delay_ms = recorded_ms
+        if self.jitter_ms:
+            delay_ms += random.Random(digest).random() * self.jitter_ms
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+
+    def call(
+        self,
+        kind: str,
+        request: Dict[str, Any],
+        live: Callable[[], Any],
+        stub: Callable[[], Any],
+    ) -> Any:
+        """
+        Serve one call.
+
+        Args:
+            kind: ``chat`` or ``embedding``
+            request: JSON-serializable identity of the request
+            live: Performs the real call (record mode)
+            stub: Builds a deterministic response (replay miss)
+        """
+        digest = request_hash(kind, request)
+
+        if self.mode == MODE_RECORD:
+            started = time.monotonic()
+            response = live()
+            self._save(kind, digest, {
+                "kind": kind,
+                "request": request,
+                "response": response,
+                "duration_ms": round((time.monotonic() - started) * 1000, 1),
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            })
+            with self._lock:
+                self.recorded += 1
+            return response
+
+        entry = self._load(kind, digest)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            if self.on_miss == "error":
+                raise ReplayMissError(f"No recorded {kind} response for request {digest[:12]}")
+            self._sleep(digest, None)
+            return stub()
+
+        with self._lock:
+            self.hits += 1
+        self._sleep(digest, entry.get("duration_ms"))
+        return entry["response"]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "directory": self.directory,
+            "hits": self.hits,
+            "misses": self.misses,
+            "recorded": self.recorded,
+        }
+
+
+_recorder: Optional[LLMRecorder] = None
+_configured = False
+_config_lock = threading.Lock()
+
+
+def configure_llm_recorder(mode: str = MODE_OFF, directory: Optional[str] = None, **options) -> Optional[LLMRecorder]:
+    """Install the process-wide recorder (``off`` removes it)."""
+    global _recorder, _configured
+    with _config_lock:
+        _recorder = None if mode == MODE_OFF else LLMRecorder(
+            mode, directory or settings.llm_record_dir, **options
+        )
+        _configured = True
+    return _recorder
+
+
+def get_llm_recorder() -> Optional[LLMRecorder]:
+    """The active recorder, configured from settings on first use (None when off)."""
+    if not _configured:
+        configure_llm_recorder(
+            settings.llm_record_mode,
+            settings.llm_record_dir,
+            latency_ms=settings.llm_replay_latency_ms,
+            jitter_ms=settings.llm_replay_jitter_ms,
+            on_miss=settings.llm_replay_on_miss,
+        )
+    return _recorder
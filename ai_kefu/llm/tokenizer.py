@@ -0,0 +1,127 @@
+"""
+Local token counting for Qwen prompts.
+
+If ``settings.qwen_tokenizer_path`` points to a HuggingFace ``tokenizer.json``
+(e.g. from Qwen/Qwen2.5-7B-Instruct) and the ``tokenizers`` package is
+installed, counts come from the real BPE tokenizer. Otherwise a heuristic
+calibrated against the Qwen tokenizer is used: roughly one token per CJK
+character and one token per ~3.5 other characters. That is far closer than
+the old ``len(chars) * 1.2`` for JSON-heavy tool results.
+
+Counts are cached by a digest of the text, so re-counting the same session
+messages on every turn costs a hash and a dict lookup, and the cache never
+keeps large prompts or tool results alive.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from ai_kefu.config.settings import settings
+from ai_kefu.utils.logging import logger
+
+# Per-message framing overhead of the chat template (<|im_start|>role\n ... <|im_end|>\n)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_tokenizer: Optional[Any] = None
+_tokenizer_loaded = False
+_tokenizer_lock = threading.Lock()
+
+_COUNT_CACHE_SIZE = 8192
+# blake2b digest of the text -> token count, least recently used first
+_count_cache: "OrderedDict[bytes, int]" = OrderedDict()
+_count_cache_lock = threading.Lock()
+
+
+def _get_tokenizer() -> Optional[Any]:
+    """Load the configured tokenizer once; None means heuristic mode."""
+    global _tokenizer, _tokenizer_loaded
+    if _tokenizer_loaded:
+        return _tokenizer
+    with _tokenizer_lock:
+        if _tokenizer_loaded:
+            return _tokenizer
+        path = settings.qwen_tokenizer_path
+        if path:
+            try:
+                from tokenizers import Tokenizer
+                _tokenizer = Tokenizer.from_file(path)
+                logger.info(f"Loaded Qwen tokenizer from {path}")
+            except Exception as e:
+                logger.warning(f"Failed to load tokenizer from {path}, using heuristic counts: {e}")
+        _tokenizer_loaded = True
+    return _tokenizer
+
+
+def _is_cjk(ch: str) -> bool:
+    code = ord(ch)
+    return (
+        0x4E00 <= code <= 0x9FFF      # CJK Unified Ideographs
+        or 0x3400 <= code <= 0x4DBF   # Extension A
+        or 0x3000 <= code <= 0x303F   # CJK punctuation
+        or 0xFF00 <= code <= 0xFFEF   # Full-width forms
+    )
+
+
+def _heuristic_count(text: str) -> int:
+    cjk = sum(1 for ch in text if _is_cjk(ch))
+    other = len(text) - cjk
+    return cjk + int(other / 3.5 + 0.999)
+
+
+def _count_uncached(text: str) -> int:
+    tokenizer = _get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+    return _heuristic_count(text)
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens ``text`` encodes to (cached by digest)."""
+    if not text:
+        return 0
+    key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    with _count_cache_lock:
+        count = _count_cache.get(key)
+        if count is not None:
+            _count_cache.move_to_end(key)
+            return count
+    count = _count_uncached(text)
+    with _count_cache_lock:
+        _count_cache[key] = count
+        if len(_count_cache) > _COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+    return count
+
+
+def count_message_tokens(message: Dict[str, Any]) -> int:
+    """Tokens for one Qwen-format message dict, including tool_call arguments."""
+    total = MESSAGE_OVERHEAD_TOKENS + count_tokens(message.get("content") or "")
+    for tc in message.get("tool_calls") or []:
+        function = tc.get("function", {})
+        total += count_tokens(function.get("name", "")) + count_tokens(function.get("arguments", ""))
+    return total
+
+
+def count_messages_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Total prompt tokens for a list of Qwen-format message dicts."""
+    return sum(count_message_tokens(m) for m in messages)
+
+
+def count_tools_tokens(tools: Optional[List[Dict[str, Any]]]) -> int:
+    """Tokens taken by function definitions (they are part of the prompt too)."""
+    if not tools:
+        return 0
+    return count_tokens(json.dumps(tools, ensure_ascii=False, sort_keys=True))
+
+
+def reset_tokenizer_cache() -> None:
+    """Forget the loaded tokenizer and cached counts (tests / settings reload)."""
+    global _tokenizer, _tokenizer_loaded
+    with _tokenizer_lock:
+        _tokenizer = None
+        _tokenizer_loaded = False
+    with _count_cache_lock:
+        _count_cache.clear()
@@ -3,7 +3,7 @@ Session and message data models.
 Based on data-model.md specifications.
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from datetime import datetime
 from typing import List, Optional, Dict, Any, Literal
 from ai_kefu.config.constants import (
@@ -188,6 +188,9 @@ class Session(BaseModel):
         description="Extended metadata"
     )
     
+    # Persistence bookkeeping used by SessionStore for delta writes (not serialized)
+    _store_state: Optional[Any] = PrivateAttr(default=None)
+    
     class Config:
         json_schema_extra = {
             "example": {
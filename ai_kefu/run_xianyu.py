@@ -9,6 +9,7 @@
 import asyncio
 import sys
 from pathlib import Path
+from typing import Optional
 
 # 添加项目根目录到 Python 路径
 project_root = Path(__file__).parent
@@ -26,11 +27,21 @@ from xianyu_interceptor.cdp_interceptor import CDPInterceptor
 from xianyu_interceptor.messaging_core import XianyuMessageCodec
 from xianyu_interceptor.models import XianyuMessage, XianyuMessageType
 from xianyu_interceptor.image_handler import get_image_handler
+from xianyu_interceptor.frame_dispatcher import FrameDispatcher
+from xianyu_interceptor.account_runtime import MultiAccountRuntime, load_accounts
 from xianyu_interceptor.history_message_parser import HistoryMessageParser
 from xianyu_interceptor.browser_transport import BrowserTransport
 from ai_kefu.config.settings import settings
+from ai_kefu.utils.logging import is_debug_enabled
+from ai_kefu.utils.tracing import configure_tracing
 import json
 
+# 帧中出现这些关键词时（DEBUG 级别下）记录整帧，用于寻找历史消息接口
+_HISTORY_KEYWORDS = (
+    "conversation", "message", "history", "list",
+    "sync", "query", "get", "load",
+)
+
 
 async def _wait_for_api_ready(
     base_url: str,
@@ -80,7 +91,10 @@ async def _wait_for_api_ready(
     return False
 
 
-async def _save_history_messages_to_api(history_messages: list) -> None:
+async def _save_history_messages_to_api(
+    history_messages: list,
+    seller_user_id: Optional[str] = None,
+) -> None:
     """
     将解析出的历史消息通过 HTTP POST 到 /xianyu/history-inbound 保存到数据库。
     直接调用 conversation_store 依赖于 API 层的单例，所以改为 HTTP 调用。
@@ -89,7 +103,7 @@ async def _save_history_messages_to_api(history_messages: list) -> None:
     import httpx
     inbound_url = f"{config.agent_service_url.rstrip('/')}/xianyu/inbound"
 
-    seller_user_id = settings.seller_user_id
+    seller_user_id = seller_user_id or settings.seller_user_id
 
     for xianyu_message in history_messages:
         try:
@@ -155,6 +169,9 @@ async def _push_cookies_to_api(browser_controller, agent_service_url: str) -> No
     """
     Extract current browser cookies and push them to the FastAPI process
     so GoofishProvider can be re-initialized with valid credentials.
+
+    ``browser_controller`` may be a BrowserController or an AccountSession —
+    anything exposing ``extract_cookies()``.
     """
     import httpx
     try:
@@ -174,10 +191,274 @@ async def _push_cookies_to_api(browser_controller, agent_service_url: str) -> No
         logger.warning(f"[cookie-push] Failed to push cookies to API: {e}")
 
 
+async def process_frame(
+    message_data: dict,
+    *,
+    seller_user_id: str,
+    message_handler,
+    image_handler,
+    account_id: Optional[str] = None,
+) -> None:
+    """
+    处理拦截到的 WebSocket 消息
+
+    单账号与多账号模式共用；多账号模式下每个账号传入自己的
+    seller_user_id / message_handler，account_id 随消息 metadata 转发。
+
+    【重要】WebSocket 消息需要解码和转换：
+    1. 使用 XianyuMessageCodec.decode_message() 解码原始消息
+    2. 使用 XianyuMessageCodec.extract_message_data() 提取标准化数据
+    3. 转换为 XianyuMessage 对象
+    4. 传递给 message_handler（薄中继，POST 到 /xianyu/inbound）
+    """
+    try:
+        # 过滤心跳和系统消息，减少日志噪音
+        # 心跳响应: {"headers":{...},"code":200} 且没有 body
+        # 心跳请求已在 _on_console_api 中过滤
+        if message_data.get("code") == 200 and "body" not in message_data:
+            return  # 静默忽略心跳响应
+
+        # ============================================================
+        # 【调试】记录可能包含历史消息的 WebSocket 帧
+        # 仅在 DEBUG 级别启用时才序列化整帧，避免每帧 json.dumps 的开销
+        # ============================================================
+        lwp = message_data.get("lwp", "")
+        contains_history_keywords = False
+        if is_debug_enabled():
+            body = message_data.get("body", {})
+            body_str = json.dumps(body, ensure_ascii=False).lower() if body else ""
+            contains_history_keywords = any(
+                keyword in lwp.lower() or keyword in body_str
+                for keyword in _HISTORY_KEYWORDS
+            )
+            if contains_history_keywords:
+                message_str = json.dumps(message_data, ensure_ascii=False)
+                logger.debug(
+                    "🔍 [历史调试] 可能包含历史消息的WebSocket消息: lwp={} 长度={} 字节 内容（前2000字符）: {}",
+                    lwp, len(message_str), message_str[:2000],
+                )
+
+        # ============================================================
+        # 【历史消息处理】检查是否是历史消息API响应
+        # ============================================================
+        if HistoryMessageParser.is_history_message_response(message_data):
+            logger.info(f"📜 检测到历史消息API响应，开始解析...")
+
+            # 解析历史消息列表
+            history_messages = HistoryMessageParser.parse_history_messages(message_data)
+
+            if history_messages:
+                logger.info(f"✅ 解析到 {len(history_messages)} 条历史消息，正在保存到数据库...")
+
+                # ============================================================
+                # 【重要】历史消息只保存到数据库，不触发 AI 回复！
+                # 通过 /xianyu/inbound 发送，metadata 中携带 history_only=True，
+                # API 层收到后仅入库，不调用 AI Agent。
+                # ============================================================
+                saved_count = len(history_messages)
+                await _save_history_messages_to_api(history_messages, seller_user_id)
+                logger.success(f"🎉 已转发 {saved_count} 条历史消息到 API 层入库")
+            else:
+                logger.warning("未能从历史消息响应中解析到消息")
+
+            # 历史消息已处理完成，不再继续解码流程
+            return
+
+        # 步骤 1: 解码消息
+        # 只有 syncPushPackage 格式的消息（别人发给你的）才能被解码
+        # 其他消息（响应、状态更新等）会被静默忽略
+        decoded_message = XianyuMessageCodec.decode_message(message_data)
+        if not decoded_message:
+            # 记录被过滤的消息（如果包含历史关键词）
+            if contains_history_keywords:
+                logger.debug("   ⚠️ 此消息无法被decode_message解码（可能需要新的解码逻辑）")
+            return  # 静默忽略非聊天消息
+
+        # 🔬 解码成功后，先打印解码结果的分类信息
+        msg_type = XianyuMessageCodec.classify_message(decoded_message)
+        logger.debug("🔬 [解码成功] 消息分类={}, 顶层键={}", msg_type.value, list(decoded_message))
+
+        # 步骤 2: 提取标准化数据
+        std_message = XianyuMessageCodec.extract_message_data(decoded_message)
+        if not std_message:
+            return  # 无法提取的消息（如订单消息）静默忽略
+
+        # 🔬 打印提取结果
+        logger.debug(
+            "🔬 [提取结果] type={}, user_id={}, chat_id={}, content={}",
+            std_message.message_type.value, std_message.user_id, std_message.chat_id,
+            std_message.content[:50] if std_message.content else None,
+        )
+
+        # 步骤 3: 转换为 XianyuMessage 对象
+        metadata = std_message.metadata or {}
+        if account_id:
+            metadata["account_id"] = account_id
+        is_self_sent = (
+            bool(seller_user_id) and
+            std_message.user_id == seller_user_id
+        )
+        xianyu_message = XianyuMessage(
+            message_type=XianyuMessageType(std_message.message_type.value),
+            chat_id=std_message.chat_id,
+            user_id=std_message.user_id,
+            user_nickname=metadata.get("user_nickname") or metadata.get("reminder_title") or None,
+            encrypted_uid=metadata.get("encrypted_uid") or None,
+            content=std_message.content,
+            item_id=std_message.item_id,
+            item_title=metadata.get("item_title") or None,
+            item_price=None,  # 闲鱼 WebSocket 不携带价格
+            message_id=metadata.get("message_id") or None,
+            is_self_sent=is_self_sent,
+            timestamp=std_message.timestamp,
+            raw_data=std_message.raw_data,
+            metadata=metadata
+        )
+
+        # 【重要】处理图片消息
+        if xianyu_message.content and "[图片]" in xianyu_message.content:
+            logger.info(f"检测到图片消息 (chat_id={xianyu_message.chat_id}, user_id={xianyu_message.user_id})")
+
+            # 调试：记录原始数据（仅 DEBUG 级别时才序列化）
+            logger.opt(lazy=True).debug(
+                "图片消息原始数据: {}",
+                lambda: json.dumps(std_message.raw_data, ensure_ascii=False, indent=2),
+            )
+
+            # 图片放入后台队列下载，不阻塞消息转发
+            try:
+                image_urls = image_handler.submit(
+                    raw_data=std_message.raw_data,
+                    chat_id=xianyu_message.chat_id,
+                    user_id=xianyu_message.user_id,
+                    timestamp=xianyu_message.timestamp
+                )
+
+                if image_urls:
+                    # 文件路径在后台下载完成后才确定，这里只随消息转发 URL
+                    xianyu_message.metadata["image_urls"] = image_urls
+                else:
+                    logger.warning("未能从图片消息中提取图片 URL")
+            except Exception as e:
+                logger.error(f"处理图片消息失败: {e}", exc_info=True)
+
+        # 步骤 4: 传递给消息处理器（薄中继，POST 到 /xianyu/inbound）
+        await message_handler.handle_message(xianyu_message)
+
+    except Exception as e:
+        logger.error(f"处理消息失败: {e}", exc_info=True)
+
+
+async def run_multi_account() -> None:
+    """
+    多账号模式：一个浏览器进程、每个账号一个 context。
+
+    每个账号有独立的拦截器 / BrowserTransport / MessageHandler / seller_user_id，
+    所有页面的帧进入同一个 FrameDispatcher，按账号 ID 路由。
+    API 层的 GoofishProvider 仍是单账号，只推送第一个账号的 Cookie。
+    """
+    specs = load_accounts(config.accounts_file)
+    logger.info(f"多账号模式: {len(specs)} 个账号 ({', '.join(s.account_id for s in specs)})")
+
+    inbound_url = f"{config.agent_service_url.rstrip('/')}/xianyu/inbound"
+    image_handler = get_image_handler(
+        save_dir=config.image_save_dir,
+        max_bytes=config.image_max_bytes,
+        max_disk_bytes=config.image_max_disk_bytes,
+        queue_size=config.image_queue_size,
+        workers=config.image_workers,
+    )
+    await image_handler.start()
+
+    async def on_account_frame(session, message_data: dict):
+        await process_frame(
+            message_data,
+            seller_user_id=session.seller_user_id,
+            message_handler=session.message_handler,
+            image_handler=image_handler,
+            account_id=session.account_id,
+        )
+
+    async def _unrouted(message_data: dict):
+        logger.warning("收到未关联账号的帧，已忽略")
+
+    frame_dispatcher = FrameDispatcher(
+        _unrouted,
+        workers=config.frame_dispatch_workers,
+        max_queue=config.frame_queue_size,
+        overflow_policy=config.frame_overflow_policy,
+        spill_dir=config.frame_spill_dir,
+        lane_key=XianyuMessageCodec.peek_chat_id,
+    )
+    runtime = MultiAccountRuntime(
+        specs,
+        dispatcher=frame_dispatcher,
+        frame_handler=on_account_frame,
+        inbound_url=inbound_url,
+        state_dir=config.accounts_state_dir,
+        headless=config.browser_headless,
+        viewport={
+            "width": config.browser_viewport_width,
+            "height": config.browser_viewport_height,
+        },
+        start_url=config.accounts_start_url,
+    )
+
+    try:
+        await frame_dispatcher.start()
+        await runtime.start()
+        if not runtime.sessions:
+            logger.error("没有账号启动成功")
+            return
+
+        await _wait_for_api_ready(config.agent_service_url)
+        primary = runtime.primary
+        if primary is not None:
+            await _push_cookies_to_api(primary, config.agent_service_url)
+            try:
+                from ai_kefu.services.dingtalk_reply_handler import set_global_transport
+                set_global_transport(primary.transport)
+            except Exception as e:
+                logger.warning(f"钉钉回复服务注入失败（不影响主流程）: {e}")
+
+        logger.success("多账号拦截器已启动！")
+        logger.info("按 Ctrl+C 停止")
+
+        import time
+        check_interval = 5
+        cookie_push_interval = 1800
+        last_check_time = 0.0
+        last_cookie_push_time = time.time()
+        while True:
+            await asyncio.sleep(1)
+            current_time = time.time()
+            if current_time - last_check_time >= check_interval:
+                last_check_time = current_time
+                await runtime.check_pending()
+            if current_time - last_cookie_push_time >= cookie_push_interval:
+                last_cookie_push_time = current_time
+                await runtime.save_all_states()
+                if runtime.primary is not None:
+                    await _push_cookies_to_api(runtime.primary, config.agent_service_url)
+
+    except KeyboardInterrupt:
+        logger.info("\n收到停止信号，正在关闭...")
+    finally:
+        logger.info("正在清理资源...")
+        logger.info(f"账号状态: {runtime.status()}")
+        logger.info(f"帧分发统计: {frame_dispatcher.stats()}")
+        await frame_dispatcher.close()
+        await runtime.close()
+        await image_handler.close()
+        logger.success("拦截器已停止")
+
+
 async def main():
     """主函数"""
     # 设置日志
     setup_logging()
+    # 每条买家消息一个 trace，span 写入 logs/traces_interceptor_<日期>.jsonl
+    configure_tracing("interceptor")
 
     logger.info("=" * 60)
     logger.info("闲鱼消息拦截器 (传输层中继)")
@@ -189,6 +470,10 @@ async def main():
     # 初始化拦截器（返回 MessageHandler 薄中继）
     message_handler = await initialize_interceptor()
 
+    if config.accounts_file:
+        await run_multi_account()
+        return
+
     # 初始化浏览器控制器
     logger.info("正在启动浏览器...")
     browser_controller = BrowserController()
@@ -292,158 +577,36 @@ async def main():
     active_cdp_interceptor = None
 
     # 初始化图片处理器
-    image_handler = get_image_handler(save_dir=config.image_save_dir)
+    image_handler = get_image_handler(
+        save_dir=config.image_save_dir,
+        max_bytes=config.image_max_bytes,
+        max_disk_bytes=config.image_max_disk_bytes,
+        queue_size=config.image_queue_size,
+        workers=config.image_workers,
+    )
+    await image_handler.start()
 
     # 设置消息回调
     async def on_message(message_data: dict):
-        """
-        处理拦截到的 WebSocket 消息
-
-        【重要】WebSocket 消息需要解码和转换：
-        1. 使用 XianyuMessageCodec.decode_message() 解码原始消息
-        2. 使用 XianyuMessageCodec.extract_message_data() 提取标准化数据
-        3. 转换为 XianyuMessage 对象
-        4. 传递给 message_handler（薄中继，POST 到 /xianyu/inbound）
-        """
-        try:
-            # 过滤心跳和系统消息，减少日志噪音
-            # 心跳响应: {"headers":{...},"code":200} 且没有 body
-            # 心跳请求已在 _on_console_api 中过滤
-            if message_data.get("code") == 200 and "body" not in message_data:
-                return  # 静默忽略心跳响应
-
-            # ============================================================
-            # 【调试】完整记录所有WebSocket消息，寻找历史消息
-            # ============================================================
-            message_str = json.dumps(message_data, ensure_ascii=False)
-
-            # 检查消息中是否包含关键词（可能包含历史消息）
-            history_keywords = [
-                "conversation", "message", "history", "list",
-                "sync", "query", "get", "load"
-            ]
-
-            # 检查lwp路径或body中是否包含历史消息相关的关键词
-            lwp = message_data.get("lwp", "")
-            body = message_data.get("body", {})
-            body_str = json.dumps(body, ensure_ascii=False) if body else ""
-
-            contains_history_keywords = any(
-                keyword in lwp.lower() or keyword in body_str.lower()
-                for keyword in history_keywords
-            )
-
-            if contains_history_keywords:
-                logger.info(f"🔍 [历史调试] 可能包含历史消息的WebSocket消息:")
-                logger.info(f"   lwp: {lwp}")
-                if len(message_str) > 2000:
-                    logger.info(f"   消息内容（前2000字符）: {message_str[:2000]}...")
-                    logger.info(f"   消息长度: {len(message_str)} 字节")
-                else:
-                    logger.info(f"   完整消息: {message_str}")
-
-            # ============================================================
-            # 【历史消息处理】检查是否是历史消息API响应
-            # ============================================================
-            if HistoryMessageParser.is_history_message_response(message_data):
-                logger.info(f"📜 检测到历史消息API响应，开始解析...")
-
-                # 解析历史消息列表
-                history_messages = HistoryMessageParser.parse_history_messages(message_data)
-
-                if history_messages:
-                    logger.info(f"✅ 解析到 {len(history_messages)} 条历史消息，正在保存到数据库...")
-
-                    # ============================================================
-                    # 【重要】历史消息只保存到数据库，不触发 AI 回复！
-                    # 通过 /xianyu/inbound 发送，metadata 中携带 history_only=True，
-                    # API 层收到后仅入库，不调用 AI Agent。
-                    # ============================================================
-                    saved_count = len(history_messages)
-                    await _save_history_messages_to_api(history_messages)
-                    logger.success(f"🎉 已转发 {saved_count} 条历史消息到 API 层入库")
-                else:
-                    logger.warning("未能从历史消息响应中解析到消息")
-
-                # 历史消息已处理完成，不再继续解码流程
-                return
-
-            # 步骤 1: 解码消息
-            # 只有 syncPushPackage 格式的消息（别人发给你的）才能被解码
-            # 其他消息（响应、状态更新等）会被静默忽略
-            decoded_message = XianyuMessageCodec.decode_message(message_data)
-            if not decoded_message:
-                # 记录被过滤的消息（如果包含历史关键词）
-                if contains_history_keywords:
-                    logger.info(f"   ⚠️ 此消息无法被decode_message解码（可能需要新的解码逻辑）")
-                return  # 静默忽略非聊天消息
-
-            # 🔬 解码成功后，先打印解码结果的分类信息
-            msg_type = XianyuMessageCodec.classify_message(decoded_message)
-            logger.info(f"🔬 [解码成功] 消息分类={msg_type.value}, 顶层键={list(decoded_message.keys())}")
-
-            # 步骤 2: 提取标准化数据
-            std_message = XianyuMessageCodec.extract_message_data(decoded_message)
-            if not std_message:
-                return  # 无法提取的消息（如订单消息）静默忽略
-
-            # 🔬 打印提取结果
-            logger.info(f"🔬 [提取结果] type={std_message.message_type.value}, user_id={std_message.user_id}, chat_id={std_message.chat_id}, content={std_message.content[:50] if std_message.content else 'None'}")
-
-            # 步骤 3: 转换为 XianyuMessage 对象
-            metadata = std_message.metadata or {}
-            is_self_sent = (
-                bool(seller_user_id) and
-                std_message.user_id == seller_user_id
-            )
-            xianyu_message = XianyuMessage(
-                message_type=XianyuMessageType(std_message.message_type.value),
-                chat_id=std_message.chat_id,
-                user_id=std_message.user_id,
-                user_nickname=metadata.get("user_nickname") or metadata.get("reminder_title") or None,
-                encrypted_uid=metadata.get("encrypted_uid") or None,
-                content=std_message.content,
-                item_id=std_message.item_id,
-                item_title=metadata.get("item_title") or None,
-                item_price=None,  # 闲鱼 WebSocket 不携带价格
-                message_id=metadata.get("message_id") or None,
-                is_self_sent=is_self_sent,
-                timestamp=std_message.timestamp,
-                raw_data=std_message.raw_data,
-                metadata=metadata
-            )
-
-            # 【重要】处理图片消息
-            if xianyu_message.content and "[图片]" in xianyu_message.content:
-                logger.info(f"检测到图片消息 (chat_id={xianyu_message.chat_id}, user_id={xianyu_message.user_id})")
-
-                # 调试：记录原始数据（可以根据需要启用）
-                if logger.level("DEBUG").no >= logger._core.min_level:
-                    logger.debug(f"图片消息原始数据: {json.dumps(std_message.raw_data, ensure_ascii=False, indent=2)}")
-
-                # 下载并保存图片
-                try:
-                    saved_files = await image_handler.handle_image_message(
-                        raw_data=std_message.raw_data,
-                        chat_id=xianyu_message.chat_id,
-                        user_id=xianyu_message.user_id,
-                        timestamp=xianyu_message.timestamp
-                    )
-
-                    if saved_files:
-                        # 将保存的文件路径添加到 metadata 中
-                        xianyu_message.metadata["image_files"] = saved_files
-                        logger.info(f"图片已保存: {saved_files}")
-                    else:
-                        logger.warning("未能从图片消息中提取或下载图片")
-                except Exception as e:
-                    logger.error(f"处理图片消息失败: {e}", exc_info=True)
-
-            # 步骤 4: 传递给消息处理器（薄中继，POST 到 /xianyu/inbound）
-            await message_handler.handle_message(xianyu_message)
+        await process_frame(
+            message_data,
+            seller_user_id=seller_user_id,
+            message_handler=message_handler,
+            image_handler=image_handler,
+        )
 
-        except Exception as e:
-            logger.error(f"处理消息失败: {e}", exc_info=True)
+    # 帧分发队列：所有页面共享，CDP 事件只负责入队，
+    # 由固定数量的 worker 调用 on_message（慢的 /xianyu/inbound 不再阻塞事件处理），
+    # 同一 chat_id 的帧按顺序逐条处理
+    frame_dispatcher = FrameDispatcher(
+        on_message,
+        workers=config.frame_dispatch_workers,
+        max_queue=config.frame_queue_size,
+        overflow_policy=config.frame_overflow_policy,
+        spill_dir=config.frame_spill_dir,
+        lane_key=XianyuMessageCodec.peek_chat_id,
+    )
+    await frame_dispatcher.start()
 
     # 设置页面监控的辅助函数
     async def setup_page_monitoring(page, should_reload=False):
@@ -464,7 +627,7 @@ async def main():
             cdp_session = await browser_controller.context.new_cdp_session(page)
 
             # 创建拦截器
-            interceptor = CDPInterceptor(cdp_session)
+            interceptor = CDPInterceptor(cdp_session, dispatcher=frame_dispatcher)
             interceptor.message_callback = on_message
 
             # 设置监控
@@ -600,6 +763,9 @@ async def main():
         logger.info("正在清理资源...")
         for page_id, info in page_interceptors.items():
             await info['interceptor'].close()
+        logger.info(f"帧分发统计: {frame_dispatcher.stats()}")
+        await frame_dispatcher.close()
+        await image_handler.close()
         await browser_controller.close()
         logger.success("拦截器已停止")
 
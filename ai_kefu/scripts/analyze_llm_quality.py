@@ -18,6 +18,12 @@ LLM 回复质量分析工具 v3 — 基于 eval_runs 表
     # 调整并发线程数
     python -m ai_kefu.scripts.analyze_llm_quality -j 12
 
+    # 一次请求评 5 条（结构化 JSON 输出），并限速 2 req/s、60k tokens/min
+    python -m ai_kefu.scripts.analyze_llm_quality --judge-batch 5 --rps 2 --tpm 60000
+
+    # 忽略评分缓存，全部重新评分
+    python -m ai_kefu.scripts.analyze_llm_quality --no-cache
+
     # 跳过 LLM 评分，仅做统计分析
     python -m ai_kefu.scripts.analyze_llm_quality --no-llm-eval
 
@@ -29,6 +35,7 @@ LLM 回复质量分析工具 v3 — 基于 eval_runs 表
 """
 
 import argparse
+import hashlib
 import json
 import os
 import re
@@ -181,6 +188,99 @@ def fetch_eval_items(conn: pymysql.Connection, run_id: str) -> List[EvalItem]:
     return items
 
 
+# ------------------------------------------------------------------
+# 评分缓存
+# ------------------------------------------------------------------
+
+# 评分 prompt 的版本：修改 EVAL_PROMPT / BATCH_EVAL_PROMPT 的评分标准时必须递增，
+# 否则会沿用旧标准下缓存的分数
+JUDGE_PROMPT_VERSION = "v3"
+
+CREATE_JUDGE_CACHE_SQL = """
+    CREATE TABLE IF NOT EXISTS eval_judge_cache (
+        judge_version VARCHAR(64) NOT NULL COMMENT '评分 prompt 版本',
+        item_hash CHAR(64) NOT NULL COMMENT '被评内容 (上下文/买家/人工/AI 回复/评分模型) 的 sha256',
+        score JSON NOT NULL COMMENT '评分结果',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (judge_version, item_hash)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    COMMENT='analyze_llm_quality 评分缓存，内容不变的条目重跑报告时不再评分'
+"""
+
+
+def item_hash(item: EvalItem, judge_model: str) -> str:
+    """被评内容的哈希：只包含实际送进评分 prompt 的字段。"""
+    payload = json.dumps(
+        [
+            judge_model,
+            _build_context_text(item.context_messages),
+            (item.user_message or "")[:500],
+            (item.human_reply or "")[:800],
+            (item.ai_reply or "")[:800],
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class JudgeCache:
+    """按 (JUDGE_PROMPT_VERSION, item_hash) 缓存评分结果，只缓存成功的评分。"""
+
+    def __init__(self, conn: pymysql.Connection, judge_model: str, version: str = JUDGE_PROMPT_VERSION):
+        self.conn = conn
+        self.judge_model = judge_model
+        self.version = version
+        self.hits = 0
+        self.stored = 0
+        with conn.cursor() as cursor:
+            cursor.execute(CREATE_JUDGE_CACHE_SQL)
+        conn.commit()
+
+    def apply(self, items: List[EvalItem]) -> List[EvalItem]:
+        """给命中缓存的条目填入 score，返回仍需评分的条目。"""
+        hashes = {item.id: item_hash(item, self.judge_model) for item in items}
+        cached: Dict[str, Dict] = {}
+        unique = list(set(hashes.values()))
+        with self.conn.cursor() as cursor:
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i + 500]
+                cursor.execute(
+                    f"SELECT item_hash, score FROM eval_judge_cache "
+                    f"WHERE judge_version = %s AND item_hash IN ({', '.join(['%s'] * len(chunk))})",
+                    [self.version, *chunk],
+                )
+                for row in cursor.fetchall():
+                    score = row["score"]
+                    cached[row["item_hash"]] = json.loads(score) if isinstance(score, str) else score
+
+        remaining = []
+        for item in items:
+            data = cached.get(hashes[item.id])
+            if data:
+                item.score = _score_from_dict(data)
+                self.hits += 1
+            else:
+                remaining.append(item)
+        return remaining
+
+    def store(self, items: List[EvalItem]):
+        rows = [
+            (self.version, item_hash(item, self.judge_model), json.dumps(item.score.raw_json, ensure_ascii=False))
+            for item in items
+            if item.score and item.score.overall_score > 0 and item.score.raw_json
+        ]
+        if not rows:
+            return
+        with self.conn.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO eval_judge_cache (judge_version, item_hash, score) VALUES (%s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE score = VALUES(score)",
+                rows,
+            )
+        self.conn.commit()
+        self.stored += len(rows)
+
+
 # ------------------------------------------------------------------
 # LLM 评分
 # ------------------------------------------------------------------
@@ -236,6 +336,60 @@ EVAL_PROMPT = """你是一个专业的客服质量评估专家。以下是闲鱼
 ```"""
 
 
+BATCH_EVAL_PROMPT = """你是一个专业的客服质量评估专家。以下是闲鱼平台上手机/数码租赁客服的 {count} 条真实对话片段，彼此独立。
+
+每条都有买家消息，以及「人工客服」和「AI 客服」各自的回复。请逐条对比两者差异并评分。
+
+{items_text}
+
+## 评分要求
+
+对每一条，请从以下 5 个维度对 **AI 客服** 的回复进行评分（1-10 分），以人工客服为参照：
+
+1. **简洁度** (conciseness): AI 回复是否像人工一样简洁直接，而非冗长啰嗦
+2. **自然度** (naturalness): AI 回复是否像真人说话，不机械、不模板化
+3. **准确性** (accuracy): AI 回复信息是否正确，有没有编造或错误
+4. **理解力** (understanding): AI 是否正确理解了买家的意图和需求
+5. **转化力** (conversion): AI 的回复是否有助于促成交易（而非让买家跑掉）
+
+各条独立评分，不要互相比较。
+
+## 输出格式
+
+只输出一个 JSON 对象，results 中每条对话一项，index 与上面的编号一致：
+
+{{
+    "results": [
+        {{
+            "index": 1,
+            "conciseness": 7,
+            "naturalness": 6,
+            "accuracy": 8,
+            "understanding": 7,
+            "conversion": 6,
+            "overall_score": 6.8,
+            "key_differences": ["差异1"],
+            "ai_problems": ["问题1"],
+            "prompt_improvements": ["改进建议1"]
+        }}
+    ]
+}}"""
+
+BATCH_ITEM_TEMPLATE = """## 对话 {index}
+
+### 上下文（对话历史）
+{context_text}
+
+**👤 买家消息**：{user_message}
+
+**👨‍💼 人工客服回复**：{human_reply}
+
+**🤖 AI 客服回复**：{ai_reply}
+"""
+
+_JUDGE_SYSTEM_PROMPT = "你是客服质量评估专家。只输出 JSON，不要输出任何其他文字。"
+
+
 def _build_context_text(context_messages: Optional[List[Dict]], max_turns: int = 8) -> str:
     """将上下文消息格式化为文本。"""
     if not context_messages:
@@ -333,31 +487,73 @@ def _parse_eval_json(content: str) -> Optional[Dict]:
     return None
 
 
-def _call_llm_for_eval(messages: List[Dict], max_retries: int = 5, timeout: float = 120) -> Dict:
-    """在线调用 LLM（带重试），用于实时并发评分。"""
-    from openai import OpenAI, APIError, APITimeoutError, APIConnectionError
+_eval_client = None
+_eval_client_lock = threading.Lock()
+
+
+def _get_eval_client(timeout: float = 120):
+    """评分用的 OpenAI client（全部线程共享一个连接池）。"""
+    global _eval_client
+    if _eval_client is None:
+        with _eval_client_lock:
+            if _eval_client is None:
+                from openai import OpenAI
+                from ai_kefu.config.settings import settings
+                _eval_client = OpenAI(
+                    api_key=settings.api_key,
+                    base_url=settings.model_base_url,
+                    timeout=timeout,
+                )
+    return _eval_client
+
+
+def _call_llm_for_eval(
+    messages: List[Dict],
+    max_retries: int = 5,
+    timeout: float = 120,
+    max_tokens: int = 1500,
+    json_mode: bool = False,
+) -> Dict:
+    """
+    在线调用 LLM（带重试），用于实时并发评分。
+
+    每次尝试前都在共享令牌桶（utils.rate_limiter）中排队，
+    所以重试也受 --rps / --tpm 限制。
+    """
+    from openai import APIError, APITimeoutError, APIConnectionError
     from ai_kefu.config.settings import settings
+    from ai_kefu.llm.tokenizer import count_messages_tokens
+    from ai_kefu.utils.rate_limiter import get_llm_rate_limiter
     import random
 
-    client = OpenAI(
-        api_key=settings.api_key,
-        base_url=settings.model_base_url,
-        timeout=timeout,
-    )
+    client = _get_eval_client(timeout)
+    limiter = get_llm_rate_limiter()
+    reserved = count_messages_tokens(messages) + max_tokens if limiter else 0
+
+    kwargs: Dict[str, Any] = {
+        "model": settings.model_name,
+        "messages": messages,
+        "temperature": 0.3,
+        "max_tokens": max_tokens,
+        "stream": False,
+    }
+    if json_mode:
+        kwargs["response_format"] = {"type": "json_object"}
 
     last_error = None
     for attempt in range(1, max_retries + 1):
+        if limiter:
+            limiter.acquire(reserved)
         try:
-            completion = client.chat.completions.create(
-                model=settings.model_name,
-                messages=messages,
-                temperature=0.3,
-                max_tokens=1500,
-                stream=False,
-            )
+            completion = client.chat.completions.create(**kwargs)
+            usage = getattr(completion, "usage", None)
+            if limiter:
+                limiter.settle(reserved, getattr(usage, "total_tokens", None))
             msg = completion.choices[0].message
             return {"choices": [{"message": {"role": msg.role or "assistant", "content": msg.content or ""}}]}
         except (APITimeoutError, APIConnectionError, APIError) as e:
+            if limiter:
+                limiter.settle(reserved, 0)
             last_error = e
             delay = min(2 ** attempt + random.uniform(0, 2), 30)
             logger.warning(f"LLM 调用失败 (attempt {attempt}/{max_retries}): {type(e).__name__}: {e} | 等待 {delay:.1f}s")
@@ -383,7 +579,7 @@ def evaluate_single(item: EvalItem) -> EvalScore:
     try:
         response = _call_llm_for_eval(
             messages=[
-                {"role": "system", "content": "你是客服质量评估专家。只输出 JSON，不要输出任何其他文字。"},
+                {"role": "system", "content": _JUDGE_SYSTEM_PROMPT},
                 {"role": "user", "content": prompt},
             ],
         )
@@ -393,64 +589,158 @@ def evaluate_single(item: EvalItem) -> EvalScore:
             logger.warning(f"LLM 返回无法解析 (id={item.id}): {content[:200]}")
             return EvalScore()
 
-        return EvalScore(
-            conciseness=float(data.get("conciseness", 0)),
-            naturalness=float(data.get("naturalness", 0)),
-            accuracy=float(data.get("accuracy", 0)),
-            understanding=float(data.get("understanding", 0)),
-            conversion=float(data.get("conversion", 0)),
-            overall_score=float(data.get("overall_score", 0)),
-            key_differences=data.get("key_differences", []),
-            ai_problems=data.get("ai_problems", []),
-            prompt_improvements=data.get("prompt_improvements", []),
-            raw_json=data,
-        )
+        return _score_from_dict(data)
     except Exception as e:
         logger.error(f"LLM 评分失败 (id={item.id}): {e}")
         return EvalScore()
 
 
-def evaluate_batch(items: List[EvalItem], concurrency: int = 10) -> List[EvalItem]:
-    """在线并发评分（带限速）。"""
-    total = len(items)
-    counters = {"done": 0, "success": 0, "fail": 0, "lock": threading.Lock()}
+def _score_from_dict(data: Dict) -> EvalScore:
+    return EvalScore(
+        conciseness=float(data.get("conciseness", 0)),
+        naturalness=float(data.get("naturalness", 0)),
+        accuracy=float(data.get("accuracy", 0)),
+        understanding=float(data.get("understanding", 0)),
+        conversion=float(data.get("conversion", 0)),
+        overall_score=float(data.get("overall_score", 0)),
+        key_differences=data.get("key_differences", []),
+        ai_problems=data.get("ai_problems", []),
+        prompt_improvements=data.get("prompt_improvements", []),
+        raw_json=data,
+    )
 
-    # 启动节流：每秒最多发出 concurrency 个请求
-    rate_limiter = threading.Semaphore(max(1, concurrency))
 
-    def _release_after_delay():
-        time.sleep(1.0)
-        rate_limiter.release()
+def _parse_batch_results(content: str, count: int) -> Dict[int, Dict]:
+    """解析批量评分 JSON，返回 {index: 单条评分 dict}。"""
+    try:
+        data = json.loads(content)
+    except (TypeError, json.JSONDecodeError):
+        match = re.search(r'\{[\s\S]*\}', content or "")
+        try:
+            data = json.loads(match.group()) if match else None
+        except json.JSONDecodeError:
+            data = None
+    results = data.get("results") if isinstance(data, dict) else data
+    if not isinstance(results, list):
+        return {}
+
+    parsed: Dict[int, Dict] = {}
+    for position, entry in enumerate(results, 1):
+        if not isinstance(entry, dict):
+            continue
+        try:
+            index = int(entry.get("index", position))
+        except (TypeError, ValueError):
+            continue
+        if 1 <= index <= count and "overall_score" in entry:
+            entry = dict(entry)
+            entry.pop("index", None)
+            parsed[index] = entry
+    return parsed
 
-    def _worker(item: EvalItem) -> EvalItem:
-        rate_limiter.acquire()
-        threading.Thread(target=_release_after_delay, daemon=True).start()
 
-        score = evaluate_single(item)
-        item.score = score
+def evaluate_group(items: List[EvalItem]) -> List[EvalScore]:
+    """
+    在线推理：一次请求评 K 条（结构化 JSON 输出）。
 
-        with counters["lock"]:
-            counters["done"] += 1
-            if score.overall_score > 0:
-                counters["success"] += 1
-            else:
-                counters["fail"] += 1
-            done = counters["done"]
-            success = counters["success"]
-            fail = counters["fail"]
-
-        logger.info(
-            f"  [{done}/{total}] id={item.id} | 综合={score.overall_score:.1f} "
-            f"简洁={score.conciseness:.0f} 自然={score.naturalness:.0f} 准确={score.accuracy:.0f} "
-            f"| 成功={success} 失败={fail}"
+    返回结果里缺失或无法解析的条目，逐条回退到 evaluate_single。
+    """
+    if len(items) == 1:
+        return [evaluate_single(items[0])]
+
+    blocks = [
+        BATCH_ITEM_TEMPLATE.format(
+            index=i,
+            context_text=_build_context_text(item.context_messages),
+            user_message=item.user_message[:500] if item.user_message else "",
+            human_reply=item.human_reply[:800] if item.human_reply else "（无）",
+            ai_reply=item.ai_reply[:800] if item.ai_reply else "（无）",
+        )
+        for i, item in enumerate(items, 1)
+    ]
+    prompt = BATCH_EVAL_PROMPT.format(count=len(items), items_text="\n".join(blocks))
+
+    parsed: Dict[int, Dict] = {}
+    try:
+        response = _call_llm_for_eval(
+            messages=[
+                {"role": "system", "content": _JUDGE_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            max_tokens=max(1500, 700 * len(items)),
+            json_mode=True,
         )
-        return item
+        content = response["choices"][0]["message"].get("content", "")
+        parsed = _parse_batch_results(content, len(items))
+        if len(parsed) < len(items):
+            logger.warning(
+                f"批量评分只解析到 {len(parsed)}/{len(items)} 条 "
+                f"(ids={[it.id for it in items]})，其余逐条重评"
+            )
+    except Exception as e:
+        logger.error(f"批量评分失败 (ids={[it.id for it in items]}): {e}，逐条重评")
+
+    return [
+        _score_from_dict(parsed[i]) if i in parsed else evaluate_single(item)
+        for i, item in enumerate(items, 1)
+    ]
+
+
+def evaluate_batch(
+    items: List[EvalItem],
+    concurrency: int = 10,
+    judge_batch_size: int = 1,
+    cache: Optional[JudgeCache] = None,
+) -> List[EvalItem]:
+    """
+    在线并发评分。
+
+    - 命中评分缓存的条目直接复用分数
+    - 其余每 judge_batch_size 条合成一个请求（evaluate_group）
+    - 请求速率由共享令牌桶限制（main 中按 --rps / --tpm 配置），
+      concurrency 只限制同时在途的请求数
+    """
+    total = len(items)
+    pending = cache.apply(items) if cache else list(items)
+    if cache:
+        logger.info(f"评分缓存命中 {cache.hits} 条，需评分 {len(pending)} 条")
 
-    logger.info(f"LLM 评分：{total} 条，{concurrency} 线程并行")
-    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
-        futures = [pool.submit(_worker, item) for item in items]
-        for fut in as_completed(futures):
-            fut.result()
+    counters = {"done": total - len(pending), "success": total - len(pending), "fail": 0, "lock": threading.Lock()}
+    size = max(1, judge_batch_size)
+    groups = [pending[i:i + size] for i in range(0, len(pending), size)]
+
+    def _worker(group: List[EvalItem]) -> List[EvalItem]:
+        scores = evaluate_group(group)
+        for item, score in zip(group, scores):
+            item.score = score
+
+        with counters["lock"]:
+            for item in group:
+                counters["done"] += 1
+                if item.score.overall_score > 0:
+                    counters["success"] += 1
+                else:
+                    counters["fail"] += 1
+                logger.info(
+                    f"  [{counters['done']}/{total}] id={item.id} | 综合={item.score.overall_score:.1f} "
+                    f"简洁={item.score.conciseness:.0f} 自然={item.score.naturalness:.0f} "
+                    f"准确={item.score.accuracy:.0f} "
+                    f"| 成功={counters['success']} 失败={counters['fail']}"
+                )
+        return group
+
+    if groups:
+        logger.info(f"LLM 评分：{len(pending)} 条，每请求 {size} 条，{concurrency} 线程并行")
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            futures = [pool.submit(_worker, group) for group in groups]
+            for fut in as_completed(futures):
+                group = fut.result()
+                if cache:
+                    # 每组完成即写缓存，中途中断也不会丢掉已评的分数
+                    try:
+                        cache.store(group)
+                    except Exception as e:
+                        logger.warning(f"写入评分缓存失败: {e}")
 
     logger.info(f"评分完成：{counters['success']} 成功 / {counters['fail']} 失败 / {total} 总计")
     return items
@@ -749,6 +1039,10 @@ def main():
     parser.add_argument("--run-id", type=str, default=None, help="分析指定 run_id（默认最近一次）")
     parser.add_argument("--list-runs", action="store_true", help="列出可用的 eval runs")
     parser.add_argument("--concurrency", "-j", type=int, default=10, help="在线评分并发线程数 (默认 10)")
+    parser.add_argument("--judge-batch", type=int, default=1, help="每个评分请求包含的条数 (默认 1，建议 ≤8)")
+    parser.add_argument("--rps", type=float, default=None, help="评分请求数上限/秒 (默认 SCRIPT_LLM_RPS，0 不限)")
+    parser.add_argument("--tpm", type=float, default=None, help="评分 token 上限/分钟 (默认 SCRIPT_LLM_TPM，0 不限)")
+    parser.add_argument("--no-cache", action="store_true", help="不读取评分缓存，全部重新评分")
     parser.add_argument("--no-llm-eval", action="store_true", help="跳过 LLM 评分，仅做统计分析")
     parser.add_argument("--output", type=str, default=None, help="MD 报告输出路径")
     parser.add_argument("--no-terminal", action="store_true", help="不输出终端报告")
@@ -787,13 +1081,14 @@ def main():
     logger.info(f"  run_id      : {run_id}")
     logger.info(f"  llm_mode    : online")
     logger.info(f"  concurrency : {args.concurrency}")
+    logger.info(f"  judge_batch : {args.judge_batch}")
 
     # 读取数据
     items = fetch_eval_items(conn, run_id)
-    conn.close()
 
     if not items:
         print(f"run_id '{run_id}' 没有可分析的成功记录（需要同时有 ai_reply 和 human_reply）。")
+        conn.close()
         return
 
     logger.info(f"  找到 {len(items)} 条有效配对")
@@ -801,11 +1096,36 @@ def main():
     # LLM 评分
     start_time = time.time()
     if not args.no_llm_eval:
-        items = evaluate_batch(items, concurrency=args.concurrency)
+        from ai_kefu.utils.rate_limiter import configure_llm_rate_limit
+
+        rps = settings.script_llm_rps if args.rps is None else args.rps
+        tpm = settings.script_llm_tpm if args.tpm is None else args.tpm
+        limiter = configure_llm_rate_limit(rps, tpm)
+        logger.info(f"  rate_limit  : {f'{rps:g} req/s, {tpm:g} tokens/min' if limiter else '不限'}")
+
+        cache = None
+        if not args.no_cache:
+            try:
+                cache = JudgeCache(conn, judge_model=settings.model_name)
+            except Exception as e:
+                logger.warning(f"评分缓存不可用，全部重新评分: {e}")
+
+        items = evaluate_batch(
+            items,
+            concurrency=args.concurrency,
+            judge_batch_size=args.judge_batch,
+            cache=cache,
+        )
         elapsed = time.time() - start_time
         logger.info(f"  LLM 评分完成，耗时 {elapsed:.1f}s")
+        if cache:
+            logger.info(f"  评分缓存: 命中 {cache.hits} 条，新写入 {cache.stored} 条")
+        if limiter:
+            stats = limiter.stats()
+            logger.info(f"  限速: {stats['acquired']} 次请求，累计等待 {stats['waited_s']}s")
     else:
         logger.info("  跳过 LLM 评分（--no-llm-eval）")
+    conn.close()
 
     # 统计
     stats = compute_stats(items)
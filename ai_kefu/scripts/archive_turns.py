@@ -0,0 +1,45 @@
+"""
+将 agent_turns 中的旧记录移入按月分区的 agent_turns_archive。
+
+运行方式（建议每天一次，例如 cron）：
+    cd ai_kefu && python -m scripts.archive_turns
+    cd ai_kefu && python -m scripts.archive_turns --days 14 --batch-size 1000
+
+归档时会把旧格式（明文 llm_input / llm_output）的记录压缩成 llm_payload。
+/conversations 的轮次查询会自动合并归档表，无需额外操作。
+"""
+import sys
+import argparse
+from pathlib import Path
+
+# 确保项目根目录在 sys.path 中
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from ai_kefu.xianyu_interceptor.conversation_store import ConversationStore
+from ai_kefu.config.settings import settings
+
+
+def main(days: int, batch_size: int):
+    store = ConversationStore(
+        host=settings.mysql_host,
+        port=settings.mysql_port,
+        user=settings.mysql_user,
+        password=settings.mysql_password,
+        database=settings.mysql_database,
+    )
+    try:
+        moved = store.archive_old_turns(older_than_days=days, batch_size=batch_size)
+        print(f"✅ 已归档 {moved} 条超过 {days} 天的 agent_turns 记录")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="归档旧的 agent_turns 记录")
+    parser.add_argument("--days", type=int, default=settings.turn_archive_after_days,
+                        help=f"归档超过多少天的记录（默认 {settings.turn_archive_after_days}）")
+    parser.add_argument("--batch-size", type=int, default=500, help="每个事务移动的行数")
+    args = parser.parse_args()
+    main(args.days, args.batch_size)
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Benchmark - 离线压测 Agent 热路径
+
+LLM / Embedding 调用全部走回放层 (llm/recorder.py, replay 模式)，不访问网络：
+有录制的请求返回录制结果，没有录制的返回确定性的桩回复；每次调用按
+--latency-ms / --jitter-ms 注入合成延迟 (抖动由请求哈希决定，可复现)。
+Redis 默认用进程内 fakeredis，MySQL 不连接 (conversation_store=None)。
+
+测两组指标：
+    - chats: N 个并发会话，每个会话顺序发 M 条买家消息，统计 AgentExecutor.run
+      单条延迟 p50/p95/p99 与吞吐
+    - hot paths: 会话读写、轮次载荷编码、忽略规则匹配、token 计数、日期解析工具
+      的单次耗时 p50/p95
+
+结果写到 ai_kefu/reports/benchmark_<commit>_<时间>.json (带 git commit)，--profile
+额外输出合并了所有工作线程的 cProfile 文件 (用 snakeviz / pstats 查看)。
+
+用法:
+    # 先录制一批真实响应 (可选；不录制也能跑，全部走桩回复)
+    LLM_RECORD_MODE=record python -m ai_kefu.scripts.eval_replay --limit 20
+
+    # 20 个并发会话 x 每会话 5 条消息，每次 LLM 调用 800ms±200ms
+    python -m ai_kefu.scripts.benchmark_agent --chats 20 --messages 5 \\
+        --latency-ms 700 --jitter-ms 200
+
+    # 只测 CPU 开销 (无合成延迟) 并输出 profile
+    python -m ai_kefu.scripts.benchmark_agent --latency-ms 0 --profile bench.prof
+"""
+
+import argparse
+import cProfile
+import json
+import math
+import os
+import pstats
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from ai_kefu.llm.recorder import MODE_REPLAY, configure_llm_recorder
+from ai_kefu.utils.logging import setup_logging
+
+# ------------------------------------------------------------------
+# ai_kefu.utils.logging 导入时会装上 INFO 级 handler；压测时只保留告警，
+# 否则每条消息几十行日志会把耗时算进结果里
+# ------------------------------------------------------------------
+setup_logging(level="WARNING")
+
+REPORT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "reports")
+
+# 买家消息样本，按 (会话序号 + 消息序号) 轮转，保证每次运行输入一致
+BUYER_MESSAGES = [
+    "你好，这个还在吗",
+    "我想租3天，20号到23号可以吗",
+    "押金多少？支持免押吗",
+    "发顺丰吗，寄到杭州要几天",
+    "用完怎么还，寄回哪个地址",
+    "好的，那我下单了",
+    "能便宜点吗，租一周多少钱",
+    "镜头有划痕吗，能发几张实拍图",
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩百分位数 (values 为空时返回 0)。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100.0 * len(ordered))
+    return ordered[min(len(ordered), max(1, rank)) - 1]
+
+
+def summarize(latencies_ms: List[float]) -> Dict[str, Any]:
+    return {
+        "count": len(latencies_ms),
+        "p50_ms": round(percentile(latencies_ms, 50), 3),
+        "p95_ms": round(percentile(latencies_ms, 95), 3),
+        "p99_ms": round(percentile(latencies_ms, 99), 3),
+        "max_ms": round(max(latencies_ms), 3) if latencies_ms else 0.0,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def build_session_store(redis_url: Optional[str]):
+    """--redis-url 指定时连真实 Redis，否则用进程内 fakeredis。"""
+    from ai_kefu.storage.session_store import SessionStore
+
+    if redis_url:
+        return SessionStore(redis_url=redis_url, ttl=600)
+    import fakeredis
+
+    store = SessionStore.__new__(SessionStore)
+    store.redis_url = "fakeredis://"
+    store.ttl = 600
+    store.client = fakeredis.FakeRedis(decode_responses=True)
+    return store
+
+
+class Profiler:
+    """每个工作线程一个 cProfile.Profile，结束后合并。"""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def run(self, fn: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return fn()
+        profile = getattr(self._local, "profile", None)
+        if profile is None:
+            profile = cProfile.Profile()
+            self._local.profile = profile
+            with self._lock:
+                self._profiles.append(profile)
+        return profile.runcall(fn)
+
+    def dump(self, path: str) -> None:
+        if not self._profiles:
+            return
+        stats = pstats.Stats(self._profiles[0])
+        for profile in self._profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+        stats.sort_stats("cumulative").print_stats(15)
+
+
+# ============================================================
+# 并发会话
+# ============================================================
+
+def bench_chats(session_store, chats: int, messages: int, profiler: Profiler) -> Dict[str, Any]:
+    """N 个会话并发，每个会话内部顺序发消息 (与真实买家一致)。"""
+    from ai_kefu.agent.executor import AgentExecutor
+
+    local = threading.local()
+    latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    def executor() -> "AgentExecutor":
+        # run() 会临时改写自身工具注册表，每个线程一个实例
+        instance = getattr(local, "executor", None)
+        if instance is None:
+            instance = AgentExecutor(session_store=session_store, conversation_store=None)
+            local.executor = instance
+        return instance
+
+    def run_chat(chat_index: int) -> None:
+        session_id = None
+        context = {"conversation_id": f"bench_chat_{chat_index}", "user_nickname": "bench"}
+        for message_index in range(messages):
+            query = BUYER_MESSAGES[(chat_index + message_index) % len(BUYER_MESSAGES)]
+            started = time.perf_counter()
+            result = profiler.run(lambda: executor().run(
+                query=query, session_id=session_id,
+                user_id=f"bench_user_{chat_index}", context=context,
+            ))
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed_ms)
+                if result.get("error"):
+                    errors.append(str(result["error"])[:200])
+            session_id = result.get("session_id")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=chats, thread_name_prefix="bench") as pool:
+        list(pool.map(run_chat, range(chats)))
+    wall_s = time.perf_counter() - started
+
+    return {
+        **summarize(latencies),
+        "chats": chats,
+        "messages_per_chat": messages,
+        "wall_s": round(wall_s, 3),
+        "throughput_msg_s": round(len(latencies) / wall_s, 2) if wall_s else 0.0,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+    }
+
+
+# ============================================================
+# 热路径微基准
+# ============================================================
+
+def time_calls(fn: Callable[[], Any], iterations: int, profiler: Profiler) -> Dict[str, Any]:
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        profiler.run(fn)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return summarize(latencies)
+
+
+def bench_hot_paths(session_store, iterations: int, profiler: Profiler) -> Dict[str, Any]:
+    from ai_kefu.models.session import Message, Session
+    from ai_kefu.llm.tokenizer import count_messages_tokens
+    from ai_kefu.storage.pattern_matcher import MATCH_CONTAINS, MATCH_EXACT, MATCH_REGEX, IgnoreMatcher, IgnoreRule
+    from ai_kefu.tools.parse_date import parse_date
+    from ai_kefu.xianyu_interceptor.turn_payload import encode_turn_payload
+
+    # 一个聊了 40 条消息的会话
+    session = Session(session_id="bench_hot_session", user_id="bench")
+    history = []
+    for i in range(40):
+        role = "user" if i % 2 == 0 else "assistant"
+        history.append({"role": role, "content": BUYER_MESSAGES[i % len(BUYER_MESSAGES)] * 3})
+    session.messages = [Message(**message) for message in history]
+    session_dict_messages = [{"role": "system", "content": "你是闲鱼租赁客服。" * 300}] + history
+    session_store.set(session)
+
+    # 300 条忽略规则，三种匹配方式混合
+    rules = []
+    for i in range(300):
+        match_type = (MATCH_EXACT, MATCH_CONTAINS, MATCH_REGEX)[i % 3]
+        pattern = f"规则{i}" if match_type != MATCH_REGEX else rf"^订单{i}\d+号$"
+        rules.append(IgnoreRule(id=i, pattern=pattern, match_type=match_type))
+    matcher = IgnoreMatcher(rules)
+    sample_text = "你好，我想问一下这个相机明天能发货吗，押金可以免吗" * 2
+
+    return {
+        "session_get": time_calls(lambda: session_store.get(session.session_id), iterations, profiler),
+        "session_set": time_calls(lambda: session_store.set(session), iterations, profiler),
+        "encode_turn_payload": time_calls(
+            lambda: encode_turn_payload(session_dict_messages, {"content": "好的"}), iterations, profiler
+        ),
+        "ignore_match": time_calls(lambda: matcher.match(sample_text), iterations, profiler),
+        "count_messages_tokens": time_calls(
+            lambda: count_messages_tokens(session_dict_messages), iterations, profiler
+        ),
+        "tool_parse_date": time_calls(lambda: parse_date("下周三到周五"), iterations, profiler),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线压测 Agent 热路径 (LLM 走回放层)")
+    parser.add_argument("--chats", type=int, default=10, help="并发会话数 (默认 10)")
+    parser.add_argument("--messages", type=int, default=4, help="每个会话的消息数 (默认 4)")
+    parser.add_argument("--iterations", type=int, default=500, help="热路径微基准每项迭代次数 (默认 500)")
+    parser.add_argument("--latency-ms", type=float, default=500.0, help="每次 LLM 调用的合成延迟 (默认 500)")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="额外随机延迟上限，按请求哈希固定 (默认 0)")
+    parser.add_argument("--recorded-latency", action="store_true", help="有录制时按录制时的真实耗时回放")
+    parser.add_argument("--recordings", type=str, default=None, help="录制目录 (默认 settings.llm_record_dir)")
+    parser.add_argument("--redis-url", type=str, default=None, help="使用真实 Redis (默认进程内 fakeredis)")
+    parser.add_argument("--skip-chats", action="store_true", help="只跑热路径微基准")
+    parser.add_argument("--profile", type=str, default=None, help="输出合并后的 cProfile 文件")
+    parser.add_argument("--output", type=str, default=None, help="结果 JSON 路径 (默认 ai_kefu/reports/benchmark_<commit>_<时间>.json)")
+    args = parser.parse_args()
+
+    recorder = configure_llm_recorder(
+        MODE_REPLAY,
+        args.recordings,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        recorded_latency=args.recorded_latency,
+        on_miss="stub",
+    )
+    session_store = build_session_store(args.redis_url)
+    profiler = Profiler(bool(args.profile))
+    commit = git_commit()
+
+    report: Dict[str, Any] = {
+        "commit": commit,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "profile")},
+    }
+
+    print(f"🏁 benchmark @ {commit}: chats={args.chats} x {args.messages}, "
+          f"latency={args.latency_ms}ms (+{args.jitter_ms}ms jitter)")
+
+    report["hot_paths"] = bench_hot_paths(session_store, args.iterations, profiler)
+    for name, stats in report["hot_paths"].items():
+        print(f"  {name:<24} p50={stats['p50_ms']:.3f}ms  p95={stats['p95_ms']:.3f}ms")
+
+    if not args.skip_chats:
+        report["chats"] = bench_chats(session_store, args.chats, args.messages, profiler)
+        chats = report["chats"]
+        print(f"  {'agent_run':<24} p50={chats['p50_ms']:.1f}ms  p95={chats['p95_ms']:.1f}ms  "
+              f"p99={chats['p99_ms']:.1f}ms  {chats['throughput_msg_s']} msg/s  errors={chats['errors']}")
+
+    report["recorder"] = recorder.stats()
+    print(f"  回放: 命中 {recorder.hits} / 桩回复 {recorder.misses}")
+
+    output = args.output or os.path.join(
+        REPORT_DIR, f"benchmark_{commit}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"📄 结果已写入 {output}")
+
+    if args.profile:
+        profiler.dump(args.profile)
+        print(f"🔬 profile 已写入 {args.profile}")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,11 +20,19 @@ Eval Analyze - 评估结果分析工具
 
     # 导出样例 (markdown)
     python -m ai_kefu.scripts.eval_analyze --run-id "xxx" --export-samples samples.md
+
+    # 同时计算 embedding 语义相似度（每条不同的回复调用一次 embedding API）
+    python -m ai_kefu.scripts.eval_analyze --run-id "xxx" --embedding
+
+相似度按 run_id 缓存在 reports/eval_cache/<run_id>.json，重复分析同一个 run 不再重算。
 """
 
 import argparse
+import hashlib
 import json
+import os
 import sys
+import time
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
@@ -32,6 +40,8 @@ import pymysql
 from pymysql.cursors import DictCursor
 from loguru import logger
 
+from ai_kefu.utils.similarity import score_pairs
+
 logger.remove()
 logger.add(sys.stderr, level="INFO", format="{time:HH:mm:ss} | {level:<7} | {message}")
 
@@ -108,60 +118,107 @@ def get_latest_run_id(conn: pymysql.Connection) -> Optional[str]:
 
 
 # ------------------------------------------------------------------
-# 文本相似度 (简单 Jaccard)
+# 文本相似度 (bigram Jaccard，utils/similarity.py 批量向量化计算)
 # ------------------------------------------------------------------
 
-def jaccard_similarity(text_a: str, text_b: str) -> float:
-    """基于字符 bigram 的 Jaccard 相似度。"""
-    if not text_a or not text_b:
-        return 0.0
+# 每个 run_id 的打分缓存: {row id: {"sig": ..., "similarity": ..., ...}}
+# sig 是 AI / 人类回复的摘要，回复变了（重跑 eval_replay 覆盖）就重新打分
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "reports", "eval_cache")
+
 
-    def bigrams(text: str) -> set:
-        text = text.strip()
-        return {text[i:i+2] for i in range(len(text) - 1)} if len(text) >= 2 else {text}
+def _cache_path(run_id: str) -> str:
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in run_id)
+    return os.path.join(CACHE_DIR, f"{safe}.json")
 
-    set_a = bigrams(text_a)
-    set_b = bigrams(text_b)
 
-    intersection = len(set_a & set_b)
-    union = len(set_a | set_b)
-    return intersection / union if union > 0 else 0.0
+def load_score_cache(run_id: str) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(_cache_path(run_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
 
-def length_ratio(text_a: str, text_b: str) -> float:
-    """长度比 (短 / 长)。"""
-    if not text_a or not text_b:
-        return 0.0
-    la, lb = len(text_a.strip()), len(text_b.strip())
-    if max(la, lb) == 0:
-        return 1.0
-    return min(la, lb) / max(la, lb)
+def save_score_cache(run_id: str, cache: Dict[str, Dict[str, Any]]):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = _cache_path(run_id) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp, _cache_path(run_id))
+
+
+def _reply_sig(r: Dict) -> str:
+    return hashlib.sha1(f"{r['ai_reply']}\0{r['human_reply']}".encode("utf-8")).hexdigest()[:16]
+
+
+def score_results(results: List[Dict], run_id: Optional[str] = None, with_embeddings: bool = False) -> int:
+    """
+    给有 AI / 人类回复的成功行打分，写入 r["_similarity"] / r["_length_ratio"]
+    (以及 --embedding 时的 r["_embedding_similarity"])。
+
+    未命中缓存的行一次性批量计算；给了 run_id 时读写该 run 的缓存。
+    embedding 调用失败的行 r["_embedding_similarity"] 为 None，不写缓存，
+    下次运行重新计算。返回本次新计算的行数。
+    """
+    rows = [r for r in results if r["status"] == "success" and r.get("ai_reply") and r.get("human_reply")]
+    cache = load_score_cache(run_id) if run_id else {}
+    metrics = ("similarity", "length_ratio") + (("embedding_similarity",) if with_embeddings else ())
+
+    pending = []
+    for r in rows:
+        hit = cache.get(str(r["id"]))
+        if hit and hit.get("sig") == _reply_sig(r) and all(m in hit for m in metrics):
+            for m in metrics:
+                r[f"_{m}"] = hit[m]
+        else:
+            pending.append(r)
+
+    if pending:
+        started = time.perf_counter()
+        scores = score_pairs(
+            [r["ai_reply"] for r in pending],
+            [r["human_reply"] for r in pending],
+            with_embeddings=with_embeddings,
+        )
+        for i, r in enumerate(pending):
+            entry = cache.setdefault(str(r["id"]), {})
+            if entry.get("sig") != _reply_sig(r):
+                entry.clear()
+                entry["sig"] = _reply_sig(r)
+            for m, values in scores.items():
+                r[f"_{m}"] = values[i]
+                if values[i] is None:
+                    entry.pop(m, None)  # embedding 失败，不缓存
+                else:
+                    entry[m] = values[i]
+        logger.info(f"相似度打分: 新计算 {len(pending)} 条, 缓存命中 {len(rows) - len(pending)} 条, "
+                    f"耗时 {time.perf_counter() - started:.2f}s")
+        if run_id:
+            save_score_cache(run_id, cache)
+    return len(pending)
 
 
 # ------------------------------------------------------------------
 # 分析 & 报告
 # ------------------------------------------------------------------
 
-def analyze_run(results: List[Dict]) -> Dict[str, Any]:
+def _avg(values: List[float]) -> float:
+    return sum(values) / len(values) if values else 0
+
+
+def analyze_run(results: List[Dict], run_id: Optional[str] = None, with_embeddings: bool = False) -> Dict[str, Any]:
     """分析一次评估的结果。"""
     total = len(results)
     success = [r for r in results if r["status"] == "success"]
     errors = [r for r in results if r["status"] == "error"]
 
     # 相似度
-    similarities = []
-    length_ratios = []
-    for r in success:
-        if r.get("ai_reply") and r.get("human_reply"):
-            sim = jaccard_similarity(r["ai_reply"], r["human_reply"])
-            lr = length_ratio(r["ai_reply"], r["human_reply"])
-            r["_similarity"] = sim
-            r["_length_ratio"] = lr
-            similarities.append(sim)
-            length_ratios.append(lr)
-
-    avg_sim = sum(similarities) / len(similarities) if similarities else 0
-    avg_lr = sum(length_ratios) / len(length_ratios) if length_ratios else 0
+    score_results(results, run_id=run_id, with_embeddings=with_embeddings)
+    scored = [r for r in success if "_similarity" in r]
+    avg_sim = _avg([r["_similarity"] for r in scored])
+    avg_lr = _avg([r["_length_ratio"] for r in scored])
+    embedded = [r["_embedding_similarity"] for r in scored if r.get("_embedding_similarity") is not None]
+    avg_emb = _avg(embedded) if with_embeddings and embedded else None
 
     # 耗时
     durations = [r["ai_duration_ms"] for r in success if r.get("ai_duration_ms")]
@@ -177,17 +234,10 @@ def analyze_run(results: List[Dict]) -> Dict[str, Any]:
                 tool_usage[name] = tool_usage.get(name, 0) + 1
 
     # 找出最不相似的 (potential issues)
-    low_sim = sorted(
-        [r for r in success if "_similarity" in r],
-        key=lambda x: x["_similarity"]
-    )[:10]
+    low_sim = sorted(scored, key=lambda x: x["_similarity"])[:10]
 
     # 找出最相似的 (best matches)
-    high_sim = sorted(
-        [r for r in success if "_similarity" in r],
-        key=lambda x: x["_similarity"],
-        reverse=True
-    )[:10]
+    high_sim = sorted(scored, key=lambda x: x["_similarity"], reverse=True)[:10]
 
     return {
         "total": total,
@@ -195,6 +245,7 @@ def analyze_run(results: List[Dict]) -> Dict[str, Any]:
         "error_count": len(errors),
         "avg_similarity": round(avg_sim, 4),
         "avg_length_ratio": round(avg_lr, 4),
+        "avg_embedding_similarity": round(avg_emb, 4) if avg_emb is not None else None,
         "avg_duration_ms": round(avg_dur, 1),
         "tool_usage": tool_usage,
         "low_similarity_samples": low_sim,
@@ -217,6 +268,8 @@ def print_report(run_id: str, tag: str, analysis: Dict[str, Any]):
     print(f"  失败      : {analysis['error_count']}")
     print(f"  平均相似度: {analysis['avg_similarity']:.2%}")
     print(f"  平均长度比: {analysis['avg_length_ratio']:.2%}")
+    if analysis.get("avg_embedding_similarity") is not None:
+        print(f"  语义相似度: {analysis['avg_embedding_similarity']:.2%}")
     print(f"  平均耗时  : {analysis['avg_duration_ms']:.0f}ms")
 
     if analysis["tool_usage"]:
@@ -276,6 +329,10 @@ def print_comparison(run_a: str, analysis_a: Dict, run_b: str, analysis_b: Dict)
          f"{analysis_a['avg_duration_ms']:.0f}ms",
          f"{analysis_b['avg_duration_ms']:.0f}ms"),
     ]
+    if analysis_a.get("avg_embedding_similarity") is not None and analysis_b.get("avg_embedding_similarity") is not None:
+        metrics.insert(3, ("语义相似度",
+                           f"{analysis_a['avg_embedding_similarity']:.2%}",
+                           f"{analysis_b['avg_embedding_similarity']:.2%}"))
 
     print(f"\n{'指标':<12} {'A':<20} {'B':<20} {'对比'}")
     print("-" * 60)
@@ -288,6 +345,8 @@ def print_comparison(run_a: str, analysis_a: Dict, run_b: str, analysis_b: Dict)
 def export_samples_md(results: List[Dict], filepath: str):
     """导出样例为 Markdown 格式。"""
     success = [r for r in results if r["status"] == "success" and r.get("ai_reply") and r.get("human_reply")]
+    if any("_similarity" not in r for r in success):
+        score_results(success)
 
     with open(filepath, "w", encoding="utf-8") as f:
         f.write(f"# 评估样例报告\n\n")
@@ -296,8 +355,7 @@ def export_samples_md(results: List[Dict], filepath: str):
         f.write("---\n\n")
 
         for i, r in enumerate(success):
-            sim = jaccard_similarity(r["ai_reply"], r["human_reply"])
-            f.write(f"## 样例 {i+1} (相似度: {sim:.2%})\n\n")
+            f.write(f"## 样例 {i+1} (相似度: {r['_similarity']:.2%})\n\n")
             f.write(f"**chat_id**: `{r['chat_id']}`\n\n")
 
             # 上下文
@@ -361,6 +419,7 @@ def main():
     parser.add_argument("--list-runs", action="store_true", help="列出最近的评估运行")
     parser.add_argument("--export", type=str, default=None, help="导出为 JSON 文件")
     parser.add_argument("--export-samples", type=str, default=None, help="导出样例为 Markdown")
+    parser.add_argument("--embedding", action="store_true", help="额外计算 embedding 语义相似度 (调用 embedding API，结果按 run_id 缓存)")
     args = parser.parse_args()
 
     from ai_kefu.config.settings import settings
@@ -394,8 +453,8 @@ def main():
         if not results_b:
             print(f"run_id '{run_b_id}' 未找到结果。")
             return
-        analysis_a = analyze_run(results_a)
-        analysis_b = analyze_run(results_b)
+        analysis_a = analyze_run(results_a, run_id=run_a_id, with_embeddings=args.embedding)
+        analysis_b = analyze_run(results_b, run_id=run_b_id, with_embeddings=args.embedding)
         print_comparison(run_a_id, analysis_a, run_b_id, analysis_b)
         return
 
@@ -411,7 +470,7 @@ def main():
         return
 
     tag = results[0].get("tag", "")
-    analysis = analyze_run(results)
+    analysis = analyze_run(results, run_id=run_id, with_embeddings=args.embedding)
     print_report(run_id, tag, analysis)
 
     # 导出
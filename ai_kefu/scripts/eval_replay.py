@@ -14,8 +14,11 @@ Eval Replay - 批量回放评估工具
     # 回放最近 50 条满足过滤条件的对话 (串行)
     python -m ai_kefu.scripts.eval_replay
 
-    # 并行回放 (5 线程并发, 推荐值 3-8)
-    python -m ai_kefu.scripts.eval_replay --limit 100 -j 5
+    # 并行回放 (并发上限 8；实际并发按 Qwen 延迟与 429 自适应调整, AIMD)
+    python -m ai_kefu.scripts.eval_replay --limit 100 -j 8
+
+    # 中断后续跑：跳过该 run 已写入的条目 (--retry-errors 同时重跑失败条目)
+    python -m ai_kefu.scripts.eval_replay --resume eval_20260401_120000_ab12cd
 
     # 指定回放数量和标签
     python -m ai_kefu.scripts.eval_replay --limit 100 --tag "qwen-plus-v2-prompt-v3"
@@ -33,9 +36,9 @@ import sys
 import time
 import uuid
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set
 
 import pymysql
 from pymysql.cursors import DictCursor
@@ -47,6 +50,9 @@ from loguru import logger
 logger.remove()
 logger.add(sys.stderr, level="INFO", format="{time:HH:mm:ss} | {level:<7} | {message}")
 
+from ai_kefu.utils.adaptive_concurrency import AdaptiveConcurrency, is_rate_limited
+from ai_kefu.utils.rate_limiter import configure_llm_rate_limit
+
 
 def get_db_connection(settings) -> pymysql.Connection:
     """创建数据库连接。"""
@@ -62,6 +68,23 @@ def get_db_connection(settings) -> pymysql.Connection:
     )
 
 
+# 每个 run 的候选集与参数，用于中断后 --resume 续跑。
+# 进度本身不单独记录：已写入 eval_runs 的 source_conversation_id 即为已完成。
+CREATE_EVAL_CHECKPOINTS_SQL = """
+    CREATE TABLE IF NOT EXISTS eval_run_checkpoints (
+        run_id VARCHAR(255) NOT NULL PRIMARY KEY,
+        tag VARCHAR(255) DEFAULT '',
+        params JSON COMMENT '运行参数 (model, context_limit, ...)',
+        candidate_ids MEDIUMTEXT NOT NULL COMMENT '候选 conversations.id 列表 (JSON array)',
+        total_items INT NOT NULL DEFAULT 0,
+        status ENUM('running', 'finished') NOT NULL DEFAULT 'running',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    COMMENT='eval_replay 断点续跑信息'
+"""
+
+
 def ensure_eval_tables(conn: pymysql.Connection):
     """确保评估相关表存在。"""
 
@@ -105,10 +128,82 @@ def ensure_eval_tables(conn: pymysql.Connection):
         COMMENT='Prompt / 模型 A/B 测试回放评估结果'
     """
 
+    from ai_kefu.storage.eval_store import (
+        CREATE_EVAL_RUN_SUMMARIES_SQL,
+        REFRESH_EVAL_RUN_SUMMARIES_SQL,
+        ensure_eval_keyset_index,
+    )
+
     with conn.cursor() as cursor:
         cursor.execute(create_eval_runs_sql)
+        cursor.execute(CREATE_EVAL_CHECKPOINTS_SQL)
+        cursor.execute("SHOW TABLES LIKE 'eval_run_summaries'")
+        summaries_existed = cursor.fetchone() is not None
+        cursor.execute(CREATE_EVAL_RUN_SUMMARIES_SQL)
+        if not summaries_existed:
+            # 首次创建汇总表时从历史 eval_runs 回填
+            cursor.execute(REFRESH_EVAL_RUN_SUMMARIES_SQL.format(where=""))
+        ensure_eval_keyset_index(cursor)
+        conn.commit()
+    logger.info("✅ eval_runs / eval_run_summaries / eval_run_checkpoints 表已就绪")
+
+
+def save_checkpoint(
+    conn: pymysql.Connection,
+    run_id: str,
+    tag: str,
+    params: Dict[str, Any],
+    candidate_ids: List[int],
+):
+    """记录本次 run 的候选集，之后即可按 run_id 续跑。"""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO eval_run_checkpoints (run_id, tag, params, candidate_ids, total_items)
+            VALUES (%s, %s, %s, %s, %s)
+            """,
+            (run_id, tag, json.dumps(params, ensure_ascii=False), json.dumps(candidate_ids), len(candidate_ids)),
+        )
+        conn.commit()
+
+
+def load_checkpoint(conn: pymysql.Connection, run_id: str) -> Optional[Dict[str, Any]]:
+    """读取 run 的断点信息 (tag / params / candidate_ids)。"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT * FROM eval_run_checkpoints WHERE run_id = %s", (run_id,))
+        row = cursor.fetchone()
+    if not row:
+        return None
+    params = row.get("params")
+    return {
+        "tag": row.get("tag") or "",
+        "params": json.loads(params) if isinstance(params, str) else (params or {}),
+        "candidate_ids": json.loads(row["candidate_ids"]),
+        "status": row.get("status"),
+    }
+
+
+def fetch_done_ids(conn: pymysql.Connection, run_id: str, retry_errors: bool = False) -> Set[int]:
+    """
+    该 run 已写入结果的 source_conversation_id。
+
+    retry_errors=True 时先删除失败条目，让它们重新回放
+    (汇总表在运行结束时由 refresh_eval_run_summary 校准)。
+    """
+    with conn.cursor() as cursor:
+        if retry_errors:
+            cursor.execute("DELETE FROM eval_runs WHERE run_id = %s AND status = 'error'", (run_id,))
+            if cursor.rowcount:
+                logger.info(f"已删除 {cursor.rowcount} 条失败结果，将重新回放")
+            conn.commit()
+        cursor.execute("SELECT source_conversation_id FROM eval_runs WHERE run_id = %s", (run_id,))
+        return {row["source_conversation_id"] for row in cursor.fetchall()}
+
+
+def finish_checkpoint(conn: pymysql.Connection, run_id: str):
+    with conn.cursor() as cursor:
+        cursor.execute("UPDATE eval_run_checkpoints SET status = 'finished' WHERE run_id = %s", (run_id,))
         conn.commit()
-    logger.info("✅ eval_runs 表已就绪")
 
 
 def fetch_eval_candidates(
@@ -116,6 +211,7 @@ def fetch_eval_candidates(
     limit: int = 50,
     chat_id: Optional[str] = None,
     offset: int = 0,
+    source_ids: Optional[List[int]] = None,
 ) -> List[Dict[str, Any]]:
     """
     从 conversations 表中提取待评估的 (买家消息, 人类客服回复) 配对。
@@ -125,6 +221,7 @@ def fetch_eval_candidates(
     - human_reply: 同 chat_id 中紧跟着的人类客服回复
       定义: (user_id='2200687521877' OR message_type='seller') AND NOT LIKE '【调试】%'
       同时排除 Agent API Error / Unexpected Error
+    - source_ids: 只取指定的 conversations.id（续跑时按断点中的候选集重新取）
     """
     # 核心过滤: 只取买家消息（排除卖家本人发的消息）
     filter_condition = "(c.message_type = 'user' AND c.user_id != '2200687521877')"
@@ -136,6 +233,13 @@ def fetch_eval_candidates(
         conditions.append("c.chat_id = %s")
         params.append(chat_id)
 
+    if source_ids is not None:
+        if not source_ids:
+            return []
+        conditions.append(f"c.id IN ({', '.join(['%s'] * len(source_ids))})")
+        params.extend(source_ids)
+        limit, offset = len(source_ids), 0
+
     where = " AND ".join(conditions)
 
     # 取消息，并 join 同 chat_id 中紧跟着的 seller 回复
@@ -209,22 +313,90 @@ def fetch_context_messages(
     return context
 
 
+class ReplayResources:
+    """
+    回放共享资源，整个 run 只创建一次。
+
+    - SessionStore (Redis 连接池) 与 ConversationStore (线程本地连接) 全局共享
+    - AgentExecutor 每个工作线程一个：run() 会临时改写自身的工具注册表
+      (预绑定 chat_id 等)，不能被多个线程同时使用
+    - 读上下文用的 MySQL 连接每个工作线程一个，跨条目复用
+    """
+
+    def __init__(self, settings):
+        from ai_kefu.storage.session_store import SessionStore
+        from ai_kefu.xianyu_interceptor.conversation_store import ConversationStore
+
+        self.settings = settings
+        self.session_store = SessionStore(
+            redis_url=settings.redis_url,
+            ttl=300  # 短 TTL，评估完就过期
+        )
+        self.conversation_store = ConversationStore(
+            host=settings.mysql_host,
+            port=settings.mysql_port,
+            user=settings.mysql_user,
+            password=settings.mysql_password,
+            database=settings.mysql_database,
+        )
+        self._local = threading.local()
+        self._connections: List[pymysql.Connection] = []
+        self._lock = threading.Lock()
+
+    def executor(self):
+        """当前线程的 AgentExecutor。"""
+        executor = getattr(self._local, "executor", None)
+        if executor is None:
+            from ai_kefu.agent.executor import AgentExecutor
+            executor = AgentExecutor(
+                session_store=self.session_store,
+                conversation_store=self.conversation_store
+            )
+            self._local.executor = executor
+        return executor
+
+    def db(self) -> pymysql.Connection:
+        """当前线程的 MySQL 连接（断线自动重连）。"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = get_db_connection(self.settings)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        else:
+            conn.ping(reconnect=True)
+        return conn
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        try:
+            self.conversation_store.close()
+        except Exception:
+            pass
+
+
 def replay_single(
     candidate: Dict[str, Any],
     context_messages: List[Dict[str, str]],
     settings,
-    model_override: Optional[str] = None
+    model_override: Optional[str] = None,
+    resources: Optional[ReplayResources] = None
 ) -> Dict[str, Any]:
     """
     对单条用户消息执行 Agent 回放。
 
+    Args:
+        resources: 共享的 store / executor；不传则为本条单独创建（单条调试用）
+
     Returns:
         包含 ai_reply, ai_session_id, ai_turn_count, ai_tool_calls, ai_duration_ms, status, error_message 的 dict
     """
-    from ai_kefu.storage.session_store import SessionStore
-    from ai_kefu.xianyu_interceptor.conversation_store import ConversationStore
-    from ai_kefu.agent.executor import AgentExecutor
-
     result = {
         "ai_reply": None,
         "ai_session_id": None,
@@ -239,23 +411,13 @@ def replay_single(
     # 使用指定模型或默认模型（不修改共享的 settings 对象，保证线程安全）
     effective_model = model_override or settings.model_name
 
+    owned = resources is None
     try:
-        session_store = SessionStore(
-            redis_url=settings.redis_url,
-            ttl=300  # 短 TTL，评估完就过期
-        )
-        conversation_store = ConversationStore(
-            host=settings.mysql_host,
-            port=settings.mysql_port,
-            user=settings.mysql_user,
-            password=settings.mysql_password,
-            database=settings.mysql_database,
-        )
-
-        executor = AgentExecutor(
-            session_store=session_store,
-            conversation_store=conversation_store
-        )
+        if owned:
+            resources = ReplayResources(settings)
+        session_store = resources.session_store
+        conversation_store = resources.conversation_store
+        executor = resources.executor()
 
         # 构建上下文 — 把历史对话摘要注入到 context
         context_summary = ""
@@ -348,35 +510,39 @@ def replay_single(
         result["status"] = "error"
         result["error_message"] = str(e)
         logger.error(f"回放失败: {e}", exc_info=True)
+    finally:
+        if owned and resources is not None:
+            resources.close()
 
     return result
 
 
-def save_eval_result(
-    conn: pymysql.Connection,
+_INSERT_EVAL_RUN_SQL = """
+    INSERT INTO eval_runs (
+        run_id, tag,
+        source_conversation_id, chat_id, user_message, human_reply,
+        context_messages,
+        ai_reply, ai_session_id, ai_turn_count, ai_tool_calls, ai_duration_ms, ai_model,
+        status, error_message
+    ) VALUES (
+        %s, %s,
+        %s, %s, %s, %s,
+        %s,
+        %s, %s, %s, %s, %s, %s,
+        %s, %s
+    )
+"""
+
+
+def eval_run_values(
     run_id: str,
     tag: str,
     candidate: Dict[str, Any],
     context_messages: List[Dict[str, str]],
     replay_result: Dict[str, Any]
-):
-    """将评估结果写入 eval_runs 表。"""
-    sql = """
-        INSERT INTO eval_runs (
-            run_id, tag,
-            source_conversation_id, chat_id, user_message, human_reply,
-            context_messages,
-            ai_reply, ai_session_id, ai_turn_count, ai_tool_calls, ai_duration_ms, ai_model,
-            status, error_message
-        ) VALUES (
-            %s, %s,
-            %s, %s, %s, %s,
-            %s,
-            %s, %s, %s, %s, %s, %s,
-            %s, %s
-        )
-    """
-    values = (
+) -> tuple:
+    """一条 eval_runs 记录的插入参数。"""
+    return (
         run_id,
         tag,
         candidate["source_conversation_id"],
@@ -394,8 +560,121 @@ def save_eval_result(
         replay_result.get("error_message"),
     )
 
+
+def save_eval_result(
+    conn: pymysql.Connection,
+    run_id: str,
+    tag: str,
+    candidate: Dict[str, Any],
+    context_messages: List[Dict[str, str]],
+    replay_result: Dict[str, Any]
+):
+    """将单条评估结果写入 eval_runs 表，并在同一事务中累加 eval_run_summaries。"""
+    from ai_kefu.storage.eval_store import UPSERT_EVAL_RUN_SUMMARY_SQL, eval_summary_values
+
     with conn.cursor() as cursor:
-        cursor.execute(sql, values)
+        cursor.execute(_INSERT_EVAL_RUN_SQL, eval_run_values(run_id, tag, candidate, context_messages, replay_result))
+        cursor.execute(UPSERT_EVAL_RUN_SUMMARY_SQL, eval_summary_values(run_id, tag, replay_result))
+        conn.commit()
+
+
+class EvalResultWriter:
+    """
+    批量写入回放结果。
+
+    结果先进缓冲区，满 batch_size 条或距上次写入超过 flush_interval 秒时，
+    用一条多行 INSERT 写入 eval_runs，并在同一事务中累加 eval_run_summaries。
+    写入失败的批次留在缓冲区，下次重试；进程崩溃最多丢失一个批次，
+    续跑时这些条目会被重新回放。
+    """
+
+    def __init__(
+        self,
+        conn_factory,
+        run_id: str,
+        tag: str,
+        batch_size: int = 20,
+        flush_interval: float = 10.0,
+    ):
+        self._conn_factory = conn_factory
+        self._conn: Optional[pymysql.Connection] = None
+        self.run_id = run_id
+        self.tag = tag
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._rows: List[tuple] = []
+        self._summaries: List[tuple] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+
+    def add(
+        self,
+        candidate: Dict[str, Any],
+        context_messages: List[Dict[str, str]],
+        replay_result: Dict[str, Any]
+    ):
+        from ai_kefu.storage.eval_store import eval_summary_values
+
+        with self._lock:
+            self._rows.append(eval_run_values(self.run_id, self.tag, candidate, context_messages, replay_result))
+            self._summaries.append(eval_summary_values(self.run_id, self.tag, replay_result))
+            if (
+                len(self._rows) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            ):
+                self._flush_locked()
+
+    def flush(self) -> bool:
+        """写出缓冲区中的全部结果，返回是否成功。"""
+        with self._lock:
+            return self._flush_locked()
+
+    def _flush_locked(self) -> bool:
+        from ai_kefu.storage.eval_store import UPSERT_EVAL_RUN_SUMMARY_SQL
+
+        self._last_flush = time.monotonic()
+        if not self._rows:
+            return True
+        try:
+            if self._conn is None:
+                self._conn = self._conn_factory()
+            with self._conn.cursor() as cursor:
+                cursor.executemany(_INSERT_EVAL_RUN_SQL, self._rows)
+                cursor.executemany(UPSERT_EVAL_RUN_SUMMARY_SQL, self._summaries)
+            self._conn.commit()
+        except Exception as e:
+            logger.error(f"批量写入 {len(self._rows)} 条结果失败，下次重试: {e}")
+            self._reset_connection()
+            return False
+        self.written += len(self._rows)
+        self.batches += 1
+        self._rows, self._summaries = [], []
+        return True
+
+    def _reset_connection(self):
+        if self._conn is not None:
+            try:
+                self._conn.rollback()
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def close(self):
+        with self._lock:
+            if not self._flush_locked():
+                logger.error(f"⚠️ {len(self._rows)} 条结果未能写入，续跑 (--resume) 时会重新回放")
+            self._reset_connection()
+
+
+def refresh_eval_run_summary(conn: pymysql.Connection, run_id: str):
+    """运行结束后按 eval_runs 重新校准本次 run 的汇总（如中途有写入失败）。"""
+    from ai_kefu.storage.eval_store import REFRESH_EVAL_RUN_SUMMARIES_SQL
+
+    with conn.cursor() as cursor:
+        cursor.execute(REFRESH_EVAL_RUN_SUMMARIES_SQL.format(where="WHERE run_id = %s"), (run_id,))
         conn.commit()
 
 
@@ -403,10 +682,9 @@ def _replay_worker(
     index: int,
     total: int,
     candidate: Dict[str, Any],
-    conn_factory,
-    settings,
-    run_id: str,
-    tag: str,
+    resources: ReplayResources,
+    writer: EvalResultWriter,
+    limiter: AdaptiveConcurrency,
     model_override: Optional[str],
     context_limit: int,
     counters: Dict[str, Any],
@@ -414,20 +692,19 @@ def _replay_worker(
     """
     单条回放的 worker 函数，在线程池中执行。
 
-    每个 worker 使用独立的 DB 连接，保证线程安全。
+    调用方已 limiter.acquire()；这里按本条的耗时和是否被限流 release，
+    由 AIMD 调整后续并发。
     """
-    thread_conn = None
+    latency_ms = None
+    throttled = False
     try:
         logger.info(f"[{index}/{total}] 开始回放 chat_id={candidate['chat_id']}")
         logger.info(f"  用户消息: {candidate['user_message'][:80]}")
         logger.info(f"  人类回复: {(candidate.get('human_reply') or 'N/A')[:80]}")
 
-        # 每个线程独立的 DB 连接
-        thread_conn = conn_factory()
-
-        # 获取上下文
+        # 获取上下文（复用本线程的连接）
         context_msgs = fetch_context_messages(
-            thread_conn,
+            resources.db(),
             chat_id=candidate["chat_id"],
             before_time=candidate["user_msg_time"],
             context_limit=context_limit
@@ -437,15 +714,17 @@ def _replay_worker(
         replay_result = replay_single(
             candidate=candidate,
             context_messages=context_msgs,
-            settings=settings,
-            model_override=model_override
+            settings=resources.settings,
+            model_override=model_override,
+            resources=resources
         )
+        latency_ms = replay_result.get("ai_duration_ms")
+        throttled = is_rate_limited(replay_result.get("error_message"))
 
         logger.info(f"[{index}/{total}] AI 回复: {(replay_result.get('ai_reply') or 'N/A')[:80]}")
-        logger.info(f"[{index}/{total}] 状态: {replay_result['status']} | 耗时: {replay_result.get('ai_duration_ms', 0)}ms")
+        logger.info(f"[{index}/{total}] 状态: {replay_result['status']} | 耗时: {latency_ms or 0}ms")
 
-        # 保存结果（每个线程用自己的连接写入）
-        save_eval_result(thread_conn, run_id, tag, candidate, context_msgs, replay_result)
+        writer.add(candidate, context_msgs, replay_result)
 
         # 线程安全的计数
         with counters["lock"]:
@@ -454,7 +733,10 @@ def _replay_worker(
             else:
                 counters["error"] += 1
             done = counters["success"] + counters["error"]
-            logger.info(f"  进度: {done}/{total} (成功={counters['success']}, 失败={counters['error']})")
+            logger.info(
+                f"  进度: {done}/{total} (成功={counters['success']}, 失败={counters['error']}, "
+                f"并发上限={limiter.limit})"
+            )
 
         return replay_result
 
@@ -464,11 +746,7 @@ def _replay_worker(
             counters["error"] += 1
         return {"status": "error", "error_message": str(e)}
     finally:
-        if thread_conn:
-            try:
-                thread_conn.close()
-            except Exception:
-                pass
+        limiter.release(latency_ms, throttled=throttled)
 
 
 def main():
@@ -479,40 +757,76 @@ def main():
     parser.add_argument("--tag", type=str, default="", help="标签 (如 prompt 版本)")
     parser.add_argument("--model", type=str, default=None, help="覆盖模型名 (如 qwen-max)")
     parser.add_argument("--context-limit", type=int, default=20, help="每条消息的上下文条数 (默认 20)")
-    parser.add_argument("--concurrency", "-j", type=int, default=10, help="并行工作线程数 (默认 10, 设为 1 则串行)")
+    parser.add_argument("--concurrency", "-j", type=int, default=10, help="并发上限 (默认 10, 设为 1 则串行)")
+    parser.add_argument("--initial-concurrency", type=int, default=None, help="起始并发 (默认 上限的一半)")
+    parser.add_argument("--latency-target", type=float, default=20.0, help="单条回放耗时超过该秒数即降低并发 (默认 20)")
+    parser.add_argument("--batch-size", type=int, default=20, help="每批写入 eval_runs 的条数 (默认 20)")
+    parser.add_argument("--rps", type=float, default=None, help="LLM 请求数上限/秒 (默认 SCRIPT_LLM_RPS，0 不限)")
+    parser.add_argument("--tpm", type=float, default=None, help="LLM token 上限/分钟 (默认 SCRIPT_LLM_TPM，0 不限)")
+    parser.add_argument("--resume", type=str, default=None, metavar="RUN_ID", help="续跑中断的 run (沿用其候选集与参数)")
+    parser.add_argument("--retry-errors", action="store_true", help="续跑时重新回放失败的条目")
     parser.add_argument("--dry-run", action="store_true", help="只查看候选，不真正回放")
     args = parser.parse_args()
 
     from ai_kefu.config.settings import settings
 
-    run_id = f"eval_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
-    tag = args.tag or f"{args.model or settings.model_name}"
+    conn = get_db_connection(settings)
+    ensure_eval_tables(conn)
+
+    checkpoint = None
+    if args.resume:
+        checkpoint = load_checkpoint(conn, args.resume)
+        if not checkpoint:
+            logger.error(f"找不到 run 的断点信息: {args.resume}")
+            conn.close()
+            return
+        run_id = args.resume
+        tag = checkpoint["tag"]
+        args.model = checkpoint["params"].get("model", args.model)
+        args.context_limit = checkpoint["params"].get("context_limit", args.context_limit)
+    else:
+        run_id = f"eval_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        tag = args.tag or f"{args.model or settings.model_name}"
 
-    logger.info(f"=== Eval Replay 开始 ===")
+    logger.info(f"=== Eval Replay {'续跑' if checkpoint else '开始'} ===")
     logger.info(f"  run_id      : {run_id}")
     logger.info(f"  tag         : {tag}")
     logger.info(f"  model       : {args.model or settings.model_name}")
     logger.info(f"  limit       : {args.limit}")
-    logger.info(f"  concurrency : {args.concurrency}")
+    logger.info(f"  concurrency : ≤{args.concurrency} (AIMD, 目标耗时 {args.latency_target:.0f}s)")
+
+    # 全部 call_qwen / call_qwen_fast 在共享令牌桶中排队
+    rps = settings.script_llm_rps if args.rps is None else args.rps
+    tpm = settings.script_llm_tpm if args.tpm is None else args.tpm
+    rate_limiter = configure_llm_rate_limit(rps, tpm)
+    logger.info(f"  rate_limit  : {f'{rps:g} req/s, {tpm:g} tokens/min' if rate_limiter else '不限'}")
 
     no_mock_availability = bool(getattr(args, "no_mock_availability", False))
     settings.eval_mock_availability = not no_mock_availability
     settings.eval_mock_availability_available_ratio = 0.80
     logger.info(f"  mock_slot   : {'ON(80/20)' if settings.eval_mock_availability else 'OFF'}")
 
-    conn = get_db_connection(settings)
-    ensure_eval_tables(conn)
-
     # 过滤规则说明
     logger.info(f"  过滤规则: 输入=买家消息, human_reply=(user_id=卖家 OR seller) 且非调试非Error")
 
-    # 提取候选（过滤规则已固化在 fetch_eval_candidates 中）
-    candidates = fetch_eval_candidates(
-        conn, limit=args.limit, chat_id=args.chat_id, offset=args.offset
-    )
+    if checkpoint:
+        # 按断点中的候选集重新取数，跳过已写入 eval_runs 的条目
+        done_ids = fetch_done_ids(conn, run_id, retry_errors=args.retry_errors)
+        pending_ids = [i for i in checkpoint["candidate_ids"] if i not in done_ids]
+        logger.info(f"  断点: 共 {len(checkpoint['candidate_ids'])} 条，已完成 {len(done_ids)}，剩余 {len(pending_ids)}")
+        candidates = fetch_eval_candidates(conn, source_ids=pending_ids)
+        order = {cid: i for i, cid in enumerate(pending_ids)}
+        candidates.sort(key=lambda c: order.get(c["source_conversation_id"], 0))
+    else:
+        # 提取候选（过滤规则已固化在 fetch_eval_candidates 中）
+        candidates = fetch_eval_candidates(
+            conn, limit=args.limit, chat_id=args.chat_id, offset=args.offset
+        )
 
     if not candidates:
-        logger.warning("没有找到可评估的对话候选，退出。")
+        logger.warning("没有需要回放的对话候选，退出。")
+        if checkpoint:
+            finish_checkpoint(conn, run_id)
         conn.close()
         return
 
@@ -527,10 +841,16 @@ def main():
         conn.close()
         return
 
-    # 主连接不再需要（每个 worker 创建自己的连接）
+    if not checkpoint:
+        save_checkpoint(
+            conn, run_id, tag,
+            params={"model": args.model, "context_limit": args.context_limit,
+                    "limit": args.limit, "offset": args.offset, "chat_id": args.chat_id},
+            candidate_ids=[c["source_conversation_id"] for c in candidates],
+        )
     conn.close()
 
-    # 连接工厂，供每个 worker 线程创建独立连接
+    # 连接工厂，供结果写入器与收尾使用
     def conn_factory():
         return get_db_connection(settings)
 
@@ -542,57 +862,60 @@ def main():
     }
 
     total = len(candidates)
-    concurrency = max(1, args.concurrency)
+    max_concurrency = max(1, args.concurrency)
+    limiter = AdaptiveConcurrency(
+        initial=args.initial_concurrency or max(1, max_concurrency // 2),
+        max_limit=max_concurrency,
+        latency_target_ms=args.latency_target * 1000,
+    )
+    resources = ReplayResources(settings)
+    writer = EvalResultWriter(conn_factory, run_id, tag, batch_size=args.batch_size)
     start_time = time.time()
+    logger.info(f"共 {total} 条，并发上限 {max_concurrency}，起始并发 {limiter.limit}")
 
-    if concurrency == 1:
-        # 串行模式：向后兼容，不启动线程池
-        logger.info(f"串行模式，共 {total} 条")
-        for i, candidate in enumerate(candidates):
-            _replay_worker(
-                index=i + 1,
-                total=total,
-                candidate=candidate,
-                conn_factory=conn_factory,
-                settings=settings,
-                run_id=run_id,
-                tag=tag,
-                model_override=args.model,
-                context_limit=args.context_limit,
-                counters=counters,
-            )
-    else:
-        # 并行模式
-        logger.info(f"并行模式，{concurrency} 线程，共 {total} 条")
-        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+    try:
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
             futures = []
             for i, candidate in enumerate(candidates):
-                fut = pool.submit(
+                # 按当前并发上限放行：被限流或变慢时自动收缩
+                limiter.acquire()
+                futures.append(pool.submit(
                     _replay_worker,
                     index=i + 1,
                     total=total,
                     candidate=candidate,
-                    conn_factory=conn_factory,
-                    settings=settings,
-                    run_id=run_id,
-                    tag=tag,
+                    resources=resources,
+                    writer=writer,
+                    limiter=limiter,
                     model_override=args.model,
                     context_limit=args.context_limit,
                     counters=counters,
-                )
-                futures.append(fut)
+                ))
+            wait(futures)
+    finally:
+        writer.close()
+        resources.close()
 
-            # 等待所有任务完成
-            for fut in as_completed(futures):
-                try:
-                    fut.result()  # 触发异常上报
-                except Exception as e:
-                    logger.error(f"Future 异常: {e}")
+    try:
+        summary_conn = conn_factory()
+        try:
+            refresh_eval_run_summary(summary_conn, run_id)
+            finish_checkpoint(summary_conn, run_id)
+        finally:
+            summary_conn.close()
+    except Exception as e:
+        logger.warning(f"刷新 eval_run_summaries 失败: {e}")
 
     elapsed = time.time() - start_time
+    stats = limiter.stats()
     logger.info(f"=== Eval Replay 完成 ===")
     logger.info(f"  总数: {total} | 成功: {counters['success']} | 失败: {counters['error']}")
     logger.info(f"  总耗时: {elapsed:.1f}s | 平均: {elapsed/max(total,1):.1f}s/条")
+    logger.info(
+        f"  并发: 最终 {stats['limit']} / 峰值 {stats['peak_limit']} | "
+        f"限流 {stats['throttled']} 次 | 超时 {stats['slow']} 次 | 降并发 {stats['decreases']} 次"
+    )
+    logger.info(f"  写入: {writer.written} 条 / {writer.batches} 批")
     logger.info(f"  run_id: {run_id}")
     logger.info(f"  查看结果: python -m ai_kefu.scripts.eval_analyze --run-id {run_id}")
 
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Export Profile - 导出 Agent 运行的采样剖析结果 (utils/profiling.py 写入 agent_turn_profiles)
+
+采样方式：
+    # 强制对这一条消息采样（X-Profile: 0 则跳过 PROFILE_SAMPLE_RATE 的随机采样）
+    curl -H 'X-Profile: 1' -H 'Content-Type: application/json' \\
+         -d @message.json http://localhost:8000/xianyu/inbound
+
+用法:
+    # 最近的 20 条剖析记录（可按 chat_id 过滤）
+    python -m ai_kefu.scripts.export_profile
+    python -m ai_kefu.scripts.export_profile --chat-id 123456
+
+    # 导出 speedscope JSON，拖进 https://www.speedscope.app 查看
+    python -m ai_kefu.scripts.export_profile <interaction_id> -o run.speedscope.json
+
+    # 导出 collapsed stacks，配合 flamegraph.pl 生成火焰图
+    python -m ai_kefu.scripts.export_profile <interaction_id> --format collapsed | flamegraph.pl > run.svg
+
+interaction_id 与 agent_turns 的同名列一致，也会出现在 Agent 日志 [profiling] 行里。
+"""
+
+import argparse
+import json
+import sys
+
+from ai_kefu.config.settings import settings
+from ai_kefu.utils.profiling import Profile
+from ai_kefu.xianyu_interceptor.conversation_store import ConversationStore
+
+
+def _store() -> ConversationStore:
+    return ConversationStore(
+        host=settings.mysql_host,
+        port=settings.mysql_port,
+        user=settings.mysql_user,
+        password=settings.mysql_password,
+        database=settings.mysql_database,
+    )
+
+
+def list_profiles(store: ConversationStore, chat_id: str, limit: int) -> None:
+    rows = store.get_recent_profiles(chat_id=chat_id, limit=limit)
+    if not rows:
+        print("❌ 没有剖析记录 (请求头 X-Profile: 1 或设置 PROFILE_SAMPLE_RATE)")
+        sys.exit(1)
+    print(f"{'created_at':<19}  {'duration':>9}  {'samples':>7}  {'interaction_id':<36}  chat_id")
+    for row in rows:
+        print(
+            f"{str(row['created_at']):<19}  {row['duration_ms'] or 0:>7}ms  {row['sample_count']:>7}  "
+            f"{row['interaction_id']:<36}  {row['chat_id'] or '-'}"
+        )
+
+
+def export_profile(store: ConversationStore, interaction_id: str, fmt: str, output: str) -> None:
+    row = store.get_profile(interaction_id)
+    if row is None:
+        print(f"❌ 未找到剖析记录: {interaction_id}", file=sys.stderr)
+        sys.exit(1)
+    if fmt == "collapsed":
+        text = Profile.from_speedscope(row["profile"]).to_collapsed()
+    else:
+        text = json.dumps(row["profile"], ensure_ascii=False)
+    if output == "-":
+        sys.stdout.write(text)
+        return
+    with open(output, "w", encoding="utf-8") as f:
+        f.write(text)
+    print(f"✅ {row['sample_count']} 个采样 / {row['duration_ms']}ms → {output}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出 Agent 运行的采样剖析结果")
+    parser.add_argument("interaction_id", nargs="?", help="要导出的 interaction_id；不填则列出最近的记录")
+    parser.add_argument("--format", choices=("speedscope", "collapsed"), default="speedscope", help="导出格式")
+    parser.add_argument("-o", "--output", default="-", help="输出文件 (默认 stdout)")
+    parser.add_argument("--chat-id", default=None, help="列出记录时按 chat_id 过滤")
+    parser.add_argument("--limit", type=int, default=20, help="列出最近的 N 条 (默认 20)")
+    args = parser.parse_args()
+
+    store = _store()
+    try:
+        if args.interaction_id:
+            export_profile(store, args.interaction_id, args.format, args.output)
+        else:
+            list_profiles(store, args.chat_id, args.limit)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,685 @@
+#!/usr/bin/env python3
+"""
+Load Test - 对 POST /xianyu/inbound 做开环压测，得出单实例容量曲线
+
+买家消息流两种来源：
+    - db:        从 conversations 表抽取真实会话里的买家消息 (按会话内顺序)
+    - synthetic: 按模板生成 (问在不在 → 租期 → 目的地 → 押金 → 下单)，--seed 固定
+
+每一档到达率 (--rates, 条/秒) 持续 --duration 秒：消息到达间隔服从 gamma 分布，
+--burstiness 是间隔的变异系数 (1 = 泊松，>1 更突发，<1 更均匀)。每条消息属于
+--chats 个会话之一，同一会话的消息串行发送 (与真实买家一致)；延迟从“计划到达
+时刻”算起，排队时间也计入 (避免 coordinated omission)。
+
+每档统计吞吐、延迟 p50/p95/p99、错误率、有回复比例，并每秒采样饱和度：
+    - API /metrics: DB 线程池 in-flight / 排队数 / 超时、事件循环延迟、
+      请求与 Agent 运行 in-flight
+    - Redis INFO (--redis-url): 连接数、ops/s、阻塞客户端
+    - MySQL (--mysql-stats): Threads_running / Threads_connected
+p95 超过 --slo-ms 或错误率超过 --max-error-rate 即视为拐点，停止加压。
+
+LLM 必须走离线桩，否则压的是 DashScope：
+    - --spawn: 本脚本按 --workers 逐个配置启动 uvicorn (自动设置
+      LLM_RECORD_MODE=replay 与 --llm-latency-ms)，每个配置一条容量曲线
+    - 不带 --spawn: 压 --url 指向的已启动实例，需自行以
+      LLM_RECORD_MODE=replay 启动
+
+多 worker 时的饱和度指标：/metrics 的数值在每个 worker 进程内各自统计，
+同一端口上的采样请求随机落到某个 worker。--workers N>1 时每秒的样本只代表
+当时应答的那个 worker，均值 / 最大值是“单个 worker”的量级而不是全实例合计；
+*_delta 计数器在不同 worker 间跳变，不可信 (报告中标记为 per_worker_samples)。
+要看全实例合计，请让 Prometheus 逐个 worker 抓取，或用 --workers 1 压单进程。
+Redis / MySQL 采样不受影响。
+
+压测数据 (chat_id / user_id 以 loadtest_ 开头) 会写入：
+    - MySQL: conversations、agent_turns、agent_turns_archive、agent_turn_profiles、
+      chat_summaries
+    - Redis: xianyu:session:* 会话映射、session:{id}:meta / :msgs 会话、
+      history_summary:* / user_history_summary:* 历史摘要缓存等
+加 --cleanup 在压测结束后全部删除 (或 --cleanup-only 只清理不压测)。
+
+用法:
+    # 启动 1 / 2 / 4 个 worker 各压一遍，LLM 每次 800ms
+    python -m ai_kefu.scripts.load_test_inbound --spawn --workers 1,2,4 \\
+        --rates 1,2,4,8,16 --duration 30 --llm-latency-ms 800
+
+    # 压已启动的实例，真实会话回放，突发流量
+    python -m ai_kefu.scripts.load_test_inbound --url http://localhost:8000 \\
+        --source db --rates 2,4,8 --burstiness 2.5 --redis-url redis://localhost:6379
+
+    # 清理上次压测留下的数据
+    python -m ai_kefu.scripts.load_test_inbound --cleanup-only
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from ai_kefu.config.settings import settings
+from ai_kefu.scripts.benchmark_agent import REPORT_DIR, git_commit, percentile
+
+CHAT_PREFIX = "loadtest_"
+
+# /metrics 中按秒采样的饱和度指标 (带标签的按标签求和)
+SATURATION_GAUGES = (
+    "ai_kefu_db_pool_in_flight",
+    "ai_kefu_db_pool_queue_depth",
+    "ai_kefu_event_loop_lag_ms",
+    "ai_kefu_http_requests_in_flight",
+    "ai_kefu_agent_runs_in_flight",
+)
+SATURATION_COUNTERS = ("ai_kefu_db_pool_timeouts_total",)
+
+# 压测数据所在的 MySQL 表 (均按 chat_id 清理)
+CLEANUP_TABLES = (
+    "conversations",
+    "agent_turns",
+    "agent_turns_archive",
+    "agent_turn_profiles",
+    "chat_summaries",
+)
+
+_SAMPLE_RE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})?\s+(\S+)$")
+
+# ============================================================
+# 买家消息流
+# ============================================================
+
+_GREETINGS = ["你好，这个还在吗", "在吗", "您好，相机可以租吗", "请问还能租吗"]
+_CITIES = ["杭州", "上海", "北京", "成都", "广州", "深圳", "西安", "厦门"]
+_QUESTIONS = [
+    "押金多少？支持免押吗",
+    "发顺丰吗，几天能到",
+    "用完怎么还，寄回哪个地址",
+    "能便宜点吗，租一周多少钱",
+    "镜头有划痕吗，能发几张实拍图",
+    "电池和充电器都有吗",
+]
+_CLOSINGS = ["好的，那我下单了", "行，我考虑一下", "那就这样定了", "谢谢"]
+
+
+def synthetic_streams(count: int, seed: int) -> List[Dict[str, Any]]:
+    """按模板生成 count 个买家消息流；同一 seed 结果相同。"""
+    rng = random.Random(seed)
+    today = datetime.now()
+    streams = []
+    for index in range(count):
+        start = today + timedelta(days=rng.randint(2, 30))
+        days = rng.randint(2, 7)
+        messages = [
+            rng.choice(_GREETINGS),
+            f"我想租{days}天，{start.month}月{start.day}号到"
+            f"{(start + timedelta(days=days)).day}号可以吗",
+            f"寄到{rng.choice(_CITIES)}",
+        ]
+        messages += rng.sample(_QUESTIONS, rng.randint(1, 3))
+        messages.append(rng.choice(_CLOSINGS))
+        streams.append({
+            "source_chat_id": f"synthetic_{index}",
+            "item_id": f"loadtest_item_{index % 20}",
+            "item_title": "索尼 A7M4 相机出租",
+            "messages": messages,
+        })
+    return streams
+
+
+def db_streams(count: int, min_messages: int, seed: int) -> List[Dict[str, Any]]:
+    """从最近的会话里随机抽 count 个 (买家消息 ≥ min_messages 条)。"""
+    from ai_kefu.xianyu_interceptor.conversation_store import ConversationStore
+
+    store = ConversationStore(
+        host=settings.mysql_host,
+        port=settings.mysql_port,
+        user=settings.mysql_user,
+        password=settings.mysql_password,
+        database=settings.mysql_database,
+    )
+    try:
+        recent = store.get_recent_conversations(limit=max(count * 5, 200))["items"]
+        candidates = [
+            row for row in recent
+            if (row.get("user_messages") or 0) >= min_messages
+            and not str(row["chat_id"]).startswith(CHAT_PREFIX)
+        ]
+        random.Random(seed).shuffle(candidates)
+        streams = []
+        for row in candidates[:count]:
+            history = store.get_conversation_history(row["chat_id"], limit=200)
+            messages = [
+                m.content for m in history
+                if m.message_type == "user" and m.content and m.content.strip()
+            ]
+            if len(messages) >= min_messages:
+                streams.append({
+                    "source_chat_id": row["chat_id"],
+                    "item_id": row.get("item_id"),
+                    "item_title": None,
+                    "messages": messages,
+                })
+        return streams
+    finally:
+        store.close()
+
+
+class ChatPool:
+    """
+    --chats 个会话轮流取消息；某个会话的消息流发完后换下一个流、用新的
+    chat_id 重新开始，保证会话数恒定。
+    """
+
+    def __init__(self, streams: List[Dict[str, Any]], chats: int, run_id: str):
+        self.streams = streams
+        self.run_id = run_id
+        self._next_stream = 0
+        self._next_chat = 0
+        self._chats = [self._new_chat(i) for i in range(chats)]
+        self.locks = [asyncio.Lock() for _ in range(chats)]
+
+    def _new_chat(self, slot: int) -> Dict[str, Any]:
+        stream = self.streams[self._next_stream % len(self.streams)]
+        self._next_stream += 1
+        return {
+            "chat_id": f"{CHAT_PREFIX}{self.run_id}_{slot}_{self._next_stream}",
+            "user_id": f"{CHAT_PREFIX}buyer_{slot}",
+            "stream": stream,
+            "position": 0,
+        }
+
+    def next_message(self) -> Tuple[int, Dict[str, Any]]:
+        """(会话槽位, /xianyu/inbound 请求体)"""
+        slot = self._next_chat % len(self._chats)
+        self._next_chat += 1
+        chat = self._chats[slot]
+        if chat["position"] >= len(chat["stream"]["messages"]):
+            chat = self._chats[slot] = self._new_chat(slot)
+        content = chat["stream"]["messages"][chat["position"]]
+        chat["position"] += 1
+        stream = chat["stream"]
+        return slot, {
+            "chat_id": chat["chat_id"],
+            "user_id": chat["user_id"],
+            "content": content,
+            "item_id": stream.get("item_id"),
+            "item_title": stream.get("item_title"),
+            "user_nickname": "loadtest",
+            "message_id": uuid.uuid4().hex,
+            "timestamp": int(time.time() * 1000),
+            "metadata": {"load_test": True, "source_chat_id": stream["source_chat_id"]},
+        }
+
+
+def arrival_offsets(rate: float, duration: float, burstiness: float, rng: random.Random) -> List[float]:
+    """gamma 间隔的到达时刻 (秒)：均值 1/rate，变异系数 burstiness。"""
+    shape = 1.0 / (burstiness ** 2)
+    scale = 1.0 / (rate * shape)
+    offsets, t = [], 0.0
+    while True:
+        t += rng.gammavariate(shape, scale)
+        if t >= duration:
+            return offsets
+        offsets.append(t)
+
+
+# ============================================================
+# 饱和度采样
+# ============================================================
+
+def parse_metrics(text: str) -> Dict[str, float]:
+    """Prometheus 文本 → {指标名: 值}，同名不同标签的样本求和。"""
+    values: Dict[str, float] = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = _SAMPLE_RE.match(line.strip())
+        if not match:
+            continue
+        try:
+            value = float(match.group(3))
+        except ValueError:
+            continue
+        values[match.group(1)] = values.get(match.group(1), 0.0) + value
+    return values
+
+
+class SaturationSampler:
+    """每 interval 秒采一次 /metrics、Redis INFO、MySQL 状态，汇总成均值 / 最大值。"""
+
+    def __init__(self, client: httpx.AsyncClient, url: str, redis_url: Optional[str],
+                 mysql_stats: bool, interval: float = 1.0):
+        self.client = client
+        self.url = url
+        self.interval = interval
+        self.samples: Dict[str, List[float]] = {}
+        self._first_counters: Dict[str, float] = {}
+        self._last_counters: Dict[str, float] = {}
+        self._redis = None
+        self._mysql = None
+        if redis_url:
+            import redis
+
+            self._redis = redis.Redis.from_url(redis_url, socket_timeout=2)
+        if mysql_stats:
+            import pymysql
+
+            self._mysql = pymysql.connect(
+                host=settings.mysql_host, port=settings.mysql_port,
+                user=settings.mysql_user, password=settings.mysql_password,
+                connect_timeout=3, autocommit=True,
+            )
+
+    def _add(self, name: str, value: float) -> None:
+        self.samples.setdefault(name, []).append(value)
+
+    async def sample_once(self) -> None:
+        try:
+            response = await self.client.get(f"{self.url}/metrics", timeout=5)
+            metrics = parse_metrics(response.text)
+            for name in SATURATION_GAUGES:
+                if name in metrics:
+                    self._add(name, metrics[name])
+            for name in SATURATION_COUNTERS:
+                if name in metrics:
+                    self._first_counters.setdefault(name, metrics[name])
+                    self._last_counters[name] = metrics[name]
+        except Exception:
+            self._add("metrics_scrape_errors", 1)
+        if self._redis is not None:
+            try:
+                info = await asyncio.to_thread(self._redis.info)
+                self._add("redis_connected_clients", info.get("connected_clients", 0))
+                self._add("redis_ops_per_sec", info.get("instantaneous_ops_per_sec", 0))
+                self._add("redis_blocked_clients", info.get("blocked_clients", 0))
+            except Exception:
+                self._add("redis_errors", 1)
+        if self._mysql is not None:
+            try:
+                status = await asyncio.to_thread(self._mysql_status)
+                self._add("mysql_threads_running", status.get("Threads_running", 0))
+                self._add("mysql_threads_connected", status.get("Threads_connected", 0))
+            except Exception:
+                self._add("mysql_errors", 1)
+
+    def _mysql_status(self) -> Dict[str, float]:
+        with self._mysql.cursor() as cursor:
+            cursor.execute("SHOW GLOBAL STATUS WHERE Variable_name IN ('Threads_running', 'Threads_connected')")
+            return {name: float(value) for name, value in cursor.fetchall()}
+
+    async def run(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            await self.sample_once()
+            try:
+                await asyncio.wait_for(stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def summary(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        for name, values in self.samples.items():
+            if name.endswith("_errors"):
+                result[name] = int(sum(values))
+                continue
+            result[name] = {"mean": round(sum(values) / len(values), 2), "max": round(max(values), 2)}
+        for name, last in self._last_counters.items():
+            result[name.replace("_total", "_delta")] = last - self._first_counters.get(name, last)
+        return result
+
+    def close(self) -> None:
+        if self._mysql is not None:
+            self._mysql.close()
+
+
+# ============================================================
+# 压测
+# ============================================================
+
+async def run_step(
+    client: httpx.AsyncClient,
+    url: str,
+    pool: ChatPool,
+    rate: float,
+    args: argparse.Namespace,
+    rng: random.Random,
+) -> Dict[str, Any]:
+    """一档到达率：按计划时刻发消息，返回该档统计。"""
+    offsets = arrival_offsets(rate, args.duration, args.burstiness, rng)
+    latencies: List[float] = []
+    outcomes = {"replied": 0, "no_reply": 0, "http_error": 0, "timeout": 0, "conn_error": 0}
+    error_samples: List[str] = []
+    in_flight = 0
+    peak_in_flight = 0
+
+    sampler = SaturationSampler(client, url, args.redis_url, args.mysql_stats)
+    stop_sampling = asyncio.Event()
+    sampler_task = asyncio.create_task(sampler.run(stop_sampling))
+
+    async def send(scheduled: float, slot: int, body: Dict[str, Any]) -> None:
+        nonlocal in_flight, peak_in_flight
+        async with pool.locks[slot]:  # 同一会话串行
+            in_flight += 1
+            peak_in_flight = max(peak_in_flight, in_flight)
+            try:
+                response = await client.post(f"{url}/xianyu/inbound", json=body, timeout=args.timeout)
+                if response.status_code != 200:
+                    outcomes["http_error"] += 1
+                    if len(error_samples) < 5:
+                        error_samples.append(f"HTTP {response.status_code}: {response.text[:200]}")
+                    return
+                outcomes["replied" if response.json().get("reply") else "no_reply"] += 1
+                latencies.append((time.perf_counter() - scheduled) * 1000)
+            except httpx.TimeoutException:
+                outcomes["timeout"] += 1
+            except httpx.HTTPError as e:
+                outcomes["conn_error"] += 1
+                if len(error_samples) < 5:
+                    error_samples.append(f"{type(e).__name__}: {e}")
+            finally:
+                in_flight -= 1
+
+    started = time.perf_counter()
+    tasks = []
+    for offset in offsets:
+        delay = started + offset - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        slot, body = pool.next_message()
+        tasks.append(asyncio.create_task(send(started + offset, slot, body)))
+
+    _, pending = await asyncio.wait(tasks, timeout=args.drain_timeout) if tasks else (set(), set())
+    for task in pending:
+        task.cancel()
+    outcomes["timeout"] += len(pending)
+    wall_s = time.perf_counter() - started
+
+    stop_sampling.set()
+    await sampler_task
+    sampler.close()
+
+    sent = len(offsets)
+    failed = outcomes["http_error"] + outcomes["timeout"] + outcomes["conn_error"]
+    completed = outcomes["replied"] + outcomes["no_reply"]
+    return {
+        "rate": rate,
+        "sent": sent,
+        "completed": completed,
+        "throughput_msg_s": round(completed / wall_s, 2) if wall_s else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "max_ms": round(max(latencies), 1) if latencies else 0.0,
+        "error_rate": round(failed / sent, 4) if sent else 0.0,
+        "reply_rate": round(outcomes["replied"] / completed, 4) if completed else 0.0,
+        "peak_in_flight": peak_in_flight,
+        "outcomes": outcomes,
+        "error_samples": error_samples,
+        "saturation": sampler.summary(),
+        "wall_s": round(wall_s, 2),
+    }
+
+
+async def run_curve(url: str, streams: List[Dict[str, Any]], args: argparse.Namespace, label: str) -> Dict[str, Any]:
+    """逐档加压直到拐点，返回一条容量曲线。"""
+    rng = random.Random(args.seed)
+    pool = ChatPool(streams, args.chats, uuid.uuid4().hex[:6])
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    steps = []
+    knee = None
+    async with httpx.AsyncClient(limits=limits) as client:
+        for rate in args.rates:
+            step = await run_step(client, url, pool, rate, args, rng)
+            steps.append(step)
+            sat = step["saturation"]
+            lag = sat.get("ai_kefu_event_loop_lag_ms", {}).get("max", 0)
+            db_queue = sat.get("ai_kefu_db_pool_queue_depth", {}).get("max", 0)
+            print(
+                f"  [{label}] {rate:>6g}/s  thr={step['throughput_msg_s']:>6}/s  "
+                f"p50={step['p50_ms']:>8.0f}ms  p95={step['p95_ms']:>8.0f}ms  p99={step['p99_ms']:>8.0f}ms  "
+                f"err={step['error_rate']:.1%}  in_flight≤{step['peak_in_flight']}  "
+                f"loop_lag≤{lag:.0f}ms  db_queue≤{db_queue:.0f}"
+            )
+            if step["p95_ms"] > args.slo_ms or step["error_rate"] > args.max_error_rate:
+                knee = rate
+                if not args.no_stop:
+                    break
+            if args.pause:
+                await asyncio.sleep(args.pause)
+
+    sustained = [s["rate"] for s in steps if s["p95_ms"] <= args.slo_ms and s["error_rate"] <= args.max_error_rate]
+    return {
+        "label": label,
+        "url": url,
+        "max_sustained_rate": max(sustained) if sustained else 0.0,
+        "knee_rate": knee,
+        "steps": steps,
+    }
+
+
+# ============================================================
+# 被测实例 (--spawn)
+# ============================================================
+
+def spawn_api(port: int, workers: int, args: argparse.Namespace) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "LLM_RECORD_MODE": "replay",
+        "LLM_REPLAY_LATENCY_MS": str(args.llm_latency_ms),
+        "LLM_REPLAY_JITTER_MS": str(args.llm_jitter_ms),
+        "LLM_REPLAY_ON_MISS": "stub",
+        "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING"),
+    })
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "ai_kefu.api.main:app",
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        cwd=project_root,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(url: str, timeout: float = 60.0) -> bool:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{url}/health", timeout=2)).status_code < 500:
+                    return True
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    return False
+
+
+def stop_api(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+# ============================================================
+# 清理
+# ============================================================
+
+def cleanup_mysql() -> Dict[str, int]:
+    """删除 CLEANUP_TABLES 中 chat_id 以 loadtest_ 开头的行，返回 {表名: 行数}。"""
+    import pymysql
+
+    conn = pymysql.connect(
+        host=settings.mysql_host, port=settings.mysql_port,
+        user=settings.mysql_user, password=settings.mysql_password,
+        database=settings.mysql_database, connect_timeout=5, autocommit=True,
+    )
+    deleted = {}
+    try:
+        with conn.cursor() as cursor:
+            for table in CLEANUP_TABLES:
+                try:
+                    deleted[table] = cursor.execute(
+                        f"DELETE FROM {table} WHERE chat_id LIKE %s", (CHAT_PREFIX.replace("_", "\\_") + "%",)
+                    )
+                except pymysql.err.ProgrammingError:
+                    deleted[table] = 0  # 表不存在 (对应功能未启用)
+    finally:
+        conn.close()
+    return deleted
+
+
+def cleanup_redis(redis_url: str) -> int:
+    """
+    删除压测会话在 Redis 中的所有键，返回删除的键数。
+
+    键名带 loadtest_ 的直接删除；会话本身以 session_id 为键，先通过
+    xianyu:session:{chat_id} 映射找到 session_id 再删。
+    """
+    import redis
+
+    client = redis.Redis.from_url(redis_url, decode_responses=True)
+    keys = set(client.scan_iter(match=f"*{CHAT_PREFIX}*", count=1000))
+    forward = [k for k in keys if k.startswith(f"xianyu:session:{CHAT_PREFIX}")]
+    session_ids = [sid for sid in (client.mget(forward) if forward else []) if sid]
+    for sid in session_ids:
+        keys.update((
+            f"session:{sid}", f"session:{sid}:meta", f"session:{sid}:msgs",
+            f"xianyu:session:rev:{sid}",
+        ))
+    deleted = 0
+    keys = sorted(keys)
+    for i in range(0, len(keys), 500):
+        deleted += client.delete(*keys[i:i + 500])
+    return deleted
+
+
+def cleanup(redis_url: str) -> None:
+    try:
+        for table, rows in cleanup_mysql().items():
+            print(f"🧹 MySQL {table}: 删除 {rows} 行")
+    except Exception as e:
+        print(f"⚠️  MySQL 清理失败: {e}")
+    try:
+        print(f"🧹 Redis: 删除 {cleanup_redis(redis_url)} 个键")
+    except Exception as e:
+        print(f"⚠️  Redis 清理失败: {e}")
+
+
+# ============================================================
+# 入口
+# ============================================================
+
+def _float_list(value: str) -> List[float]:
+    return [float(v) for v in value.split(",") if v.strip()]
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/xianyu/inbound 开环压测，输出容量曲线")
+    parser.add_argument("--url", default=f"http://localhost:{settings.api_port}", help="被测 API 地址 (不带 --spawn 时)")
+    parser.add_argument("--spawn", action="store_true", help="按 --workers 逐个启动 uvicorn (LLM 自动走回放桩)")
+    parser.add_argument("--workers", type=_int_list, default=[1], help="--spawn 时的 worker 数配置，逗号分隔 (默认 1)")
+    parser.add_argument("--port", type=int, default=18080, help="--spawn 时的端口 (默认 18080)")
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0, help="--spawn 时每次 LLM 调用的合成延迟")
+    parser.add_argument("--llm-jitter-ms", type=float, default=200.0, help="--spawn 时的额外随机延迟上限")
+    parser.add_argument("--label", default=None, help="不带 --spawn 时这条曲线的配置名 (写进报告)")
+    parser.add_argument("--source", choices=("synthetic", "db"), default="synthetic", help="买家消息流来源")
+    parser.add_argument("--streams", type=int, default=200, help="抽取 / 生成的消息流数量 (默认 200)")
+    parser.add_argument("--min-messages", type=int, default=3, help="--source db 时每个会话至少的买家消息数")
+    parser.add_argument("--chats", type=int, default=50, help="同时活跃的会话数 (默认 50)")
+    parser.add_argument("--rates", type=_float_list, default=[1, 2, 4, 8, 16], help="到达率档位 (条/秒)，逗号分隔")
+    parser.add_argument("--duration", type=float, default=30.0, help="每档持续秒数 (默认 30)")
+    parser.add_argument("--burstiness", type=float, default=1.0, help="到达间隔变异系数，1 = 泊松 (默认 1)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="单请求超时秒数 (默认 120)")
+    parser.add_argument("--drain-timeout", type=float, default=150.0, help="每档结束后等待在途请求的秒数")
+    parser.add_argument("--pause", type=float, default=2.0, help="档位之间的间隔秒数")
+    parser.add_argument("--max-connections", type=int, default=500, help="HTTP 连接池上限")
+    parser.add_argument("--slo-ms", type=float, default=10000.0, help="p95 延迟目标，超过即为拐点 (默认 10000)")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="错误率上限，超过即为拐点 (默认 0.01)")
+    parser.add_argument("--no-stop", action="store_true", help="过了拐点也跑完所有档位")
+    parser.add_argument("--redis-url", default=None, help="采样该 Redis 的 INFO (一般填 settings.redis_url)")
+    parser.add_argument("--mysql-stats", action="store_true", help="采样 MySQL Threads_running / Threads_connected")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子 (消息流与到达时刻)")
+    parser.add_argument("--cleanup", action="store_true", help="压测结束后删除 loadtest_ 会话的 MySQL 行与 Redis 键")
+    parser.add_argument("--cleanup-only", action="store_true", help="只做清理，不压测")
+    parser.add_argument("--output", default=None, help="结果 JSON 路径 (默认 ai_kefu/reports/loadtest_<commit>_<时间>.json)")
+    args = parser.parse_args()
+
+    if args.burstiness <= 0:
+        parser.error("--burstiness 必须大于 0")
+    cleanup_redis_url = args.redis_url or settings.redis_url
+    if args.cleanup_only:
+        cleanup(cleanup_redis_url)
+        return
+
+    if args.source == "db":
+        streams = db_streams(args.streams, args.min_messages, args.seed)
+    else:
+        streams = synthetic_streams(args.streams, args.seed)
+    if not streams:
+        print("❌ 没有可用的买家消息流")
+        sys.exit(1)
+
+    commit = git_commit()
+    print(f"🏁 load test @ {commit}: {len(streams)} 个消息流 ({args.source}), {args.chats} 个会话, "
+          f"档位 {args.rates} 条/秒 × {args.duration:g}s, burstiness={args.burstiness:g}")
+
+    curves = []
+    if args.spawn and any(w > 1 for w in args.workers):
+        print("ℹ️  workers>1 时 /metrics 每次只采到随机一个 worker，饱和度为单 worker 样本 (见脚本说明)")
+    if args.spawn:
+        for workers in args.workers:
+            url = f"http://127.0.0.1:{args.port}"
+            process = spawn_api(args.port, workers, args)
+            try:
+                if not asyncio.run(wait_ready(url)):
+                    print(f"❌ workers={workers}: API 启动超时")
+                    continue
+                curve = asyncio.run(run_curve(url, streams, args, f"workers={workers}"))
+                curve["workers"] = workers
+                # /metrics 只反映随机一个 worker，见模块说明
+                curve["per_worker_samples"] = workers > 1
+                curves.append(curve)
+            finally:
+                stop_api(process)
+    else:
+        label = args.label or args.url
+        curves.append(asyncio.run(run_curve(args.url.rstrip("/"), streams, args, label)))
+
+    print("\n容量 (p95 ≤ {:g}ms 且错误率 ≤ {:.1%} 的最高到达率):".format(args.slo_ms, args.max_error_rate))
+    for curve in curves:
+        print(f"  {curve['label']:<24} {curve['max_sustained_rate']:g} 条/秒")
+
+    report = {
+        "commit": commit,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "streams": len(streams),
+        "curves": curves,
+    }
+    output = args.output or os.path.join(
+        REPORT_DIR, f"loadtest_{commit}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    print(f"📄 结果已写入 {output}")
+
+    if args.cleanup:
+        cleanup(cleanup_redis_url)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,7 @@ if str(project_root) not in sys.path:
 from ai_kefu.prompts.rental_system_prompt import get_rental_system_prompt_template
 from ai_kefu.storage.prompt_store import PromptStore
 from ai_kefu.config.settings import settings
+from ai_kefu.storage.config_cache import TOPIC_PROMPTS, publish_invalidation
 
 
 def main(auto_confirm: bool = False):
@@ -64,8 +65,12 @@ def main(auto_confirm: bool = False):
     if result:
         print(f"\n✅ 更新成功！id={result.id}, 新内容长度={len(result.content)} 字符")
         print(f"   更新时间: {result.updated_at}")
-        print("\n💡 提示: turn.py 有 5 分钟缓存 (_SYSTEM_PROMPT_CACHE_TTL=300)")
-        print("   重启服务可立即生效，否则最多等 5 分钟")
+        # 通知所有 API worker 立即后台重载 system prompt
+        if publish_invalidation(TOPIC_PROMPTS) is not None:
+            print("\n📣 已广播 prompt 变更，运行中的服务会立即重新加载")
+        else:
+            print("\n💡 提示: Redis 不可用，未能广播变更；运行中的服务最多在 "
+                  f"{settings.config_refresh_interval:.0f}s 内自动刷新")
     else:
         print("❌ 更新失败，请检查日志")
 
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Trace View - 查看链路追踪 span (utils/tracing.py 写出的 traces_*.jsonl)
+
+一条买家消息一个 trace：拦截器 → /xianyu/inbound → agent.run → 每轮 agent.turn
+→ llm.* / tool.* → rental_api.find_slot。按树形打印每个 span 相对 trace 起点
+的偏移、总耗时和自身耗时 (扣掉子 span)，一眼看出 20 秒花在了哪里。
+
+拦截器和 API 分别写 traces_interceptor_<日期>.jsonl / traces_api_<日期>.jsonl；
+不在同一台机器时把两个文件拷到同一目录再看 (不同主机的时钟偏差会体现在偏移上)。
+
+用法:
+    # 今天最慢的 20 条 trace
+    python -m ai_kefu.scripts.trace_view
+
+    # 按 trace id (前缀即可) 打印调用树，trace id 见拦截器日志 / 响应头 X-Trace-Id
+    python -m ai_kefu.scripts.trace_view 3f2a9c
+
+    # 指定日期和目录
+    python -m ai_kefu.scripts.trace_view --date 2026-05-03 --dir /data/traces --slowest 50
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List
+
+from ai_kefu.utils.tracing import default_tracing_dir
+
+
+def load_spans(directory: str, date: str) -> List[Dict[str, Any]]:
+    spans = []
+    for path in sorted(glob.glob(os.path.join(directory, f"traces_*_{date}.jsonl"))):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    spans.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # 进程被杀时可能留下半行
+    return spans
+
+
+def group_traces(spans: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    traces: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for span in spans:
+        traces[span["trace_id"]].append(span)
+    return traces
+
+
+def root_of(trace: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """没有父 span (或父 span 不在文件里) 的最早 span。"""
+    ids = {s["span_id"] for s in trace}
+    roots = [s for s in trace if not s.get("parent_id") or s["parent_id"] not in ids]
+    return min(roots or trace, key=lambda s: s["start"])
+
+
+def _format_attributes(attributes: Dict[str, Any]) -> str:
+    parts = [f"{k}={v}" for k, v in attributes.items() if v not in (None, "", False)]
+    return " ".join(parts)[:120]
+
+
+def print_trace(trace: List[Dict[str, Any]]) -> None:
+    children: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    ids = {s["span_id"] for s in trace}
+    for span in trace:
+        parent = span.get("parent_id")
+        children[parent if parent in ids else None].append(span)
+    for spans in children.values():
+        spans.sort(key=lambda s: s["start"])
+
+    origin = min(s["start"] for s in trace)
+    total = max(s["start"] * 1000 + (s["duration_ms"] or 0) for s in trace) - origin * 1000
+    print(f"trace {trace[0]['trace_id']}  {len(trace)} spans  {total:.0f}ms")
+    print(f"{'offset_ms':>9} {'total_ms':>9} {'self_ms':>9}  span")
+
+    def walk(span: Dict[str, Any], depth: int) -> None:
+        kids = children.get(span["span_id"], [])
+        duration = span["duration_ms"] or 0
+        self_ms = max(0.0, duration - sum(k["duration_ms"] or 0 for k in kids))
+        offset = (span["start"] - origin) * 1000
+        error = f"  ❌ {span['error']}" if span.get("error") else ""
+        print(
+            f"{offset:>9.0f} {duration:>9.0f} {self_ms:>9.0f}  "
+            f"{'  ' * depth}{span['name']} [{span.get('service', '?')}] "
+            f"{_format_attributes(span.get('attributes') or {})}{error}"
+        )
+        for kid in kids:
+            walk(kid, depth + 1)
+
+    for root in children.get(None, []):
+        walk(root, 0)
+
+    # 按 span 名汇总自身耗时，最耗时的排前面
+    self_by_name: Dict[str, float] = defaultdict(float)
+    for span in trace:
+        kids = children.get(span["span_id"], [])
+        self_by_name[span["name"]] += max(
+            0.0, (span["duration_ms"] or 0) - sum(k["duration_ms"] or 0 for k in kids)
+        )
+    print("\n自身耗时汇总:")
+    for name, ms in sorted(self_by_name.items(), key=lambda kv: -kv[1])[:10]:
+        print(f"  {ms:>9.0f}ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看链路追踪 span")
+    parser.add_argument("trace_id", nargs="?", help="trace id 或其前缀；不填则列出最慢的 trace")
+    parser.add_argument("--dir", default=None, help="trace 文件目录 (默认 settings.tracing_dir / ai_kefu/logs)")
+    parser.add_argument("--date", default=datetime.now().strftime("%Y-%m-%d"), help="日期 YYYY-MM-DD (默认今天)")
+    parser.add_argument("--slowest", type=int, default=20, help="列出最慢的 N 条 trace (默认 20)")
+    args = parser.parse_args()
+
+    directory = args.dir or default_tracing_dir()
+    traces = group_traces(load_spans(directory, args.date))
+    if not traces:
+        print(f"❌ {directory} 下没有 {args.date} 的 trace 文件")
+        sys.exit(1)
+
+    if args.trace_id:
+        matched = [tid for tid in traces if tid.startswith(args.trace_id.lower())]
+        if not matched:
+            print(f"❌ 未找到 trace: {args.trace_id}")
+            sys.exit(1)
+        for tid in matched[:5]:
+            print_trace(traces[tid])
+            print()
+        return
+
+    roots = [root_of(trace) for trace in traces.values()]
+    roots.sort(key=lambda s: -(s["duration_ms"] or 0))
+    print(f"{'duration':>10}  {'time':<8}  {'trace_id':<32}  root")
+    for root in roots[:args.slowest]:
+        started = datetime.fromtimestamp(root["start"]).strftime("%H:%M:%S")
+        print(
+            f"{root['duration_ms'] or 0:>8.0f}ms  {started:<8}  {root['trace_id']}  "
+            f"{root['name']} {_format_attributes(root.get('attributes') or {})}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Version-stamped config caches with cross-worker invalidation.
+
+Rarely changing config that is read on every message is cached per API
+worker. That covers the active system prompt, the ignore-pattern set and
+runtime settings overrides. ``ConfigCache`` never blocks the request path
+after the first load. Once the value is older than ``refresh_interval``, it
+is reloaded on a background thread while readers keep getting the current value.
+
+Edits made in one worker reach the others through Redis:
+
+    await asyncio.to_thread(publish_invalidation, TOPIC_PROMPTS)
+
+This increments ``config:version:<topic>`` and publishes on
+``config:invalidate``. The ``InvalidationBus`` listener in every worker calls
+the callbacks subscribed to that topic, typically ``ConfigCache.invalidate``,
+which reloads in the background. The version stamp makes duplicate messages
+harmless. The periodic refresh, and a full resync after the listener
+reconnects, cover messages lost while a worker was disconnected. Without
+Redis, callbacks still run in the publishing worker.
+"""
+
+import json
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Generic, List, Optional, TypeVar
+
+import redis
+
+from ai_kefu.config.settings import settings
+from ai_kefu.utils.logging import logger
+
+T = TypeVar("T")
+
+TOPIC_PROMPTS = "prompts"
+TOPIC_IGNORE_PATTERNS = "ignore_patterns"
+TOPIC_SETTINGS = "settings"
+
+CHANNEL = "config:invalidate"
+_VERSION_KEY = "config:version:{topic}"
+
+
+class ConfigCache(Generic[T]):
+    """
+    A config value with non-blocking background refresh.
+
+    Args:
+        name: Name used in logs and stats
+        loader: Blocking callable returning the fresh value
+        refresh_interval: Seconds after which a read schedules a reload
+    """
+
+    def __init__(self, name: str, loader: Callable[[], T], refresh_interval: float):
+        self.name = name
+        self.refresh_interval = refresh_interval
+        self._loader = loader
+        self._value: Optional[T] = None
+        self._loaded = False
+        self._loaded_at = 0.0
+        self._loads = 0
+        self._stale = False
+        self._refreshing = False
+        self._applied_version = 0
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        """Current value; only the very first read loads synchronously."""
+        if not self._loaded:
+            return self.refresh()
+        if self._stale or time.monotonic() - self._loaded_at > self.refresh_interval:
+            self._refresh_in_background()
+        return self._value
+
+    def refresh(self) -> T:
+        """Reload synchronously. On failure the previous value is kept."""
+        self._stale = False
+        try:
+            value = self._loader()
+        except Exception as e:
+            if not self._loaded:
+                raise
+            logger.warning(f"Config cache '{self.name}' reload failed, keeping previous value: {e}")
+            self._loaded_at = time.monotonic()  # retry after refresh_interval
+            return self._value
+        with self._lock:
+            self._value = value
+            self._loaded = True
+            self._loaded_at = time.monotonic()
+            self._loads += 1
+        logger.debug(f"Config cache '{self.name}' reloaded (load #{self._loads})")
+        return value
+
+    def invalidate(self, version: Optional[int] = None) -> None:
+        """
+        Mark the value stale and reload it in the background.
+
+        Args:
+            version: Invalidation version from the bus; versions already
+                     applied are ignored (None always reloads)
+        """
+        if version is not None:
+            with self._lock:
+                if version <= self._applied_version:
+                    return
+                self._applied_version = version
+        self._stale = True
+        self._refresh_in_background()
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(
+            target=self._background_refresh, name=f"config-refresh-{self.name}", daemon=True
+        ).start()
+
+    def _background_refresh(self) -> None:
+        try:
+            while True:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.warning(f"Config cache '{self.name}' background load failed: {e}")
+                # An invalidation that arrived during the load needs another pass
+                if not self._stale:
+                    break
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "loaded": self._loaded,
+            "loads": self._loads,
+            "age_s": round(time.monotonic() - self._loaded_at, 1) if self._loaded else None,
+            "applied_version": self._applied_version,
+            "refreshing": self._refreshing,
+        }
+
+
+class InvalidationBus:
+    """Redis pub/sub fan-out of config invalidations to every worker."""
+
+    def __init__(self, redis_url: Optional[str]):
+        self.redis_url = redis_url
+        self.instance_id = uuid.uuid4().hex[:12]
+        self._subscribers: Dict[str, List[Callable[[Optional[int]], None]]] = {}
+        self._client: Optional[redis.Redis] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.published = 0
+        self.received = 0
+
+    def get_client(self) -> redis.Redis:
+        """Redis client of the bus (also used for small shared config values)."""
+        if self._client is None:
+            self._client = redis.from_url(self.redis_url, decode_responses=True)
+        return self._client
+
+    def subscribe(self, topic: str, callback: Callable[[Optional[int]], None]) -> None:
+        """Call ``callback(version)`` whenever ``topic`` is invalidated."""
+        self._subscribers.setdefault(topic, []).append(callback)
+
+    def publish(self, topic: str) -> Optional[int]:
+        """
+        Invalidate ``topic`` in this worker and broadcast it to the others.
+
+        Returns:
+            The new topic version, or None when Redis is unavailable
+        """
+        version = None
+        if self.redis_url:
+            try:
+                client = self.get_client()
+                version = int(client.incr(_VERSION_KEY.format(topic=topic)))
+                client.publish(CHANNEL, json.dumps(
+                    {"topic": topic, "version": version, "origin": self.instance_id}
+                ))
+                self.published += 1
+            except Exception as e:
+                logger.warning(f"Failed to broadcast config invalidation '{topic}': {e}")
+        self._dispatch(topic, version)
+        return version
+
+    def _dispatch(self, topic: str, version: Optional[int]) -> None:
+        for callback in self._subscribers.get(topic, []):
+            try:
+                callback(version)
+            except Exception as e:
+                logger.error(f"Config invalidation callback for '{topic}' failed: {e}")
+
+    def _handle(self, raw: str) -> None:
+        try:
+            message = json.loads(raw)
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring malformed config invalidation: {raw!r}")
+            return
+        if message.get("origin") == self.instance_id:
+            return  # already dispatched locally by publish()
+        self.received += 1
+        self._dispatch(message.get("topic"), message.get("version"))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "instance_id": self.instance_id,
+            "redis": bool(self.redis_url),
+            "listening": self._thread is not None and self._thread.is_alive(),
+            "published": self.published,
+            "received": self.received,
+            "topics": sorted(self._subscribers),
+        }
+
+    # ── listener ──
+
+    def start(self) -> None:
+        """Start the listener thread (no-op without Redis)."""
+        if not self.redis_url or self._thread is not None:
+            return
+        self._stop.clear()
+        logger.info(f"Starting config invalidation listener (instance {self.instance_id})")
+        self._thread = threading.Thread(target=self._listen, name="config-invalidation", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _listen(self) -> None:
+        backoff = 1.0
+        connected_before = False
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = self.get_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                if connected_before:
+                    # Messages published while disconnected are lost: reload everything
+                    logger.info("Config invalidation listener reconnected, resyncing all caches")
+                    for topic in list(self._subscribers):
+                        self._dispatch(topic, None)
+                connected_before = True
+                backoff = 1.0
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self._handle(message.get("data"))
+            except Exception as e:
+                logger.warning(f"Config invalidation listener error, retrying in {backoff:.0f}s: {e}")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+
+_bus: Optional[InvalidationBus] = None
+_bus_lock = threading.Lock()
+
+
+def get_invalidation_bus() -> InvalidationBus:
+    """Get or create the process-wide invalidation bus (singleton)."""
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                _bus = InvalidationBus(settings.redis_url if settings.config_pubsub_enabled else None)
+    return _bus
+
+
+def publish_invalidation(topic: str) -> Optional[int]:
+    """Invalidate ``topic`` in every worker (blocking Redis call)."""
+    return get_invalidation_bus().publish(topic)
@@ -0,0 +1,155 @@
+"""
+Dedicated thread pool for blocking MySQL work.
+
+The stores (ConversationStore, PromptStore, IgnorePatternStore, eval queries)
+use pymysql, which blocks the calling thread. Calling them from ``async def``
+routes directly stalls the event loop, so one slow dashboard query delays
+``/xianyu/inbound`` for every buyer. Routes await ``run_db`` instead:
+
+    rows = await run_db(store.get_recent_conversations, limit=20, offset=0)
+
+The pool is bounded (``settings.db_pool_workers``) and separate from the
+default executor used by ``asyncio.to_thread`` for agent runs and provider
+calls, so DB load cannot starve those and vice versa. Every call has a
+timeout (``settings.db_query_timeout``). A call still waiting in the queue
+when it times out is cancelled and never runs. A call that is already
+running keeps its worker until pymysql's read timeout fires.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from ai_kefu.config.settings import settings
+from ai_kefu.utils.logging import logger
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, float] = {
+    "submitted": 0,
+    "completed": 0,
+    "failed": 0,
+    "timeouts": 0,
+    "in_flight": 0,
+    "max_in_flight": 0,
+    "total_ms": 0.0,
+    "max_ms": 0.0,
+}
+
+
+class DBTimeoutError(TimeoutError):
+    """A database call did not finish within its timeout."""
+
+    def __init__(self, name: str, timeout: float):
+        super().__init__(f"Database call {name} timed out after {timeout:.1f}s")
+        self.name = name
+        self.timeout = timeout
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """Get or create the DB thread pool (singleton)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.db_pool_workers,
+                    thread_name_prefix="db",
+                )
+                logger.info(f"DB executor started with {settings.db_pool_workers} workers")
+    return _executor
+
+
+def _timed_call(fn: Callable[..., T]) -> T:
+    started = time.monotonic()
+    try:
+        return fn()
+    finally:
+        elapsed_ms = (time.monotonic() - started) * 1000
+        with _stats_lock:
+            _stats["total_ms"] += elapsed_ms
+            _stats["max_ms"] = max(_stats["max_ms"], elapsed_ms)
+
+
+async def run_db(
+    fn: Callable[..., T],
+    *args: Any,
+    timeout: Optional[float] = None,
+    **kwargs: Any,
+) -> T:
+    """
+    Run a blocking DB callable on the DB pool and await its result.
+
+    Args:
+        fn: Blocking callable (e.g. a store method)
+        *args, **kwargs: Arguments for ``fn``
+        timeout: Seconds to wait (default: settings.db_query_timeout; 0 = no limit)
+
+    Returns:
+        Whatever ``fn`` returns
+
+    Raises:
+        DBTimeoutError: The call did not finish in time
+        Exception: Anything raised by ``fn``
+    """
+    timeout = settings.db_query_timeout if timeout is None else timeout
+    name = getattr(fn, "__qualname__", repr(fn))
+    loop = asyncio.get_running_loop()
+
+    with _stats_lock:
+        _stats["submitted"] += 1
+        _stats["in_flight"] += 1
+        _stats["max_in_flight"] = max(_stats["max_in_flight"], _stats["in_flight"])
+    try:
+        future = loop.run_in_executor(get_db_executor(), _timed_call, partial(fn, *args, **kwargs))
+        result = await asyncio.wait_for(future, timeout or None)
+    except asyncio.TimeoutError:
+        with _stats_lock:
+            _stats["timeouts"] += 1
+        logger.warning(f"DB call {name} timed out after {timeout:.1f}s")
+        raise DBTimeoutError(name, timeout) from None
+    except Exception:
+        with _stats_lock:
+            _stats["failed"] += 1
+        raise
+    finally:
+        with _stats_lock:
+            _stats["in_flight"] -= 1
+
+    with _stats_lock:
+        _stats["completed"] += 1
+    return result
+
+
+def db_executor_stats() -> Dict[str, Any]:
+    """Call counts, in-flight calls and durations of the DB pool."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    done = snapshot["completed"] + snapshot["failed"] or 1
+    return {
+        "workers": settings.db_pool_workers,
+        "submitted": int(snapshot["submitted"]),
+        "completed": int(snapshot["completed"]),
+        "failed": int(snapshot["failed"]),
+        "timeouts": int(snapshot["timeouts"]),
+        "in_flight": int(snapshot["in_flight"]),
+        "max_in_flight": int(snapshot["max_in_flight"]),
+        "avg_ms": round(snapshot["total_ms"] / done, 1),
+        "max_ms": round(snapshot["max_ms"], 1),
+    }
+
+
+def shutdown_db_executor(wait: bool = False) -> None:
+    """Stop the DB pool (application shutdown)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait, cancel_futures=True)
+            _executor = None
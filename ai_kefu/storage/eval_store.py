@@ -0,0 +1,386 @@
+"""
+MySQL-based read storage for eval replay results.
+
+``scripts/eval_replay`` writes one ``eval_runs`` row per replayed message and,
+in the same transaction, bumps that run's row in ``eval_run_summaries``
+(see ``UPSERT_EVAL_RUN_SUMMARY_SQL``). The dashboard lists runs from the
+summary table instead of aggregating all of ``eval_runs`` per request.
+
+Run details are paged by keyset on (chat_id, source_conversation_id, id).
+The large JSON columns (context_messages, ai_tool_calls) are not sent in
+listings, which carry only their lengths. ``get_item`` returns them parsed
+for a single expanded row.
+"""
+
+import json
+import threading
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+import pymysql
+from pymysql.cursors import DictCursor
+
+try:
+    from ai_kefu.utils.logging import logger
+except ImportError:
+    from loguru import logger
+
+from ai_kefu.storage.keyset_cursor import decode_cursor, encode_cursor
+
+
+CREATE_EVAL_RUN_SUMMARIES_SQL = """
+    CREATE TABLE IF NOT EXISTS eval_run_summaries (
+        run_id VARCHAR(255) NOT NULL PRIMARY KEY,
+        tag VARCHAR(255) DEFAULT '',
+        ai_model VARCHAR(255),
+        started_at TIMESTAMP NULL,
+        finished_at TIMESTAMP NULL,
+        total_items INT NOT NULL DEFAULT 0,
+        success_count INT NOT NULL DEFAULT 0,
+        error_count INT NOT NULL DEFAULT 0,
+        skipped_count INT NOT NULL DEFAULT 0,
+        success_duration_ms_sum BIGINT NOT NULL DEFAULT 0 COMMENT 'Sum of ai_duration_ms over successful items',
+
+        INDEX idx_started_at (started_at)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    COMMENT='Per-run aggregates of eval_runs, maintained by eval_replay'
+"""
+
+# One new eval_runs row: (run_id, tag, ai_model, success, error, skipped, success_duration_ms)
+UPSERT_EVAL_RUN_SUMMARY_SQL = """
+    INSERT INTO eval_run_summaries (
+        run_id, tag, ai_model, started_at, finished_at,
+        total_items, success_count, error_count, skipped_count, success_duration_ms_sum
+    ) VALUES (%s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, 1, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        finished_at = CURRENT_TIMESTAMP,
+        total_items = total_items + 1,
+        success_count = success_count + VALUES(success_count),
+        error_count = error_count + VALUES(error_count),
+        skipped_count = skipped_count + VALUES(skipped_count),
+        success_duration_ms_sum = success_duration_ms_sum + VALUES(success_duration_ms_sum)
+"""
+
+# Recompute summaries from eval_runs; {where} is "" or "WHERE run_id = %s"
+REFRESH_EVAL_RUN_SUMMARIES_SQL = """
+    REPLACE INTO eval_run_summaries (
+        run_id, tag, ai_model, started_at, finished_at,
+        total_items, success_count, error_count, skipped_count, success_duration_ms_sum
+    )
+    SELECT
+        run_id, MAX(tag), MAX(ai_model), MIN(created_at), MAX(updated_at),
+        COUNT(*),
+        SUM(status = 'success'),
+        SUM(status = 'error'),
+        SUM(status = 'skipped'),
+        COALESCE(SUM(CASE WHEN status = 'success' THEN ai_duration_ms END), 0)
+    FROM eval_runs
+    {where}
+    GROUP BY run_id
+"""
+
+
+def eval_summary_values(run_id: str, tag: str, replay_result: Dict[str, Any]) -> tuple:
+    """Parameters of UPSERT_EVAL_RUN_SUMMARY_SQL for one saved eval result."""
+    status = replay_result.get("status", "error")
+    return (
+        run_id,
+        tag,
+        replay_result.get("ai_model"),
+        int(status == "success"),
+        int(status == "error"),
+        int(status == "skipped"),
+        (replay_result.get("ai_duration_ms") or 0) if status == "success" else 0,
+    )
+
+
+_SUMMARY_COLUMNS = """
+    run_id, tag, ai_model, started_at, finished_at,
+    total_items, success_count, error_count, skipped_count,
+    ROUND(success_duration_ms_sum / NULLIF(success_count, 0)) AS avg_duration_ms
+"""
+
+_ITEM_COLUMNS = """
+    id, run_id, tag, chat_id,
+    source_conversation_id,
+    user_message, human_reply, ai_reply,
+    COALESCE(JSON_LENGTH(context_messages), 0) AS context_count,
+    COALESCE(JSON_LENGTH(ai_tool_calls), 0) AS tool_call_count,
+    ai_session_id, ai_turn_count, ai_duration_ms, ai_model,
+    status, error_message,
+    created_at, updated_at
+"""
+
+_JSON_FIELDS = ("context_messages", "ai_tool_calls")
+
+
+def serialize_row(row: Dict[str, Any], parse_json: bool = False) -> Dict[str, Any]:
+    """Convert datetime/bytes/Decimal fields to JSON-safe types."""
+    for key, value in row.items():
+        if isinstance(value, datetime):
+            row[key] = value.isoformat()
+        elif isinstance(value, bytes):
+            row[key] = value.decode("utf-8", errors="replace")
+        elif isinstance(value, Decimal):
+            row[key] = int(value) if value == int(value) else float(value)
+    if parse_json:
+        for field in _JSON_FIELDS:
+            value = row.get(field)
+            if isinstance(value, str):
+                try:
+                    row[field] = json.loads(value)
+                except (json.JSONDecodeError, TypeError):
+                    pass
+    return row
+
+
+class EvalStore:
+    """
+    Eval run queries for the dashboard.
+
+    One connection per thread (routes call it on the DB thread pool).
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: str,
+        password: str,
+        database: str,
+        read_timeout: Optional[int] = None,
+    ):
+        self.config = {
+            'host': host,
+            'port': port,
+            'user': user,
+            'password': password,
+            'database': database,
+            'charset': 'utf8mb4',
+            'cursorclass': DictCursor,
+            'autocommit': True,
+        }
+        if read_timeout:
+            self.config['read_timeout'] = read_timeout
+        self._local = threading.local()
+        self._ensure_tables()
+
+    def _get_connection(self) -> pymysql.Connection:
+        conn = getattr(self._local, 'connection', None)
+        if conn is not None:
+            try:
+                conn.ping(reconnect=True)
+                return conn
+            except Exception:
+                pass
+        conn = pymysql.connect(**self.config)
+        self._local.connection = conn
+        return conn
+
+    def _ensure_tables(self) -> None:
+        """Create eval_run_summaries (backfilled from eval_runs) and the keyset index."""
+        try:
+            conn = self._get_connection()
+            with conn.cursor() as cursor:
+                cursor.execute("SHOW TABLES LIKE 'eval_run_summaries'")
+                existed = cursor.fetchone() is not None
+                cursor.execute(CREATE_EVAL_RUN_SUMMARIES_SQL)
+                cursor.execute("SHOW TABLES LIKE 'eval_runs'")
+                if cursor.fetchone() is None:
+                    return  # created by scripts/eval_replay on first run
+                if not existed:
+                    cursor.execute(REFRESH_EVAL_RUN_SUMMARIES_SQL.format(where=""))
+                    logger.info(f"Backfilled eval_run_summaries for {cursor.rowcount} runs")
+                ensure_eval_keyset_index(cursor)
+        except Exception as e:
+            logger.error(f"Failed to ensure eval tables: {e}")
+
+    # ============================================================
+    # Queries
+    # ============================================================
+
+    def list_runs(self, limit: int = 50, offset: int = 0, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        List eval runs, newest first.
+
+        Returns:
+            Dict with 'items', 'total' and 'next_cursor' (None on the last page)
+        """
+        conditions = ["1=1"]
+        params: List[Any] = []
+        position = decode_cursor(cursor, "eval") if cursor else None
+        if position is not None:
+            conditions.append("(started_at < %s OR (started_at = %s AND run_id < %s))")
+            params += [position['t'], position['t'], position['id']]
+
+        sql = f"""
+            SELECT {_SUMMARY_COLUMNS}
+            FROM eval_run_summaries
+            WHERE {" AND ".join(conditions)}
+            ORDER BY started_at DESC, run_id DESC
+            LIMIT %s
+        """
+        params.append(limit + 1)
+        if position is None and offset:
+            sql += " OFFSET %s"
+            params.append(offset)
+
+        conn = self._get_connection()
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) AS total FROM eval_run_summaries")
+            total = cur.fetchone()["total"]
+            cur.execute(sql, params)
+            items = list(cur.fetchall())
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            started = last["started_at"]
+            next_cursor = encode_cursor({
+                "t": started.isoformat(sep=" ") if isinstance(started, datetime) else started,
+                "id": last["run_id"],
+            })
+        return {"total": total, "items": [serialize_row(i) for i in items], "next_cursor": next_cursor}
+
+    def get_run_summary(self, run_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._get_connection()
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT {_SUMMARY_COLUMNS} FROM eval_run_summaries WHERE run_id = %s", (run_id,))
+            summary = cur.fetchone()
+        return serialize_row(summary) if summary else None
+
+    def get_run_items(
+        self,
+        run_id: str,
+        status_filter: Optional[str] = None,
+        chat_id_filter: Optional[str] = None,
+        limit: int = 500,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+        include_json: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Page through one run's items, ordered by chat_id then source order.
+
+        Args:
+            run_id: Eval run ID
+            status_filter: Only items with this status
+            chat_id_filter: Only items of this chat
+            limit: Page size
+            offset: Pagination offset (deprecated, ignored when cursor is given)
+            cursor: Opaque keyset cursor from a previous page's ``next_cursor``
+            include_json: Also return parsed context_messages / ai_tool_calls
+
+        Returns:
+            Dict with 'summary', 'items', 'next_cursor' and, for the first
+            page only, 'total' (None on later pages)
+        """
+        conditions = ["run_id = %s"]
+        params: List[Any] = [run_id]
+        if status_filter:
+            conditions.append("status = %s")
+            params.append(status_filter)
+        if chat_id_filter:
+            conditions.append("chat_id = %s")
+            params.append(chat_id_filter)
+        filter_where = " AND ".join(conditions)
+        filter_params = list(params)
+
+        position = decode_cursor(cursor, "eval") if cursor else None
+        if position is not None:
+            conditions.append(
+                "(chat_id, source_conversation_id, id) > (%s, %s, %s)"
+            )
+            params += [position["c"], position["s"], position["id"]]
+
+        columns = _ITEM_COLUMNS + (", context_messages, ai_tool_calls" if include_json else "")
+        sql = f"""
+            SELECT {columns}
+            FROM eval_runs
+            WHERE {" AND ".join(conditions)}
+            ORDER BY chat_id, source_conversation_id, id
+            LIMIT %s
+        """
+        params.append(limit + 1)
+        if position is None and offset:
+            sql += " OFFSET %s"
+            params.append(offset)
+
+        summary = self.get_run_summary(run_id)
+        total = None
+        conn = self._get_connection()
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            items = list(cur.fetchall())
+            if position is None:
+                if summary and not chat_id_filter:
+                    # Totals come from the summary row unless filtering by chat
+                    total = summary["total_items"] if not status_filter else summary.get(f"{status_filter}_count")
+                if total is None:
+                    cur.execute(f"SELECT COUNT(*) AS total FROM eval_runs WHERE {filter_where}", filter_params)
+                    total = cur.fetchone()["total"]
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            next_cursor = encode_cursor({
+                "c": last["chat_id"], "s": last["source_conversation_id"], "id": last["id"],
+            })
+
+        return {
+            "summary": summary,
+            "total": total,
+            "items": [serialize_row(i, parse_json=include_json) for i in items],
+            "next_cursor": next_cursor,
+        }
+
+    def get_item(self, run_id: str, item_id: int) -> Optional[Dict[str, Any]]:
+        """One eval item with its JSON fields parsed (for an expanded row)."""
+        conn = self._get_connection()
+        with conn.cursor() as cur:
+            cur.execute(
+                f"SELECT {_ITEM_COLUMNS}, context_messages, ai_tool_calls "
+                f"FROM eval_runs WHERE id = %s AND run_id = %s",
+                (item_id, run_id),
+            )
+            row = cur.fetchone()
+        return serialize_row(row, parse_json=True) if row else None
+
+    def get_run_chats(self, run_id: str) -> List[Dict[str, Any]]:
+        """Distinct chat_ids within a run with per-chat counts."""
+        conn = self._get_connection()
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT
+                    chat_id,
+                    COUNT(*) AS message_count,
+                    SUM(status = 'success') AS success_count,
+                    SUM(status = 'error')   AS error_count
+                FROM eval_runs
+                WHERE run_id = %s
+                GROUP BY chat_id
+                ORDER BY chat_id
+                """,
+                (run_id,),
+            )
+            return [serialize_row(r) for r in cur.fetchall()]
+
+
+def ensure_eval_keyset_index(cursor) -> None:
+    """Add the (run_id, chat_id, source_conversation_id, id) index used by run detail paging."""
+    cursor.execute("""
+        SELECT INDEX_NAME FROM INFORMATION_SCHEMA.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND TABLE_NAME = 'eval_runs'
+          AND INDEX_NAME = 'idx_run_chat_source'
+    """)
+    if not cursor.fetchone():
+        cursor.execute("""
+            ALTER TABLE eval_runs
+            ADD INDEX idx_run_chat_source (run_id, chat_id, source_conversation_id, id)
+        """)
+        logger.info("Added 'idx_run_chat_source' index to eval_runs table")
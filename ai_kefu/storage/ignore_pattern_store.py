@@ -4,18 +4,27 @@ MySQL-based storage for message ignore patterns.
 Stores patterns that should be skipped by the message handler
 (e.g., system messages like [图片], [买家已确认退回金额] etc.).
 
-Includes an in-memory cache that auto-refreshes to avoid querying
-MySQL on every incoming message.
+Each pattern is matched exactly, as a substring or as a regex (match_type).
+Active patterns are compiled into an IgnoreMatcher held by an in-memory
+ConfigCache, so the per-message check never queries MySQL: stale caches are
+reloaded and recompiled on a background thread, and edits in any API worker
+are broadcast via storage.config_cache.
 """
 
-import threading
-import time
-from typing import List, Optional, Dict, Any, Set
+from typing import List, Optional, Dict, Any
 from datetime import datetime
 import pymysql
 from pymysql.cursors import DictCursor
 from contextlib import contextmanager
 
+from ai_kefu.storage.config_cache import ConfigCache
+from ai_kefu.storage.pattern_matcher import (
+    MATCH_EXACT,
+    IgnoreMatch,
+    IgnoreMatcher,
+    IgnoreRule,
+)
+
 try:
     from ai_kefu.utils.logging import logger
 except ImportError:
@@ -32,12 +41,14 @@ class IgnorePattern:
         description: Optional[str] = None,
         active: bool = True,
         created_at: Optional[datetime] = None,
-        updated_at: Optional[datetime] = None
+        updated_at: Optional[datetime] = None,
+        match_type: str = MATCH_EXACT
     ):
         self.id = id
         self.pattern = pattern
         self.description = description
         self.active = active
+        self.match_type = match_type
         self.created_at = created_at
         self.updated_at = updated_at
 
@@ -48,8 +59,9 @@ class IgnorePatternStore:
 
     Features:
     - CRUD operations for ignore patterns
-    - In-memory cache of active patterns (refreshed every 60s)
-    - Thread-safe cache access
+    - exact / contains / regex matching via a compiled IgnoreMatcher
+    - In-memory cache of the matcher (background rebuild every cache_ttl seconds)
+    - Lock-free reads on the hot path
     """
 
     def __init__(
@@ -71,9 +83,9 @@ class IgnorePatternStore:
             'cursorclass': DictCursor
         }
         self._cache_ttl = cache_ttl
-        self._cache: Set[str] = set()
-        self._cache_lock = threading.Lock()
-        self._cache_last_refresh: float = 0.0
+        self._cache: ConfigCache[IgnoreMatcher] = ConfigCache(
+            "ignore_patterns", self._load_active_patterns, cache_ttl
+        )
 
         # Ensure table exists
         self._ensure_table()
@@ -131,11 +143,20 @@ class IgnorePatternStore:
                             pattern VARCHAR(500) NOT NULL COMMENT '要忽略的消息内容',
                             description VARCHAR(500) DEFAULT NULL COMMENT '描述说明',
                             active BOOLEAN NOT NULL DEFAULT TRUE COMMENT '是否启用',
+                            match_type VARCHAR(16) NOT NULL DEFAULT 'exact' COMMENT '匹配方式: exact/contains/regex',
                             created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
                             updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
                             UNIQUE KEY uk_pattern (pattern)
                         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
                     """)
+                    # Migrate tables created before match_type existed
+                    cursor.execute("SHOW COLUMNS FROM ignore_patterns LIKE 'match_type'")
+                    if not cursor.fetchone():
+                        cursor.execute("""
+                            ALTER TABLE ignore_patterns
+                            ADD COLUMN match_type VARCHAR(16) NOT NULL DEFAULT 'exact'
+                            COMMENT '匹配方式: exact/contains/regex' AFTER active
+                        """)
                     # Remove order-trigger patterns that may have been seeded by a
                     # previous buggy version — these strings must reach the order
                     # detection handler and must never be filtered here.
@@ -161,56 +182,65 @@ class IgnorePatternStore:
     # Cache
     # ============================================================
 
+    def _load_active_patterns(self) -> IgnoreMatcher:
+        """Load the active patterns from MySQL and compile them into a matcher."""
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT id, pattern, match_type FROM ignore_patterns WHERE active = TRUE"
+                )
+                rows = cursor.fetchall()
+        matcher = IgnoreMatcher(
+            IgnoreRule(row['id'], row['pattern'], row.get('match_type') or MATCH_EXACT)
+            for row in rows
+        )
+        for rule, error in matcher.invalid_rules:
+            logger.warning(f"Skipping invalid ignore regex id={rule.id} '{rule.pattern}': {error}")
+        logger.debug(f"Ignore pattern cache refreshed: {len(matcher)} active patterns {matcher.stats()}")
+        return matcher
+
     def _refresh_cache(self):
-        """Refresh the in-memory set of active patterns from MySQL."""
+        """Recompile the in-memory matcher from MySQL (blocking)."""
         try:
-            with self.get_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        "SELECT pattern FROM ignore_patterns WHERE active = TRUE"
-                    )
-                    rows = cursor.fetchall()
-                    new_cache = {row['pattern'] for row in rows}
-
-            with self._cache_lock:
-                self._cache = new_cache
-                self._cache_last_refresh = time.monotonic()
-
-            logger.debug(f"Ignore pattern cache refreshed: {len(new_cache)} active patterns")
+            self._cache.refresh()
         except Exception as e:
             logger.error(f"Failed to refresh ignore pattern cache: {e}")
 
-    def _maybe_refresh_cache(self):
-        """Refresh cache if TTL has expired."""
-        now = time.monotonic()
-        if now - self._cache_last_refresh > self._cache_ttl:
-            self._refresh_cache()
+    def invalidate_cache(self, version: Optional[int] = None):
+        """
+        Schedule a background cache reload.
 
-    def invalidate_cache(self):
-        """Force cache refresh (call after create/update/delete)."""
-        self._refresh_cache()
+        Subscribed to the invalidation bus; create/update/delete in this
+        process reload synchronously instead.
+        """
+        self._cache.invalidate(version)
 
-    def should_ignore(self, content: str) -> bool:
+    def match(self, content: str) -> Optional[IgnoreMatch]:
         """
-        Check if a message content matches any active ignore pattern.
+        Find the active ignore pattern matching a message content.
 
         This is the hot-path method called for every incoming message.
-        Uses in-memory cache for O(1) lookup.
+        Uses the cached compiled matcher and never waits on MySQL
+        (after the initial load).
 
         Args:
             content: Message content to check
 
         Returns:
-            True if the message should be ignored
+            The rule that fired, or None if the message should be processed
         """
         if not content:
-            return False
+            return None
 
-        self._maybe_refresh_cache()
+        try:
+            matcher = self._cache.get()
+        except Exception:
+            return None  # never loaded (MySQL down at startup): ignore nothing
+        return matcher.match(content)
 
-        stripped = content.strip()
-        with self._cache_lock:
-            return stripped in self._cache
+    def should_ignore(self, content: str) -> bool:
+        """Check if a message content matches any active ignore pattern."""
+        return self.match(content) is not None
 
     # ============================================================
     # CRUD
@@ -222,14 +252,15 @@ class IgnorePatternStore:
             with self.get_connection() as conn:
                 with conn.cursor() as cursor:
                     sql = """
-                        INSERT INTO ignore_patterns (pattern, description, active, created_at, updated_at)
-                        VALUES (%s, %s, %s, %s, %s)
+                        INSERT INTO ignore_patterns (pattern, description, active, match_type, created_at, updated_at)
+                        VALUES (%s, %s, %s, %s, %s, %s)
                     """
                     now = datetime.utcnow()
                     cursor.execute(sql, (
                         pattern.pattern.strip(),
                         pattern.description,
                         pattern.active,
+                        pattern.match_type,
                         now,
                         now
                     ))
@@ -237,7 +268,7 @@ class IgnorePatternStore:
                     pattern.created_at = now
                     pattern.updated_at = now
 
-            self.invalidate_cache()
+            self._refresh_cache()
             logger.info(f"Created ignore pattern: id={pattern.id}, pattern='{pattern.pattern}'")
             return pattern
 
@@ -267,7 +298,7 @@ class IgnorePatternStore:
             update_values = []
 
             for key, value in updates.items():
-                if key in ('pattern', 'description', 'active'):
+                if key in ('pattern', 'description', 'active', 'match_type'):
                     update_fields.append(f"{key} = %s")
                     if key == 'pattern':
                         value = value.strip()
@@ -283,7 +314,7 @@ class IgnorePatternStore:
                     sql = f"UPDATE ignore_patterns SET {', '.join(update_fields)}, updated_at = NOW() WHERE id = %s"
                     cursor.execute(sql, update_values)
 
-            self.invalidate_cache()
+            self._refresh_cache()
             return self.get(pattern_id)
 
         except Exception as e:
@@ -299,7 +330,7 @@ class IgnorePatternStore:
                     deleted = cursor.rowcount > 0
 
             if deleted:
-                self.invalidate_cache()
+                self._refresh_cache()
             return deleted
 
         except Exception as e:
@@ -348,5 +379,6 @@ class IgnorePatternStore:
             description=row.get('description'),
             active=row.get('active', True),
             created_at=row.get('created_at'),
-            updated_at=row.get('updated_at')
+            updated_at=row.get('updated_at'),
+            match_type=row.get('match_type') or MATCH_EXACT
         )
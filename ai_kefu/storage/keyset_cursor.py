@@ -0,0 +1,41 @@
+"""
+Opaque cursors for keyset ("seek") pagination.
+
+A cursor is the sort key of the last row on a page (e.g. ``{"s": 101, "id": 11}``)
+as compact JSON in URL-safe base64 without padding. Every position carries the
+row ``id`` as the final tie-breaker.
+"""
+
+import base64
+import json
+from typing import Any, Dict, Optional
+
+try:
+    from ai_kefu.utils.logging import logger
+except ImportError:
+    from loguru import logger
+
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    """Encode the sort key of the last row on a page."""
+    raw = json.dumps(position, separators=(",", ":"), ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str = "page") -> Optional[Dict[str, Any]]:
+    """
+    Decode a cursor from ``encode_cursor``.
+
+    Args:
+        cursor: Cursor string from the client
+        kind: What the cursor pages through, for the warning on bad input
+
+    Returns:
+        The position, or None when the cursor is malformed (start from the first page)
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return position if isinstance(position, dict) and "id" in position else None
+    except Exception:
+        logger.warning(f"Ignoring invalid {kind} cursor: {cursor!r}")
+        return None
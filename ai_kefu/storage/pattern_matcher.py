@@ -0,0 +1,202 @@
+"""
+Compiled matcher for message ignore patterns.
+
+Every active rule has a match type:
+- ``exact``: the stripped message equals the pattern (hash lookup)
+- ``contains``: the pattern occurs anywhere in the message (Aho-Corasick)
+- ``regex``: the pattern matches somewhere in the message (``re.search``)
+
+``IgnoreMatcher`` is built once per cache load, on the ConfigCache refresh
+thread, so the per-message cost does not grow with the number of exact and
+substring rules: one dict lookup plus one pass over the text. All regex rules
+are folded into a single alternation so the message is scanned once, and the
+named group that matched identifies the rule that fired.
+"""
+
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+MATCH_EXACT = "exact"
+MATCH_CONTAINS = "contains"
+MATCH_REGEX = "regex"
+MATCH_TYPES = (MATCH_EXACT, MATCH_CONTAINS, MATCH_REGEX)
+
+# Regexes referring to their own groups cannot share one alternation
+_BACKREF_RE = re.compile(r"\\[1-9]|\(\?P=")
+
+
+@dataclass(frozen=True)
+class IgnoreRule:
+    """One active ignore pattern."""
+    id: Optional[int]
+    pattern: str
+    match_type: str = MATCH_EXACT
+
+
+@dataclass(frozen=True)
+class IgnoreMatch:
+    """The rule that fired and the text it matched."""
+    rule: IgnoreRule
+    matched: str
+
+
+def validate_regex(pattern: str) -> Optional[str]:
+    """Return an error message when ``pattern`` is not a valid regex."""
+    try:
+        re.compile(pattern)
+    except re.error as e:
+        return str(e)
+    return None
+
+
+class AhoCorasick(Generic[T]):
+    """
+    Aho-Corasick automaton over a fixed set of keywords.
+
+    ``search`` reports the keyword ending earliest in the text in a single
+    pass, independent of how many keywords were added.
+    """
+
+    def __init__(self, keywords: Iterable[Tuple[str, T]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Payload of a keyword ending at the node, or at one of its suffixes
+        self._out: List[Optional[Tuple[str, T]]] = [None]
+        self.size = 0
+
+        for word, payload in keywords:
+            if not word:
+                continue
+            node = 0
+            for ch in word:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(None)
+                node = nxt
+            if self._out[node] is None:
+                self._out[node] = (word, payload)
+                self.size += 1
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                if self._out[child] is None:
+                    self._out[child] = self._out[self._fail[child]]
+
+    def search(self, text: str) -> Optional[Tuple[str, T]]:
+        """First ``(keyword, payload)`` found in ``text``, or None."""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node] is not None:
+                return out[node]
+        return None
+
+
+class IgnoreMatcher:
+    """
+    All active ignore rules, compiled once per cache load.
+
+    Rules whose regex does not compile are skipped and listed in
+    ``invalid_rules`` instead of breaking the whole filter.
+    """
+
+    def __init__(self, rules: Iterable[IgnoreRule]):
+        self._exact: Dict[str, IgnoreRule] = {}
+        contains: List[Tuple[str, IgnoreRule]] = []
+        combined: List[str] = []
+        self._groups: Dict[str, IgnoreRule] = {}
+        self._standalone: List[Tuple[re.Pattern, IgnoreRule]] = []
+        self.invalid_rules: List[Tuple[IgnoreRule, str]] = []
+        self.rule_count = 0
+
+        for rule in rules:
+            pattern = rule.pattern.strip() if rule.match_type != MATCH_REGEX else rule.pattern
+            if not pattern:
+                continue
+            self.rule_count += 1
+            if rule.match_type == MATCH_CONTAINS:
+                contains.append((pattern, rule))
+            elif rule.match_type == MATCH_REGEX:
+                try:
+                    compiled = re.compile(pattern)
+                except re.error as e:
+                    self.invalid_rules.append((rule, str(e)))
+                    continue
+                if compiled.groupindex or _BACKREF_RE.search(pattern):
+                    self._standalone.append((compiled, rule))
+                else:
+                    name = f"r{len(self._groups)}"
+                    self._groups[name] = rule
+                    combined.append(f"(?P<{name}>{pattern})")
+            else:
+                self._exact.setdefault(pattern, rule)
+
+        self._contains: Optional[AhoCorasick[IgnoreRule]] = AhoCorasick(contains) if contains else None
+        self._combined: Optional[re.Pattern] = None
+        if combined:
+            try:
+                self._combined = re.compile("|".join(combined))
+            except re.error:
+                # e.g. inline global flags such as "(?i)" only compile on their own
+                self._standalone[:0] = [(re.compile(r.pattern), r) for r in self._groups.values()]
+                self._groups = {}
+
+    def match(self, content: str) -> Optional[IgnoreMatch]:
+        """Return the first rule matching ``content`` (exact, then contains, then regex)."""
+        if not content:
+            return None
+        text = content.strip()
+
+        rule = self._exact.get(text)
+        if rule is not None:
+            return IgnoreMatch(rule, text)
+
+        if self._contains is not None:
+            found = self._contains.search(text)
+            if found is not None:
+                return IgnoreMatch(found[1], found[0])
+
+        if self._combined is not None:
+            m = self._combined.search(text)
+            if m is not None:
+                rule = self._groups.get(m.lastgroup)
+                if rule is None:
+                    name = next(k for k, v in m.groupdict().items() if v is not None and k in self._groups)
+                    rule = self._groups[name]
+                return IgnoreMatch(rule, m.group(0))
+
+        for compiled, rule in self._standalone:
+            m = compiled.search(text)
+            if m is not None:
+                return IgnoreMatch(rule, m.group(0))
+        return None
+
+    def __len__(self) -> int:
+        return self.rule_count
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "exact": len(self._exact),
+            "contains": self._contains.size if self._contains is not None else 0,
+            "regex": len(self._groups) + len(self._standalone),
+            "invalid": len(self.invalid_rules),
+        }
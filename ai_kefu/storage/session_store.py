@@ -1,134 +1,361 @@
 """
 Redis session store implementation.
 Handles session persistence with TTL.
+
+Layout (append-oriented, so per-turn writes scale with the new messages only):
+
+    session:{id}:meta   hash  header -> Session JSON without messages
+                              version -> write counter for optimistic concurrency
+    session:{id}:msgs   list  one Message JSON per element, oldest first
+
+Sessions written by older versions as a single JSON string under
+``session:{id}`` are still readable and are migrated on their next save.
+
+Persisted messages are treated as immutable: ``set`` appends messages added
+since the last load/save and trims messages dropped from the front (context
+summarization). Any other change to the message list triggers a full rewrite.
+
+Writes are optimistic: ``set`` only succeeds if nobody else saved the
+session since it was loaded. On a conflict the session is rebased onto the
+stored copy (this writer's new messages are re-appended after the other
+writer's) and the write is retried, so two overlapping runs on the same
+session keep both sets of messages.
 """
 
-import redis
 import json
-from typing import Optional
-from ai_kefu.models.session import Session
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import redis
+
+from ai_kefu.models.session import Message, Session
 from ai_kefu.config.settings import settings
+from ai_kefu.utils.logging import logger
+from ai_kefu.utils.metrics import SESSION_SAVE_CONFLICTS
+
+
+@dataclass
+class _PersistState:
+    """What this process last read from / wrote to Redis for one session."""
+    version: int
+    messages: List[Message] = field(default_factory=list)
 
 
 class SessionStore:
     """Redis-based session storage."""
-    
-    def __init__(self, redis_url: Optional[str] = None, ttl: Optional[int] = None):
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        ttl: Optional[int] = None,
+        conflict_retries: int = 3,
+    ):
         """
         Initialize session store.
-        
+
         Args:
             redis_url: Redis connection URL (defaults to settings.redis_url)
             ttl: Session TTL in seconds (defaults to settings.redis_session_ttl)
+            conflict_retries: Rebase-and-retry attempts when another writer
+                saved the session first
         """
         self.redis_url = redis_url or settings.redis_url
         self.ttl = ttl or settings.redis_session_ttl
+        self.conflict_retries = conflict_retries
         self.client = redis.from_url(self.redis_url, decode_responses=True)
-    
+
     def _get_key(self, session_id: str) -> str:
-        """Generate Redis key for session."""
+        """Generate Redis key for session (legacy single-JSON layout)."""
         return f"session:{session_id}"
-    
+
+    def _meta_key(self, session_id: str) -> str:
+        return f"session:{session_id}:meta"
+
+    def _msgs_key(self, session_id: str) -> str:
+        return f"session:{session_id}:msgs"
+
     def get(self, session_id: str) -> Optional[Session]:
         """
         Retrieve session by ID.
-        
+
         Args:
             session_id: Session ID
-            
+
         Returns:
             Session object if found, None otherwise
         """
-        key = self._get_key(session_id)
-        data = self.client.get(key)
-        
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hgetall(self._meta_key(session_id))
+        pipe.lrange(self._msgs_key(session_id), 0, -1)
+        meta, raw_messages = pipe.execute()
+
+        if not meta:
+            return self._get_legacy(session_id)
+
+        try:
+            data = json.loads(meta["header"])
+            data["messages"] = [json.loads(m) for m in raw_messages]
+            session = Session.model_validate(data)
+        except Exception as e:
+            logger.error(f"Error deserializing session {session_id}: {e}")
+            return None
+
+        session._store_state = _PersistState(
+            version=int(meta.get("version", 0)),
+            messages=list(session.messages),
+        )
+        return session
+
+    def _get_legacy(self, session_id: str) -> Optional[Session]:
+        data = self.client.get(self._get_key(session_id))
         if data is None:
             return None
-        
         try:
+            # No _store_state: the next set() writes the new layout in full
             return Session.model_validate_json(data)
         except Exception as e:
-            # Log error and return None
-            print(f"Error deserializing session {session_id}: {e}")
+            logger.error(f"Error deserializing session {session_id}: {e}")
             return None
-    
+
     def set(self, session: Session) -> bool:
         """
         Save session with TTL.
-        
+
+        Only messages appended since the session was loaded (or last saved)
+        are pushed; messages removed from the front are trimmed in the same
+        transaction. If another writer saved the same session in the
+        meantime, ``session`` is rebased onto the stored copy (see
+        ``_rebase``) and the write is retried up to ``conflict_retries`` times.
+
         Args:
             session: Session object to save
-            
+
         Returns:
-            True if successful
+            True if successful, False on error or when conflicts persisted
+            after all retries
         """
-        key = self._get_key(session.session_id)
-        
+        for attempt in range(self.conflict_retries + 1):
+            saved = self._write(session)
+            if saved is not None:
+                if attempt:
+                    SESSION_SAVE_CONFLICTS.inc(outcome="rebased")
+                return saved
+            if attempt < self.conflict_retries and not self._rebase(session):
+                break
+
+        SESSION_SAVE_CONFLICTS.inc(outcome="lost")
+        logger.error(
+            f"Session {session.session_id} save lost after {self.conflict_retries} "
+            f"concurrent-write retries"
+        )
+        return False
+
+    def _write(self, session: Session) -> Optional[bool]:
+        """One optimistic write: True / False on success / error, None on a version conflict."""
+        session_id = session.session_id
+        meta_key = self._meta_key(session_id)
+        msgs_key = self._msgs_key(session_id)
+        state: Optional[_PersistState] = session._store_state
+        expected_version = state.version if state else 0
+        delta = self._plan_delta(state, session.messages)
+
         try:
-            data = session.model_dump_json()
-            self.client.setex(key, self.ttl, data)
-            return True
+            header = session.model_dump_json(exclude={"messages"})
+            with self.client.pipeline(transaction=True) as pipe:
+                pipe.watch(meta_key)
+                remote_version = int(pipe.hget(meta_key, "version") or 0)
+                if remote_version != expected_version:
+                    pipe.unwatch()
+                    logger.warning(
+                        f"Session {session_id} was modified concurrently "
+                        f"(expected version {expected_version}, found {remote_version})"
+                    )
+                    return None
+
+                pipe.multi()
+                if delta is None:
+                    pipe.delete(msgs_key, self._get_key(session_id))
+                    new_messages = session.messages
+                else:
+                    trim, new_messages = delta
+                    if trim:
+                        pipe.ltrim(msgs_key, trim, -1)
+                if new_messages:
+                    pipe.rpush(msgs_key, *(m.model_dump_json() for m in new_messages))
+                pipe.hset(meta_key, mapping={
+                    "header": header,
+                    "version": expected_version + 1,
+                })
+                pipe.expire(meta_key, self.ttl)
+                pipe.expire(msgs_key, self.ttl)
+                pipe.execute()
+        except redis.WatchError:
+            logger.warning(f"Session {session_id} was modified concurrently")
+            return None
         except Exception as e:
-            print(f"Error saving session {session.session_id}: {e}")
+            logger.error(f"Error saving session {session_id}: {e}")
             return False
-    
+
+        session._store_state = _PersistState(
+            version=expected_version + 1,
+            messages=list(session.messages),
+        )
+        return True
+
+    def _rebase(self, session: Session) -> bool:
+        """
+        Replay this writer's changes on top of the copy another writer saved.
+
+        The stored messages are taken as the base; messages this writer
+        trimmed from the front are dropped from it if they are still there,
+        and the messages it appended since its last load/save go after the
+        other writer's. Without a record of what this writer loaded, its
+        messages are merged by content instead, so stored ones are never
+        overwritten. Header fields (status, turn counter, ...) keep this
+        writer's values; context keys only the other writer set are kept.
+
+        Returns:
+            False if the stored copy could not be read
+        """
+        remote = self.get(session.session_id)
+        if remote is None:
+            if self.client.exists(self._meta_key(session.session_id)):
+                return False
+            # Deleted in the meantime: write this session from scratch
+            session._store_state = None
+            return True
+
+        state: Optional[_PersistState] = session._store_state
+        delta = self._plan_delta(state, session.messages)
+        if delta is None:
+            # No usable record of what this writer loaded (legacy or brand-new
+            # session, or a rewritten list): keep everything stored and add
+            # the local messages the stored copy does not already have
+            base = remote.messages
+            stored = Counter(m.model_dump_json() for m in base)
+            new_messages = []
+            for m in session.messages:
+                key = m.model_dump_json()
+                if stored[key]:
+                    stored[key] -= 1
+                else:
+                    new_messages.append(m)
+        else:
+            trim, new_messages = delta
+            base = remote.messages
+            if trim and [m.model_dump() for m in base[:trim]] == [
+                m.model_dump() for m in state.messages[:trim]
+            ]:
+                base = base[trim:]
+
+        session.messages = base + new_messages
+        session.context = {**remote.context, **session.context}
+        # Only remote.messages objects count as persisted, so _plan_delta
+        # trims what was dropped from the base and appends new_messages
+        session._store_state = remote._store_state
+        logger.info(
+            f"Session {session.session_id}: rebased {len(new_messages)} new messages "
+            f"onto {len(base)} stored ones"
+        )
+        return True
+
+    @staticmethod
+    def _plan_delta(
+        state: Optional[_PersistState], messages: List[Message]
+    ) -> Optional[Tuple[int, List[Message]]]:
+        """
+        Work out how the current message list relates to what is in Redis.
+
+        Returns:
+            ``(trim, new_messages)`` when the current list is the persisted list
+            with ``trim`` messages dropped from the front and ``new_messages``
+            appended; ``None`` when a full rewrite is needed.
+        """
+        if state is None:
+            return None
+        persisted = state.messages
+        n = len(persisted)
+
+        trim = n
+        if messages:
+            trim = next((i for i, m in enumerate(persisted) if m is messages[0]), n)
+        kept = n - trim
+        if len(messages) < kept:
+            return None
+        if any(messages[i] is not persisted[trim + i] for i in range(kept)):
+            return None
+        # Everything after the kept prefix must be new (not re-ordered old messages)
+        persisted_ids = {id(m) for m in persisted}
+        new_messages = messages[kept:]
+        if any(id(m) in persisted_ids for m in new_messages):
+            return None
+        return trim, new_messages
+
     def delete(self, session_id: str) -> bool:
         """
         Delete session.
-        
+
         Args:
             session_id: Session ID
-            
+
         Returns:
             True if deleted, False if not found
         """
-        key = self._get_key(session_id)
-        result = self.client.delete(key)
+        result = self.client.delete(
+            self._meta_key(session_id),
+            self._msgs_key(session_id),
+            self._get_key(session_id),
+        )
         return result > 0
-    
+
     def exists(self, session_id: str) -> bool:
         """
         Check if session exists.
-        
+
         Args:
             session_id: Session ID
-            
+
         Returns:
             True if exists
         """
-        key = self._get_key(session_id)
-        return self.client.exists(key) > 0
-    
+        return self.client.exists(self._meta_key(session_id), self._get_key(session_id)) > 0
+
     def get_ttl(self, session_id: str) -> int:
         """
         Get remaining TTL for session.
-        
+
         Args:
             session_id: Session ID
-            
+
         Returns:
             TTL in seconds, -1 if no expiration, -2 if not found
         """
-        key = self._get_key(session_id)
-        return self.client.ttl(key)
-    
+        ttl = self.client.ttl(self._meta_key(session_id))
+        if ttl == -2:
+            ttl = self.client.ttl(self._get_key(session_id))
+        return ttl
+
     def refresh_ttl(self, session_id: str) -> bool:
         """
         Refresh TTL for session.
-        
+
         Args:
             session_id: Session ID
-            
+
         Returns:
             True if successful
         """
-        key = self._get_key(session_id)
-        return self.client.expire(key, self.ttl)
-    
+        pipe = self.client.pipeline(transaction=True)
+        pipe.expire(self._meta_key(session_id), self.ttl)
+        pipe.expire(self._msgs_key(session_id), self.ttl)
+        pipe.expire(self._get_key(session_id), self.ttl)
+        return any(pipe.execute())
+
     def ping(self) -> bool:
         """
         Check Redis connection.
-        
+
         Returns:
             True if connected
         """
@@ -0,0 +1,16 @@
+"""
+Shared pytest setup.
+
+Test runs must not write into ai_kefu/logs: logs and traces go to a
+throwaway directory and tracing is off unless a test turns it on
+(test_tracing.py does, with its own tmp_path exporter). This runs before
+any ai_kefu module is imported, so settings pick the overrides up.
+"""
+
+import os
+import tempfile
+
+_RUNTIME_DIR = tempfile.mkdtemp(prefix="ai_kefu_tests_")
+os.environ["LOG_DIR"] = _RUNTIME_DIR
+os.environ["TRACING_DIR"] = _RUNTIME_DIR
+os.environ["TRACING_ENABLED"] = "false"
@@ -0,0 +1,121 @@
+"""
+Unit tests for budget-driven context packing.
+"""
+
+import json
+
+from ai_kefu.agent.context_packer import elide_tool_result, pack_context
+from ai_kefu.llm.tokenizer import count_tokens
+from ai_kefu.models.session import Message, ToolCall
+from ai_kefu.config.constants import MessageRole
+
+
+def _tool_exchange(i, result):
+    call = ToolCall(id=f"call_{i}", name="check_availability", args={"day": i})
+    return [
+        Message(role=MessageRole.USER, content=f"第{i}天有货吗"),
+        Message(role=MessageRole.ASSISTANT, content="", tool_calls=[call]),
+        Message(role=MessageRole.TOOL, content=result, tool_call_id=f"call_{i}"),
+        Message(role=MessageRole.ASSISTANT, content=f"第{i}天有货"),
+    ]
+
+
+def _device_list(n):
+    return json.dumps(
+        {"devices": [{"sn": f"SN{i:04d}", "model": "Pocket 3", "free": True} for i in range(n)]},
+        ensure_ascii=False,
+    )
+
+
+def test_elide_tool_result_keeps_json_structure():
+    content = _device_list(200)
+    short = elide_tool_result(content, 120)
+
+    assert count_tokens(short) <= 120
+    data = json.loads(short)
+    assert data["devices"][0]["sn"] == "SN0000"
+    assert "省略" in data["devices"][-1]
+    assert elide_tool_result("small", 120) == "small"
+
+
+def test_old_units_dropped_but_tool_pairs_stay_together():
+    history = []
+    for i in range(20):
+        history.extend(_tool_exchange(i, _device_list(30)))
+    new_msg = Message(role=MessageRole.USER, content="明天呢")
+
+    pack = pack_context("系统提示", history, new_msg, budget_tokens=1500, reserve_tokens=200)
+
+    assert pack.prompt_tokens <= 1500 - 200
+    assert pack.dropped_messages > 0
+    assert pack.messages[0]["role"] == "system"
+    assert pack.messages[-1] == {"role": "user", "content": "明天呢"}
+    # Every tool message follows its assistant tool_calls message
+    call_ids = set()
+    for m in pack.messages:
+        if m.get("tool_calls"):
+            call_ids = {tc["id"] for tc in m["tool_calls"]}
+        if m["role"] == "tool":
+            assert m["tool_call_id"] in call_ids
+    assert pack.messages[1]["role"] == "user"
+
+
+def test_tool_continuation_keeps_current_interaction():
+    history = _tool_exchange(0, "old") + _tool_exchange(1, _device_list(100))[:3]
+
+    pack = pack_context(
+        "系统提示", history, None,
+        budget_tokens=100000, reserve_tokens=0,
+        current_tool_result_max_tokens=100000,
+    )
+
+    assert [m["role"] for m in pack.messages[-3:]] == ["user", "assistant", "tool"]
+    assert pack.messages[-1]["content"] == _device_list(100)
+    assert pack.dropped_messages == 0
+
+
+def _real_prompt_and_tools():
+    from ai_kefu.llm.tokenizer import count_tools_tokens
+    from ai_kefu.prompts.rental_system_prompt import get_rental_system_prompt_template
+    from ai_kefu.tools import (
+        ask_human_agent, calculate_logistics, calculate_price, check_availability,
+        collect_rental_info, complete_task, get_order_status, get_return_address,
+        knowledge_search, parse_date,
+    )
+
+    modules = (
+        knowledge_search, complete_task, ask_human_agent, parse_date, check_availability,
+        calculate_logistics, calculate_price, collect_rental_info, get_return_address, get_order_status,
+    )
+    tools = [{"type": "function", "function": m.get_tool_definition()} for m in modules]
+    return get_rental_system_prompt_template(), count_tools_tokens(tools)
+
+
+def test_default_budget_keeps_the_whole_session_with_real_prompt_and_tools():
+    system_prompt, tools_tokens = _real_prompt_and_tools()
+    assert tools_tokens > 3000  # the rental tool schemas alone
+    history = []
+    for i in range(10):
+        history.extend(_tool_exchange(i, _device_list(5)))
+
+    pack = pack_context(system_prompt, history, Message(role=MessageRole.USER, content="明天呢"),
+                        tools_tokens=tools_tokens)
+
+    assert pack.dropped_messages == 0
+    assert not pack.over_budget
+    assert len(pack.messages) == 1 + len(history) + 1
+
+
+def test_recent_turns_survive_a_budget_the_prompt_already_exceeds():
+    system_prompt, tools_tokens = _real_prompt_and_tools()
+    history = []
+    for i in range(10):
+        history.extend(_tool_exchange(i, _device_list(5)))
+
+    pack = pack_context(system_prompt, history, Message(role=MessageRole.USER, content="明天呢"),
+                        tools_tokens=tools_tokens, budget_tokens=6000, min_recent_turns=3)
+
+    assert pack.over_budget
+    assert pack.dropped_messages == len(history) - 3 * 4
+    assert pack.messages[1] == {"role": "user", "content": "第7天有货吗"}
+    assert pack.messages[-2]["content"] == "第9天有货"
@@ -0,0 +1,190 @@
+"""
+Unit tests for the rolling conversation-history summary.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from ai_kefu.agent import executor as executor_module
+from ai_kefu.agent.executor import AgentExecutor
+from ai_kefu.agent.history_summary import (
+    RollingSummary,
+    fold_lines,
+    history_lines,
+    needs_full_refresh,
+    render_chat_summary,
+)
+from ai_kefu.config.settings import settings
+from ai_kefu.models.session import Session
+
+
+def _msg(id, content, message_type="user"):
+    return SimpleNamespace(id=id, message_content=content, message_type=message_type)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+
+
+class FakeConversationStore:
+    """Rows of one chat; the fingerprint changes whenever a row is added."""
+
+    def __init__(self):
+        self.rows = []
+        self.window_loads = 0
+
+    def add(self, content, message_type="user"):
+        self.rows.append(_msg(len(self.rows) + 1, content, message_type))
+
+    def get_conversation_fingerprint(self, chat_id):
+        return {"message_count": len(self.rows), "last_message_at": str(len(self.rows))}
+
+    def get_conversation_history(self, chat_id, limit=50, offset=0):
+        self.window_loads += 1
+        return self.rows[offset:offset + limit]
+
+    def get_messages_after_id(self, after_id, chat_id=None, user_id=None, limit=50):
+        return [row for row in self.rows if row.id > after_id][:limit]
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    calls = {"full": [], "fold": []}
+    agent = AgentExecutor.__new__(AgentExecutor)  # skip tool registration
+    agent.session_store = SimpleNamespace(client=FakeRedis())
+    agent.conversation_store = FakeConversationStore()
+    monkeypatch.setattr(
+        agent, "_summarize_history",
+        lambda text, is_returning_customer=False: calls["full"].append(text) or f"摘要{len(calls['full'])}",
+    )
+    monkeypatch.setattr(
+        executor_module, "fold_history_summary",
+        lambda previous, lines, is_returning_customer: calls["fold"].append(lines) or f"{previous}+{len(lines)}",
+    )
+    agent.calls = calls
+    return agent
+
+
+def _load(agent):
+    session = Session(session_id="s", user_id="u")
+    agent._load_history_as_context_from_mysql(session, "chat-1")
+    return session
+
+
+def test_history_lines_tracks_payment_and_high_water_mark():
+    lines, paid, high_water_id = history_lines([
+        _msg(3, "在吗"),
+        _msg(7, "  ", "seller"),
+        _msg(5, "【调试】在的", "seller"),
+        _msg(6, "[我已付款，等待你发货]", "system"),
+    ])
+    assert lines == ["用户: 在吗", "客服: 在的"]
+    assert paid is True
+    assert high_water_id == 7
+
+
+def test_full_refresh_triggers(monkeypatch):
+    monkeypatch.setattr(settings, "history_summary_fold_max", 5)
+    monkeypatch.setattr(settings, "history_summary_refresh_folds", 3)
+    monkeypatch.setattr(settings, "history_summary_refresh_seconds", 100)
+    state = RollingSummary(digest="d", high_water_id=10, refreshed_at=1000.0)
+
+    assert needs_full_refresh(None, 1) is not None
+    assert needs_full_refresh(state, 2, now=1050.0) is None
+    assert needs_full_refresh(state, 0, now=1050.0) is not None
+    assert needs_full_refresh(state, 6, now=1050.0) is not None
+    assert needs_full_refresh(state, 2, now=1100.0) is not None
+    assert needs_full_refresh(state.model_copy(update={"folds": 3}), 2, now=1050.0) is not None
+    assert needs_full_refresh(state.model_copy(update={"stale": True}), 2, now=1050.0) is not None
+
+
+def test_fold_keeps_recent_lines_and_marks_failures_stale():
+    state = fold_lines(RollingSummary(), ["a", "b"], lambda p, o: "never", verbatim_limit=3, keep_recent=2)
+    assert state.recent == ["a", "b"] and not state.digest
+
+    folded = []
+    state = fold_lines(state, ["c", "d"], lambda p, o: folded.append(o) or "D", verbatim_limit=3, keep_recent=2)
+    assert folded == [["a", "b"]]
+    assert (state.digest, state.recent) == ("D", ["c", "d"])
+
+    state = fold_lines(state, ["e"], lambda p, o: None, verbatim_limit=3, keep_recent=2)
+    assert state.stale and state.digest == "D" and state.recent == ["c", "d", "e"]
+
+
+def test_returning_buyer_costs_one_fold_per_new_batch(executor):
+    store = executor.conversation_store
+    for i in range(12):
+        store.add(f"消息{i}")
+
+    first = _load(executor)
+    assert len(executor.calls["full"]) == 1 and store.window_loads == 1
+    assert first.context["context_summary"].endswith("摘要1")
+
+    # Unchanged fingerprint: plain cache hit
+    _load(executor)
+    assert len(executor.calls["full"]) == 1 and not executor.calls["fold"]
+
+    store.add("押金多少")
+    store.add("押金500", "seller")
+    session = _load(executor)
+    assert executor.calls["fold"] == [["用户: 押金多少", "客服: 押金500"]]
+    assert len(executor.calls["full"]) == 1 and store.window_loads == 1
+    assert session.context["context_summary"].endswith("摘要1+2")
+
+    store.add("[我已付款，等待你发货]")
+    session = _load(executor)
+    assert len(executor.calls["fold"]) == 2
+    assert session.context["is_returning_customer"] is True
+    assert session.context["context_summary"].startswith("【老客户】")
+
+
+def test_periodic_full_refresh(executor, monkeypatch):
+    monkeypatch.setattr(settings, "history_summary_refresh_folds", 2)
+    store = executor.conversation_store
+    for i in range(12):
+        store.add(f"消息{i}")
+    _load(executor)
+    for i in range(3):
+        store.add(f"新消息{i}")
+        _load(executor)
+
+    assert len(executor.calls["fold"]) == 2
+    assert len(executor.calls["full"]) == 2 and store.window_loads == 2
+
+
+def test_full_refresh_keeps_returning_customer_flag(executor, monkeypatch):
+    monkeypatch.setattr(settings, "history_summary_fold_max", 5)
+    store = executor.conversation_store
+    store.add("[我已付款，等待你发货]")
+    for i in range(12):
+        store.add(f"消息{i}")
+    assert _load(executor).context["is_returning_customer"] is True
+
+    # The payment falls outside the 50-message rebuild window
+    for i in range(60):
+        store.add(f"新消息{i}")
+    session = _load(executor)
+    assert len(executor.calls["full"]) == 2
+    assert session.context["is_returning_customer"] is True
+
+def test_short_history_stays_verbatim_without_llm(executor):
+    store = executor.conversation_store
+    store.add("在吗")
+    _load(executor)
+    store.add("在的", "seller")
+    session = _load(executor)
+
+    assert not executor.calls["full"] and not executor.calls["fold"]
+    assert session.context["context_summary"] == render_chat_summary(
+        RollingSummary(recent=["用户: 在吗", "客服: 在的"]), False
+    )
+    # Verbatim-only appends are not folds, so they don't bring the next full refresh closer
+    assert executor._get_cached_summary("chat-1")["rolling"]["folds"] == 0
@@ -0,0 +1,62 @@
+"""
+Unit tests for the prefix-cache-friendly prompt layout.
+"""
+
+from datetime import datetime
+
+from ai_kefu.agent.context_packer import pack_context
+from ai_kefu.agent.prompt_layout import (
+    CONTEXT_HEADER,
+    build_prompt_layout,
+    canonical_tools,
+)
+from ai_kefu.llm.cache_metrics import PrefixCacheMetrics
+from ai_kefu.models.session import Message
+from ai_kefu.config.constants import MessageRole
+from ai_kefu.prompts.rental_system_prompt import get_rental_system_prompt_template
+
+
+def test_static_prompt_does_not_change_across_days():
+    template = get_rental_system_prompt_template()
+    day1 = build_prompt_layout(template, now=datetime(2026, 4, 1))
+    day2 = build_prompt_layout(template, now=datetime(2026, 5, 20), item_slot="## 当前商品信息\n商品标题：X300Pro")
+
+    assert day1.static == day2.static
+    assert "2026" not in day1.static
+    assert "{today_str}" not in day1.static
+    assert "今天: 2026年04月01日" in day1.daily
+    assert "今天是5月" in day2.daily
+    assert "X300Pro" in day2.context_block
+
+
+def test_context_block_is_attached_to_current_user_message():
+    layout = build_prompt_layout("规则 {{不变}}\n今天: {today_date}", context_summary="用户要租X300U",
+                                 now=datetime(2026, 4, 1))
+    history = [
+        Message(role=MessageRole.USER, content="你好"),
+        Message(role=MessageRole.ASSISTANT, content="什么时候用呢"),
+    ]
+    new_msg = Message(role=MessageRole.USER, content="明天")
+
+    pack = pack_context(layout.static, history, new_msg, budget_tokens=100000, context_block=layout.context_block)
+
+    assert pack.messages[0]["content"].startswith("规则 {不变}")
+    assert pack.messages[1] == {"role": "user", "content": "你好"}
+    last = pack.messages[-1]["content"]
+    assert last.startswith(CONTEXT_HEADER)
+    assert "2026-04-01" in last and "用户要租X300U" in last
+    assert last.endswith("明天")
+
+
+def test_canonical_tools_and_cache_metrics():
+    tools = [{"type": "function", "function": {"name": n}} for n in ("parse_date", "calculate_price")]
+    assert [t["function"]["name"] for t in canonical_tools(tools)] == ["calculate_price", "parse_date"]
+
+    metrics = PrefixCacheMetrics()
+    metrics.record("call_qwen", "qwen-plus", 1000, 800, 120)
+    metrics.record("call_qwen", "qwen-plus", 1000, 0, 200)
+    metrics.record("call_qwen", "qwen-plus", None, None)
+    snap = metrics.snapshot()
+    assert snap["prefix_hit_rate"] == 0.4
+    assert snap["by_call"][0]["calls"] == 2
+    assert snap["by_call"][0]["calls_with_cache_hit"] == 1
@@ -0,0 +1,121 @@
+"""
+Unit tests for the multi-account interceptor runtime (accounts file + per-account routing).
+"""
+
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("playwright")
+# 浏览器相关模块按拦截器的运行方式导入 utils（需要 ai_kefu 目录在 sys.path 中）
+pytest.importorskip("utils.xianyu_utils")
+
+from ai_kefu.xianyu_interceptor.account_runtime import (  # noqa: E402
+    AccountSession,
+    AccountSpec,
+    load_accounts,
+)
+from ai_kefu.xianyu_interceptor.frame_dispatcher import FrameDispatcher  # noqa: E402
+
+
+class _FakeContext:
+    def __init__(self, cookies=None):
+        self.pages = []
+        self._cookies = cookies or []
+        self.init_scripts = []
+        self.added_cookies = []
+
+    async def add_init_script(self, script):
+        self.init_scripts.append(script)
+
+    async def add_cookies(self, cookies):
+        self.added_cookies.extend(cookies)
+
+    async def cookies(self):
+        return self._cookies
+
+    def on(self, event, handler):
+        pass
+
+
+def test_load_accounts_rejects_duplicates(tmp_path):
+    path = tmp_path / "accounts.json"
+    path.write_text(json.dumps([
+        {"account_id": "a", "cookies_str": "unb=1"},
+        {"account_id": "b"},
+    ]))
+    specs = load_accounts(str(path))
+    assert [s.account_id for s in specs] == ["a", "b"]
+
+    path.write_text(json.dumps([{"account_id": "a"}, {"account_id": "a"}]))
+    with pytest.raises(ValueError):
+        load_accounts(str(path))
+
+
+def test_frames_are_routed_to_their_account(tmp_path):
+    async def run():
+        seen = []
+
+        async def frame_handler(session, frame):
+            seen.append((session.account_id, session.seller_user_id, frame["n"]))
+
+        async def default(frame):
+            seen.append(("default", None, frame["n"]))
+
+        dispatcher = FrameDispatcher(default, workers=2)
+        await dispatcher.start()
+        sessions = []
+        for account_id, cookies in (("a", "unb=111"), ("b", "unb=222")):
+            session = AccountSession(
+                AccountSpec(account_id=account_id, cookies_str=cookies),
+                _FakeContext(),
+                dispatcher=dispatcher,
+                frame_handler=frame_handler,
+                inbound_url="http://api/xianyu/inbound",
+                state_path=tmp_path / f"{account_id}.json",
+            )
+            await session._resolve_seller_user_id()
+            dispatcher.register(account_id, session._on_frame)
+            sessions.append(session)
+
+        dispatcher.submit({"n": 1, "body": {}}, route="a")
+        dispatcher.submit({"n": 2, "body": {}}, route="b")
+        dispatcher.submit({"n": 3, "body": {}})
+        while dispatcher.stats()["processed"] < 3:
+            await asyncio.sleep(0.01)
+        await dispatcher.close()
+        return seen, sessions
+
+    seen, sessions = asyncio.run(run())
+    assert sorted(seen) == [("a", "111", 1), ("b", "222", 2), ("default", None, 3)]
+    # 每个账号有独立的 transport / handler
+    assert sessions[0].message_handler.transport is not sessions[1].message_handler.transport
+
+
+def test_navigation_tasks_are_tracked_until_done(tmp_path, monkeypatch):
+    async def run():
+        session = AccountSession(
+            AccountSpec(account_id="a", cookies_str="unb=111"),
+            _FakeContext(),
+            dispatcher=FrameDispatcher(lambda frame: None),
+            frame_handler=None,
+            inbound_url="http://api/xianyu/inbound",
+            state_path=tmp_path / "a.json",
+        )
+
+        async def failing_reattach(page):
+            raise RuntimeError("page closed")
+
+        monkeypatch.setattr(session, "_reattach_after_navigation", failing_reattach)
+        page = type("Page", (), {"main_frame": object()})()
+        session._on_navigation(page, object())       # 子 frame 导航不处理
+        assert not session._navigation_tasks
+        session._on_navigation(page, page.main_frame)
+        assert len(session._navigation_tasks) == 1
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return session
+
+    session = asyncio.run(run())
+    assert not session._navigation_tasks
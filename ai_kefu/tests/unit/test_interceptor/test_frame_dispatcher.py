@@ -0,0 +1,199 @@
+"""
+Unit tests for FrameDispatcher priority queue, overflow policies and spill replay.
+"""
+
+import asyncio
+import base64
+
+import pytest
+
+from ai_kefu.xianyu_interceptor.frame_dispatcher import (
+    PRIORITY_CHAT,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL,
+    FrameDispatcher,
+    classify_frame,
+)
+
+
+def _chat_frame(n: int) -> dict:
+    # 加密数据无法直接 base64 解出 JSON
+    return {"lwp": "/s/para", "body": {"syncPushPackage": {"data": [{"data": f"ENC@@{n}"}]}}}
+
+
+HEARTBEAT = {"code": 200, "headers": {"mid": "1"}}
+SYSTEM_SYNC = {
+    "lwp": "/s/sync",
+    "body": {"syncPushPackage": {"data": [{"data": base64.b64encode(b'{"a":1}').decode()}]}},
+}
+HISTORY = {"code": 200, "headers": {"mid": "2"}, "body": {"userMessageModels": []}}
+
+
+def test_classify_frame():
+    assert classify_frame(_chat_frame(1)) == PRIORITY_CHAT
+    assert classify_frame(HISTORY) == PRIORITY_NORMAL
+    assert classify_frame(HEARTBEAT) == PRIORITY_LOW
+    assert classify_frame(SYSTEM_SYNC) == PRIORITY_LOW
+    assert classify_frame({"lwp": "/!", "body": {}}) == PRIORITY_LOW
+
+
+def test_slow_callback_does_not_block_submit_and_chat_runs_first():
+    async def run():
+        order = []
+        gate = asyncio.Event()
+
+        async def callback(frame):
+            await gate.wait()
+            order.append(frame)
+
+        dispatcher = FrameDispatcher(callback, workers=1, max_queue=10, overflow_policy="drop_new")
+        await dispatcher.start()
+        dispatcher.submit(HEARTBEAT)           # 被 worker 立即取走，阻塞在 gate 上
+        await asyncio.sleep(0)
+        dispatcher.submit(HEARTBEAT)
+        dispatcher.submit(HISTORY)
+        dispatcher.submit(_chat_frame(1))
+        assert dispatcher.stats()["in_flight"] == 1
+        gate.set()
+        while dispatcher.stats()["processed"] < 4:
+            await asyncio.sleep(0.01)
+        await dispatcher.close()
+        return order
+
+    order = asyncio.run(run())
+    assert order[1:] == [_chat_frame(1), HISTORY, HEARTBEAT]
+
+
+def test_full_queue_evicts_lower_priority_before_chat():
+    async def run():
+        async def callback(frame):
+            pass
+
+        # 不启动 worker，只观察入队行为
+        dispatcher = FrameDispatcher(callback, max_queue=2, overflow_policy="drop_new")
+        dispatcher.submit(HEARTBEAT)
+        dispatcher.submit(HISTORY)
+        assert dispatcher.submit(_chat_frame(1)) is True
+        assert dispatcher.submit(_chat_frame(2)) is True
+        assert dispatcher.submit(_chat_frame(3)) is False
+        return dispatcher.stats()
+
+    stats = asyncio.run(run())
+    assert stats["depth_by_priority"] == {"chat": 2, "normal": 0, "low": 0}
+    assert stats["dropped"] == {"chat": 1, "normal": 1, "low": 1}
+
+
+def test_spill_policy_replays_chat_frames(tmp_path):
+    async def run():
+        seen = []
+        gate = asyncio.Event()
+
+        async def callback(frame):
+            await gate.wait()
+            seen.append(frame)
+
+        dispatcher = FrameDispatcher(
+            callback, workers=1, max_queue=2, overflow_policy="spill", spill_dir=str(tmp_path)
+        )
+        await dispatcher.start()
+        dispatcher.submit(_chat_frame(0))
+        await asyncio.sleep(0)                 # worker 取走第 0 帧
+        for n in range(1, 6):
+            dispatcher.submit(_chat_frame(n))
+        spilled = dispatcher.stats()["spilled"]
+        gate.set()
+        while dispatcher.stats()["processed"] < 6:
+            await asyncio.sleep(0.01)
+        stats = dispatcher.stats()
+        await dispatcher.close()
+        return seen, spilled, stats
+
+    seen, spilled, stats = asyncio.run(run())
+    assert spilled == 3
+    assert stats["replayed"] == 3
+    assert stats["spill_pending"] == 0
+    assert sorted(int(f["body"]["syncPushPackage"]["data"][0]["data"][5:]) for f in seen) == list(range(6))
+    assert not (tmp_path / "frames.jsonl").exists()
+
+
+def test_new_frames_of_a_spilled_chat_queue_behind_the_spill(tmp_path):
+    async def run():
+        seen = []
+        gates = {n: asyncio.Event() for n in range(6)}
+
+        async def callback(frame):
+            await gates[frame["n"]].wait()
+            seen.append((frame["chat"], frame["n"]))
+
+        def frame(chat, n):
+            return dict(_chat_frame(n), chat=chat, n=n)
+
+        dispatcher = FrameDispatcher(
+            callback, workers=1, max_queue=2, overflow_policy="spill",
+            spill_dir=str(tmp_path), lane_key=lambda f: f["chat"],
+        )
+        await dispatcher.start()
+        dispatcher.submit(frame("a", 0))
+        await asyncio.sleep(0)                 # worker 取走 a0
+        assert dispatcher.submit(frame("a", 1))
+        assert dispatcher.submit(frame("a", 2))
+        assert dispatcher.submit(frame("a", 3)) is False
+        gates[0].set()
+        while dispatcher.stats()["processed"] < 1:
+            await asyncio.sleep(0.01)
+        # 队列有空位了，但 a3 还在磁盘上：a4 也要溢写，别的会话照常入队
+        assert dispatcher.submit(frame("a", 4)) is False
+        assert dispatcher.submit(frame("b", 5)) is True
+        for gate in gates.values():
+            gate.set()
+        while dispatcher.stats()["processed"] < 6:
+            await asyncio.sleep(0.01)
+        stats = dispatcher.stats()
+        await dispatcher.close()
+        return seen, stats
+
+    seen, stats = asyncio.run(run())
+    assert [n for chat, n in seen if chat == "a"] == [0, 1, 2, 3, 4]
+    assert stats["spilled"] == 2
+    assert stats["spill_pending"] == 0
+
+def test_same_chat_frames_run_serially_in_order():
+    async def run():
+        seen = {"a": [], "b": []}
+        active = {"a": 0, "b": 0}
+        overlap = {"same_chat": 0, "max_in_flight": 0}
+
+        async def callback(frame):
+            chat, n = frame["chat"], frame["n"]
+            active[chat] += 1
+            overlap["same_chat"] = max(overlap["same_chat"], active[chat])
+            overlap["max_in_flight"] = max(overlap["max_in_flight"], sum(active.values()))
+            # 先到的帧处理得更慢：没有会话串行时后到的帧会先完成
+            await asyncio.sleep(0.02 if n % 3 == 0 else 0.001)
+            seen[chat].append(n)
+            active[chat] -= 1
+
+        dispatcher = FrameDispatcher(
+            callback, workers=4, max_queue=50, overflow_policy="drop_new",
+            lane_key=lambda frame: frame["chat"],
+        )
+        await dispatcher.start()
+        for n in range(12):
+            chat = "a" if n % 2 == 0 else "b"
+            assert dispatcher.submit(dict(_chat_frame(n), chat=chat, n=n))
+        while dispatcher.stats()["processed"] < 12:
+            await asyncio.sleep(0.01)
+        stats = dispatcher.stats()
+        await dispatcher.close()
+        return seen, overlap, stats
+
+    seen, overlap, stats = asyncio.run(run())
+    assert seen == {"a": [0, 2, 4, 6, 8, 10], "b": [1, 3, 5, 7, 9, 11]}
+    assert overlap["same_chat"] == 1
+    assert overlap["max_in_flight"] == 2      # 两个会话仍然并行
+    assert stats["busy_lanes"] == 0
+
+
+def test_unknown_policy_rejected():
+    with pytest.raises(ValueError):
+        FrameDispatcher(lambda f: None, overflow_policy="block")
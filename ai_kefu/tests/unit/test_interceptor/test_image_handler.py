@@ -0,0 +1,104 @@
+"""
+Unit tests for ImageHandler content-addressed storage and background queue.
+"""
+
+import asyncio
+import hashlib
+import os
+
+from aiohttp import web
+
+from ai_kefu.xianyu_interceptor.image_handler import ImageHandler
+
+PNG_A = b"\x89PNG" + b"a" * 1000
+PNG_B = b"\x89PNG" + b"b" * 2000
+
+
+async def _serve(routes):
+    app = web.Application()
+    for path, body in routes.items():
+        app.router.add_get(path, lambda request, body=body: web.Response(body=body))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_same_content_is_stored_once(tmp_path):
+    async def run():
+        runner, base = await _serve({"/a.png": PNG_A, "/copy.png": PNG_A})
+        handler = ImageHandler(save_dir=str(tmp_path))
+        try:
+            first = await handler.download_image(f"{base}/a.png", "chat1", "u1")
+            second = await handler.download_image(f"{base}/copy.png", "chat2", "u2")
+        finally:
+            await handler.close()
+            await runner.cleanup()
+        return handler, first, second
+
+    handler, first, second = asyncio.run(run())
+
+    digest = hashlib.sha256(PNG_A).hexdigest()
+    assert first == second
+    assert os.path.basename(first) == f"{digest}.png"
+    assert handler.stats["downloaded"] == 1
+    assert handler.stats["deduplicated"] == 1
+    assert not list((tmp_path / ".tmp").iterdir())
+
+
+def test_oversized_image_is_rejected(tmp_path):
+    async def run():
+        runner, base = await _serve({"/big.png": PNG_B})
+        handler = ImageHandler(save_dir=str(tmp_path), max_bytes=1500)
+        try:
+            return handler, await handler.download_image(f"{base}/big.png", "c", "u")
+        finally:
+            await handler.close()
+            await runner.cleanup()
+
+    handler, path = asyncio.run(run())
+
+    assert path is None
+    assert handler.stats["oversized"] == 1
+    assert not list((tmp_path / "objects").rglob("*.png"))
+
+
+def test_disk_usage_eviction(tmp_path):
+    async def run():
+        runner, base = await _serve({"/a.png": PNG_A, "/b.png": PNG_B})
+        handler = ImageHandler(save_dir=str(tmp_path), max_disk_bytes=2500)
+        try:
+            a = await handler.download_image(f"{base}/a.png", "c", "u")
+            os.utime(a, (1, 1))  # make A the least recently used
+            b = await handler.download_image(f"{base}/b.png", "c", "u")
+        finally:
+            await handler.close()
+            await runner.cleanup()
+        return handler, a, b
+
+    handler, a, b = asyncio.run(run())
+
+    assert not os.path.exists(a)
+    assert os.path.exists(b)
+    assert handler.stats["evicted"] == 1
+
+
+def test_submit_returns_immediately_and_drops_when_full(tmp_path):
+    raw = {"1": {"10": {"reminderUrl": "http://127.0.0.1:9/x.jpg"}}}
+
+    async def run():
+        handler = ImageHandler(save_dir=str(tmp_path), queue_size=1, workers=1)
+        # worker not started yet: submit is a no-op
+        assert handler.submit(raw, "c", "u") == []
+        handler._queue = asyncio.Queue(maxsize=1)
+        queued_first = handler.submit(raw, "c", "u")
+        queued_second = handler.submit(raw, "c", "u")
+        return handler, queued_first, queued_second
+
+    handler, first, second = asyncio.run(run())
+
+    assert first == ["http://127.0.0.1:9/x.jpg"]
+    assert second == []
+    assert handler.stats["dropped"] == 1
@@ -0,0 +1,80 @@
+"""
+Unit tests for the LLM record / replay layer.
+"""
+
+import time
+
+import pytest
+
+from ai_kefu.llm import recorder as recorder_module
+from ai_kefu.llm.recorder import (
+    KIND_CHAT,
+    KIND_EMBEDDING,
+    STUB_REPLY,
+    STUB_SCORE,
+    LLMRecorder,
+    ReplayMissError,
+    chat_request_key,
+    configure_llm_recorder,
+    stub_chat_response,
+    stub_embedding,
+)
+
+REQUEST = chat_request_key({
+    "model": "qwen-plus",
+    "messages": [{"role": "user", "content": "押金多少"}],
+    "temperature": 0.7,
+    "timeout": 30,
+})
+RESPONSE = {"choices": [{"message": {"role": "assistant", "content": "押金 500 元~"}}], "usage": {}}
+
+
+def test_request_key_ignores_transport_options():
+    assert "timeout" not in REQUEST
+    assert REQUEST["model"] == "qwen-plus"
+
+
+def test_recorded_response_is_replayed_without_live_call(tmp_path):
+    LLMRecorder("record", str(tmp_path)).call(KIND_CHAT, REQUEST, lambda: RESPONSE, lambda: None)
+
+    replay = LLMRecorder("replay", str(tmp_path))
+
+    def live():
+        raise AssertionError("replay must not call the API")
+
+    assert replay.call(KIND_CHAT, REQUEST, live, lambda: None) == RESPONSE
+    assert replay.stats()["hits"] == 1
+
+
+def test_replay_miss_stubs_or_raises(tmp_path):
+    replay = LLMRecorder("replay", str(tmp_path))
+    stub = replay.call(KIND_CHAT, REQUEST, lambda: RESPONSE, lambda: stub_chat_response(REQUEST))
+    assert stub["choices"][0]["message"]["content"] == STUB_REPLY
+    assert replay.misses == 1
+
+    strict = LLMRecorder("replay", str(tmp_path), on_miss="error")
+    with pytest.raises(ReplayMissError):
+        strict.call(KIND_CHAT, REQUEST, lambda: RESPONSE, lambda: None)
+
+
+def test_synthetic_latency_is_applied(tmp_path):
+    replay = LLMRecorder("replay", str(tmp_path), latency_ms=50)
+    started = time.monotonic()
+    replay.call(KIND_EMBEDDING, {"input": "x"}, lambda: None, lambda: stub_embedding("x", 8))
+    assert time.monotonic() - started >= 0.045
+
+
+def test_stubs_are_deterministic():
+    assert stub_embedding("相机", 16) == stub_embedding("相机", 16)
+    assert abs(sum(v * v for v in stub_embedding("相机", 16)) - 1.0) < 1e-9
+    # Scoring calls (short, no tools) get a passing score
+    score = stub_chat_response({"messages": [], "max_tokens": 16})
+    assert score["choices"][0]["message"]["content"] == STUB_SCORE
+
+
+def test_configure_off_removes_recorder(tmp_path):
+    try:
+        assert configure_llm_recorder("replay", str(tmp_path)) is recorder_module.get_llm_recorder()
+        assert configure_llm_recorder("off") is None
+    finally:
+        configure_llm_recorder("off")
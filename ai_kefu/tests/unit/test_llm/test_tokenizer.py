@@ -0,0 +1,27 @@
+"""
+Unit tests for local token counting.
+"""
+
+from ai_kefu.llm import tokenizer
+from ai_kefu.llm.tokenizer import count_tokens, reset_tokenizer_cache
+
+
+def test_counts_are_cached_by_digest_not_text(monkeypatch):
+    reset_tokenizer_cache()
+    monkeypatch.setattr(tokenizer, "_COUNT_CACHE_SIZE", 2)
+    calls = []
+    original = tokenizer._count_uncached
+    monkeypatch.setattr(tokenizer, "_count_uncached", lambda text: calls.append(text) or original(text))
+
+    big = "租赁" * 5000 + '{"order": 1}'
+    first = count_tokens(big)
+    assert count_tokens(big) == first
+    assert len(calls) == 1
+    assert all(isinstance(key, bytes) and len(key) == 16 for key in tokenizer._count_cache)
+
+    count_tokens("a")
+    count_tokens("b")
+    assert len(tokenizer._count_cache) == 2
+    count_tokens(big)
+    assert len(calls) == 4
+    reset_tokenizer_cache()
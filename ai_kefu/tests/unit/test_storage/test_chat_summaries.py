@@ -0,0 +1,134 @@
+"""
+Unit tests for chat_summaries maintenance in ConversationStore.
+"""
+
+import threading
+from datetime import datetime
+
+from ai_kefu.xianyu_interceptor.conversation_models import ConversationMessage, MessageType
+from ai_kefu.xianyu_interceptor.conversation_store import (
+    ConversationStore,
+    _UPSERT_CHAT_SUMMARY_SQL,
+    _UPSERT_CHAT_TURN_SQL,
+    _chat_summary_values,
+)
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+        self.lastrowid = 0
+
+    def execute(self, sql, params=None):
+        self.conn.executed.append((sql, params))
+        if "INSERT IGNORE INTO conversations" in sql:
+            self.rowcount = 0 if self.conn.duplicate else 1
+            self.lastrowid = 0 if self.conn.duplicate else 42
+        elif "INSERT INTO agent_turns" in sql:
+            self.rowcount, self.lastrowid = 1, 7
+
+    def fetchone(self):
+        return {"total": 0}
+
+    def fetchall(self):
+        return []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self, duplicate=False):
+        self.duplicate = duplicate
+        self.executed = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def ping(self, reconnect=False):
+        return True
+
+
+def _store(conn):
+    store = object.__new__(ConversationStore)
+    store._local = threading.local()
+    store._connections = [conn]
+    store._connections_lock = threading.Lock()
+    store._lock = threading.Lock()
+    store._known_segments = {}
+    store._connection = conn
+    return store
+
+
+def _message(**overrides):
+    fields = dict(
+        chat_id="chat-1",
+        user_id="buyer-1",
+        message_content="明天能到吗" * 30,
+        message_type=MessageType.SELLER,
+        agent_response="【调试】可以的" * 20,
+        created_at=datetime(2026, 4, 1, 12, 0),
+    )
+    fields.update(overrides)
+    return ConversationMessage(**fields)
+
+
+def test_summary_values_from_message():
+    msg = _message()
+    values = _chat_summary_values(msg, "seller", msg.created_at)
+
+    assert values[:4] == ("chat-1", "buyer-1", None, None)
+    # user / seller / ai / debug increments
+    assert values[4:8] == (0, 1, 1, 1)
+    assert len(values[10]) == 100
+    assert values[11] == "seller"
+    assert len(values[12]) == 100
+
+
+def test_save_message_updates_summary_in_same_transaction():
+    conn = FakeConnection()
+    assert _store(conn).save_message(_message()) == 42
+
+    sqls = [sql for sql, _ in conn.executed]
+    assert sqls[1] == _UPSERT_CHAT_SUMMARY_SQL
+    assert conn.commits == 1
+
+
+def test_duplicate_message_does_not_touch_summary():
+    conn = FakeConnection(duplicate=True)
+    _store(conn).save_message(_message(message_id="m-1"))
+
+    assert all(sql != _UPSERT_CHAT_SUMMARY_SQL for sql, _ in conn.executed)
+
+
+def test_save_turn_counts_suppressed_turns():
+    conn = FakeConnection()
+    _store(conn).save_turn(
+        session_id="s", turn_number=1, user_query="q", llm_input=None, llm_output=None,
+        response_text="", tool_calls=None, tool_results=None, duration_ms=1,
+        response_suppressed=True, chat_id="chat-1",
+    )
+
+    assert (_UPSERT_CHAT_TURN_SQL, ("chat-1", 1)) in conn.executed
+
+
+def test_recent_listing_is_a_single_summary_query():
+    conn = FakeConnection()
+    _store(conn).get_recent_conversations(limit=20, offset=0, date="2026-04-01")
+
+    sqls = [sql for sql, _ in conn.executed]
+    assert len(sqls) == 2  # count + page, no per-row follow-up queries
+    assert all("FROM chat_summaries" in sql for sql in sqls)
+    assert all("DATE(" not in sql for sql in sqls)
+    assert conn.executed[1][1][:2] == [datetime(2026, 4, 1), datetime(2026, 4, 2)]
@@ -0,0 +1,93 @@
+"""
+Unit tests for the background-refreshed config cache and invalidation bus.
+"""
+
+import threading
+import time
+
+import fakeredis
+
+from ai_kefu.storage.config_cache import CHANNEL, ConfigCache, InvalidationBus
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_stale_read_returns_current_value_while_reloading():
+    release = threading.Event()
+    values = iter(["v1", "v2"])
+
+    def loader():
+        value = next(values)
+        if value == "v2":
+            release.wait(2)
+        return value
+
+    cache = ConfigCache("test", loader, refresh_interval=0)
+    assert cache.get() == "v1"  # first load is synchronous
+
+    started = time.monotonic()
+    assert cache.get() == "v1"  # stale: reload scheduled, not awaited
+    assert time.monotonic() - started < 0.5
+    release.set()
+    assert _wait_for(lambda: cache.get() == "v2")
+
+
+def test_invalidate_ignores_versions_already_applied():
+    loads = []
+    cache = ConfigCache("test", lambda: loads.append(1) or len(loads), refresh_interval=3600)
+    cache.get()
+
+    cache.invalidate(3)
+    assert _wait_for(lambda: cache.stats()["loads"] == 2 and not cache.stats()["refreshing"])
+    cache.invalidate(3)
+    cache.invalidate(2)
+    time.sleep(0.05)
+    assert cache.stats()["loads"] == 2
+
+
+def test_failed_reload_keeps_previous_value():
+    state = {"fail": False}
+
+    def loader():
+        if state["fail"]:
+            raise RuntimeError("mysql down")
+        return {"[图片]"}
+
+    cache = ConfigCache("test", loader, refresh_interval=3600)
+    cache.get()
+    state["fail"] = True
+    assert cache.refresh() == {"[图片]"}
+
+
+def test_bus_dispatches_remote_invalidations_only_once():
+    server = fakeredis.FakeServer()
+    worker_a = InvalidationBus("redis://fake")
+    worker_b = InvalidationBus("redis://fake")
+    for bus in (worker_a, worker_b):
+        bus._client = fakeredis.FakeRedis(server=server, decode_responses=True)
+
+    seen_a, seen_b = [], []
+    worker_a.subscribe("prompts", seen_a.append)
+    worker_b.subscribe("prompts", seen_b.append)
+
+    pubsub = worker_b.get_client().pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(CHANNEL)
+
+    assert worker_a.publish("prompts") == 1
+    assert seen_a == [1]  # local dispatch, no round trip
+
+    message = None
+    for _ in range(20):
+        message = pubsub.get_message(timeout=0.1)
+        if message:
+            break
+    worker_b._handle(message["data"])
+    worker_a._handle(message["data"])  # own echo is ignored
+    assert seen_b == [1] and seen_a == [1]
@@ -0,0 +1,62 @@
+"""
+Unit tests for the DB thread pool used by async routes.
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from ai_kefu.storage import db_executor
+from ai_kefu.storage.db_executor import DBTimeoutError, db_executor_stats, run_db
+
+
+@pytest.fixture(autouse=True)
+def fresh_executor():
+    db_executor.shutdown_db_executor(wait=True)
+    yield
+    db_executor.shutdown_db_executor(wait=True)
+
+
+def test_run_db_runs_off_the_event_loop():
+    loop_thread = threading.get_ident()
+
+    def query(a, b=0):
+        assert threading.get_ident() != loop_thread
+        assert threading.current_thread().name.startswith("db")
+        return a + b
+
+    assert asyncio.run(run_db(query, 1, b=2)) == 3
+    assert db_executor_stats()["completed"] >= 1
+
+
+def test_slow_query_times_out_without_blocking_other_work():
+    release = threading.Event()
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while not release.is_set():
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        tick_task = asyncio.create_task(ticker())
+        with pytest.raises(DBTimeoutError):
+            await run_db(release.wait, 5, timeout=0.2)
+        release.set()
+        await tick_task
+        return ticks
+
+    ticks = asyncio.run(run())
+    assert ticks >= 5
+    assert db_executor_stats()["timeouts"] == 1
+
+
+def test_errors_propagate():
+    def broken():
+        raise ValueError("bad sql")
+
+    with pytest.raises(ValueError, match="bad sql"):
+        asyncio.run(run_db(broken))
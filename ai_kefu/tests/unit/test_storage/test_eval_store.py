@@ -0,0 +1,105 @@
+"""
+Unit tests for eval run summaries and keyset-paged run details.
+"""
+
+import threading
+from datetime import datetime
+from decimal import Decimal
+
+from ai_kefu.storage.eval_store import (
+    EvalStore,
+    eval_summary_values,
+)
+from ai_kefu.storage.keyset_cursor import decode_cursor
+
+
+class RecordingConnection:
+    def __init__(self, items, summary):
+        self.items = items
+        self.summary = summary
+        self.executed = []
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def execute(self, sql, params=None):
+                conn.executed.append((sql, params))
+                self._sql = sql
+
+            def fetchone(self):
+                if "FROM eval_run_summaries" in self._sql:
+                    return dict(conn.summary) if conn.summary else None
+                return {"total": 7}
+
+            def fetchall(self):
+                return [dict(i) for i in conn.items]
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+        return Cursor()
+
+    def ping(self, reconnect=False):
+        return True
+
+
+def _store(conn):
+    store = object.__new__(EvalStore)
+    store._local = threading.local()
+    store._local.connection = conn
+    return store
+
+
+def _items(n):
+    return [
+        {"id": 10 + i, "chat_id": "chat-a", "source_conversation_id": 100 + i,
+         "context_count": 3, "tool_call_count": 0, "created_at": datetime(2026, 4, 1)}
+        for i in range(n)
+    ]
+
+
+SUMMARY = {"run_id": "r1", "total_items": 42, "success_count": Decimal("40"),
+           "error_count": 2, "skipped_count": 0, "avg_duration_ms": Decimal("1532")}
+
+
+def test_summary_values_count_status_and_success_duration():
+    assert eval_summary_values("r1", "t", {"status": "success", "ai_model": "m", "ai_duration_ms": 900}) == (
+        "r1", "t", "m", 1, 0, 0, 900,
+    )
+    assert eval_summary_values("r1", "t", {"ai_duration_ms": 900})[3:] == (0, 1, 0, 0)
+
+
+def test_first_page_uses_summary_total_and_skips_json_columns():
+    conn = RecordingConnection(_items(3), SUMMARY)
+    page = _store(conn).get_run_items("r1", limit=2)
+
+    item_sql, params = next((sql, p) for sql, p in conn.executed if "FROM eval_runs" in sql)
+    assert "JSON_LENGTH(context_messages)" in item_sql
+    assert ", context_messages, ai_tool_calls" not in item_sql
+    assert "OFFSET" not in item_sql and params == ["r1", 3]
+    assert not any("COUNT(*)" in sql for sql, _ in conn.executed)
+    assert page["total"] == 42
+    assert page["summary"]["avg_duration_ms"] == 1532
+    assert decode_cursor(page["next_cursor"]) == {"c": "chat-a", "s": 101, "id": 11}
+    assert page["items"][0]["created_at"] == "2026-04-01T00:00:00"
+
+
+def test_cursor_page_is_keyset_without_count():
+    conn = RecordingConnection(_items(2), SUMMARY)
+    store = _store(conn)
+    first = store.get_run_items("r1", chat_id_filter="chat-a", limit=1)
+    assert first["total"] == 7  # chat filter needs a real (indexed) count
+
+    conn.items = _items(1)
+    conn.executed.clear()
+    page = store.get_run_items("r1", chat_id_filter="chat-a", limit=1, cursor=first["next_cursor"])
+
+    item_sql, params = next((sql, p) for sql, p in conn.executed if "FROM eval_runs" in sql)
+    assert "(chat_id, source_conversation_id, id) > (%s, %s, %s)" in item_sql
+    assert params == ["r1", "chat-a", "chat-a", 100, 10, 2]
+    assert page["total"] is None and page["next_cursor"] is None
+    assert not any("COUNT(*)" in sql for sql, _ in conn.executed)
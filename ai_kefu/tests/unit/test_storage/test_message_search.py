@@ -0,0 +1,116 @@
+"""
+Unit tests for full-text message search with keyset pagination.
+"""
+
+import threading
+from datetime import datetime
+
+from ai_kefu.storage.keyset_cursor import decode_cursor
+from ai_kefu.xianyu_interceptor.conversation_store import (
+    ConversationStore,
+    _SEARCH_COUNT_CAP,
+    _fulltext_query,
+)
+
+
+class RecordingConnection:
+    """Returns canned rows and records every statement."""
+
+    def __init__(self, rows, count=0):
+        self.rows = rows
+        self.count = count
+        self.executed = []
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def execute(self, sql, params=None):
+                conn.executed.append((sql, params))
+
+            def fetchall(self):
+                return [dict(r) for r in conn.rows]
+
+            def fetchone(self):
+                return {"total": conn.count}
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+        return Cursor()
+
+    def ping(self, reconnect=False):
+        return True
+
+
+def _store(conn, fulltext=True):
+    store = object.__new__(ConversationStore)
+    store._local = threading.local()
+    store._connections = [conn]
+    store._connections_lock = threading.Lock()
+    store._lock = threading.Lock()
+    store._known_segments = {}
+    store._fulltext_available = fulltext
+    store._connection = conn
+    return store
+
+
+def _rows(n, relevance=False):
+    rows = []
+    for i in range(n):
+        row = {"id": 100 - i, "created_at": datetime(2026, 4, 1, 12, 0, 0), "context": None}
+        if relevance:
+            row["relevance"] = 3.5 - i * 0.25
+        rows.append(row)
+    return rows
+
+
+def test_fulltext_query_requires_all_terms():
+    assert _fulltext_query('押金 "花呗"') == ('+"押金" +"花呗"', [])
+    assert _fulltext_query("X 档期") == ('+"档期"', ["X"])
+
+
+def test_keyword_search_is_relevance_ranked_with_keyset_cursor():
+    conn = RecordingConnection(_rows(3, relevance=True), count=_SEARCH_COUNT_CAP + 1)
+    store = _store(conn)
+
+    page = store.search_messages(keyword="押金", message_type="user", limit=2)
+
+    sql, params = conn.executed[0]
+    assert "MATCH(message_content, agent_response) AGAINST" in sql
+    assert "ORDER BY relevance DESC, id DESC" in sql
+    assert "LIKE" not in sql and "OFFSET" not in sql
+    assert params[-1] == 3  # limit + 1 to detect a next page
+    assert page["total"] == _SEARCH_COUNT_CAP and page["total_is_estimate"] is True
+    assert len(page["items"]) == 2
+    assert decode_cursor(page["next_cursor"]) == {"r": 3.25, "id": 99}
+
+    conn.executed.clear()
+    store.search_messages(keyword="押金", message_type="user", limit=2, cursor=page["next_cursor"])
+    sql, params = conn.executed[0]
+    assert "< %s OR (" in sql
+    assert params[-6:] == ['+"押金"', 3.25, '+"押金"', 3.25, 99, 3]
+    # Later pages skip the count query
+    assert len(conn.executed) == 1
+
+
+def test_browse_without_keyword_pages_by_created_at():
+    conn = RecordingConnection(_rows(2), count=2)
+    page = _store(conn).search_messages(limit=5)
+
+    sql, _ = conn.executed[0]
+    assert "ORDER BY created_at DESC, id DESC" in sql
+    assert page["next_cursor"] is None
+    assert page["total"] == 2 and page["total_is_estimate"] is False
+
+
+def test_falls_back_to_like_without_fulltext_index():
+    conn = RecordingConnection([], count=0)
+    _store(conn, fulltext=False).search_messages(keyword="押金")
+
+    sql, params = conn.executed[0]
+    assert "MATCH" not in sql
+    assert "%押金%" in params
@@ -0,0 +1,61 @@
+"""
+Unit tests for the compiled ignore-pattern matcher.
+"""
+
+from ai_kefu.storage.pattern_matcher import (
+    AhoCorasick,
+    IgnoreMatcher,
+    IgnoreRule,
+    validate_regex,
+)
+
+
+def _matcher():
+    return IgnoreMatcher([
+        IgnoreRule(1, "[图片]", "exact"),
+        IgnoreRule(2, "队友喊你来打气", "contains"),
+        IgnoreRule(3, "she", "contains"),
+        IgnoreRule(4, "hers", "contains"),
+        IgnoreRule(5, r"^\[.*系统关闭了订单\]$", "regex"),
+        IgnoreRule(6, r"(\d{11})", "regex"),
+        IgnoreRule(7, r"(?P<x>a)(?P=x)", "regex"),
+        IgnoreRule(8, "([", "regex"),
+    ])
+
+
+def test_reports_the_rule_that_fired():
+    m = _matcher()
+    assert m.match("  [图片] ").rule.id == 1
+    assert m.match("[图片] 你好") is None  # exact rules need the whole message
+
+    hit = m.match("快来！队友喊你来打气，点击领取")
+    assert hit.rule.id == 2 and hit.matched == "队友喊你来打气"
+
+    assert m.match("[超时未付款，系统关闭了订单]").rule.id == 5
+    hit = m.match("电话 13800138000")
+    assert hit.rule.id == 6 and hit.matched == "13800138000"
+    assert m.match("xaay").rule.id == 7
+    assert m.match("你好，还在吗") is None
+
+
+def test_aho_corasick_follows_failure_links():
+    ac = AhoCorasick([("he", 1), ("she", 2), ("his", 3), ("hers", 4)])
+    assert ac.search("ushers") == ("she", 2)
+    assert ac.search("ahis") == ("his", 3)
+    assert ac.search("xyz") is None
+
+
+def test_invalid_regex_is_skipped_not_fatal():
+    m = _matcher()
+    assert [rule.id for rule, _ in m.invalid_rules] == [8]
+    assert m.stats() == {"exact": 1, "contains": 3, "regex": 3, "invalid": 1}
+    assert validate_regex("([") and validate_regex(r"\d+") is None
+
+
+def test_inline_flags_fall_back_to_separate_regexes():
+    m = IgnoreMatcher([
+        IgnoreRule(1, "(?i)^hello$", "regex"),
+        IgnoreRule(2, "world", "regex"),
+    ])
+    assert m.match("HELLO").rule.id == 1
+    assert m.match("new world").rule.id == 2
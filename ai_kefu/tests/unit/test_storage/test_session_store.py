@@ -0,0 +1,162 @@
+"""
+Unit tests for SessionStore delta persistence (header hash + message list).
+"""
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from ai_kefu.storage.session_store import SessionStore  # noqa: E402
+from ai_kefu.models.session import Session, Message  # noqa: E402
+from ai_kefu.config.constants import MessageRole  # noqa: E402
+from ai_kefu.agent.context_summarizer import apply_summary_to_session  # noqa: E402
+
+
+@pytest.fixture
+def store():
+    s = SessionStore(redis_url="redis://localhost:6379", ttl=600)
+    s.client = fakeredis.FakeRedis(decode_responses=True)
+    return s
+
+
+def _msg(i):
+    role = MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT
+    return Message(role=role, content=f"message {i}")
+
+
+def test_roundtrip_and_append_only_new_messages(store):
+    session = Session(session_id="s1", user_id="u1", messages=[_msg(0), _msg(1)])
+    assert store.set(session)
+
+    loaded = store.get("s1")
+    assert [m.content for m in loaded.messages] == ["message 0", "message 1"]
+    assert loaded.user_id == "u1"
+
+    loaded.messages.extend([_msg(2), _msg(3)])
+    loaded.turn_counter = 3
+    assert store.set(loaded)
+
+    assert store.client.llen("session:s1:msgs") == 4
+    reloaded = store.get("s1")
+    assert [m.content for m in reloaded.messages] == [f"message {i}" for i in range(4)]
+    assert reloaded.turn_counter == 3
+
+
+def test_delta_write_pushes_only_new_messages(store):
+    pushed = []
+    original = store.client.pipeline
+
+    def spy_pipeline(*args, **kwargs):
+        pipe = original(*args, **kwargs)
+        rpush = pipe.rpush
+
+        def counting_rpush(name, *values):
+            pushed.append(len(values))
+            return rpush(name, *values)
+
+        pipe.rpush = counting_rpush
+        return pipe
+
+    store.client.pipeline = spy_pipeline
+    session = Session(session_id="s2", messages=[_msg(i) for i in range(10)])
+    assert store.set(session)
+    session.messages.append(_msg(10))
+    assert store.set(session)
+
+    assert pushed == [10, 1]
+    assert store.client.llen("session:s2:msgs") == 11
+
+
+def test_summary_trim_is_applied_atomically(store):
+    session = Session(session_id="s3", messages=[_msg(i) for i in range(10)])
+    assert store.set(session)
+
+    apply_summary_to_session(session, "summary text", keep_recent_count=4)
+    session.messages.append(_msg(10))
+    assert store.set(session)
+
+    loaded = store.get("s3")
+    assert [m.content for m in loaded.messages] == [m.content for m in session.messages]
+    assert loaded.context["context_summary"] == "summary text"
+
+
+def test_concurrent_writer_is_rebased_not_lost(store):
+    session = Session(session_id="s4", messages=[_msg(0)])
+    assert store.set(session)
+
+    worker_a = store.get("s4")
+    worker_b = store.get("s4")
+    worker_a.messages.append(_msg(1))
+    worker_a.context["item_info"] = "a"
+    assert store.set(worker_a)
+
+    worker_b.messages.append(_msg(2))
+    worker_b.turn_counter = 2
+    assert store.set(worker_b)
+    assert [m.content for m in worker_b.messages] == ["message 0", "message 1", "message 2"]
+
+    loaded = store.get("s4")
+    assert [m.content for m in loaded.messages] == ["message 0", "message 1", "message 2"]
+    assert loaded.context["item_info"] == "a"
+    assert loaded.turn_counter == 2
+
+    # The rebased session keeps saving as a plain delta
+    worker_b.messages.append(_msg(3))
+    assert store.set(worker_b)
+    assert store.client.llen("session:s4:msgs") == 4
+
+
+def test_rebase_reapplies_summary_trim(store):
+    session = Session(session_id="s6", messages=[_msg(i) for i in range(8)])
+    assert store.set(session)
+
+    other = store.get("s6")
+    other.messages.append(_msg(8))
+    assert store.set(other)
+
+    apply_summary_to_session(session, "summary text", keep_recent_count=4)
+    session.messages.append(_msg(9))
+    assert store.set(session)
+
+    loaded = store.get("s6")
+    assert [m.content for m in loaded.messages] == [f"message {i}" for i in range(4, 10)]
+    assert loaded.context["context_summary"] == "summary text"
+
+
+def test_rebase_without_state_merges_instead_of_overwriting(store):
+    legacy = Session(session_id="s8", messages=[_msg(0), _msg(1)])
+    store.client.setex("session:s8", 600, legacy.model_dump_json())
+
+    worker_a = store.get("s8")
+    worker_b = store.get("s8")
+    worker_a.messages.append(_msg(2))
+    assert store.set(worker_a)
+
+    # worker_b read the legacy copy too, so it has no delta to replay
+    worker_b.messages.append(_msg(3))
+    assert store.set(worker_b)
+
+    loaded = store.get("s8")
+    assert [m.content for m in loaded.messages] == [f"message {i}" for i in range(4)]
+
+def test_conflicts_that_never_clear_are_reported(store, monkeypatch):
+    session = Session(session_id="s7", messages=[_msg(0)])
+    assert store.set(session)
+    monkeypatch.setattr(store, "_write", lambda s: None)
+    assert store.set(session) is False
+
+
+def test_legacy_json_session_is_migrated(store):
+    legacy = Session(session_id="s5", messages=[_msg(0), _msg(1)])
+    store.client.setex("session:s5", 600, legacy.model_dump_json())
+
+    loaded = store.get("s5")
+    assert [m.content for m in loaded.messages] == ["message 0", "message 1"]
+    loaded.messages.append(_msg(2))
+    assert store.set(loaded)
+
+    assert not store.client.exists("session:s5")
+    assert store.client.llen("session:s5:msgs") == 3
+    assert store.exists("s5")
+    assert store.delete("s5")
+    assert store.get("s5") is None
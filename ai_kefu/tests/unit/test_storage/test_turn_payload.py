@@ -0,0 +1,150 @@
+"""
+Unit tests for compressed, content-addressed agent turn payloads.
+"""
+
+import threading
+from datetime import datetime
+
+from ai_kefu.xianyu_interceptor.conversation_store import ConversationStore
+from ai_kefu.xianyu_interceptor.turn_payload import (
+    SEGMENT_MIN_CHARS,
+    compress_text,
+    decode_turn_payload,
+    encode_turn_payload,
+    resolve_segments,
+    segment_refs,
+)
+
+SYSTEM_PROMPT = "你是租赁客服。" * 200
+
+
+def _llm_input(question):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": question},
+    ]
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.lastrowid = 0
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        self.conn.executed.append((sql, params))
+        if "INSERT INTO agent_turns" in sql:
+            self.lastrowid = 7
+            self.conn.turns.append(params)
+        elif "FROM prompt_segments" in sql:
+            self._rows = [
+                {"seg_hash": h, "content": compress_text(self.conn.segments[h])}
+                for h in params if h in self.conn.segments
+            ]
+        elif "FROM agent_turns_archive" in sql:
+            self._rows = self.conn.archived
+        elif "FROM agent_turns" in sql:
+            self._rows = self.conn.hot
+
+    def executemany(self, sql, rows):
+        self.conn.executed.append((sql, rows))
+
+    def fetchall(self):
+        return [dict(r) for r in self._rows]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self):
+        self.executed = []
+        self.turns = []
+        self.segments = {}
+        self.hot = []
+        self.archived = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def ping(self, reconnect=False):
+        return True
+
+
+def _store(conn):
+    store = object.__new__(ConversationStore)
+    store._local = threading.local()
+    store._connections = [conn]
+    store._connections_lock = threading.Lock()
+    store._lock = threading.Lock()
+    store._known_segments = {}
+    store._connection = conn
+    return store
+
+
+def _save(store, question):
+    return store.save_turn(
+        session_id="s", turn_number=1, user_query=question,
+        llm_input=_llm_input(question), llm_output={"choices": [{"message": {"content": "好的"}}]},
+        response_text="好的", tool_calls=None, tool_results=None, duration_ms=1,
+    )
+
+
+def test_payload_round_trip_stores_long_contents_once():
+    payload, segments = encode_turn_payload(_llm_input("明天能到吗"), {"id": "x"})
+
+    assert list(segments.values()) == [SYSTEM_PROMPT]
+    assert len(payload) < len(SYSTEM_PROMPT)
+
+    llm_input, llm_output = decode_turn_payload(payload)
+    assert llm_input[0]["content"] == {"$seg": next(iter(segments))}
+    assert segment_refs([llm_input]) == set(segments)
+    assert resolve_segments(llm_input, segments) == _llm_input("明天能到吗")
+    assert llm_output == {"id": "x"}
+
+    short = [{"role": "user", "content": "x" * (SEGMENT_MIN_CHARS - 1)}]
+    assert encode_turn_payload(short, None)[1] == {}
+    assert encode_turn_payload(None, None) == (None, {})
+
+
+def test_save_turn_writes_each_segment_once():
+    conn = FakeConnection()
+    store = _store(conn)
+
+    assert _save(store, "明天能到吗") == 7
+    _save(store, "押金多少")
+
+    segment_writes = [rows for sql, rows in conn.executed if "INSERT IGNORE INTO prompt_segments" in sql]
+    assert len(segment_writes) == 1 and len(segment_writes[0]) == 1
+    # llm_payload is the 7th value; legacy llm_input / llm_output are no longer written
+    assert all("llm_input" not in sql for sql, _ in conn.executed if "INSERT INTO agent_turns" in sql)
+    assert isinstance(conn.turns[0][6], bytes)
+
+
+def test_turn_reads_merge_archive_and_resolve_segments():
+    conn = FakeConnection()
+    payload, segments = encode_turn_payload(_llm_input("明天能到吗"), None)
+    conn.segments.update(segments)
+    created = datetime(2026, 4, 1)
+    conn.hot = [{"id": 9, "session_id": "s", "turn_number": 2, "created_at": created,
+                 "llm_input": '[{"role": "user", "content": "旧格式"}]', "llm_output": None,
+                 "llm_payload": None, "tool_calls": None, "tool_results": None}]
+    conn.archived = [{"id": 3, "session_id": "s", "turn_number": 1, "created_at": created,
+                      "llm_payload": payload, "tool_calls": '[{"name": "parse_date"}]', "tool_results": None}]
+
+    turns = _store(conn).get_turns_by_session("s")
+
+    assert [t["turn_number"] for t in turns] == [1, 2]
+    assert turns[0]["llm_input"] == _llm_input("明天能到吗")
+    assert turns[0]["tool_calls"] == [{"name": "parse_date"}]
+    assert "llm_payload" not in turns[0]
+    assert turns[1]["llm_input"] == [{"role": "user", "content": "旧格式"}]
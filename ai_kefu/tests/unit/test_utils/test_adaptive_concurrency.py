@@ -0,0 +1,62 @@
+"""
+Unit tests for the AIMD concurrency limiter.
+"""
+
+import threading
+import time
+
+from ai_kefu.utils.adaptive_concurrency import AdaptiveConcurrency, is_rate_limited
+
+
+def test_fast_calls_grow_the_limit_by_about_one_per_window():
+    limiter = AdaptiveConcurrency(initial=2, max_limit=4, latency_target_ms=1000)
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(100)
+    assert limiter.limit == 3  # 2 -> 2.5 -> 2.9 -> 3.24
+
+    for _ in range(50):
+        limiter.acquire()
+        limiter.release(100)
+    assert limiter.limit == 4  # capped at max_limit
+
+
+def test_throttling_halves_the_limit_once_per_cooldown():
+    limiter = AdaptiveConcurrency(initial=8, max_limit=8, latency_target_ms=1000, cooldown=60)
+    for _ in range(3):
+        limiter.acquire()
+    for _ in range(3):
+        limiter.release(200, throttled=True)
+    assert limiter.limit == 4
+    assert limiter.stats()["throttled"] == 3 and limiter.stats()["decreases"] == 1
+
+    limiter.cooldown = 0
+    limiter.acquire()
+    limiter.release(5000)  # slower than the target counts like a 429
+    assert limiter.limit == 2
+    assert limiter.stats()["slow"] == 1
+
+
+def test_acquire_blocks_at_the_limit():
+    limiter = AdaptiveConcurrency(initial=1, max_limit=1)
+    limiter.acquire()
+    acquired = threading.Event()
+
+    def second():
+        limiter.acquire()
+        acquired.set()
+
+    t = threading.Thread(target=second, daemon=True)
+    t.start()
+    time.sleep(0.05)
+    assert not acquired.is_set()
+    limiter.release(10)
+    assert acquired.wait(1)
+    t.join(1)
+
+
+def test_is_rate_limited():
+    assert is_rate_limited("Error code: 429 - {'code': 'Throttling.RateQuota'}")
+    assert is_rate_limited("Rate limit exceeded")
+    assert not is_rate_limited("Connection reset")
+    assert not is_rate_limited(None)
@@ -0,0 +1,97 @@
+"""
+Unit tests for the async log sinks and the per-call-site repeat limiter.
+"""
+
+import threading
+
+from loguru import logger
+
+from ai_kefu.utils.logging import AsyncLogSink, RepeatLimiter
+
+
+def _capture(limiter):
+    lines = []
+    sink = AsyncLogSink("test", lines.append)
+    handler_id = logger.add(sink, format="{message}", filter=limiter)
+    return lines, sink, handler_id
+
+
+def test_repeat_limiter_caps_identical_lines_only():
+    limiter = RepeatLimiter(burst=3, window=60)
+    lines, sink, handler_id = _capture(limiter)
+    try:
+        for i in range(10):
+            logger.info("frame {}", i % 2 or "heartbeat")
+        logger.info("other site")
+        sink.drain()
+    finally:
+        logger.remove(handler_id)
+
+    assert [line.strip() for line in lines] == [
+        "frame heartbeat", "frame 1", "frame heartbeat", "frame 1",
+        "frame heartbeat", "frame 1", "other site",
+    ]
+    assert limiter.suppressed_total == 4
+
+
+def test_suppressed_count_is_attached_to_the_next_window(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr("ai_kefu.utils.logging.time.monotonic", lambda: clock[0])
+    limiter = RepeatLimiter(burst=1, window=10)
+    lines, sink, handler_id = _capture(limiter)
+    try:
+        for tick in (0, 1, 2, 11):
+            clock[0] = tick
+            logger.info("poll")
+        sink.drain()
+    finally:
+        logger.remove(handler_id)
+
+    assert [line.strip() for line in lines] == ["poll", "poll [suppressed 2 repeats in 10s]"]
+
+
+def test_warnings_and_errors_are_never_rate_limited():
+    limiter = RepeatLimiter(burst=1, window=60)
+    lines, sink, handler_id = _capture(limiter)
+    try:
+        for _ in range(5):
+            logger.warning("slow reply")
+            logger.error("db down")
+        sink.drain()
+    finally:
+        logger.remove(handler_id)
+    assert len(lines) == 10
+
+
+def test_one_decision_per_record_across_handlers():
+    limiter = RepeatLimiter(burst=2, window=60)
+    first, first_sink, first_id = _capture(limiter)
+    second, second_sink, second_id = _capture(limiter)
+    try:
+        for _ in range(4):
+            logger.info("same line")
+        first_sink.drain()
+        second_sink.drain()
+    finally:
+        logger.remove(first_id)
+        logger.remove(second_id)
+    assert len(first) == len(second) == 2
+
+
+def test_full_queue_drops_instead_of_blocking():
+    release = threading.Event()
+    written = []
+
+    def slow_write(line):
+        release.wait()
+        written.append(line)
+
+    sink = AsyncLogSink("slow", slow_write, maxsize=2)
+    for i in range(10):
+        sink.write(f"line {i}\n")  # returns immediately even though the writer is stuck
+    release.set()
+    sink.drain()
+    sink.stop()
+
+    assert sink.dropped >= 7
+    assert written[-1].endswith(f"dropped {sink.dropped} lines\n")
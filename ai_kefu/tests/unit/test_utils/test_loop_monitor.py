@@ -0,0 +1,44 @@
+"""
+Unit tests for the event-loop lag monitor.
+"""
+
+import asyncio
+import time
+
+from ai_kefu.utils.loop_monitor import LoopLagMonitor
+
+
+def test_blocking_handler_is_reported_with_its_stack():
+    def slow_blocking_handler():
+        time.sleep(0.4)
+
+    async def run():
+        monitor = LoopLagMonitor(interval=0.05, threshold_ms=100)
+        monitor.start()
+        monitor.track_request(1, "GET /conversations/recent")
+        await asyncio.sleep(0.1)
+        slow_blocking_handler()
+        await asyncio.sleep(0.15)
+        monitor.untrack_request(1)
+        await monitor.stop()
+        return monitor.stats()
+
+    stats = asyncio.run(run())
+    assert stats["stalls"] == 1
+    assert stats["max_lag_ms"] >= 300
+    assert stats["last_stall"]["requests"] == ["GET /conversations/recent"]
+    assert "slow_blocking_handler" in stats["last_stall"]["stack"]
+    assert stats["in_flight_requests"] == 0
+
+
+def test_idle_loop_has_no_stalls():
+    async def run():
+        monitor = LoopLagMonitor(interval=0.02, threshold_ms=200)
+        monitor.start()
+        await asyncio.sleep(0.2)
+        await monitor.stop()
+        return monitor.stats()
+
+    stats = asyncio.run(run())
+    assert stats["samples"] >= 5
+    assert stats["stalls"] == 0
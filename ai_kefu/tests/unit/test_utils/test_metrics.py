@@ -0,0 +1,70 @@
+"""
+Unit tests for the Prometheus-style metrics registry.
+"""
+
+import pytest
+
+from ai_kefu.utils.metrics import MetricsRegistry
+
+
+def test_counter_renders_labelled_totals():
+    registry = MetricsRegistry()
+    ignored = registry.counter("ignored_messages", "Ignored messages", ("match_type",))
+    ignored.inc(match_type="regex")
+    ignored.inc(2, match_type="exact")
+
+    text = registry.render()
+    assert "# TYPE ignored_messages counter" in text
+    assert 'ignored_messages_total{match_type="exact"} 2' in text
+    assert 'ignored_messages_total{match_type="regex"} 1' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("llm_seconds", "LLM latency", ("model",), buckets=(0.5, 1.0, 5.0))
+    for value in (0.2, 0.7, 3.0, 9.0):
+        latency.observe(value, model="qwen-plus")
+
+    text = registry.render()
+    assert 'llm_seconds_bucket{model="qwen-plus",le="0.5"} 1' in text
+    assert 'llm_seconds_bucket{model="qwen-plus",le="1"} 2' in text
+    assert 'llm_seconds_bucket{model="qwen-plus",le="5"} 3' in text
+    assert 'llm_seconds_bucket{model="qwen-plus",le="+Inf"} 4' in text
+    assert 'llm_seconds_count{model="qwen-plus"} 4' in text
+    assert 'llm_seconds_sum{model="qwen-plus"} 12.9' in text
+    assert latency.count(model="qwen-plus") == 4
+
+
+def test_gauges_read_callbacks_at_scrape_time():
+    registry = MetricsRegistry()
+    depth = {"value": 3}
+    registry.gauge("queue_depth", "Queue depth").set_function(lambda: depth["value"])
+    assert "queue_depth 3\n" in registry.render()
+    depth["value"] = 0
+    assert "queue_depth 0\n" in registry.render()
+
+
+def test_failing_callback_does_not_break_the_scrape():
+    registry = MetricsRegistry()
+    registry.gauge("broken", "Broken").set_function(lambda: 1 / 0)
+    registry.counter("ok", "Fine").inc()
+    text = registry.render()
+    assert "# broken unavailable: ZeroDivisionError" in text
+    assert "ok_total 1" in text
+
+
+def test_labels_are_validated_and_escaped():
+    registry = MetricsRegistry()
+    tools = registry.counter("tool_calls", "Tool calls", ("tool",))
+    with pytest.raises(ValueError):
+        tools.inc(name="x")
+    tools.inc(tool='say "hi"\n')
+    assert r'tool_calls_total{tool="say \"hi\"\n"} 1' in registry.render()
+
+
+def test_reregistering_returns_the_same_metric():
+    registry = MetricsRegistry()
+    first = registry.counter("calls", "Calls", ("kind",))
+    assert registry.counter("calls", "Calls", ("kind",)) is first
+    with pytest.raises(ValueError):
+        registry.gauge("calls", "Calls", ("kind",))
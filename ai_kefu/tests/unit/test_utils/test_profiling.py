@@ -0,0 +1,112 @@
+"""
+Unit tests for the per-interaction sampling profiler.
+"""
+
+import asyncio
+import time
+
+from ai_kefu.config.settings import settings
+from ai_kefu.utils.profiling import (
+    Profile,
+    SamplingProfiler,
+    parse_profile_header,
+    profile_interaction,
+    request_profiling,
+    reset_profiling,
+    should_profile,
+)
+
+
+def _busy_leaf(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def _busy_parent(seconds):
+    _busy_leaf(seconds)
+
+
+def test_parse_profile_header():
+    assert parse_profile_header("1") is True
+    assert parse_profile_header(" TRUE ") is True
+    assert parse_profile_header("0") is False
+    assert parse_profile_header("maybe") is None
+    assert parse_profile_header(None) is None
+
+
+def test_header_decision_overrides_sample_rate(monkeypatch):
+    monkeypatch.setattr(settings, "profile_sample_rate", 1.0)
+    token = request_profiling(False)
+    try:
+        assert should_profile() is False
+    finally:
+        reset_profiling(token)
+    assert should_profile() is True
+
+    monkeypatch.setattr(settings, "profile_sample_rate", 0.0)
+    assert should_profile() is False
+
+
+def test_decision_follows_asyncio_to_thread(monkeypatch):
+    monkeypatch.setattr(settings, "profile_sample_rate", 0.0)
+
+    async def handler():
+        token = request_profiling(True)
+        try:
+            return await asyncio.to_thread(should_profile)
+        finally:
+            reset_profiling(token)
+
+    assert asyncio.run(handler()) is True
+
+
+def test_sampler_captures_the_calling_threads_stacks():
+    profiler = SamplingProfiler("test", interval_ms=1).start()
+    _busy_parent(0.1)
+    profile = profiler.stop()
+
+    assert len(profile.samples) > 10
+    assert len(profile.samples) == len(profile.weights)
+    names = [frame["name"] for frame in profile.frames]
+    leaf, parent = names.index("_busy_leaf"), names.index("_busy_parent")
+    # Stacks are root first: the caller precedes the callee
+    busy = [stack for stack in profile.samples if leaf in stack]
+    assert busy and all(stack.index(parent) < stack.index(leaf) for stack in busy)
+    assert abs(sum(profile.weights) - profile.duration_ms) < profile.duration_ms * 0.5
+
+
+def test_speedscope_round_trip_and_collapsed_output():
+    profile = Profile(
+        name="agent.run",
+        frames=[
+            {"name": "run", "file": "agent/executor.py", "line": 10},
+            {"name": "call_qwen", "file": "llm/qwen_client.py", "line": 20},
+        ],
+        samples=[(0, 1), (0, 1), (0,)],
+        weights=[5.0, 5.0, 5.0],
+        duration_ms=15.0,
+    )
+    document = profile.to_speedscope()
+    assert document["profiles"][0]["type"] == "sampled"
+    restored = Profile.from_speedscope(document)
+    assert restored.samples == profile.samples
+
+    assert restored.to_collapsed().splitlines() == [
+        "run (agent/executor.py:10);call_qwen (llm/qwen_client.py:20) 2",
+        "run (agent/executor.py:10) 1",
+    ]
+
+
+def test_profile_interaction_is_inert_when_not_requested(monkeypatch):
+    monkeypatch.setattr(settings, "profile_sample_rate", 0.0)
+    with profile_interaction() as profiler:
+        assert profiler is None
+
+    token = request_profiling(True)
+    try:
+        with profile_interaction() as profiler:
+            _busy_leaf(0.02)
+        assert profiler is not None and profiler.profile().samples
+    finally:
+        reset_profiling(token)
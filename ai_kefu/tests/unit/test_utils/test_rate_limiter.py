@@ -0,0 +1,47 @@
+"""
+Unit tests for the token-bucket LLM rate limiter.
+"""
+
+import time
+
+from ai_kefu.utils import rate_limiter
+from ai_kefu.utils.rate_limiter import TokenBucketLimiter, configure_llm_rate_limit
+
+
+def test_request_bucket_spaces_calls_after_the_burst():
+    limiter = TokenBucketLimiter(requests_per_second=20)
+    started = time.monotonic()
+    for _ in range(25):
+        limiter.acquire()
+    elapsed = time.monotonic() - started
+    # 20 burst immediately, the remaining 5 at 20/s
+    assert 0.2 <= elapsed < 0.6
+    assert limiter.stats()["acquired"] == 25
+
+
+def test_token_bucket_waits_for_tokens_and_settles_actual_usage():
+    limiter = TokenBucketLimiter(tokens_per_minute=6000)  # 100 tokens/s
+    assert limiter.acquire(6000) < 0.05
+
+    # The reservation was too large: 5900 of 6000 tokens come back
+    limiter.settle(6000, 100)
+    assert limiter.acquire(5000) < 0.05
+
+    started = time.monotonic()
+    limiter.acquire(950)  # ~900 left, needs ~0.5s of refill
+    assert time.monotonic() - started >= 0.3
+
+
+def test_oversized_request_is_clamped_to_capacity():
+    limiter = TokenBucketLimiter(tokens_per_minute=600)
+    assert limiter.acquire(10_000) < 0.05
+
+
+def test_configure_installs_and_removes_the_shared_limiter():
+    try:
+        limiter = configure_llm_rate_limit(5, 0)
+        assert rate_limiter.get_llm_rate_limiter() is limiter
+        assert configure_llm_rate_limit(0, 0) is None
+        assert rate_limiter.get_llm_rate_limiter() is None
+    finally:
+        configure_llm_rate_limit(0, 0)
@@ -0,0 +1,79 @@
+"""
+Unit tests for the vectorized reply-similarity engine.
+"""
+
+import random
+
+import pytest
+
+from ai_kefu.utils.similarity import BigramMatrix, jaccard_pairs, length_ratios, score_pairs
+
+
+def _reference_jaccard(text_a, text_b):
+    """The per-pair set implementation the engine replaced."""
+    if not text_a or not text_b:
+        return 0.0
+
+    def bigrams(text):
+        text = text.strip()
+        return {text[i:i + 2] for i in range(len(text) - 1)} if len(text) >= 2 else {text}
+
+    set_a, set_b = bigrams(text_a), bigrams(text_b)
+    union = len(set_a | set_b)
+    return len(set_a & set_b) / union if union > 0 else 0.0
+
+
+def test_jaccard_matches_the_set_implementation():
+    rng = random.Random(7)
+    alphabet = "你好在吗押金多少可以租 ab\n😀"
+
+    def text():
+        return "".join(rng.choice(alphabet) for _ in range(rng.choice([0, 1, 2, 3, rng.randint(4, 40)])))
+
+    texts_a = ["", " ", "x", "  ", "押金押金押金"] + [text() for _ in range(2000)]
+    texts_b = ["ab", "  ", "x", "", "押金"] + [text() for _ in range(2000)]
+
+    scores = jaccard_pairs(texts_a, texts_b)
+    expected = [_reference_jaccard(a, b) for a, b in zip(texts_a, texts_b)]
+    assert scores.tolist() == pytest.approx(expected, abs=1e-12)
+
+
+def test_texts_are_encoded_once_per_distinct_stripped_text():
+    matrix = BigramMatrix()
+    rows = [matrix.add(t) for t in ("押金多少", " 押金多少 ", "押金多少", "租期")]
+    matrix.freeze()
+    assert rows == [0, 0, 0, 1]
+    assert matrix.row_sizes.tolist() == [3, 1]
+
+
+def test_length_ratios_and_empty_pairs():
+    assert length_ratios(["abcd", "", " ab "], ["ab", "ab", "ab"]).tolist() == [0.5, 0.0, 1.0]
+    assert jaccard_pairs([], []).tolist() == []
+    with pytest.raises(ValueError):
+        jaccard_pairs(["a"], [])
+
+
+def test_embedding_similarity_embeds_each_distinct_text_once(monkeypatch):
+    calls = []
+
+    def fake_batch(texts, task_type="retrieval_document"):
+        calls.append(list(texts))
+        return [[1.0, 0.0] if "押金" in t else [0.0, 1.0] for t in texts]
+
+    monkeypatch.setattr("ai_kefu.llm.embeddings.generate_embeddings_batch", fake_batch)
+    scores = score_pairs(["押金多少", "押金多少", "你好"], ["押金500", "在的", ""], with_embeddings=True)
+
+    assert calls == [["押金多少", "你好", "押金500", "在的"]]
+    assert scores["embedding_similarity"] == pytest.approx([1.0, 0.0, 0.0])
+    assert set(scores) == {"similarity", "length_ratio", "embedding_similarity"}
+    assert "embedding_similarity" not in score_pairs(["a"], ["a"])
+
+
+def test_failed_embeddings_score_none(monkeypatch):
+    def flaky_batch(texts, task_type="retrieval_document"):
+        # generate_embeddings_batch returns a zero vector for a failed text
+        return [[0.0, 0.0] if t == "超时" else [1.0, 0.0] for t in texts]
+
+    monkeypatch.setattr("ai_kefu.llm.embeddings.generate_embeddings_batch", flaky_batch)
+    scores = score_pairs(["押金", "超时", "押金"], ["押金", "押金", ""], with_embeddings=True)
+    assert scores["embedding_similarity"] == [pytest.approx(1.0), None, 0.0]
@@ -0,0 +1,94 @@
+"""
+Unit tests for span tracing and traceparent propagation.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from ai_kefu.config.settings import settings
+from ai_kefu.utils import tracing
+from ai_kefu.utils.tracing import (
+    TRACEPARENT_HEADER,
+    configure_tracing,
+    current_trace_id,
+    inject_headers,
+    parse_traceparent,
+    start_span,
+)
+
+
+@pytest.fixture
+def exporter(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "tracing_enabled", True)
+    exporter = configure_tracing("test", str(tmp_path))
+    yield exporter
+    exporter.shutdown()
+    tracing._exporter = None
+
+
+def _exported(exporter):
+    exporter.flush()
+    with open(exporter.path_for(), encoding="utf-8") as f:
+        return {span["name"]: span for span in map(json.loads, f)}
+
+
+def test_parse_traceparent():
+    trace_id, span_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+    assert parse_traceparent(f"00-{trace_id}-{span_id}-01") == (trace_id, span_id)
+    assert parse_traceparent("garbage") is None
+    assert parse_traceparent(f"00-{'0' * 32}-{span_id}-01") is None
+    assert parse_traceparent(None) is None
+
+
+def test_nested_spans_share_the_trace_and_link_parents(exporter):
+    with start_span("api.inbound") as root:
+        with start_span("agent.run"):
+            with start_span("tool.check_availability", {"chat_id": "c1"}):
+                assert current_trace_id() == root.trace_id
+    assert current_trace_id() is None
+
+    spans = _exported(exporter)
+    assert {s["trace_id"] for s in spans.values()} == {root.trace_id}
+    assert spans["agent.run"]["parent_id"] == spans["api.inbound"]["span_id"]
+    assert spans["tool.check_availability"]["parent_id"] == spans["agent.run"]["span_id"]
+    assert spans["tool.check_availability"]["attributes"] == {"chat_id": "c1"}
+    assert spans["api.inbound"]["service"] == "test"
+
+
+def test_traceparent_header_continues_a_remote_trace(exporter):
+    with start_span("interceptor.handle_message") as client_span:
+        headers = inject_headers({"content-type": "application/json"})
+    assert headers[TRACEPARENT_HEADER] == client_span.traceparent
+
+    # Server side: no current span, so the header decides the trace
+    with start_span("api.POST /xianyu/inbound", traceparent=headers[TRACEPARENT_HEADER]) as server_span:
+        pass
+    assert server_span.trace_id == client_span.trace_id
+    assert server_span.parent_id == client_span.span_id
+
+
+def test_span_context_follows_asyncio_to_thread(exporter):
+    async def handler():
+        with start_span("api.inbound") as span:
+            trace_id = await asyncio.to_thread(current_trace_id)
+        return span.trace_id, trace_id
+
+    expected, seen = asyncio.run(handler())
+    assert seen == expected
+
+
+def test_exception_is_recorded_on_the_span(exporter):
+    with pytest.raises(ValueError):
+        with start_span("tool.broken"):
+            raise ValueError("boom")
+    assert _exported(exporter)["tool.broken"]["error"] == "ValueError: boom"
+
+
+def test_disabled_tracing_returns_inert_spans(monkeypatch):
+    monkeypatch.setattr(settings, "tracing_enabled", False)
+    with start_span("agent.run") as span:
+        span.set_attribute("ignored", 1)
+        assert current_trace_id() is None
+        assert TRACEPARENT_HEADER not in inject_headers()
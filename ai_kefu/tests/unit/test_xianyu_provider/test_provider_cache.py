@@ -0,0 +1,138 @@
+"""
+Unit tests for CachedXianyuProvider (TTL cache + single-flight coalescing).
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from ai_kefu.utils.metrics import XIANYU_CACHE_LOOKUPS
+from ai_kefu.xianyu_provider.cache import CachedXianyuProvider
+
+
+def _inner():
+    inner = MagicMock()
+    inner.get_item_info = AsyncMock(
+        side_effect=lambda item_id: {"success": True, "item_id": item_id, "title": "X300U"}
+    )
+    inner.get_order_detail = AsyncMock(
+        side_effect=lambda order_id: {"success": True, "order_id": order_id, "status": "WAIT_BUYER_PAY"}
+    )
+    inner.get_buyer_info = AsyncMock(return_value={"success": False, "error": "rate limited"})
+    return inner
+
+
+def test_item_info_is_cached():
+    inner = _inner()
+    provider = CachedXianyuProvider(inner)
+    hits_before = XIANYU_CACHE_LOOKUPS.value(method="get_item_info", outcome="hit")
+    misses_before = XIANYU_CACHE_LOOKUPS.value(method="get_item_info", outcome="miss")
+
+    async def run():
+        first = await provider.get_item_info("123")
+        second = await provider.get_item_info("123")
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first == second
+    assert inner.get_item_info.await_count == 1
+    stats = provider.stats()["methods"]["get_item_info"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    # Same counts on /metrics
+    assert XIANYU_CACHE_LOOKUPS.value(method="get_item_info", outcome="hit") == hits_before + 1
+    assert XIANYU_CACHE_LOOKUPS.value(method="get_item_info", outcome="miss") == misses_before + 1
+
+
+def test_concurrent_lookups_are_coalesced():
+    inner = _inner()
+
+    async def slow_item(item_id):
+        await asyncio.sleep(0.05)
+        return {"success": True, "item_id": item_id}
+
+    inner.get_item_info = AsyncMock(side_effect=slow_item)
+    provider = CachedXianyuProvider(inner)
+
+    async def run():
+        return await asyncio.gather(*(provider.get_item_info("123") for _ in range(5)))
+
+    results = asyncio.run(run())
+
+    assert all(r["item_id"] == "123" for r in results)
+    assert inner.get_item_info.await_count == 1
+    assert provider.stats()["methods"]["get_item_info"]["coalesced"] == 4
+
+
+def test_failures_use_negative_ttl():
+    inner = _inner()
+    provider = CachedXianyuProvider(inner, negative_ttl=0)
+
+    async def run():
+        await provider.get_buyer_info("u1")
+        await provider.get_buyer_info("u1")
+
+    asyncio.run(run())
+
+    # negative_ttl=0 disables negative caching
+    assert inner.get_buyer_info.await_count == 2
+
+
+def test_negative_cache_hit_is_counted():
+    inner = _inner()
+    provider = CachedXianyuProvider(inner, negative_ttl=30)
+
+    async def run():
+        await provider.get_buyer_info("u1")
+        return await provider.get_buyer_info("u1")
+
+    result = asyncio.run(run())
+
+    assert result["success"] is False
+    assert inner.get_buyer_info.await_count == 1
+    assert provider.stats()["methods"]["get_buyer_info"]["negative_hits"] == 1
+
+
+def test_invalidate_order():
+    inner = _inner()
+    provider = CachedXianyuProvider(inner)
+
+    async def run():
+        await provider.get_order_detail("9876543210")
+        provider.invalidate_order("9876543210")
+        await provider.get_order_detail("9876543210")
+
+    asyncio.run(run())
+
+    assert inner.get_order_detail.await_count == 2
+
+
+def test_upstream_exception_is_not_cached():
+    inner = _inner()
+    inner.get_item_info = AsyncMock(side_effect=[RuntimeError("boom"), {"success": True}])
+    provider = CachedXianyuProvider(inner)
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await provider.get_item_info("1")
+        return await provider.get_item_info("1")
+
+    assert asyncio.run(run()) == {"success": True}
+    assert inner.get_item_info.await_count == 2
+
+
+def test_max_entries_evicts_oldest():
+    inner = _inner()
+    provider = CachedXianyuProvider(inner, max_entries=2)
+
+    async def run():
+        for item_id in ("1", "2", "3"):
+            await provider.get_item_info(item_id)
+        await provider.get_item_info("1")
+
+    asyncio.run(run())
+
+    assert provider.stats()["entries"] == 2
+    assert inner.get_item_info.await_count == 4
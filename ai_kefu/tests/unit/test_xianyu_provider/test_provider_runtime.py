@@ -0,0 +1,89 @@
+"""
+Unit tests for the Xianyu provider runtime (persistent background event loop).
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from ai_kefu.xianyu_provider.runtime import ProviderRuntime
+
+
+@pytest.fixture
+def runtime():
+    rt = ProviderRuntime(max_workers=2, default_timeout=2.0).start()
+    yield rt
+    rt.shutdown()
+
+
+def test_submit_reuses_single_loop(runtime):
+    """All submitted coroutines run on the same background loop thread."""
+    async def current_loop_thread():
+        return id(asyncio.get_running_loop()), threading.current_thread().name
+
+    first = runtime.submit(current_loop_thread())
+    second = runtime.submit(current_loop_thread())
+
+    assert first == second
+    assert first[1] != threading.current_thread().name
+
+
+def test_submit_runs_sync_work_in_bounded_executor(runtime):
+    """run_in_executor(None, ...) uses the runtime's own thread pool."""
+    async def in_executor():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: threading.current_thread().name)
+
+    name = runtime.submit(in_executor())
+
+    assert name.startswith("xianyu-provider-io")
+
+
+def test_submit_timeout_cancels_coroutine(runtime):
+    """A deadline overrun raises TimeoutError and cancels the task."""
+    cancelled = threading.Event()
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(TimeoutError):
+        runtime.submit(slow(), timeout=0.1)
+
+    assert cancelled.wait(1.0)
+
+
+def test_submit_propagates_exceptions(runtime):
+    async def boom():
+        raise ValueError("bad cookie")
+
+    with pytest.raises(ValueError, match="bad cookie"):
+        runtime.submit(boom())
+
+
+def test_submit_from_loop_thread_is_rejected(runtime):
+    """Submitting from inside the runtime loop would deadlock, so it raises."""
+    async def nested():
+        async def inner():
+            return 1
+        return runtime.submit(inner())
+
+    with pytest.raises(RuntimeError):
+        runtime.submit(nested())
+
+
+def test_shutdown_then_submit_restarts():
+    rt = ProviderRuntime(max_workers=1)
+
+    async def value():
+        return 42
+
+    assert rt.submit(value()) == 42
+    rt.shutdown()
+    assert not rt.is_running
+    assert rt.submit(value()) == 42
+    rt.shutdown()
@@ -9,6 +9,7 @@ from typing import Dict, Any, Optional
 from datetime import datetime
 from ai_kefu.utils.logging import logger
 from ai_kefu.config.settings import settings
+from ai_kefu.utils.tracing import inject_headers, start_span
 
 
 def check_availability(
@@ -139,12 +140,15 @@ def check_availability(
         logger.info(f"Equivalent curl command (readable):\n{curl_command_readable}")
         logger.info(f"Equivalent curl command (one-line): {curl_command_oneline}")
         
-        response = requests.post(
-            api_url,
-            json=payload,
-            headers=headers,
-            timeout=10  # 10秒超时
-        )
+        # 档期服务 (InventoryManager find-slot) 的耗时单独记 span，并透传 traceparent
+        with start_span("rental_api.find_slot", {"url": api_url}) as span:
+            response = requests.post(
+                api_url,
+                json=payload,
+                headers=inject_headers(headers),
+                timeout=10  # 10秒超时
+            )
+            span.set_attribute("status_code", response.status_code)
         
         # 检查响应状态
         if response.status_code == 404:
@@ -3,9 +3,12 @@ Tool registry for managing and executing tools.
 T035 - Tool registry implementation.
 """
 
+import time
 from typing import Dict, List, Callable, Any, Optional
 from ai_kefu.utils.errors import ToolExecutionError
 from ai_kefu.utils.logging import logger
+from ai_kefu.utils.metrics import TOOL_CALL_SECONDS
+from ai_kefu.utils.tracing import start_span
 
 
 class ToolRegistry:
@@ -106,12 +109,16 @@ class ToolRegistry:
         if tool is None:
             raise ToolExecutionError(name, f"Tool '{name}' not found")
         
+        started = time.perf_counter()
         try:
             logger.info(f"Executing tool: {name} with args: {args}")
-            result = tool(**args)
+            with start_span(f"tool.{name}"):
+                result = tool(**args)
+            TOOL_CALL_SECONDS.observe(time.perf_counter() - started, tool=name, outcome="ok")
             logger.info(f"Tool {name} executed successfully")
             return result
         except Exception as e:
+            TOOL_CALL_SECONDS.observe(time.perf_counter() - started, tool=name, outcome="error")
             error_msg = f"Tool execution failed: {str(e)}"
             logger.error(f"Tool {name} failed: {error_msg}")
             raise ToolExecutionError(name, error_msg)
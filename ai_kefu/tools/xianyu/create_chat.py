@@ -29,15 +29,14 @@ def create_chat(
     Returns:
         {"success": bool, "message": str, "error": str (on failure)}
     """
-    import asyncio
-    from ai_kefu.xianyu_provider import get_provider
+    from ai_kefu.xianyu_provider import get_provider, run_sync
 
     try:
         logger.info(
             f"[create_chat] Initiating chat: buyer_id={buyer_id}, item_id={item_id}"
         )
         provider = get_provider()
-        asyncio.run(provider.create_chat(websocket, buyer_id, item_id))
+        run_sync(provider.create_chat(websocket, buyer_id, item_id))
         logger.info(f"[create_chat] Chat initiated: buyer_id={buyer_id}")
         return {
             "success": True,
@@ -3,10 +3,9 @@ Tool: get_buyer_info
 查询闲鱼买家信息，包括购买历史统计和地区信息。底层调用由 xianyu_provider 层统一管理。
 """
 
-import asyncio
 from typing import Dict, Any
 
-from ai_kefu.xianyu_provider import get_provider
+from ai_kefu.xianyu_provider import get_provider, run_sync
 from ai_kefu.utils.logging import logger
 
 
@@ -35,7 +34,7 @@ def get_buyer_info(buyer_id: str) -> Dict[str, Any]:
     try:
         logger.info(f"[get_buyer_info] Fetching buyer info: {buyer_id}")
         provider = get_provider()
-        result = asyncio.run(provider.get_buyer_info(str(buyer_id)))
+        result = run_sync(provider.get_buyer_info(str(buyer_id)))
 
         if result["success"]:
             logger.info(
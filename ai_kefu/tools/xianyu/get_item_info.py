@@ -3,10 +3,9 @@ Tool: get_item_info
 查询闲鱼商品详情。底层调用由 xianyu_provider 层统一管理。
 """
 
-import asyncio
 from typing import Dict, Any
 
-from ai_kefu.xianyu_provider import get_provider
+from ai_kefu.xianyu_provider import get_provider, run_sync
 from ai_kefu.utils.logging import logger
 
 
@@ -35,7 +34,7 @@ def get_item_info(item_id: str) -> Dict[str, Any]:
     try:
         logger.info(f"[get_item_info] Fetching item: {item_id}")
         provider = get_provider()
-        result = asyncio.run(provider.get_item_info(str(item_id)))
+        result = run_sync(provider.get_item_info(str(item_id)))
 
         if result["success"]:
             logger.info(
@@ -3,10 +3,9 @@ Tool: get_order_detail
 查询闲鱼订单详情。底层调用由 xianyu_provider 层统一管理。
 """
 
-import asyncio
 from typing import Dict, Any
 
-from ai_kefu.xianyu_provider import get_provider
+from ai_kefu.xianyu_provider import get_provider, run_sync
 from ai_kefu.utils.logging import logger
 
 
@@ -37,7 +36,7 @@ def get_order_detail(order_id: str) -> Dict[str, Any]:
     try:
         logger.info(f"[get_order_detail] Fetching order: {order_id}")
         provider = get_provider()
-        result = asyncio.run(provider.get_order_detail(str(order_id)))
+        result = run_sync(provider.get_order_detail(str(order_id)))
 
         if result["success"]:
             logger.info(
@@ -4,10 +4,9 @@ Tool: list_conversations
 底层调用由 xianyu_provider 层统一管理。
 """
 
-import asyncio
 from typing import Dict, Any, List
 
-from ai_kefu.xianyu_provider import get_provider
+from ai_kefu.xianyu_provider import get_provider, run_sync
 from ai_kefu.utils.logging import logger
 
 
@@ -37,7 +36,7 @@ def list_conversations(chat_id: str) -> Dict[str, Any]:
     try:
         logger.info(f"[list_conversations] Fetching history for chat_id={chat_id}")
         provider = get_provider()
-        messages: List[Dict[str, Any]] = asyncio.run(
+        messages: List[Dict[str, Any]] = run_sync(
             provider.list_all_conversations(chat_id)
         )
         logger.info(
@@ -3,10 +3,9 @@ Tool: send_xianyu_message
 向闲鱼买家发送消息。底层调用由 xianyu_provider 层统一管理。
 """
 
-import asyncio
 from typing import Dict, Any
 
-from ai_kefu.xianyu_provider import get_provider
+from ai_kefu.xianyu_provider import get_provider, run_sync
 from ai_kefu.utils.logging import logger
 
 
@@ -30,7 +29,7 @@ def send_xianyu_message(chat_id: str, buyer_id: str, text: str) -> Dict[str, Any
     try:
         logger.info(f"[send_xianyu_message] chat_id={chat_id}, buyer_id={buyer_id}")
         provider = get_provider()
-        return asyncio.run(provider.send_message_once(chat_id, buyer_id, text))
+        return run_sync(provider.send_message_once(chat_id, buyer_id, text))
 
     except ValueError as e:
         msg = str(e)
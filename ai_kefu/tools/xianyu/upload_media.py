@@ -4,10 +4,9 @@ Tool: upload_media
 底层调用由 xianyu_provider 层统一管理。
 """
 
-import asyncio
 from typing import Dict, Any
 
-from ai_kefu.xianyu_provider import get_provider
+from ai_kefu.xianyu_provider import get_provider, run_sync
 from ai_kefu.utils.logging import logger
 
 
@@ -30,7 +29,7 @@ def upload_media(media_path: str) -> Dict[str, Any]:
     try:
         logger.info(f"[upload_media] Uploading: {media_path}")
         provider = get_provider()
-        result = asyncio.run(provider.upload_media(media_path))
+        result = run_sync(provider.upload_media(media_path))
 
         if result["success"]:
             logger.info(
@@ -50,7 +50,7 @@ export default {
     }
     if (params.debug_only) searchParams.set('debug_only', 'true')
     if (params.limit) searchParams.set('limit', params.limit)
-    if (params.offset) searchParams.set('offset', params.offset)
+    if (params.cursor) searchParams.set('cursor', params.cursor)
 
     return request(`${BASE_URL}/search?${searchParams.toString()}`)
   },
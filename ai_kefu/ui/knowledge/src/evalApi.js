@@ -18,17 +18,26 @@ export const evalAPI = {
   /**
    * Get eval run detail (all items)
    */
-  async getRunDetail(runId, { statusFilter, chatIdFilter, limit, offset } = {}) {
+  async getRunDetail(runId, { statusFilter, chatIdFilter, limit, cursor } = {}) {
     const params = new URLSearchParams()
     if (statusFilter) params.set('status_filter', statusFilter)
     if (chatIdFilter) params.set('chat_id_filter', chatIdFilter)
     if (limit) params.set('limit', limit)
-    if (offset) params.set('offset', offset)
+    if (cursor) params.set('cursor', cursor)
     const res = await fetch(`${API_BASE}/runs/${encodeURIComponent(runId)}?${params}`)
     if (!res.ok) throw new Error(`API error: ${res.status}`)
     return res.json()
   },
 
+  /**
+   * Get one eval item with context_messages / ai_tool_calls
+   */
+  async getItem(runId, itemId) {
+    const res = await fetch(`${API_BASE}/runs/${encodeURIComponent(runId)}/items/${itemId}`)
+    if (!res.ok) throw new Error(`API error: ${res.status}`)
+    return res.json()
+  },
+
   /**
    * Get distinct chat_ids within a run
    */
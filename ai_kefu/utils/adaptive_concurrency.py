@@ -0,0 +1,113 @@
+"""
+AIMD concurrency limit for batch jobs that call the LLM.
+
+A fixed worker count is either too timid when Qwen is fast or overloads it
+when Qwen is slow. ``AdaptiveConcurrency`` works like TCP congestion control:
+every call that finishes under ``latency_target_ms`` without being throttled
+adds ``1 / limit`` to the limit, so the limit grows by about one per full
+window. A throttled (429) or slow call halves it, at most once per
+``cooldown`` seconds, because a single overload usually fails several
+in-flight calls at once.
+
+    limiter = AdaptiveConcurrency(initial=4, max_limit=16)
+    limiter.acquire()
+    try:
+        ...
+    finally:
+        limiter.release(latency_ms, throttled=is_rate_limited(error))
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# Error text the OpenAI SDK / DashScope use for rate limiting
+_THROTTLE_MARKERS = ("429", "rate limit", "ratelimit", "throttl", "too many requests")
+
+
+def is_rate_limited(error: Optional[str]) -> bool:
+    """Whether an error message reports rate limiting."""
+    if not error:
+        return False
+    text = error.lower()
+    return any(marker in text for marker in _THROTTLE_MARKERS)
+
+
+class AdaptiveConcurrency:
+    """Additive-increase / multiplicative-decrease limit on in-flight calls."""
+
+    def __init__(
+        self,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        latency_target_ms: float = 20000.0,
+        decrease_factor: float = 0.5,
+        cooldown: float = 5.0,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.latency_target_ms = latency_target_ms
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self._limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+        # metrics
+        self.completed = 0
+        self.throttled = 0
+        self.slow = 0
+        self.decreases = 0
+        self.peak_limit = int(self._limit)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self) -> None:
+        """Block until a slot is free under the current limit."""
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, latency_ms: Optional[float], throttled: bool = False) -> None:
+        """
+        Free a slot and adjust the limit from the call's outcome.
+
+        Args:
+            latency_ms: Duration of the call (None when unknown, e.g. it crashed)
+            throttled: The call was rejected or failed because of rate limiting
+        """
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            self.completed += 1
+            slow = latency_ms is not None and latency_ms > self.latency_target_ms
+            if throttled or slow:
+                self.throttled += int(throttled)
+                self.slow += int(slow)
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+                    self._last_decrease = now
+                    self.decreases += 1
+            elif latency_ms is not None:
+                self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+                self.peak_limit = max(self.peak_limit, int(self._limit))
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "peak_limit": self.peak_limit,
+            "completed": self.completed,
+            "throttled": self.throttled,
+            "slow": self.slow,
+            "decreases": self.decreases,
+        }
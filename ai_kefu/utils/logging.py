@@ -4,12 +4,34 @@ Logging infrastructure using loguru.
 - Console: colored text (dev) or JSON (production, LOG_FORMAT=json)
 - File:    always JSON (JSONL), daily rotation → logs/backend_YYYY-MM-DD.log
 - stdlib bridge: all logging.getLogger() calls are routed through loguru
+
+Both sinks are asynchronous: the calling thread (often the event loop) only
+formats the record and puts it on a bounded queue, and a writer thread does
+the stdout / disk I/O. When a queue is full the line is dropped and counted
+instead of blocking the caller. An identical INFO / DEBUG line (same call
+site and same formatted message) may be emitted ``log_rate_limit_burst``
+times per ``log_rate_limit_window`` seconds; further repeats are dropped and
+the next copy let through reports how many were suppressed. Distinct lines
+and WARNING and above are never rate limited. Drop and suppression counts
+are exported on ``GET /metrics`` (``log_stats``).
+
+Hot paths should pass fields as arguments instead of pre-formatting them, so
+records below the active level cost nothing:
+
+    logger.debug("frame {} keys={}", lwp, list(frame))                 # formatted only if emitted
+    logger.opt(lazy=True).debug("raw: {}", lambda: json.dumps(frame))  # payload built only if emitted
 """
 
+import atexit
+import copy
+import json
+import queue
 import sys
 import logging
+import threading
+import time
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 
 from loguru import logger
 
@@ -17,7 +39,7 @@ from ai_kefu.config.settings import settings
 
 
 # ── Log directory ──────────────────────────────────────────────────────────────
-LOG_DIR = Path(__file__).parent.parent / "logs"
+LOG_DIR = Path(settings.log_dir) if settings.log_dir else Path(__file__).parent.parent / "logs"
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 
 
@@ -44,38 +66,207 @@ class _InterceptHandler(logging.Handler):
 _INTERCEPT_INSTALLED = False
 
 
-# ── Public setup ───────────────────────────────────────────────────────────────
+# ── Async sinks and rate limiting ──────────────────────────────────────────────
+class RepeatLimiter:
+    """
+    Loguru filter that caps repeats of one line (module + line number +
+    formatted message) per window.
 
-def setup_logging(
-    level: Optional[str] = None,
-    log_format: Optional[str] = None,
-) -> "logger":  # type: ignore[return]
+    WARNING and above always pass. One instance is shared by all handlers: the
+    first handler decides for a record and the others reuse that decision, so
+    every sink sees the same lines.
     """
-    Configure application logging.
 
-    Call once at startup (api/main.py already does this).
-    Safe to call multiple times – handlers are rebuilt from scratch each call.
+    def __init__(self, burst: int, window: float, exempt_level: int = 30):
+        self.burst = burst
+        self.window = window
+        self.exempt_level = exempt_level
+        self.suppressed_total = 0
+        # (module, line, message) -> [window start, emitted, suppressed]
+        self._sites: Dict[Tuple[str, int, str], list] = {}
+        self._lock = threading.Lock()
+        self._last = threading.local()
+
+    def __call__(self, record: Dict[str, Any]) -> bool:
+        last = self._last
+        if getattr(last, "record", None) is record:
+            return last.allowed
+        allowed = self._decide(record)
+        last.record, last.allowed = record, allowed
+        return allowed
+
+    def _decide(self, record: Dict[str, Any]) -> bool:
+        if self.burst <= 0 or record["level"].no >= self.exempt_level:
+            return True
+        key = (record["name"], record["line"], record["message"])
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site else 0
+                self._sites[key] = [now, 1, 0]
+                if len(self._sites) > 10000:
+                    self._prune(now)
+            elif site[1] < self.burst:
+                site[1] += 1
+                suppressed = 0
+            else:
+                site[2] += 1
+                self.suppressed_total += 1
+                return False
+        if suppressed:
+            record["message"] += f" [suppressed {suppressed} repeats in {self.window:g}s]"
+        return True
+
+    def _prune(self, now: float) -> None:
+        # Expired windows only matter for their suppressed count, which is
+        # already in suppressed_total; drop them, or everything if still too many
+        self._sites = {k: v for k, v in self._sites.items() if now - v[0] < self.window}
+        if len(self._sites) > 10000:
+            self._sites = {}
+
+
+class AsyncLogSink:
+    """
+    Loguru sink that hands formatted lines to a writer thread through a
+    bounded queue. ``write`` never blocks: a full queue drops the line, and
+    the writer reports the drop count once it catches up.
     """
-    global _INTERCEPT_INSTALLED
 
-    level = (level or settings.log_level).upper()
-    log_format = log_format or settings.log_format
+    def __init__(self, name: str, write: Callable[[str], None], maxsize: int = 10000, serialize: bool = False):
+        self.name = name
+        self._write = write
+        self._serialize = serialize
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize)
+        self.dropped = 0
+        self._reported = 0
+        self._thread = threading.Thread(target=self._run, name=f"log-writer-{name}", daemon=True)
+        self._thread.start()
+
+    def write(self, message: str) -> None:
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+    def drain(self, timeout: float = 5.0) -> None:
+        """Wait until every queued line has been written (tests, shutdown)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def stop(self) -> None:
+        """Called by loguru when the handler is removed; flushes what is queued."""
+        try:
+            self._queue.put(None, timeout=1)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        while True:
+            message = self._queue.get()
+            try:
+                if message is None:
+                    return
+                try:
+                    self._write(message)
+                except Exception as e:  # a broken sink must not kill the writer
+                    sys.stderr.write(f"log sink {self.name} failed: {e}\n")
+            finally:
+                self._queue.task_done()
+            if self.dropped != self._reported and self._queue.empty():
+                dropped, self._reported = self.dropped - self._reported, self.dropped
+                self._write_notice(f"Log queue {self.name} full: dropped {dropped} lines")
+
+    def _write_notice(self, text: str) -> None:
+        # Written directly: logging it would need the handler lock, which
+        # loguru holds while stop() joins this thread.
+        now = time.time()
+        if self._serialize:
+            line = json.dumps({
+                "text": text,
+                "record": {
+                    "level": {"name": "WARNING", "no": 30},
+                    "message": text,
+                    "name": __name__,
+                    "time": {"timestamp": now},
+                },
+            }, ensure_ascii=False) + "\n"
+        else:
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+            line = f"{stamp} | WARNING  | {__name__} | {text}\n"
+        try:
+            self._write(line)
+        except Exception:
+            pass
+
+
+def _stream_writer(stream) -> Callable[[str], None]:
+    def write(message: str) -> None:
+        stream.write(message)
+        stream.flush()
+    return write
+
+
+_sinks: list = []
+_file_logger = None
+_level_no = 20
+repeat_limiter = RepeatLimiter(0, 1.0)
+
+
+def is_debug_enabled() -> bool:
+    """True when DEBUG records are emitted; guard debug-only work (frame dumps) with it."""
+    return _level_no <= logger.level("DEBUG").no
+
 
-    # ── Remove all existing loguru handlers ──────────────────────────────────
+def install_handlers(level: str, log_format: str, console, file_pattern: str) -> None:
+    """
+    Replace all loguru handlers with an async console sink and an async daily
+    JSONL file sink (``file_pattern`` under ``LOG_DIR``), both behind the
+    shared ``repeat_limiter``. Also used by the interceptor's logging setup.
+    """
+    global _file_logger, _level_no, repeat_limiter
+
+    # ── Remove all existing loguru handlers (stops and flushes old sinks) ────
     logger.remove()
+    _sinks.clear()
+    repeat_limiter = RepeatLimiter(settings.log_rate_limit_burst, settings.log_rate_limit_window)
+    _level_no = logger.level(level).no
+
+    # The file is written by a private logger copy inside the file sink's
+    # writer thread, keeping loguru's rotation / retention / compression.
+    if _file_logger is None:
+        _file_logger = copy.deepcopy(logger)
+    _file_logger.remove()
+    _file_logger.add(
+        str(LOG_DIR / file_pattern),
+        format="{message}",
+        rotation="00:00",         # rotate at midnight
+        retention="30 days",
+        compression="zip",
+        encoding="utf-8",
+    )
+    file_logger = _file_logger.opt(raw=True)
+
+    serialize_console = log_format.lower() == "json"
+    console_sink = AsyncLogSink("console", _stream_writer(console), settings.log_queue_size, serialize_console)
+    file_sink = AsyncLogSink("file", lambda line: file_logger.info(line), settings.log_queue_size, True)
+    _sinks.extend([console_sink, file_sink])
 
     # ── Console handler ──────────────────────────────────────────────────────
-    if log_format.lower() == "json":
+    if serialize_console:
         # serialize=True → compact JSONL on stdout, easy for log shippers
         logger.add(
-            sys.stdout,
+            console_sink,
             level=level,
             serialize=True,
             colorize=False,
+            filter=repeat_limiter,
         )
     else:
         logger.add(
-            sys.stdout,
+            console_sink,
             level=level,
             format=(
                 "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | "
@@ -84,20 +275,54 @@ def setup_logging(
                 "<level>{message}</level>"
             ),
             colorize=True,
+            filter=repeat_limiter,
         )
 
     # ── File handler – always JSONL, daily rotation, 30-day retention ────────
     logger.add(
-        str(LOG_DIR / "backend_{time:YYYY-MM-DD}.log"),
+        file_sink,
         level=level,
-        rotation="00:00",         # rotate at midnight
-        retention="30 days",
-        compression="zip",
-        encoding="utf-8",
         serialize=True,           # robust JSON – handles quotes/newlines in messages
-        enqueue=True,             # async-safe (works with uvicorn workers)
+        colorize=False,
+        filter=repeat_limiter,
     )
 
+
+@atexit.register
+def _close_sinks() -> None:
+    # Runs before loguru's own atexit hook: drain the async sinks into the
+    # file logger, then close the log file.
+    logger.remove()
+    if _file_logger is not None:
+        _file_logger.remove()
+
+
+def log_stats() -> Dict[str, int]:
+    """Lines dropped by full queues and by the repeat limiter (exported on /metrics)."""
+    stats = {f"dropped_{sink.name}": sink.dropped for sink in _sinks}
+    stats["suppressed_repeats"] = repeat_limiter.suppressed_total
+    return stats
+
+
+# ── Public setup ───────────────────────────────────────────────────────────────
+
+def setup_logging(
+    level: Optional[str] = None,
+    log_format: Optional[str] = None,
+) -> "logger":  # type: ignore[return]
+    """
+    Configure application logging.
+
+    Call once at startup (api/main.py already does this).
+    Safe to call multiple times – handlers are rebuilt from scratch each call.
+    """
+    global _INTERCEPT_INSTALLED
+
+    level = (level or settings.log_level).upper()
+    log_format = log_format or settings.log_format
+
+    install_handlers(level, log_format, sys.stdout, "backend_{time:YYYY-MM-DD}.log")
+
     # ── Intercept stdlib logging (installed once) ────────────────────────────
     if not _INTERCEPT_INSTALLED:
         logging.basicConfig(handlers=[_InterceptHandler()], level=0, force=True)
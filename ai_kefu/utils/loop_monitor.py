@@ -0,0 +1,158 @@
+"""
+Event-loop lag monitor.
+
+A heartbeat task sleeps for ``interval`` seconds and measures how late it
+wakes up. The delay is the time other callbacks held the loop. A watchdog
+thread watches the heartbeat. When the loop has been blocked longer than
+``threshold_ms``, it logs the loop thread's current stack once per stall,
+which names the handler doing blocking work while it still blocks.
+
+Requests that were in progress when a stall was detected are included in the
+report (see ``LoopLagMonitor.track_request``).
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, Optional
+
+from ai_kefu.utils.logging import logger
+
+
+class LoopLagMonitor:
+    """Measure event-loop scheduling lag and report blocking handlers."""
+
+    def __init__(self, interval: float = 0.5, threshold_ms: float = 200.0):
+        self.interval = interval
+        self.threshold_ms = threshold_ms
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._stall_reported = False
+        self._lock = threading.Lock()
+        self._active_requests: Dict[int, str] = {}
+        # metrics
+        self._samples = 0
+        self._total_lag_ms = 0.0
+        self._max_lag_ms = 0.0
+        self._last_lag_ms = 0.0
+        self._stalls = 0
+        self._last_stall: Optional[Dict[str, Any]] = None
+
+    # ── lifecycle ──
+
+    def start(self) -> None:
+        """Start the heartbeat task (on the running loop) and the watchdog thread."""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(
+            f"Event-loop lag monitor started (interval={self.interval}s, "
+            f"threshold={self.threshold_ms:.0f}ms)"
+        )
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=self.interval * 2)
+            self._watchdog = None
+
+    # ── request tracking ──
+
+    def track_request(self, request_id: int, description: str) -> None:
+        with self._lock:
+            self._active_requests[request_id] = description
+
+    def untrack_request(self, request_id: int) -> None:
+        with self._lock:
+            self._active_requests.pop(request_id, None)
+
+    # ── heartbeat ──
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag_ms = max(now - expected, 0.0) * 1000
+            self._last_beat = now
+            self._record(lag_ms)
+
+    def _record(self, lag_ms: float) -> None:
+        with self._lock:
+            self._samples += 1
+            self._total_lag_ms += lag_ms
+            self._max_lag_ms = max(self._max_lag_ms, lag_ms)
+            self._last_lag_ms = lag_ms
+            reported = self._stall_reported
+            self._stall_reported = False
+            active = list(self._active_requests.values())
+        if lag_ms >= self.threshold_ms:
+            if not reported:
+                self._stalls += 1
+            logger.warning(
+                f"Event loop was blocked for {lag_ms:.0f}ms "
+                f"(threshold {self.threshold_ms:.0f}ms); in-flight requests: {active or 'none'}"
+            )
+
+    # ── watchdog ──
+
+    def _watch(self) -> None:
+        threshold_s = self.threshold_ms / 1000
+        while not self._stop.wait(min(self.interval / 2, threshold_s)):
+            blocked_for = time.monotonic() - self._last_beat - self.interval
+            if blocked_for < threshold_s or self._stall_reported:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame, limit=15)) if frame else "<unavailable>"
+            with self._lock:
+                self._stall_reported = True
+                self._stalls += 1
+                active = list(self._active_requests.values())
+                self._last_stall = {
+                    "detected_at": time.time(),
+                    "blocked_ms": round(blocked_for * 1000),
+                    "requests": active,
+                    "stack": stack,
+                }
+            logger.warning(
+                f"Event loop blocked for {blocked_for * 1000:.0f}ms so far; "
+                f"in-flight requests: {active or 'none'}\nLoop thread stack:\n{stack}"
+            )
+
+    # ── metrics ──
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = self._samples or 1
+            return {
+                "interval_s": self.interval,
+                "threshold_ms": self.threshold_ms,
+                "samples": self._samples,
+                "avg_lag_ms": round(self._total_lag_ms / samples, 2),
+                "max_lag_ms": round(self._max_lag_ms, 1),
+                "last_lag_ms": round(self._last_lag_ms, 1),
+                "stalls": self._stalls,
+                "in_flight_requests": len(self._active_requests),
+                "last_stall": self._last_stall,
+            }
+
+
+# Process-wide instance, started in the API lifespan
+loop_monitor: Optional[LoopLagMonitor] = None
@@ -0,0 +1,307 @@
+"""
+Prometheus-style metrics for the API process, served at ``GET /metrics``.
+
+A small, dependency-free registry of counters, gauges and histograms that
+renders the Prometheus text exposition format (0.0.4). Instrumented code
+imports the metric objects below and records into them; the values live in
+process memory, like ``PrefixCacheMetrics`` and the loop monitor.
+
+    LLM_CALL_SECONDS.observe(1.8, kind="call_qwen", model="qwen-plus", outcome="ok")
+    IGNORED_MESSAGES.inc(match_type="contains")
+
+Gauges whose value already lives elsewhere (DB pool in-flight calls, the
+embedding LRU cache) are read at scrape time through ``set_function``, so
+the hot path pays nothing for them.
+
+Every API worker process keeps its own numbers. With several uvicorn
+workers, configure Prometheus to scrape each worker, or read the totals as
+per-worker samples. Counters reset when a worker restarts, which
+Prometheus' ``rate()`` already handles.
+"""
+
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers sub-millisecond cache hits up to the 120s agent timeout
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count (exported with a ``_total`` suffix)."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read an unlabelled counter kept elsewhere (e.g. lru_cache hits) at scrape time."""
+        self._function = function
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> Iterable[str]:
+        if self._function is not None:
+            yield f"{self.name}_total {_format_value(self._function())}"
+            return
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """Value that goes up and down."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Compute an unlabelled gauge at scrape time."""
+        self._function = function
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> Iterable[str]:
+        if self._function is not None:
+            yield f"{self.name} {_format_value(self._function())}"
+            return
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts plus sum and count, per label set."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count], sum
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            return sum(self._counts.get(self._key(labels), ()))
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class MetricsRegistry:
+    """Named metrics of one process, rendered in registration order."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:  # a failing scrape-time callback must not break /metrics
+                lines.append(f"# {metric.name} unavailable: {type(e).__name__}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry served by GET /metrics
+REGISTRY = MetricsRegistry()
+
+# ── Latency ─────────────────────────────────────────────────────────────────
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "ai_kefu_http_request_duration_seconds",
+    "API request duration by route template",
+    ("method", "route", "status"),
+)
+INBOUND_REPLY_SECONDS = REGISTRY.histogram(
+    "ai_kefu_inbound_reply_seconds",
+    "Time from /xianyu/inbound receipt to the agent's reply decision",
+    ("outcome",),
+)
+LLM_CALL_SECONDS = REGISTRY.histogram(
+    "ai_kefu_llm_call_duration_seconds",
+    "Qwen chat / embedding call latency by call kind and model",
+    ("kind", "model", "outcome"),
+)
+TOOL_CALL_SECONDS = REGISTRY.histogram(
+    "ai_kefu_tool_duration_seconds",
+    "Agent tool execution latency by tool name",
+    ("tool", "outcome"),
+)
+
+# ── Counters ────────────────────────────────────────────────────────────────
+CONFIDENCE_GUARD = REGISTRY.counter(
+    "ai_kefu_confidence_guard",
+    "Confidence guard decisions on agent replies (outcome=suppressed|passed)",
+    ("outcome",),
+)
+IGNORED_MESSAGES = REGISTRY.counter(
+    "ai_kefu_ignored_messages",
+    "Inbound buyer messages dropped by an ignore pattern, by match type",
+    ("match_type",),
+)
+MANUAL_MODE_SKIPS = REGISTRY.counter(
+    "ai_kefu_manual_mode_skips",
+    "Inbound buyer messages not sent to the agent (reason=manual_mode|suppressed)",
+    ("reason",),
+)
+XIANYU_CACHE_LOOKUPS = REGISTRY.counter(
+    "ai_kefu_xianyu_cache_lookups",
+    "Xianyu provider cache lookups by method (outcome=hit|negative_hit|miss|coalesced)",
+    ("method", "outcome"),
+)
+SESSION_SAVE_CONFLICTS = REGISTRY.counter(
+    "ai_kefu_session_save_conflicts",
+    "Session saves that hit a concurrent writer (outcome=rebased|lost)",
+    ("outcome",),
+)
+
+# ── Gauges ──────────────────────────────────────────────────────────────────
+AGENT_RUNS_IN_FLIGHT = REGISTRY.gauge(
+    "ai_kefu_agent_runs_in_flight",
+    "AgentExecutor.run calls running or queued for a worker thread",
+)
+AGENT_RUNS_IN_FLIGHT.set(0)
@@ -0,0 +1,263 @@
+"""
+Opt-in sampling profiler for single agent interactions.
+
+A profiled ``AgentExecutor.run`` starts a daemon thread. Every
+``profile_interval_ms`` that thread reads the worker thread's current stack
+from ``sys._current_frames()``. The worker runs unmodified: there is no
+``sys.setprofile`` hook and no per-call cost. The only overhead is the
+sampler waking up and walking one stack, so a run can be profiled in
+production without changing its latency noticeably.
+
+Profiling is decided per interaction:
+
+- ``POST /xianyu/inbound`` with ``X-Profile: 1`` forces it and
+  ``X-Profile: 0`` suppresses it. The route stores the decision in a
+  ``ContextVar``, and ``asyncio.to_thread`` carries it into the executor.
+- otherwise ``settings.profile_sample_rate`` (0..1) of runs are profiled.
+
+Only the agent run is sampled: the worker thread executing
+``AgentExecutor.run``. The rest of ``/xianyu/inbound`` (ignore-pattern
+match, message logging, manual-mode checks) runs as coroutines on the event
+loop thread. That thread interleaves every in-flight request, so its stack
+samples could not be attributed to one interaction and are not taken. Time
+spent there shows up as the gap between ``ai_kefu_inbound_reply_seconds`` /
+the request trace and the profile's ``duration_ms``.
+
+The result is kept in ``agent_turn_profiles`` under the run's
+``interaction_id``, next to its ``agent_turns`` rows. It can be exported as
+speedscope JSON (https://www.speedscope.app) or as collapsed stacks for
+``flamegraph.pl``. ``scripts/export_profile.py`` does the export.
+
+    with profile_interaction() as profiler:
+        result = do_work()
+    if profiler is not None:
+        conversation_store.save_profile(interaction_id, profiler.profile(), ...)
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from types import CodeType, FrameType
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+from ai_kefu.config.settings import settings
+
+PROFILE_HEADER = "X-Profile"
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+# Frames above this depth are dropped from the root side (deep recursion)
+MAX_STACK_DEPTH = 200
+
+_profile_requested: ContextVar[Optional[bool]] = ContextVar("profile_requested", default=None)
+
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_profile_header(value: Optional[str]) -> Optional[bool]:
+    """``X-Profile`` header → True / False, None when absent or unrecognised."""
+    if value is None:
+        return None
+    value = value.strip().lower()
+    if value in ("1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    return None
+
+
+def request_profiling(requested: Optional[bool]) -> Token:
+    """Record a per-request decision for the current context; reset with the returned token."""
+    return _profile_requested.set(requested)
+
+
+def reset_profiling(token: Token) -> None:
+    _profile_requested.reset(token)
+
+
+def should_profile() -> bool:
+    """The request's explicit decision if any, otherwise a ``profile_sample_rate`` coin flip."""
+    requested = _profile_requested.get()
+    if requested is not None:
+        return requested
+    rate = settings.profile_sample_rate
+    return rate > 0 and random.random() < rate
+
+
+class Profile:
+    """
+    Stack samples of one thread: each sample is a root-first tuple of frame
+    indices plus the wall time (ms) it stands for.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        frames: List[Dict[str, Any]],
+        samples: List[Tuple[int, ...]],
+        weights: List[float],
+        duration_ms: float,
+    ):
+        self.name = name
+        self.frames = frames
+        self.samples = samples
+        self.weights = weights
+        self.duration_ms = duration_ms
+
+    def to_collapsed(self) -> str:
+        """``a;b;c <count>`` lines, one per distinct stack (Brendan Gregg's collapsed format)."""
+        counts: Dict[Tuple[int, ...], int] = {}
+        for stack in self.samples:
+            counts[stack] = counts.get(stack, 0) + 1
+        lines = [
+            ";".join(_frame_label(self.frames[i]) for i in stack) + f" {count}"
+            for stack, count in sorted(counts.items(), key=lambda kv: -kv[1])
+        ]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def to_speedscope(self) -> Dict[str, Any]:
+        """Speedscope ``sampled`` profile; weights are milliseconds of wall time."""
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": self.name,
+            "exporter": "ai_kefu",
+            "activeProfileIndex": 0,
+            "shared": {"frames": self.frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(self.duration_ms, 3),
+                "samples": [list(stack) for stack in self.samples],
+                "weights": [round(w, 3) for w in self.weights],
+            }],
+        }
+
+    @classmethod
+    def from_speedscope(cls, document: Dict[str, Any]) -> "Profile":
+        profile = document["profiles"][0]
+        return cls(
+            name=document.get("name") or profile.get("name", ""),
+            frames=document["shared"]["frames"],
+            samples=[tuple(stack) for stack in profile["samples"]],
+            weights=list(profile["weights"]),
+            duration_ms=profile.get("endValue", sum(profile["weights"])),
+        )
+
+
+def _frame_label(frame: Dict[str, Any]) -> str:
+    return f"{frame['name']} ({frame['file']}:{frame['line']})"
+
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(_ROOT_DIR):
+        return os.path.relpath(filename, _ROOT_DIR)
+    # site-packages / stdlib: keep the last two components
+    return "/".join(filename.replace("\\", "/").split("/")[-2:])
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's stack from a daemon thread until ``stop``.
+
+    Frames are interned by code object, so a sample costs one stack walk
+    and a few dict lookups. Sampling stops by itself after ``max_samples``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        thread_id: Optional[int] = None,
+        interval_ms: Optional[float] = None,
+        max_samples: Optional[int] = None,
+    ):
+        self.name = name
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = (interval_ms if interval_ms is not None else settings.profile_interval_ms) / 1000
+        self.max_samples = max_samples if max_samples is not None else settings.profile_max_samples
+        self._frames: List[Dict[str, Any]] = []
+        self._frame_index: Dict[CodeType, int] = {}
+        self._samples: List[Tuple[int, ...]] = []
+        self._weights: List[float] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self._stopped = 0.0
+
+    def start(self) -> "SamplingProfiler":
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample_loop, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._stopped = time.perf_counter()
+        return self.profile()
+
+    def profile(self) -> Profile:
+        end = self._stopped or time.perf_counter()
+        return Profile(
+            name=self.name,
+            frames=list(self._frames),
+            samples=list(self._samples),
+            weights=list(self._weights),
+            duration_ms=(end - self._started) * 1000,
+        )
+
+    def _intern(self, frame: FrameType) -> int:
+        code = frame.f_code
+        index = self._frame_index.get(code)
+        if index is None:
+            index = self._frame_index[code] = len(self._frames)
+            self._frames.append({
+                "name": getattr(code, "co_qualname", code.co_name),
+                "file": _short_path(code.co_filename),
+                "line": code.co_firstlineno,
+            })
+        return index
+
+    def _sample_loop(self) -> None:
+        last = self._started
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:  # target thread exited
+                break
+            now = time.perf_counter()
+            stack: List[int] = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(self._intern(frame))
+                frame = frame.f_back
+            del frame
+            stack.reverse()
+            self._samples.append(tuple(stack))
+            self._weights.append((now - last) * 1000)
+            last = now
+            if len(self._samples) >= self.max_samples:
+                logger.warning(f"Profiler for {self.name} hit {self.max_samples} samples, stopping early")
+                break
+
+
+@contextmanager
+def profile_interaction(name: str = "agent.run") -> Iterator[Optional[SamplingProfiler]]:
+    """
+    Profile the calling thread for the duration of the block when
+    ``should_profile()`` says so; yields None (and costs nothing) otherwise.
+    """
+    if not should_profile():
+        yield None
+        return
+    profiler = SamplingProfiler(name).start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
@@ -0,0 +1,139 @@
+"""
+Token-bucket rate limit for LLM calls made by batch scripts.
+
+DashScope enforces both a request rate and a token rate per model.
+``TokenBucketLimiter`` keeps two buckets, one per limit. ``acquire`` blocks
+until both have room. A call reserves its estimated token count up front
+(prompt plus ``max_tokens``). ``settle`` then returns the unused part of
+the reservation once the real usage is known.
+
+The API server never configures a limiter. Scripts call
+``configure_llm_rate_limit`` once at startup, and from then on every LLM call
+in the process waits on the same buckets: ``call_qwen`` / ``call_qwen_fast``
+and the judge calls of ``analyze_llm_quality``. This holds however many
+threads the script runs.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class TokenBucketLimiter:
+    """
+    Requests-per-second and tokens-per-minute buckets.
+
+    Args:
+        requests_per_second: Sustained request rate (0 = unlimited)
+        tokens_per_minute: Sustained token rate (0 = unlimited)
+        burst_seconds: Bucket capacity, in seconds of sustained rate
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = 0.0,
+        tokens_per_minute: float = 0.0,
+        burst_seconds: float = 1.0,
+    ):
+        self.requests_per_second = max(0.0, requests_per_second)
+        self.tokens_per_second = max(0.0, tokens_per_minute) / 60.0
+        self._request_capacity = max(1.0, self.requests_per_second * burst_seconds)
+        # A minute of tokens, so one large prompt never waits forever
+        self._token_capacity = max(1.0, float(tokens_per_minute))
+        self._requests = self._request_capacity
+        self._tokens = self._token_capacity
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        # metrics
+        self.acquired = 0
+        self.waited_s = 0.0
+        self.tokens_reserved = 0
+        self.tokens_used = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests_per_second > 0 or self.tokens_per_second > 0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_second:
+            self._requests = min(self._request_capacity, self._requests + elapsed * self.requests_per_second)
+        if self.tokens_per_second:
+            self._tokens = min(self._token_capacity, self._tokens + elapsed * self.tokens_per_second)
+
+    def _wait_time(self, tokens: float) -> float:
+        wait = 0.0
+        if self.requests_per_second and self._requests < 1.0:
+            wait = (1.0 - self._requests) / self.requests_per_second
+        if self.tokens_per_second and self._tokens < tokens:
+            wait = max(wait, (tokens - self._tokens) / self.tokens_per_second)
+        return wait
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Block until one request and ``tokens`` tokens are available.
+
+        Returns:
+            Seconds spent waiting
+        """
+        if not self.enabled:
+            return 0.0
+        tokens = min(float(max(0, tokens)), self._token_capacity)
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                self._refill(time.monotonic())
+                wait = self._wait_time(tokens)
+                if wait <= 0:
+                    break
+                self._cond.wait(wait)
+            if self.requests_per_second:
+                self._requests -= 1.0
+            if self.tokens_per_second:
+                self._tokens -= tokens
+            waited = time.monotonic() - started
+            self.acquired += 1
+            self.waited_s += waited
+            self.tokens_reserved += int(tokens)
+        return waited
+
+    def settle(self, reserved: int, used: Optional[int]) -> None:
+        """Correct a reservation with the real token usage of the call."""
+        if not self.tokens_per_second or used is None:
+            return
+        with self._cond:
+            reserved = min(float(max(0, reserved)), self._token_capacity)
+            # Over-use goes into debt, which later acquires wait off
+            self._tokens = min(self._token_capacity, self._tokens + reserved - used)
+            self.tokens_used += int(used)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests_per_second": self.requests_per_second,
+            "tokens_per_minute": round(self.tokens_per_second * 60),
+            "acquired": self.acquired,
+            "waited_s": round(self.waited_s, 1),
+            "tokens_reserved": self.tokens_reserved,
+            "tokens_used": self.tokens_used,
+        }
+
+
+_llm_limiter: Optional[TokenBucketLimiter] = None
+
+
+def configure_llm_rate_limit(
+    requests_per_second: float = 0.0,
+    tokens_per_minute: float = 0.0,
+) -> Optional[TokenBucketLimiter]:
+    """Install the process-wide LLM limiter (both 0 removes it)."""
+    global _llm_limiter
+    limiter = TokenBucketLimiter(requests_per_second, tokens_per_minute)
+    _llm_limiter = limiter if limiter.enabled else None
+    return _llm_limiter
+
+
+def get_llm_rate_limiter() -> Optional[TokenBucketLimiter]:
+    """The process-wide LLM limiter, or None when calls are unlimited."""
+    return _llm_limiter
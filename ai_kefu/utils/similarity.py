@@ -0,0 +1,217 @@
+"""
+Vectorized reply-similarity scoring (human reply vs AI reply).
+
+Each distinct text becomes one row of a sparse binary bigram matrix. The
+matrix is stored as CSR-style ``indptr`` / ``indices`` numpy arrays, and
+every text is tokenised once no matter how many pairs refer to it. To score
+a batch of aligned pairs, the bigram ids of both sides are offset by
+``pair * vocab_size``, concatenated and sorted once. A bigram shared by a
+pair then shows up as two equal adjacent keys, and ``np.bincount`` turns
+those into per-pair intersection sizes. There is no Python loop over pairs
+or over bigrams, so an eval run with thousands of pairs scores in
+milliseconds.
+
+Scores are the same as the old per-pair ``set`` implementation
+(``api/routes/conversations.py`` / ``scripts/eval_analyze.py``):
+
+- the bigrams of ``text.strip()``; a stripped text shorter than 2 chars is
+  its own single token
+- an empty (falsy) text on either side scores 0.0
+
+Embedding cosine similarity is optional because it costs one embedding call
+per distinct text. It goes through ``llm.embeddings.generate_embedding``, so
+it shares that LRU cache and the LLM record/replay layer. A pair whose text
+failed to embed has no embedding score (NaN / None), so callers can skip
+it instead of averaging or caching a fake 0.0.
+
+    scores = score_pairs(human_replies, ai_replies, with_embeddings=False)
+    scores["similarity"][i], scores["length_ratio"][i]
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# Bigram (a, b) → (a + 1) * _CODEPOINTS + b, which never collides with a lone codepoint key
+_CODEPOINTS = 0x110000
+
+
+class BigramMatrix:
+    """
+    Sparse binary bigram matrix with one row per distinct stripped text.
+
+    ``add`` returns the row of a text, and texts that strip to the same
+    string share a row. ``freeze`` tokenises all rows in one pass. It decodes
+    the texts to a codepoint array, turns each adjacent codepoint pair into an
+    int64 key and compacts the keys to dense vocabulary ids by sorting them. The
+    result is packed into ``indptr`` / ``indices`` with sorted, distinct ids
+    per row.
+    """
+
+    def __init__(self):
+        self._rows: Dict[str, int] = {}
+        self.vocab_size = 0
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, text: str) -> int:
+        text = text.strip()
+        row = self._rows.get(text)
+        if row is None:
+            row = self._rows[text] = len(self._rows)
+        return row
+
+    def freeze(self) -> "BigramMatrix":
+        texts = list(self._rows)
+        lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+        ends = np.cumsum(lengths)
+        codes = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+
+        # Bigrams start anywhere except on the last char of a text
+        starts = np.ones(len(codes), dtype=bool)
+        starts[ends[lengths > 0] - 1] = False
+        positions = np.flatnonzero(starts)
+        keys = (codes[positions] + 1) * _CODEPOINTS + codes[positions + 1]
+        owners = np.searchsorted(ends, positions, side="right")
+
+        # Texts shorter than 2 chars are a single token: the char, or -1 for ""
+        short = np.flatnonzero(lengths < 2)
+        last_char = np.append(codes, -1)[ends[short] - 1]
+        short_keys = np.where(lengths[short] == 1, last_char, -1)
+        keys = np.concatenate((keys, short_keys))
+        owners = np.concatenate((owners, short))
+
+        ids, self.vocab_size = _compact(keys)
+        width = max(self.vocab_size, 1)
+        # Sorted and de-duplicated per row in one go
+        cells = _sorted_distinct(owners * width + ids)
+        self.indices = cells % width
+        self.indptr = np.searchsorted(cells // width, np.arange(len(texts) + 1), side="left")
+        return self
+
+    @property
+    def row_sizes(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def _gather(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Bigram ids of ``rows`` concatenated, plus the position in ``rows`` each id came from."""
+        starts = self.indptr[rows]
+        sizes = self.indptr[rows + 1] - starts
+        owner = np.repeat(np.arange(len(rows), dtype=np.int64), sizes)
+        # Offset of every element inside its own row: 0..size-1 per row
+        within = np.arange(int(sizes.sum()), dtype=np.int64) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        return self.indices[np.repeat(starts, sizes) + within], owner
+
+    def intersections(self, rows_a: np.ndarray, rows_b: np.ndarray) -> np.ndarray:
+        """``|row_a ∩ row_b|`` for every aligned pair ``(rows_a[k], rows_b[k])``."""
+        if len(rows_a) == 0:
+            return np.zeros(0, dtype=np.int64)
+        ids_a, owner_a = self._gather(rows_a)
+        ids_b, owner_b = self._gather(rows_b)
+        width = max(self.vocab_size, 1)
+        # Rows hold distinct ids, so a key can only repeat once: when both sides have it
+        keys = np.sort(np.concatenate((owner_a * width + ids_a, owner_b * width + ids_b)))
+        shared = keys[1:][keys[1:] == keys[:-1]]
+        return np.bincount(shared // width, minlength=len(rows_a))
+
+
+def jaccard_pairs(texts_a: Sequence[str], texts_b: Sequence[str]) -> np.ndarray:
+    """Bigram Jaccard similarity of each aligned pair ``(texts_a[k], texts_b[k])``."""
+    if len(texts_a) != len(texts_b):
+        raise ValueError(f"Pair lists differ in length: {len(texts_a)} != {len(texts_b)}")
+    matrix = BigramMatrix()
+    rows_a = np.fromiter((matrix.add(t or "") for t in texts_a), dtype=np.int64, count=len(texts_a))
+    rows_b = np.fromiter((matrix.add(t or "") for t in texts_b), dtype=np.int64, count=len(texts_b))
+    matrix.freeze()
+
+    inter = matrix.intersections(rows_a, rows_b)
+    sizes = matrix.row_sizes
+    union = sizes[rows_a] + sizes[rows_b] - inter
+    scores = np.divide(inter, union, out=np.zeros(len(inter), dtype=np.float64), where=union > 0)
+    scores[_empty_mask(texts_a) | _empty_mask(texts_b)] = 0.0
+    return scores
+
+
+def length_ratios(texts_a: Sequence[str], texts_b: Sequence[str]) -> np.ndarray:
+    """Shorter / longer stripped length per pair; 0.0 when either text is empty."""
+    la = np.fromiter((len(t.strip()) if t else 0 for t in texts_a), dtype=np.float64, count=len(texts_a))
+    lb = np.fromiter((len(t.strip()) if t else 0 for t in texts_b), dtype=np.float64, count=len(texts_b))
+    longer = np.maximum(la, lb)
+    ratios = np.divide(np.minimum(la, lb), longer, out=np.ones(len(la), dtype=np.float64), where=longer > 0)
+    ratios[_empty_mask(texts_a) | _empty_mask(texts_b)] = 0.0
+    return ratios
+
+
+def embedding_similarities(texts_a: Sequence[str], texts_b: Sequence[str]) -> np.ndarray:
+    """
+    Cosine similarity of the text embeddings, one API call per distinct text
+    (and none for texts already in the embedding LRU cache). An empty text
+    scores 0.0; a pair with a text that failed to embed (the batch helper
+    returns a zero vector for it) scores NaN.
+    """
+    from ai_kefu.llm.embeddings import generate_embeddings_batch
+
+    distinct = list(dict.fromkeys(t for t in (*texts_a, *texts_b) if t))
+    if not distinct:
+        return np.zeros(len(texts_a), dtype=np.float64)
+    vectors = np.asarray(generate_embeddings_batch(distinct), dtype=np.float64)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    # Row 0 is an all-zero vector for empty texts
+    vectors = np.vstack((np.zeros((1, vectors.shape[1])), vectors))
+    failed = np.concatenate(([False], norms[:, 0] == 0))
+    position = {text: i + 1 for i, text in enumerate(distinct)}
+    rows_a = np.fromiter((position.get(t, 0) for t in texts_a), dtype=np.int64, count=len(texts_a))
+    rows_b = np.fromiter((position.get(t, 0) for t in texts_b), dtype=np.int64, count=len(texts_b))
+    scores = np.einsum("ij,ij->i", vectors[rows_a], vectors[rows_b])
+    scores[failed[rows_a] | failed[rows_b]] = np.nan
+    return scores
+
+
+def score_pairs(
+    texts_a: Sequence[str],
+    texts_b: Sequence[str],
+    with_embeddings: bool = False,
+) -> Dict[str, List[Optional[float]]]:
+    """
+    All pair scores as plain float lists (JSON-ready): ``similarity``,
+    ``length_ratio`` and, when requested, ``embedding_similarity`` (None
+    where an embedding call failed).
+    """
+    scores = {
+        "similarity": jaccard_pairs(texts_a, texts_b).tolist(),
+        "length_ratio": length_ratios(texts_a, texts_b).tolist(),
+    }
+    if with_embeddings:
+        scores["embedding_similarity"] = [
+            None if np.isnan(v) else v for v in embedding_similarities(texts_a, texts_b).tolist()
+        ]
+    return scores
+
+
+def _empty_mask(texts: Sequence[str]) -> np.ndarray:
+    return np.fromiter((not t for t in texts), dtype=bool, count=len(texts))
+
+
+def _sorted_distinct(values: np.ndarray) -> np.ndarray:
+    # Plain sort + mask: np.unique's hash path is several times slower on int64 keys
+    values = np.sort(values)
+    keep = np.ones(len(values), dtype=bool)
+    keep[1:] = values[1:] != values[:-1]
+    return values[keep]
+
+
+def _compact(keys: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Map arbitrary int64 keys to dense ids 0..n-1; returns (ids, n)."""
+    order = np.argsort(keys)
+    ordered = keys[order]
+    first = np.ones(len(ordered), dtype=bool)
+    first[1:] = ordered[1:] != ordered[:-1]
+    ids = np.empty(len(keys), dtype=np.int64)
+    ids[order] = np.cumsum(first) - 1
+    return ids, int(first.sum())
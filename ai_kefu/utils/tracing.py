@@ -0,0 +1,316 @@
+"""
+Span-based latency tracing across interceptor → API → agent → tools → LLM.
+
+A trace starts in the interceptor (``MessageHandler.handle_message``) and
+travels with the message:
+
+- over HTTP in the W3C ``traceparent`` header
+  (``00-<32 hex trace id>-<16 hex span id>-01``). The interceptor sends it
+  to ``/xianyu/inbound``, and ``check_availability`` sends it on to the
+  rental API's find-slot endpoint.
+- inside a process in a ``ContextVar``. ``asyncio`` tasks and
+  ``asyncio.to_thread`` copy the context, so ``AgentExecutor.run`` and the
+  tools see the request's span without extra plumbing.
+
+Finished spans are appended to ``<tracing_dir>/traces_<service>_<date>.jsonl``,
+one JSON object per line. A background thread does the writes, so a request
+never waits on disk. ``scripts/trace_view.py`` prints one trace as a tree
+with per-span offsets and durations.
+
+    with start_span("tool.check_availability", {"chat_id": chat_id}) as span:
+        ...
+        span.set_attribute("slots", len(slots))
+
+Span names are ``<layer>.<operation>`` (``interceptor.*``, ``api.*``,
+``agent.*``, ``llm.*``, ``tool.*``, ``rental_api.*``).
+"""
+
+import atexit
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from contextvars import ContextVar, Token
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from ai_kefu.config.settings import settings
+
+TRACEPARENT_HEADER = "traceparent"
+TRACE_ID_HEADER = "X-Trace-Id"
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def new_span_id() -> str:
+    return secrets.token_hex(8)
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """``traceparent`` header → (trace_id, parent span id), None when absent or malformed."""
+    if not value:
+        return None
+    match = _TRACEPARENT_RE.match(value.strip().lower())
+    if not match or match.group(1) == "0" * 32:
+        return None
+    return match.group(1), match.group(2)
+
+
+class Span:
+    """
+    One timed operation. ``start_span`` creates and activates it; ``end``
+    (or leaving the ``with`` block) deactivates and exports it.
+    """
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "attributes",
+        "start_time", "_start", "duration_ms", "error", "_token", "_ended",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str],
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent_id = parent_id
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self._token: Optional[Token] = None
+        self._ended = False
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        """Stop the clock, restore the parent span and export (idempotent)."""
+        if self._ended:
+            return
+        self._ended = True
+        self.duration_ms = round((time.perf_counter() - self._start) * 1000, 2)
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"[:500]
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                # Ended from another context (e.g. a callback thread)
+                pass
+        exporter = get_exporter()
+        if exporter is not None:
+            exporter.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "service": _service_name,
+            "start": round(self.start_time, 6),
+            "duration_ms": self.duration_ms,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+    def __enter__(self) -> "Span":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.end(exc)
+
+
+class _NoopSpan(Span):
+    """
+    Returned when tracing is disabled. It is never made current, so callers
+    can use spans unconditionally at no cost.
+    """
+
+    def __init__(self):
+        super().__init__("noop", "0" * 32, None)
+        self._ended = True
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, **attributes: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def start_span(
+    name: str,
+    attributes: Optional[Dict[str, Any]] = None,
+    traceparent: Optional[str] = None,
+) -> Span:
+    """
+    Start a span as a child of the current one and make it current.
+
+    Args:
+        name: ``<layer>.<operation>``
+        attributes: JSON-serializable key/values (chat_id, model, tokens...)
+        traceparent: Incoming ``traceparent`` header. Only used when there is
+            no current span, i.e. at a process boundary.
+    """
+    if not settings.tracing_enabled:
+        return _NOOP_SPAN
+    parent = _current_span.get()
+    if parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    else:
+        trace_id, parent_id = parse_traceparent(traceparent) or (new_trace_id(), None)
+    span = Span(name, trace_id, parent_id, attributes)
+    span._token = _current_span.set(span)
+    return span
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+
+def inject_headers(headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Add the current span's ``traceparent`` to outgoing HTTP headers."""
+    headers = dict(headers or {})
+    span = _current_span.get()
+    if span is not None:
+        headers[TRACEPARENT_HEADER] = span.traceparent
+    return headers
+
+
+# ============================================================
+# Export
+# ============================================================
+
+class JsonlSpanExporter:
+    """
+    Buffers finished spans and appends them to a daily JSONL file from a
+    daemon thread (every ``flush_interval`` seconds, or sooner when the
+    buffer fills).
+    """
+
+    def __init__(self, directory: str, service: str, flush_interval: float = 1.0, max_buffer: int = 10000):
+        self.directory = directory
+        self.service = service
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self.exported = 0
+        self.dropped = 0
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def path_for(self, day: Optional[str] = None) -> str:
+        day = day or datetime.now().strftime("%Y-%m-%d")
+        return os.path.join(self.directory, f"traces_{self.service}_{day}.jsonl")
+
+    def export(self, span: Span) -> None:
+        record = span.to_dict()
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                # Drop rather than block request threads or grow without bound
+                self.dropped += 1
+                return
+            self._buffer.append(record)
+            if len(self._buffer) >= 500:
+                self._wakeup.set()
+
+    def flush(self) -> None:
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        try:
+            with open(self.path_for(), "a", encoding="utf-8") as f:
+                for record in batch:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str, separators=(",", ":")))
+                    f.write("\n")
+            self.exported += len(batch)
+        except OSError as e:
+            self.dropped += len(batch)
+            logger.warning(f"Failed to write {len(batch)} spans: {e}")
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def shutdown(self) -> None:
+        self._stopped = True
+        self._wakeup.set()
+        self._thread.join(timeout=2)
+        self.flush()
+
+
+_service_name = "ai_kefu"
+_exporter: Optional[JsonlSpanExporter] = None
+_exporter_lock = threading.Lock()
+
+
+def default_tracing_dir() -> str:
+    return settings.tracing_dir or str(Path(__file__).parent.parent / "logs")
+
+
+def configure_tracing(service: str, directory: Optional[str] = None) -> Optional[JsonlSpanExporter]:
+    """Name this process in exported spans (``api``, ``interceptor``...) and start the exporter."""
+    global _service_name, _exporter
+    with _exporter_lock:
+        if _exporter is not None:
+            _exporter.shutdown()
+            _exporter = None
+        _service_name = service
+        if settings.tracing_enabled:
+            _exporter = JsonlSpanExporter(directory or default_tracing_dir(), service)
+    return _exporter
+
+
+def get_exporter() -> Optional[JsonlSpanExporter]:
+    """The active exporter; processes that never configured one export as ``ai_kefu``."""
+    global _exporter
+    if _exporter is None and settings.tracing_enabled:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = JsonlSpanExporter(default_tracing_dir(), _service_name)
+    return _exporter
+
+
+@atexit.register
+def _flush_on_exit() -> None:
+    if _exporter is not None:
+        _exporter.flush()
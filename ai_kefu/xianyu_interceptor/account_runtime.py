@@ -0,0 +1,367 @@
+"""
+多账号拦截器运行时
+
+单进程、单个 Chromium 内管理 N 个闲鱼账号：每个账号一个独立的
+BrowserContext（Cookie / localStorage 互相隔离），各自持有
+CDPInterceptor、BrowserTransport、MessageHandler 和 seller_user_id，
+所有页面的帧进入同一个 FrameDispatcher，按账号 ID 路由回对应的处理回调。
+
+与单账号模式（BrowserController + launch_persistent_context）的区别：
+- 多个账号共享一个浏览器进程，每增加一个账号只多一个 context
+- 登录态通过 ``storage_state`` 保存到 ``<state_dir>/<account_id>.json``，
+  下次启动时恢复（持久化 context 无法在同一浏览器内开多个）
+
+账号列表来自 JSON 文件（``config.accounts_file``）::
+
+    [
+        {"account_id": "shop-a", "cookies_str": "...", "seller_user_id": "2200..."},
+        {"account_id": "shop-b", "cookies_str": "..."}
+    ]
+"""
+
+import asyncio
+import json
+import os
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from loguru import logger
+from pydantic import BaseModel, Field
+from utils.xianyu_utils import trans_cookies
+
+from .browser_controller import (
+    _STEALTH_LAUNCH_ARGS,
+    STEALTH_INIT_JS,
+    build_cookie_list,
+)
+from .browser_transport import BrowserTransport
+from .cdp_interceptor import CDPInterceptor
+from .frame_dispatcher import FrameDispatcher
+from .message_handler import MessageHandler
+
+
+DEFAULT_START_URL = "https://www.goofish.com/im"
+
+
+class AccountSpec(BaseModel):
+    """单个闲鱼账号的配置"""
+
+    account_id: str = Field(..., min_length=1, description="账号标识（用于路由和状态文件名）")
+    cookies_str: str = Field("", description="初始 Cookie；已有保存的登录态时可留空")
+    seller_user_id: str = Field("", description="卖家 user_id；留空则从 Cookie 的 unb 提取")
+    proxy: Optional[str] = Field(None, description="该账号使用的代理")
+
+
+def load_accounts(path: str) -> List[AccountSpec]:
+    """
+    从 JSON 文件加载账号列表。
+
+    Raises:
+        ValueError: 文件格式错误或 account_id 重复
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    if not isinstance(raw, list):
+        raise ValueError(f"账号文件必须是 JSON 数组: {path}")
+    specs = [AccountSpec(**item) for item in raw]
+    ids = [spec.account_id for spec in specs]
+    if len(ids) != len(set(ids)):
+        raise ValueError(f"账号文件中存在重复的 account_id: {path}")
+    return specs
+
+
+FrameHandler = Callable[["AccountSession", Dict[str, Any]], Awaitable[None]]
+
+
+class AccountSession:
+    """
+    一个账号在共享浏览器中的运行状态。
+
+    负责该账号 context 内所有页面的 CDP 监控，
+    并把帧以 ``account_id`` 为 route 提交给共享分发器。
+    """
+
+    def __init__(
+        self,
+        spec: AccountSpec,
+        context,
+        dispatcher: FrameDispatcher,
+        frame_handler: FrameHandler,
+        inbound_url: str,
+        state_path: Path,
+    ):
+        """
+        Args:
+            spec: 账号配置
+            context: 该账号独占的 Playwright BrowserContext
+            dispatcher: 所有账号共享的帧分发器
+            frame_handler: 帧处理函数，签名 ``(session, message_data)``
+            inbound_url: AI API 的 /xianyu/inbound 地址
+            state_path: 登录态（storage_state）保存路径
+        """
+        self.spec = spec
+        self.account_id = spec.account_id
+        self.context = context
+        self.dispatcher = dispatcher
+        self.frame_handler = frame_handler
+        self.state_path = state_path
+        self.seller_user_id = spec.seller_user_id
+        self.transport = BrowserTransport(seller_user_id=self.seller_user_id)
+        self.message_handler = MessageHandler(inbound_url=inbound_url, transport=self.transport)
+        self.page_interceptors: Dict[int, Dict[str, Any]] = {}
+        self.websocket_detected = False
+        self._navigation_tasks: Set[asyncio.Task] = set()  # 导航后重新挂载监控的在途任务
+
+    # ── 启动 / 关闭 ───────────────────────────────────────────────────────────
+
+    async def start(self, start_url: str = DEFAULT_START_URL) -> None:
+        """注入脚本与 Cookie、注册路由并打开消息页面。"""
+        await self.context.add_init_script(STEALTH_INIT_JS)
+        if self.spec.cookies_str:
+            await self.context.add_cookies(build_cookie_list(self.spec.cookies_str))
+
+        await self._resolve_seller_user_id()
+        self.transport = BrowserTransport(seller_user_id=self.seller_user_id)
+        self.message_handler.transport = self.transport
+
+        self.dispatcher.register(self.account_id, self._on_frame)
+        self.context.on("page", self._on_new_page)
+
+        page = self.context.pages[0] if self.context.pages else await self.context.new_page()
+        await page.goto(start_url, wait_until="domcontentloaded")
+        for existing in list(self.context.pages):
+            await self.setup_page_monitoring(existing)
+        logger.info(f"[{self.account_id}] 账号已启动: seller_user_id={self.seller_user_id or '<未知>'}")
+
+    async def close(self) -> None:
+        """保存登录态并关闭 context。"""
+        self.dispatcher.unregister(self.account_id)
+        for task in list(self._navigation_tasks):
+            task.cancel()
+        if self._navigation_tasks:
+            await asyncio.gather(*self._navigation_tasks, return_exceptions=True)
+        for info in self.page_interceptors.values():
+            await info["interceptor"].close()
+        self.page_interceptors.clear()
+        await self.save_state()
+        try:
+            await self.context.close()
+        except Exception as e:
+            logger.warning(f"[{self.account_id}] 关闭 context 失败: {e}")
+
+    async def save_state(self) -> None:
+        """把 Cookie / localStorage 写入 storage_state 文件。"""
+        try:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            await self.context.storage_state(path=str(self.state_path))
+        except Exception as e:
+            logger.warning(f"[{self.account_id}] 保存登录态失败: {e}")
+
+    async def _resolve_seller_user_id(self) -> None:
+        if self.seller_user_id:
+            return
+        unb = trans_cookies(self.spec.cookies_str).get("unb", "") if self.spec.cookies_str else ""
+        if not unb:
+            try:
+                for cookie in await self.context.cookies():
+                    if cookie.get("name") == "unb":
+                        unb = cookie["value"]
+                        break
+            except Exception as e:
+                logger.debug(f"[{self.account_id}] 从浏览器 Cookie 提取 unb 失败: {e}")
+        if unb:
+            self.seller_user_id = unb
+            logger.info(f"[{self.account_id}] ✅ 自动从 Cookie 提取卖家 user_id: {unb}")
+        else:
+            logger.warning(
+                f"[{self.account_id}] ⚠️ 未能获取卖家 user_id，无法区分自己发的消息和用户发的消息"
+            )
+
+    # ── 页面监控 ──────────────────────────────────────────────────────────────
+
+    async def _on_frame(self, message_data: Dict[str, Any]) -> None:
+        await self.frame_handler(self, message_data)
+
+    async def _on_new_page(self, page) -> None:
+        logger.info(f"[{self.account_id}] 🆕 检测到新页面打开: {page.url[:80]}")
+        await self.setup_page_monitoring(page)
+
+    async def setup_page_monitoring(self, page) -> None:
+        """为页面创建 CDP 会话和拦截器（同一页面重复调用会替换旧拦截器）。"""
+        page_id = id(page)
+        is_new_page = page_id not in self.page_interceptors
+        try:
+            cdp_session = await self.context.new_cdp_session(page)
+            interceptor = CDPInterceptor(
+                cdp_session, dispatcher=self.dispatcher, account_id=self.account_id
+            )
+            if not await interceptor.setup():
+                return
+            await interceptor.inject_websocket_interceptor()
+            self.page_interceptors[page_id] = {
+                "page": page,
+                "interceptor": interceptor,
+                "url": page.url,
+            }
+            if is_new_page:
+                page.on("framenavigated", lambda frame, page=page: self._on_navigation(page, frame))
+
+            await asyncio.sleep(1)
+            if interceptor.is_connected():
+                self._activate(interceptor, page.url)
+        except Exception as e:
+            logger.error(f"[{self.account_id}] 设置页面监控失败: {e}")
+
+    def _on_navigation(self, page, frame) -> None:
+        if frame == page.main_frame:
+            task = asyncio.ensure_future(self._reattach_after_navigation(page))
+            self._navigation_tasks.add(task)
+            task.add_done_callback(self._on_navigation_done)
+
+    def _on_navigation_done(self, task: asyncio.Task) -> None:
+        self._navigation_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"[{self.account_id}] 导航后重新挂载页面监控失败: {task.exception()}")
+
+    async def _reattach_after_navigation(self, page) -> None:
+        logger.info(f"[{self.account_id}] 🔄 页面导航: {page.url[:80]}")
+        await asyncio.sleep(1)  # 等待页面稳定
+        await self.setup_page_monitoring(page)
+
+    def _activate(self, interceptor: CDPInterceptor, url: str) -> None:
+        self.websocket_detected = True
+        self.transport.set_interceptor(interceptor)
+        logger.info(f"[{self.account_id}] ✅ WebSocket 连接已建立（页面: {url[:80]}）")
+
+    async def check_websocket(self) -> bool:
+        """主动检测各页面的 WebSocket，找到后设置为该账号的发送通道。"""
+        for info in list(self.page_interceptors.values()):
+            interceptor = info["interceptor"]
+            if await interceptor.check_websocket_in_page():
+                self._activate(interceptor, info["url"])
+                return True
+        return False
+
+    async def extract_cookies(self) -> Optional[str]:
+        try:
+            cookies = await self.context.cookies()
+            return "; ".join(f"{c['name']}={c['value']}" for c in cookies)
+        except Exception as e:
+            logger.error(f"[{self.account_id}] 提取 cookies 失败: {e}")
+            return None
+
+
+class MultiAccountRuntime:
+    """
+    单浏览器多账号运行时。
+
+    用法::
+
+        runtime = MultiAccountRuntime(specs, dispatcher, frame_handler, inbound_url)
+        await runtime.start()
+        ...
+        await runtime.close()
+    """
+
+    def __init__(
+        self,
+        specs: List[AccountSpec],
+        dispatcher: FrameDispatcher,
+        frame_handler: FrameHandler,
+        inbound_url: str,
+        state_dir: str = "./browser_data/accounts",
+        headless: bool = False,
+        viewport: Optional[Dict[str, int]] = None,
+        start_url: str = DEFAULT_START_URL,
+    ):
+        if not specs:
+            raise ValueError("至少需要配置一个账号")
+        self.specs = specs
+        self.dispatcher = dispatcher
+        self.frame_handler = frame_handler
+        self.inbound_url = inbound_url
+        self.state_dir = Path(os.path.abspath(state_dir))
+        self.headless = headless
+        self.viewport = viewport or {"width": 1280, "height": 720}
+        self.start_url = start_url
+        self.playwright = None
+        self.browser = None
+        self.sessions: Dict[str, AccountSession] = {}
+
+    @property
+    def primary(self) -> Optional[AccountSession]:
+        """第一个账号（其 Cookie 推送给 API 层的 GoofishProvider）。"""
+        return self.sessions.get(self.specs[0].account_id)
+
+    async def start(self) -> None:
+        """启动共享浏览器，并为每个账号创建 context。单个账号失败不影响其他账号。"""
+        from playwright.async_api import async_playwright
+
+        self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(
+            headless=self.headless, args=list(_STEALTH_LAUNCH_ARGS)
+        )
+        logger.info(f"共享浏览器已启动，准备加载 {len(self.specs)} 个账号")
+
+        for spec in self.specs:
+            try:
+                self.sessions[spec.account_id] = await self._start_account(spec)
+            except Exception as e:
+                logger.error(f"[{spec.account_id}] 账号启动失败: {e}")
+
+    async def _start_account(self, spec: AccountSpec) -> AccountSession:
+        state_path = self.state_dir / f"{spec.account_id}.json"
+        ctx_kwargs: Dict[str, Any] = dict(
+            viewport=self.viewport,
+            locale="zh-CN",
+            timezone_id="Asia/Shanghai",
+        )
+        if state_path.exists():
+            ctx_kwargs["storage_state"] = str(state_path)
+            logger.info(f"[{spec.account_id}] 恢复已保存的登录态: {state_path}")
+        if spec.proxy:
+            ctx_kwargs["proxy"] = {"server": spec.proxy}
+
+        context = await self.browser.new_context(**ctx_kwargs)
+        session = AccountSession(
+            spec,
+            context,
+            dispatcher=self.dispatcher,
+            frame_handler=self.frame_handler,
+            inbound_url=self.inbound_url,
+            state_path=state_path,
+        )
+        await session.start(self.start_url)
+        return session
+
+    async def check_pending(self) -> None:
+        """为尚未检测到 WebSocket 的账号执行一次主动检测。"""
+        for session in self.sessions.values():
+            if not session.websocket_detected:
+                await session.check_websocket()
+
+    async def save_all_states(self) -> None:
+        for session in self.sessions.values():
+            await session.save_state()
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """各账号的连接状态概览。"""
+        return {
+            account_id: {
+                "seller_user_id": session.seller_user_id,
+                "websocket_detected": session.websocket_detected,
+                "pages": len(session.page_interceptors),
+            }
+            for account_id, session in self.sessions.items()
+        }
+
+    async def close(self) -> None:
+        for session in list(self.sessions.values()):
+            await session.close()
+        self.sessions.clear()
+        if self.browser:
+            await self.browser.close()
+            self.browser = None
+        if self.playwright:
+            await self.playwright.stop()
+            self.playwright = None
@@ -31,6 +31,128 @@ _STEALTH_LAUNCH_ARGS = [
 ]
 
 
+# 隐藏 webdriver 特征 + WebSocket 拦截的初始化脚本（单账号 / 多账号模式共用）
+STEALTH_INIT_JS = """
+// ========== 隐身脚本 ==========
+Object.defineProperty(navigator, 'webdriver', {
+    get: () => undefined
+});
+
+// 伪装 Chrome 对象
+window.chrome = {
+    runtime: {}
+};
+
+// 伪装 permissions
+const originalQuery = window.navigator.permissions.query;
+window.navigator.permissions.query = (parameters) => (
+    parameters.name === 'notifications' ?
+        Promise.resolve({ state: Notification.permission }) :
+        originalQuery(parameters)
+);
+
+// 伪装 plugins
+Object.defineProperty(navigator, 'plugins', {
+    get: () => [1, 2, 3, 4, 5]
+});
+
+// 伪装 languages
+Object.defineProperty(navigator, 'languages', {
+    get: () => ['zh-CN', 'zh', 'en-US', 'en']
+});
+
+// ========== WebSocket 拦截器 ==========
+(function() {
+    // 使用 Symbol 作为主要存储方式（更隐蔽）
+    const wsSymbol = Symbol.for('_ws_');
+    const wsArraySymbol = Symbol.for('_ws_array_');  // 保存所有 WebSocket
+    const injectedSymbol = Symbol.for('_inj_');
+
+    if (window[injectedSymbol]) return;
+
+    // 初始化 WebSocket 数组
+    if (!window[wsArraySymbol]) {
+        window[wsArraySymbol] = [];
+    }
+
+    const OriginalWebSocket = window.WebSocket;
+
+    window.WebSocket = class extends OriginalWebSocket {
+        constructor(...args) {
+            super(...args);
+            const url = args[0];
+
+            // 闲鱼可能使用多个 WebSocket 服务器
+            const isXianyuWs = url && (
+                url.includes('wss-goofish.dingtalk.com') ||
+                url.includes('msgacs.m.taobao.com') ||
+                url.includes('wss.goofish.com')
+            );
+
+            if (isXianyuWs) {
+                // 保存到数组中
+                window[wsArraySymbol].push({
+                    ws: this,
+                    url: url,
+                    createdAt: Date.now()
+                });
+
+                // 优先保存 dingtalk 的 WebSocket（用于发送消息）
+                if (url.includes('wss-goofish.dingtalk.com')) {
+                    window[wsSymbol] = this;
+                    window.__xianyuWebSocket = this;
+                    console.log('[WS_PRIMARY]', url);  // 标记为主 WebSocket
+                } else if (!window[wsSymbol]) {
+                    // 如果还没有主 WebSocket，使用当前的
+                    window[wsSymbol] = this;
+                    window.__xianyuWebSocket = this;
+                }
+
+                console.log('[WS_CREATED]', url);
+
+                // 拦截消息接收：使用 addEventListener 确保捕获所有消息
+                // （闲鱼使用 ws.addEventListener('message', fn) 而非 ws.onmessage = fn，
+                //   Object.defineProperty 无法拦截 addEventListener 方式）
+                this.addEventListener('message', function(event) {
+                    console.log('[WS_MESSAGE_RECEIVED]', event.data);
+                });
+
+                // 拦截 send（发送消息）
+                const originalSend = this.send;
+                this.send = function(data) {
+                    console.log('[WS_MESSAGE_SENT]', data);
+                    return originalSend.call(this, data);
+                };
+
+                this.addEventListener('open', () => {
+                    console.log('[WS_OPENED]', url);
+                });
+
+                this.addEventListener('close', (event) => {
+                    console.log('[WS_CLOSED]', url, 'code=' + event.code);
+                });
+            }
+
+            return this;
+        }
+    };
+
+    // 双重标记
+    window[injectedSymbol] = true;
+    window.__wsInterceptorInjected = true;  // 向后兼容检测代码
+    console.log('[WS_INTERCEPTOR_READY]');
+})();
+"""
+
+
+def build_cookie_list(cookies_str: str, domain: str = ".goofish.com") -> List[Dict[str, str]]:
+    """把 Cookie 字符串转换为 Playwright ``add_cookies`` 所需的格式。"""
+    return [
+        {"name": name, "value": value, "domain": domain, "path": "/"}
+        for name, value in trans_cookies(cookies_str).items()
+    ]
+
+
 class BrowserConfig:
     """浏览器配置类"""
 
@@ -168,119 +290,7 @@ class BrowserController:
                 logger.info("playwright-stealth 注入成功")
 
             # 隐藏 webdriver 特征 + WebSocket 拦截的 JavaScript 代码
-            stealth_js = """
-            // ========== 隐身脚本 ==========
-            Object.defineProperty(navigator, 'webdriver', {
-                get: () => undefined
-            });
-
-            // 伪装 Chrome 对象
-            window.chrome = {
-                runtime: {}
-            };
-
-            // 伪装 permissions
-            const originalQuery = window.navigator.permissions.query;
-            window.navigator.permissions.query = (parameters) => (
-                parameters.name === 'notifications' ?
-                    Promise.resolve({ state: Notification.permission }) :
-                    originalQuery(parameters)
-            );
-
-            // 伪装 plugins
-            Object.defineProperty(navigator, 'plugins', {
-                get: () => [1, 2, 3, 4, 5]
-            });
-
-            // 伪装 languages
-            Object.defineProperty(navigator, 'languages', {
-                get: () => ['zh-CN', 'zh', 'en-US', 'en']
-            });
-
-            // ========== WebSocket 拦截器 ==========
-            (function() {
-                // 使用 Symbol 作为主要存储方式（更隐蔽）
-                const wsSymbol = Symbol.for('_ws_');
-                const wsArraySymbol = Symbol.for('_ws_array_');  // 保存所有 WebSocket
-                const injectedSymbol = Symbol.for('_inj_');
-
-                if (window[injectedSymbol]) return;
-
-                // 初始化 WebSocket 数组
-                if (!window[wsArraySymbol]) {
-                    window[wsArraySymbol] = [];
-                }
-
-                const OriginalWebSocket = window.WebSocket;
-
-                window.WebSocket = class extends OriginalWebSocket {
-                    constructor(...args) {
-                        super(...args);
-                        const url = args[0];
-
-                        // 闲鱼可能使用多个 WebSocket 服务器
-                        const isXianyuWs = url && (
-                            url.includes('wss-goofish.dingtalk.com') ||
-                            url.includes('msgacs.m.taobao.com') ||
-                            url.includes('wss.goofish.com')
-                        );
-
-                        if (isXianyuWs) {
-                            // 保存到数组中
-                            window[wsArraySymbol].push({
-                                ws: this,
-                                url: url,
-                                createdAt: Date.now()
-                            });
-
-                            // 优先保存 dingtalk 的 WebSocket（用于发送消息）
-                            if (url.includes('wss-goofish.dingtalk.com')) {
-                                window[wsSymbol] = this;
-                                window.__xianyuWebSocket = this;
-                                console.log('[WS_PRIMARY]', url);  // 标记为主 WebSocket
-                            } else if (!window[wsSymbol]) {
-                                // 如果还没有主 WebSocket，使用当前的
-                                window[wsSymbol] = this;
-                                window.__xianyuWebSocket = this;
-                            }
-
-                            console.log('[WS_CREATED]', url);
-
-                            // 拦截消息接收：使用 addEventListener 确保捕获所有消息
-                            // （闲鱼使用 ws.addEventListener('message', fn) 而非 ws.onmessage = fn，
-                            //   Object.defineProperty 无法拦截 addEventListener 方式）
-                            this.addEventListener('message', function(event) {
-                                console.log('[WS_MESSAGE_RECEIVED]', event.data);
-                            });
-
-                            // 拦截 send（发送消息）
-                            const originalSend = this.send;
-                            this.send = function(data) {
-                                console.log('[WS_MESSAGE_SENT]', data);
-                                return originalSend.call(this, data);
-                            };
-
-                            this.addEventListener('open', () => {
-                                console.log('[WS_OPENED]', url);
-                            });
-
-                            this.addEventListener('close', (event) => {
-                                console.log('[WS_CLOSED]', url, 'code=' + event.code);
-                            });
-                        }
-
-                        return this;
-                    }
-                };
-
-                // 双重标记
-                window[injectedSymbol] = true;
-                window.__wsInterceptorInjected = true;  // 向后兼容检测代码
-                console.log('[WS_INTERCEPTOR_READY]');
-            })();
-            """
-
-            await self.context.add_init_script(stealth_js)
+            await self.context.add_init_script(STEALTH_INIT_JS)
             logger.info("隐身脚本和 WebSocket 拦截器注入成功")
 
         except Exception as e:
@@ -294,19 +304,7 @@ class BrowserController:
             cookies_str: Cookie 字符串
         """
         try:
-            cookies_dict = trans_cookies(cookies_str)
-
-            # 转换为 Playwright cookies 格式
-            cookies = []
-            for name, value in cookies_dict.items():
-                cookies.append({
-                    "name": name,
-                    "value": value,
-                    "domain": ".goofish.com",
-                    "path": "/"
-                })
-
-            await self.context.add_cookies(cookies)
+            await self.context.add_cookies(build_cookie_list(cookies_str))
             logger.info("Cookies 注入成功")
 
         except Exception as e:
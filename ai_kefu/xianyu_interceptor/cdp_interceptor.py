@@ -18,9 +18,12 @@ CDP 拦截器模块
 
 import json
 import asyncio
-from typing import Optional, Callable, Dict, Any
+from typing import Optional, Callable, Dict, Any, Set, TYPE_CHECKING
 from loguru import logger
 
+if TYPE_CHECKING:
+    from .frame_dispatcher import FrameDispatcher
+
 
 class CDPInterceptor:
     """
@@ -29,16 +32,27 @@ class CDPInterceptor:
     通过 Chrome DevTools Protocol 监控和拦截 WebSocket 通信。
     """
 
-    def __init__(self, cdp_session):
+    def __init__(
+        self,
+        cdp_session,
+        dispatcher: Optional["FrameDispatcher"] = None,
+        account_id: Optional[str] = None,
+    ):
         """
         初始化 CDP 拦截器
 
         Args:
             cdp_session: Chrome DevTools Protocol 会话
+            dispatcher: 帧分发队列；设置后收到的帧只入队，由分发器的 worker
+                调用消息处理回调，CDP 事件处理不会被慢回调阻塞
+            account_id: 多账号模式下该页面所属账号，作为分发 route
         """
         self.cdp_session = cdp_session
+        self.dispatcher = dispatcher
+        self.account_id = account_id
         self.websocket_id: Optional[str] = None
         self.message_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+        self._callback_tasks: Set[asyncio.Task] = set()  # 无分发器时的在途回调
         self._is_monitoring = False
         self._is_setup = False  # 防止重复设置监听器
         self._pending_history_requests: Dict[str, Dict[str, Any]] = {}  # 跟踪历史消息API请求
@@ -249,9 +263,8 @@ class CDPInterceptor:
                     message_data = json.loads(payload)
                     logger.debug(f"收到 WebSocket 消息 (通过 CDP)")
 
-                    # 调用回调函数
-                    if self.message_callback:
-                        await asyncio.create_task(self._safe_callback(message_data))
+                    # 交给分发队列 / 后台任务，不在 CDP 事件处理中等待回调
+                    self._dispatch(message_data)
 
                 except json.JSONDecodeError:
                     logger.debug("非 JSON 格式的 WebSocket 消息")
@@ -376,8 +389,7 @@ class CDPInterceptor:
                     # 解析并调用回调
                     try:
                         message_data = json.loads(message_data_str)
-                        if self.message_callback:
-                            await self._safe_callback(message_data)
+                        self._dispatch(message_data)
                     except json.JSONDecodeError:
                         logger.debug("非 JSON 格式的 WebSocket 消息")
                 elif first_arg_str == "[WS_MESSAGE_SENT]" and len(args) > 1:
@@ -464,6 +476,21 @@ class CDPInterceptor:
         except Exception as e:
             logger.error(f"处理 WebSocket 关闭事件失败: {e}")
 
+    def _dispatch(self, message_data: Dict[str, Any]) -> None:
+        """
+        把收到的帧交给处理回调，立即返回。
+
+        有分发器时入队（有界、按优先级处理）；否则为每帧创建后台任务。
+        """
+        if self.dispatcher is not None:
+            self.dispatcher.submit(message_data, route=self.account_id)
+            return
+        if not self.message_callback:
+            return
+        task = asyncio.create_task(self._safe_callback(message_data))
+        self._callback_tasks.add(task)
+        task.add_done_callback(self._callback_tasks.discard)
+
     async def _safe_callback(self, message_data: Dict[str, Any]) -> None:
         """
         安全地调用回调函数
@@ -34,6 +34,11 @@ class XianyuInterceptorConfig(BaseSettings):
     agent_service_url: str = "http://localhost:8000"
     agent_timeout: float = 120.0  # kept for health-check legacy callers
 
+    # Multi-account mode: JSON file listing accounts (empty = single-account mode)
+    accounts_file: str = ""
+    accounts_state_dir: str = "./browser_data/accounts"  # 各账号登录态（storage_state）保存目录
+    accounts_start_url: str = "https://www.goofish.com/im"
+
     # Transport mode
     use_browser_mode: bool = True
     browser_headless: bool = False
@@ -42,6 +47,16 @@ class XianyuInterceptorConfig(BaseSettings):
 
     # Image handling
     image_save_dir: str = "./xianyu_images"
+    image_max_bytes: int = 10 * 1024 * 1024         # 单张图片大小上限
+    image_max_disk_bytes: int = 1024 * 1024 * 1024  # 图片目录总占用上限（超出按 LRU 淘汰）
+    image_queue_size: int = 100                     # 后台下载队列长度
+    image_workers: int = 2                          # 后台下载并发数
+
+    # CDP frame dispatch
+    frame_dispatch_workers: int = 4      # 并发处理帧的 worker 数
+    frame_queue_size: int = 500          # 待处理帧队列上限
+    frame_overflow_policy: str = "spill" # 队列满时策略: spill / drop_new / drop_oldest
+    frame_spill_dir: str = "./xianyu_spill"  # spill 策略下聊天帧的落盘目录
 
     # Debug flag: mirrors enable_ai_reply from settings for logging purposes only
     enable_ai_reply: bool = False
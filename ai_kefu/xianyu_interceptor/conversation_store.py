@@ -8,13 +8,186 @@ Xianyu conversation messages from MySQL database.
 import json
 import threading
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import datetime, timedelta
 import pymysql
 from pymysql.cursors import DictCursor
 from contextlib import contextmanager
 from loguru import logger
 
+from ai_kefu.storage.keyset_cursor import decode_cursor, encode_cursor
+
 from .conversation_models import ConversationMessage, MessageType
+from .turn_payload import (
+    compress_text,
+    decode_turn_payload,
+    decompress_text,
+    encode_turn_payload,
+    resolve_segments,
+    segment_refs,
+)
+
+
+# Length of latest_message / latest_agent_response previews in chat_summaries
+_PREVIEW_CHARS = 100
+
+# Upsert one new conversations row into chat_summaries.
+# MySQL evaluates ON DUPLICATE KEY UPDATE assignments left to right and later
+# assignments see already-updated columns, so latest_* must be set before
+# last_message_at.
+_UPSERT_CHAT_SUMMARY_SQL = """
+    INSERT INTO chat_summaries (
+        chat_id, user_id, seller_id, item_id,
+        message_count, user_messages, seller_messages, ai_replies, debug_replies,
+        first_message_at, last_message_at,
+        latest_message, latest_message_type, latest_agent_response
+    ) VALUES (
+        %s, %s, %s, %s,
+        1, %s, %s, %s, %s,
+        %s, %s,
+        %s, %s, %s
+    )
+    ON DUPLICATE KEY UPDATE
+        latest_message = IF(last_message_at IS NULL OR VALUES(last_message_at) >= last_message_at,
+                            VALUES(latest_message), latest_message),
+        latest_message_type = IF(last_message_at IS NULL OR VALUES(last_message_at) >= last_message_at,
+                                 VALUES(latest_message_type), latest_message_type),
+        latest_agent_response = IF(last_message_at IS NULL OR VALUES(last_message_at) >= last_message_at,
+                                   VALUES(latest_agent_response), latest_agent_response),
+        user_id = COALESCE(GREATEST(user_id, VALUES(user_id)), user_id, VALUES(user_id)),
+        seller_id = COALESCE(GREATEST(seller_id, VALUES(seller_id)), seller_id, VALUES(seller_id)),
+        item_id = COALESCE(GREATEST(item_id, VALUES(item_id)), item_id, VALUES(item_id)),
+        message_count = message_count + 1,
+        user_messages = user_messages + VALUES(user_messages),
+        seller_messages = seller_messages + VALUES(seller_messages),
+        ai_replies = ai_replies + VALUES(ai_replies),
+        debug_replies = debug_replies + VALUES(debug_replies),
+        first_message_at = LEAST(COALESCE(first_message_at, VALUES(first_message_at)), VALUES(first_message_at)),
+        last_message_at = GREATEST(COALESCE(last_message_at, VALUES(last_message_at)), VALUES(last_message_at))
+"""
+
+# Count one new agent_turns row (chats without messages yet get a row with
+# message_count = 0, which the listing skips until the first message arrives)
+_UPSERT_CHAT_TURN_SQL = """
+    INSERT INTO chat_summaries (chat_id, agent_turn_count, suppressed_turn_count)
+    VALUES (%s, 1, %s)
+    ON DUPLICATE KEY UPDATE
+        agent_turn_count = agent_turn_count + 1,
+        suppressed_turn_count = suppressed_turn_count + VALUES(suppressed_turn_count)
+"""
+
+
+def _chat_summary_values(message: ConversationMessage, message_type: str, created_at: datetime) -> tuple:
+    """Parameters of _UPSERT_CHAT_SUMMARY_SQL for one saved message."""
+    agent_response = message.agent_response
+    return (
+        message.chat_id,
+        message.user_id,
+        message.seller_id,
+        message.item_id,
+        int(message_type == 'user'),
+        int(message_type == 'seller'),
+        int(agent_response is not None),
+        int(bool(agent_response) and agent_response.startswith('【调试】')),
+        created_at,
+        created_at,
+        (message.message_content or '')[:_PREVIEW_CHARS],
+        message_type,
+        agent_response[:_PREVIEW_CHARS] if agent_response else None,
+    )
+
+
+# ngram_token_size of the FULLTEXT parser (MySQL default)
+_NGRAM_SIZE = 2
+
+# search_messages counts at most this many matches for the first page total
+_SEARCH_COUNT_CAP = 1000
+
+
+def _fulltext_query(keyword: str) -> tuple:
+    """
+    Build a BOOLEAN MODE query requiring every term as a phrase.
+
+    Returns:
+        (boolean_query or None, terms shorter than the ngram size)
+    """
+    phrases = []
+    short_terms = []
+    for term in keyword.replace('"', ' ').split():
+        if len(term) < _NGRAM_SIZE:
+            short_terms.append(term)
+        else:
+            phrases.append(f'+"{term}"')
+    return (" ".join(phrases) or None), short_terms
+
+
+# Turns older than settings.turn_archive_after_days move here (see
+# archive_old_turns). llm_payload only: legacy llm_input / llm_output text is
+# compressed on the way in. The partition key must be part of the primary key.
+_CREATE_TURN_ARCHIVE_SQL = """
+    CREATE TABLE IF NOT EXISTS agent_turns_archive (
+        id BIGINT NOT NULL COMMENT 'agent_turns.id (kept so reviews still resolve)',
+        session_id VARCHAR(255) NOT NULL,
+        chat_id VARCHAR(255),
+        turn_number INT NOT NULL,
+        interaction_id VARCHAR(255),
+        local_turn_number INT,
+        user_query TEXT,
+        llm_payload MEDIUMBLOB,
+        response_text TEXT,
+        tool_calls JSON,
+        tool_results JSON,
+        duration_ms INT,
+        success BOOLEAN DEFAULT TRUE,
+        error_message TEXT,
+        confidence_percent INT,
+        response_suppressed BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+        PRIMARY KEY (id, created_at),
+        INDEX idx_session_turn (session_id, turn_number),
+        INDEX idx_chat_id (chat_id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    COMMENT='Archived agent turns, partitioned by month'
+"""
+_TURN_ARCHIVE_PARTITIONS = """
+    PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (
+        PARTITION pmax VALUES LESS THAN MAXVALUE
+    )
+"""
+
+_ARCHIVE_COLUMNS = (
+    'id', 'session_id', 'chat_id', 'turn_number', 'interaction_id', 'local_turn_number',
+    'user_query', 'llm_payload', 'response_text', 'tool_calls', 'tool_results',
+    'duration_ms', 'success', 'error_message', 'confidence_percent', 'response_suppressed',
+    'created_at',
+)
+_INSERT_ARCHIVE_SQL = (
+    f"INSERT IGNORE INTO agent_turns_archive ({', '.join(_ARCHIVE_COLUMNS)}) "
+    f"VALUES ({', '.join(['%s'] * len(_ARCHIVE_COLUMNS))})"
+)
+
+
+# In-process cache of prompt_segments hashes known to be stored
+_KNOWN_SEGMENTS_MAX = 512
+
+
+def _loads_or_text(value: Optional[str]) -> Any:
+    """Parse legacy JSON text columns; keep unparseable text as-is."""
+    if value is None:
+        return None
+    try:
+        return json.loads(value)
+    except Exception:
+        return value
+
+
+def _month_partition(month: datetime) -> str:
+    """Partition holding ``month`` (a first-of-month datetime)."""
+    return f"p{month:%Y%m}"
+
+
+def _next_month(month: datetime) -> datetime:
+    return (month.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
 
 class ConversationStore:
@@ -31,7 +204,8 @@ class ConversationStore:
         user: str,
         password: str,
         database: str,
-        pool_size: int = 5
+        pool_size: int = 5,
+        read_timeout: Optional[int] = None,
     ):
         """
         Initialize the conversation store.
@@ -43,6 +217,7 @@ class ConversationStore:
             password: MySQL password
             database: MySQL database name
             pool_size: Connection pool size (not used with pymysql, kept for API compatibility)
+            read_timeout: Socket read/write timeout in seconds (None = wait forever)
         """
         self.config = {
             'host': host,
@@ -54,8 +229,18 @@ class ConversationStore:
             'cursorclass': DictCursor,
             'autocommit': False
         }
-        self._connection = None
-        self._lock = threading.Lock()  # Protect connection from concurrent thread access
+        if read_timeout:
+            self.config['read_timeout'] = read_timeout
+            self.config['write_timeout'] = read_timeout
+        # One connection per thread: API routes run store calls on the DB
+        # thread pool, and a pymysql connection must not be shared between threads.
+        self._local = threading.local()
+        self._connections: List[pymysql.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._lock = threading.Lock()  # Serialize writes
+        self._fulltext_available = False  # set by _ensure_table_exists
+        self._known_segments: Dict[str, None] = {}  # prompt_segments hashes already written (bounded, insertion-ordered)
+        self._archive_partitions: Optional[set] = None  # loaded lazily by archive_old_turns
         logger.info(f"ConversationStore initialized for database: {database}@{host}:{port}")
         self._ensure_table_exists()
     
@@ -130,8 +315,9 @@ class ConversationStore:
                 local_turn_number INT COMMENT 'Turn sequence number within one interaction (starts from 1 per user message)',
                 user_query TEXT COMMENT 'Original user query that triggered this agent run',
 
-                llm_input LONGTEXT COMMENT 'Full messages array sent to LLM (JSON)',
-                llm_output LONGTEXT COMMENT 'Raw LLM response (JSON)',
+                llm_input LONGTEXT COMMENT 'Legacy: full messages array sent to LLM (JSON)',
+                llm_output LONGTEXT COMMENT 'Legacy: raw LLM response (JSON)',
+                llm_payload MEDIUMBLOB COMMENT 'zlib JSON {input, output}; long message contents stored in prompt_segments',
                 response_text TEXT COMMENT 'LLM text response content',
 
                 tool_calls JSON COMMENT 'Tool calls made in this turn (JSON array)',
@@ -151,6 +337,33 @@ class ConversationStore:
             COMMENT='Agent turn-level LLM input/output records for debugging'
         """
 
+        create_prompt_segments_sql = """
+            CREATE TABLE IF NOT EXISTS prompt_segments (
+                seg_hash CHAR(64) NOT NULL PRIMARY KEY COMMENT 'SHA-256 of the segment text',
+                content MEDIUMBLOB NOT NULL COMMENT 'zlib-compressed segment text',
+                raw_chars INT NOT NULL COMMENT 'Uncompressed length in characters',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            COMMENT='Content-addressed system prompts / history messages referenced by agent_turns.llm_payload'
+        """
+
+        create_agent_turn_profiles_sql = """
+            CREATE TABLE IF NOT EXISTS agent_turn_profiles (
+                interaction_id VARCHAR(255) NOT NULL PRIMARY KEY COMMENT 'Same interaction_id as the agent_turns rows of this run',
+                session_id VARCHAR(255) COMMENT 'Agent session ID',
+                chat_id VARCHAR(255) COMMENT 'Xianyu chat ID',
+                sample_count INT NOT NULL COMMENT 'Stack samples taken',
+                interval_ms FLOAT COMMENT 'Configured sampling interval in milliseconds',
+                duration_ms INT COMMENT 'Profiled wall time in milliseconds',
+                profile MEDIUMBLOB NOT NULL COMMENT 'zlib-compressed speedscope JSON',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+                INDEX idx_chat_id (chat_id),
+                INDEX idx_created_at (created_at)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            COMMENT='Sampling profiles of opted-in agent runs (utils/profiling.py)'
+        """
+
         create_conversation_reviews_sql = """
             CREATE TABLE IF NOT EXISTS conversation_reviews (
                 id BIGINT AUTO_INCREMENT PRIMARY KEY,
@@ -184,14 +397,48 @@ class ConversationStore:
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
             COMMENT='Per-agent-turn operator quality ratings'
         """
+
+        create_chat_summaries_sql = """
+            CREATE TABLE IF NOT EXISTS chat_summaries (
+                chat_id VARCHAR(255) NOT NULL PRIMARY KEY COMMENT 'Xianyu chat ID',
+                user_id VARCHAR(255) COMMENT 'MAX(conversations.user_id), as the old GROUP BY listing',
+                seller_id VARCHAR(255) COMMENT 'MAX(conversations.seller_id)',
+                item_id VARCHAR(255) COMMENT 'MAX(conversations.item_id)',
+
+                message_count INT NOT NULL DEFAULT 0 COMMENT 'Rows in conversations for this chat',
+                user_messages INT NOT NULL DEFAULT 0,
+                seller_messages INT NOT NULL DEFAULT 0,
+                ai_replies INT NOT NULL DEFAULT 0 COMMENT 'Messages with agent_response',
+                debug_replies INT NOT NULL DEFAULT 0 COMMENT 'agent_response starting with 【调试】',
+                first_message_at TIMESTAMP NULL DEFAULT NULL,
+                last_message_at TIMESTAMP NULL DEFAULT NULL,
+
+                latest_message VARCHAR(100) COMMENT 'First 100 chars of the newest message',
+                latest_message_type VARCHAR(16) COMMENT 'message_type of the newest message',
+                latest_agent_response VARCHAR(100) COMMENT 'First 100 chars of its agent_response',
+
+                agent_turn_count INT NOT NULL DEFAULT 0 COMMENT 'Rows in agent_turns for this chat',
+                suppressed_turn_count INT NOT NULL DEFAULT 0 COMMENT 'agent_turns with response_suppressed=1',
+
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+                INDEX idx_last_message_at (last_message_at)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            COMMENT='Per-chat aggregates maintained by save_message / save_turn'
+        """
         try:
             conn = self._get_connection()
             with conn.cursor() as cursor:
                 cursor.execute(create_conversations_sql)
                 cursor.execute(create_xianyu_orders_sql)
                 cursor.execute(create_agent_turns_sql)
+                cursor.execute(create_prompt_segments_sql)
+                cursor.execute(create_agent_turn_profiles_sql)
                 cursor.execute(create_conversation_reviews_sql)
                 cursor.execute(create_agent_turn_reviews_sql)
+                cursor.execute("SHOW TABLES LIKE 'chat_summaries'")
+                summaries_existed = cursor.fetchone() is not None
+                cursor.execute(create_chat_summaries_sql)
 
                 # 兼容已有数据库：自动添加 user_nickname 列（如果不存在）
                 try:
@@ -230,6 +477,24 @@ class ConversationStore:
                 except Exception as e:
                     logger.debug(f"message_id column check: {e}")
 
+                # 消息全文检索：ngram FULLTEXT 索引（MySQL 5.7.6+，中文按 2 字切分）
+                try:
+                    cursor.execute("""
+                        SELECT INDEX_NAME FROM INFORMATION_SCHEMA.STATISTICS
+                        WHERE TABLE_SCHEMA = DATABASE()
+                          AND TABLE_NAME = 'conversations'
+                          AND INDEX_NAME = 'ft_content'
+                    """)
+                    if not cursor.fetchone():
+                        cursor.execute("""
+                            ALTER TABLE conversations
+                            ADD FULLTEXT INDEX ft_content (message_content, agent_response) WITH PARSER ngram
+                        """)
+                        logger.info("Added ngram FULLTEXT index 'ft_content' to conversations table")
+                    self._fulltext_available = True
+                except Exception as e:
+                    logger.warning(f"ngram FULLTEXT index unavailable, message search falls back to LIKE: {e}")
+
                 # 兼容已有数据库：自动添加 interaction_id 和 local_turn_number 列（如果不存在）
                 try:
                     cursor.execute("""
@@ -290,25 +555,72 @@ class ConversationStore:
                 except Exception as e:
                     logger.debug(f"agent_turns chat_id column migration check: {e}")
 
+                # 兼容已有数据库：自动添加 llm_payload 列到 agent_turns（如果不存在）
+                try:
+                    cursor.execute("""
+                        SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS
+                        WHERE TABLE_SCHEMA = DATABASE()
+                          AND TABLE_NAME = 'agent_turns'
+                          AND COLUMN_NAME = 'llm_payload'
+                    """)
+                    if not cursor.fetchone():
+                        cursor.execute("""
+                            ALTER TABLE agent_turns
+                            ADD COLUMN llm_payload MEDIUMBLOB COMMENT 'zlib JSON {input, output}; long message contents stored in prompt_segments'
+                            AFTER llm_output
+                        """)
+                        logger.info("Added 'llm_payload' column to agent_turns table")
+                except Exception as e:
+                    logger.debug(f"agent_turns llm_payload column migration check: {e}")
+
+                # 归档表：按月分区；不支持分区时退化为普通表
+                try:
+                    cursor.execute(_CREATE_TURN_ARCHIVE_SQL + _TURN_ARCHIVE_PARTITIONS)
+                except Exception as e:
+                    logger.warning(f"Partitioned agent_turns_archive unavailable, using a plain table: {e}")
+                    cursor.execute(_CREATE_TURN_ARCHIVE_SQL)
+
                 conn.commit()
-            logger.info("Ensured 'conversations', 'xianyu_orders', 'agent_turns', 'conversation_reviews' and 'agent_turn_reviews' tables exist")
+            logger.info("Ensured 'conversations', 'xianyu_orders', 'agent_turns', 'agent_turns_archive', 'prompt_segments', 'conversation_reviews', 'agent_turn_reviews' and 'chat_summaries' tables exist")
         except Exception as e:
             logger.error(f"Failed to ensure tables exist: {e}")
+            return
+
+        # 首次创建 chat_summaries 时从历史数据回填
+        if not summaries_existed:
+            try:
+                self.rebuild_chat_summaries()
+            except Exception as e:
+                logger.error(f"Failed to backfill chat_summaries: {e}")
+
+    @property
+    def _connection(self) -> Optional[pymysql.Connection]:
+        """The calling thread's connection."""
+        return getattr(self._local, 'connection', None)
+
+    @_connection.setter
+    def _connection(self, conn: Optional[pymysql.Connection]):
+        self._local.connection = conn
 
     def _get_connection(self) -> pymysql.Connection:
         """
-        Get or create a database connection with auto-reconnect.
+        Get or create the calling thread's database connection with auto-reconnect.
         
         Returns:
             Active MySQL connection
         """
         if self._connection is None or not self._ping():
+            stale = self._connection
             try:
                 self._connection = pymysql.connect(**self.config)
                 logger.debug("Created new MySQL connection")
             except Exception as e:
                 logger.error(f"Failed to connect to MySQL: {e}")
                 raise
+            with self._connections_lock:
+                if stale is not None and stale in self._connections:
+                    self._connections.remove(stale)
+                self._connections.append(self._connection)
         return self._connection
     
     def _ping(self) -> bool:
@@ -382,6 +694,8 @@ class ConversationStore:
                     )
                 """
 
+                message_type = message.message_type.value if isinstance(message.message_type, MessageType) else message.message_type
+                created_at = message.created_at or datetime.now()
                 values = (
                     message.chat_id,
                     message.user_id,
@@ -390,17 +704,23 @@ class ConversationStore:
                     message.item_id,
                     getattr(message, 'message_id', None),
                     message.message_content,
-                    message.message_type.value if isinstance(message.message_type, MessageType) else message.message_type,
+                    message_type,
                     message.session_id,
                     message.agent_response,
                     context_json,
-                    message.created_at or datetime.now()
+                    created_at
                 )
                 
                 with conn.cursor() as cursor:
                     cursor.execute(sql, values)
-                    conn.commit()
                     row_id = cursor.lastrowid
+                    if cursor.rowcount:
+                        # Same transaction: the summary never drifts from conversations
+                        cursor.execute(
+                            _UPSERT_CHAT_SUMMARY_SQL,
+                            _chat_summary_values(message, message_type, created_at),
+                        )
+                    conn.commit()
 
                 if row_id:
                     logger.info(
@@ -604,6 +924,7 @@ class ConversationStore:
         self,
         user_id: str,
         limit: int = 100,
+        offset: int = 0,
     ) -> List[ConversationMessage]:
         """
         Retrieve all conversation history for a user across all chat_ids.
@@ -614,6 +935,7 @@ class ConversationStore:
         Args:
             user_id: The buyer's Xianyu user ID
             limit: Maximum number of messages to return (default 100)
+            offset: Number of messages to skip (message_count - limit gives the newest page)
 
         Returns:
             List of ConversationMessage objects ordered oldest-first
@@ -624,10 +946,10 @@ class ConversationStore:
                 SELECT * FROM conversations
                 WHERE user_id = %s
                 ORDER BY created_at ASC
-                LIMIT %s
+                LIMIT %s OFFSET %s
             """
             with conn.cursor() as cursor:
-                cursor.execute(sql, (user_id, limit))
+                cursor.execute(sql, (user_id, limit, offset))
                 rows = cursor.fetchall()
 
             messages = []
@@ -646,6 +968,61 @@ class ConversationStore:
             logger.error(f"Failed to retrieve cross-conversation history for user_id={user_id}: {e}")
             raise
 
+    def get_messages_after_id(
+        self,
+        after_id: int,
+        chat_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        limit: int = 50,
+    ) -> List[ConversationMessage]:
+        """
+        Retrieve the messages of a chat (or of a buyer across chats) inserted
+        after a given row, for folding new messages into a rolling summary.
+
+        Ordered by id ASC (insertion order), so the last row's id is the new
+        high-water mark.
+
+        Args:
+            after_id: Only rows with id > after_id are returned
+            chat_id: Restrict to this chat (one of chat_id / user_id is required)
+            user_id: Restrict to this buyer, across all chats
+            limit: Maximum number of messages to return
+
+        Returns:
+            List of ConversationMessage objects ordered by id
+        """
+        if chat_id:
+            column, value = "chat_id", chat_id
+        elif user_id:
+            column, value = "user_id", user_id
+        else:
+            raise ValueError("get_messages_after_id needs chat_id or user_id")
+        try:
+            conn = self._get_connection()
+            sql = f"""
+                SELECT * FROM conversations
+                WHERE {column} = %s AND id > %s
+                ORDER BY id ASC
+                LIMIT %s
+            """
+            with conn.cursor() as cursor:
+                cursor.execute(sql, (value, after_id, limit))
+                rows = cursor.fetchall()
+
+            messages = []
+            for row in rows:
+                if row.get('context'):
+                    try:
+                        row['context'] = json.loads(row['context'])
+                    except Exception:
+                        row['context'] = None
+                messages.append(ConversationMessage(**row))
+            return messages
+
+        except Exception as e:
+            logger.error(f"Failed to retrieve messages after id={after_id} ({column}={value}): {e}")
+            raise
+
     def get_user_fingerprint(self, user_id: str) -> Optional[Dict[str, Any]]:
         """
         Get a lightweight fingerprint of all conversations for a user.
@@ -690,6 +1067,10 @@ class ConversationStore:
         """
         Get summary of recent conversations with pagination.
 
+        Reads the chat_summaries table (maintained by save_message / save_turn),
+        so the page is a range scan on idx_last_message_at regardless of how
+        much history conversations / agent_turns hold.
+
         Args:
             limit: Number of conversations to return
             offset: Number of conversations to skip
@@ -702,73 +1083,43 @@ class ConversationStore:
         try:
             conn = self._get_connection()
 
-            # Build optional WHERE clause for date filtering
-            where_clause = ""
-            count_params: list = []
-            query_params: list = []
+            conditions = ["s.message_count > 0"]
+            params: list = []
             if date:
-                where_clause = "WHERE DATE(c.created_at) = %s"
-                count_params = [date]
-                query_params = [date]
+                # Sargable day range: chats active around that day, confirmed
+                # by an idx_chat_created lookup for a message inside the day
+                day_start = datetime.strptime(date, "%Y-%m-%d")
+                day_end = day_start + timedelta(days=1)
+                conditions.append("s.last_message_at >= %s AND s.first_message_at < %s")
+                conditions.append(
+                    "EXISTS (SELECT 1 FROM conversations c WHERE c.chat_id = s.chat_id"
+                    " AND c.created_at >= %s AND c.created_at < %s)"
+                )
+                params = [day_start, day_end, day_start, day_end]
+            where_clause = "WHERE " + " AND ".join(conditions)
 
-            count_sql = f"""
-                SELECT COUNT(DISTINCT chat_id) as total
-                FROM conversations c
-                {where_clause}
-            """
+            count_sql = f"SELECT COUNT(*) AS total FROM chat_summaries s {where_clause}"
 
             sql = f"""
                 SELECT
-                    c.chat_id,
-                    MAX(c.user_id) as user_id,
-                    MAX(c.seller_id) as seller_id,
-                    MAX(c.item_id) as item_id,
-                    COUNT(*) as message_count,
-                    SUM(CASE WHEN c.message_type = 'user' THEN 1 ELSE 0 END) as user_messages,
-                    SUM(CASE WHEN c.message_type = 'seller' THEN 1 ELSE 0 END) as seller_messages,
-                    SUM(CASE WHEN c.agent_response IS NOT NULL THEN 1 ELSE 0 END) as ai_replies,
-                    SUM(CASE WHEN c.agent_response LIKE '【调试】%%' THEN 1 ELSE 0 END) as debug_replies,
-                    MIN(c.created_at) as first_message_at,
-                    MAX(c.created_at) as last_message_at,
-                    COALESCE(at_counts.turn_count, 0) as agent_turn_count,
-                    COALESCE(at_counts.suppressed_count, 0) as suppressed_turn_count
-                FROM conversations c
-                LEFT JOIN (
-                    SELECT chat_id,
-                           COUNT(*) as turn_count,
-                           SUM(CASE WHEN response_suppressed = 1 THEN 1 ELSE 0 END) as suppressed_count
-                    FROM agent_turns
-                    WHERE chat_id IS NOT NULL
-                    GROUP BY chat_id
-                ) at_counts ON at_counts.chat_id = c.chat_id
+                    s.chat_id, s.user_id, s.seller_id, s.item_id,
+                    s.message_count, s.user_messages, s.seller_messages,
+                    s.ai_replies, s.debug_replies,
+                    s.first_message_at, s.last_message_at,
+                    s.agent_turn_count, s.suppressed_turn_count,
+                    s.latest_message, s.latest_message_type, s.latest_agent_response
+                FROM chat_summaries s
                 {where_clause}
-                GROUP BY c.chat_id
-                ORDER BY MAX(c.created_at) DESC
+                ORDER BY s.last_message_at DESC
                 LIMIT %s OFFSET %s
             """
 
             with conn.cursor() as cursor:
-                cursor.execute(count_sql, count_params)
+                cursor.execute(count_sql, params)
                 total = cursor.fetchone()['total']
 
-                cursor.execute(sql, query_params + [limit, offset])
+                cursor.execute(sql, params + [limit, offset])
                 rows = cursor.fetchall()
-                
-                # Get latest message content for each conversation
-                for row in rows:
-                    latest_sql = """
-                        SELECT message_content, message_type, agent_response
-                        FROM conversations 
-                        WHERE chat_id = %s
-                        ORDER BY created_at DESC
-                        LIMIT 1
-                    """
-                    cursor.execute(latest_sql, (row['chat_id'],))
-                    latest = cursor.fetchone()
-                    if latest:
-                        row['latest_message'] = latest['message_content'][:100]
-                        row['latest_message_type'] = latest['message_type']
-                        row['latest_agent_response'] = (latest['agent_response'] or '')[:100] if latest['agent_response'] else None
             
             logger.debug(f"Retrieved {len(rows)} recent conversations (total: {total})")
             return {'items': rows, 'total': total}
@@ -777,6 +1128,73 @@ class ConversationStore:
             logger.error(f"Failed to retrieve recent conversations: {e}")
             raise
 
+    def rebuild_chat_summaries(self) -> int:
+        """
+        Recompute chat_summaries from conversations and agent_turns (+ archive).
+
+        Runs automatically when the table is first created. Use it again after
+        editing conversations / agent_turns by hand.
+
+        Returns:
+            Number of chats summarised
+        """
+        with self._lock:
+            conn = self._get_connection()
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("DELETE FROM chat_summaries")
+                    cursor.execute("""
+                        INSERT INTO chat_summaries (
+                            chat_id, user_id, seller_id, item_id,
+                            message_count, user_messages, seller_messages, ai_replies, debug_replies,
+                            first_message_at, last_message_at
+                        )
+                        SELECT
+                            chat_id, MAX(user_id), MAX(seller_id), MAX(item_id),
+                            COUNT(*),
+                            SUM(message_type = 'user'),
+                            SUM(message_type = 'seller'),
+                            SUM(agent_response IS NOT NULL),
+                            COALESCE(SUM(agent_response LIKE '【调试】%'), 0),
+                            MIN(created_at), MAX(created_at)
+                        FROM conversations
+                        GROUP BY chat_id
+                    """)
+                    chats = cursor.rowcount
+                    cursor.execute(f"""
+                        UPDATE chat_summaries s
+                        JOIN conversations c ON c.id = (
+                            SELECT id FROM conversations
+                            WHERE chat_id = s.chat_id
+                            ORDER BY created_at DESC, id DESC
+                            LIMIT 1
+                        )
+                        SET s.latest_message = LEFT(c.message_content, {_PREVIEW_CHARS}),
+                            s.latest_message_type = c.message_type,
+                            s.latest_agent_response = LEFT(c.agent_response, {_PREVIEW_CHARS})
+                    """)
+                    cursor.execute("""
+                        INSERT INTO chat_summaries (chat_id, agent_turn_count, suppressed_turn_count)
+                        SELECT chat_id, COUNT(*), COALESCE(SUM(response_suppressed = 1), 0)
+                        FROM (
+                            SELECT chat_id, response_suppressed FROM agent_turns
+                            WHERE chat_id IS NOT NULL
+                            UNION ALL
+                            SELECT chat_id, response_suppressed FROM agent_turns_archive
+                            WHERE chat_id IS NOT NULL
+                        ) t
+                        GROUP BY chat_id
+                        ON DUPLICATE KEY UPDATE
+                            agent_turn_count = VALUES(agent_turn_count),
+                            suppressed_turn_count = VALUES(suppressed_turn_count)
+                    """)
+                    conn.commit()
+                logger.info(f"Rebuilt chat_summaries for {chats} chats")
+                return chats
+            except Exception:
+                conn.rollback()
+                raise
+    
     def search_messages(
         self,
         keyword: Optional[str] = None,
@@ -786,34 +1204,56 @@ class ConversationStore:
         has_agent_response: Optional[bool] = None,
         debug_only: bool = False,
         limit: int = 50,
-        offset: int = 0
+        offset: int = 0,
+        cursor: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         Search messages with various filters.
+
+        Keywords use the ngram FULLTEXT index (results ranked by relevance);
+        without a keyword results are newest first. Pages are fetched by
+        keyset: pass the returned ``next_cursor`` to get the next page.
         
         Args:
-            keyword: Search keyword in message content or agent response
+            keyword: Search keyword(s) in message content or agent response;
+                     space-separated terms must all match
             start_time: Start time filter (ISO format)
             end_time: End time filter (ISO format)
             message_type: Filter by message type (user/seller/system)
             has_agent_response: Filter messages that have AI responses
             debug_only: Only return debug mode responses
             limit: Maximum number of results
-            offset: Pagination offset
+            offset: Pagination offset (deprecated, ignored when cursor is given)
+            cursor: Opaque keyset cursor from a previous page's ``next_cursor``
             
         Returns:
-            Dict with 'items' (list of messages) and 'total' count
+            Dict with 'items', 'next_cursor' (None on the last page) and, for the
+            first page only, 'total' (capped at _SEARCH_COUNT_CAP; 'total_is_estimate'
+            is True when the cap was hit)
         """
         try:
             conn = self._get_connection()
             
             conditions = []
-            params = []
+            params: list = []
+            relevance_expr = None
+            relevance_params: list = []
             
             if keyword:
-                conditions.append("(message_content LIKE %s OR agent_response LIKE %s)")
-                like_param = f"%{keyword}%"
-                params.extend([like_param, like_param])
+                boolean_query, short_terms = _fulltext_query(keyword)
+                if not self._fulltext_available:
+                    short_terms = keyword.split()
+                    boolean_query = None
+                if boolean_query:
+                    relevance_expr = "MATCH(message_content, agent_response) AGAINST (%s IN BOOLEAN MODE)"
+                    relevance_params = [boolean_query]
+                    conditions.append(relevance_expr)
+                    params.append(boolean_query)
+                for term in short_terms:
+                    # Terms shorter than the ngram size are not indexed
+                    conditions.append("(message_content LIKE %s OR agent_response LIKE %s)")
+                    like_param = f"%{term}%"
+                    params.extend([like_param, like_param])
             
             if start_time:
                 conditions.append("created_at >= %s")
@@ -835,22 +1275,72 @@ class ConversationStore:
             if debug_only:
                 conditions.append("agent_response LIKE '【调试】%%'")
             
-            where_clause = " AND ".join(conditions) if conditions else "1=1"
-            
-            count_sql = f"SELECT COUNT(*) as total FROM conversations WHERE {where_clause}"
+            filter_clause = " AND ".join(conditions) if conditions else "1=1"
+            filter_params = list(params)
+
+            # Keyset position
+            page_conditions = [filter_clause]
+            page_params = list(filter_params)
+            position = decode_cursor(cursor, "search") if cursor else None
+            if position is not None:
+                if relevance_expr and 'r' in position:
+                    page_conditions.append(
+                        f"({relevance_expr} < %s OR ({relevance_expr} = %s AND id < %s))"
+                    )
+                    page_params += relevance_params + [position['r']] + relevance_params + [position['r'], position['id']]
+                elif 't' in position:
+                    page_conditions.append("(created_at < %s OR (created_at = %s AND id < %s))")
+                    page_params += [position['t'], position['t'], position['id']]
+
+            if relevance_expr:
+                select = f"SELECT *, {relevance_expr} AS relevance FROM conversations"
+                order = "ORDER BY relevance DESC, id DESC"
+                select_params = list(relevance_params)
+            else:
+                select = "SELECT * FROM conversations"
+                order = "ORDER BY created_at DESC, id DESC"
+                select_params = []
+
             sql = f"""
-                SELECT * FROM conversations
-                WHERE {where_clause}
-                ORDER BY created_at DESC
-                LIMIT %s OFFSET %s
+                {select}
+                WHERE {" AND ".join(page_conditions)}
+                {order}
+                LIMIT %s
             """
-            
-            with conn.cursor() as cursor:
-                cursor.execute(count_sql, params)
-                total = cursor.fetchone()['total']
-                
-                cursor.execute(sql, params + [limit, offset])
-                rows = cursor.fetchall()
+            query_params = select_params + page_params + [limit + 1]
+            if position is None and offset:
+                sql += " OFFSET %s"
+                query_params.append(offset)
+
+            total = None
+            total_is_estimate = False
+            with conn.cursor() as cur:
+                cur.execute(sql, query_params)
+                rows = cur.fetchall()
+
+                if position is None:
+                    # Bounded count: stops after _SEARCH_COUNT_CAP + 1 matches
+                    cur.execute(
+                        f"SELECT COUNT(*) AS total FROM (SELECT 1 FROM conversations "
+                        f"WHERE {filter_clause} LIMIT %s) capped",
+                        filter_params + [_SEARCH_COUNT_CAP + 1],
+                    )
+                    total = cur.fetchone()['total']
+                    if total > _SEARCH_COUNT_CAP:
+                        total, total_is_estimate = _SEARCH_COUNT_CAP, True
+
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                last = rows[-1]
+                if relevance_expr:
+                    next_cursor = encode_cursor({'r': last['relevance'], 'id': last['id']})
+                else:
+                    created = last['created_at']
+                    next_cursor = encode_cursor({
+                        't': created.isoformat(sep=' ') if isinstance(created, datetime) else created,
+                        'id': last['id'],
+                    })
             
             messages = []
             for row in rows:
@@ -861,8 +1351,13 @@ class ConversationStore:
                         row['context'] = None
                 messages.append(row)
             
-            logger.debug(f"Search found {total} messages (returning {len(messages)})")
-            return {'items': messages, 'total': total}
+            logger.debug(f"Search returned {len(messages)} messages (total: {total})")
+            return {
+                'items': messages,
+                'total': total,
+                'total_is_estimate': total_is_estimate,
+                'next_cursor': next_cursor,
+            }
             
         except Exception as e:
             logger.error(f"Failed to search messages: {e}")
@@ -954,20 +1449,27 @@ class ConversationStore:
                     INSERT INTO agent_turns (
                         session_id, chat_id, turn_number, interaction_id, local_turn_number,
                         user_query,
-                        llm_input, llm_output, response_text,
+                        llm_payload, response_text,
                         tool_calls, tool_results,
                         duration_ms, success, error_message,
                         confidence_percent, response_suppressed
                     ) VALUES (
                         %s, %s, %s, %s, %s,
                         %s,
-                        %s, %s, %s,
+                        %s, %s,
                         %s, %s,
                         %s, %s, %s,
                         %s, %s
                     )
                 """
 
+                llm_payload, segments = encode_turn_payload(llm_input, llm_output)
+                new_segments = [
+                    (digest, compress_text(text), len(text))
+                    for digest, text in segments.items()
+                    if digest not in self._known_segments
+                ]
+
                 def safe_json_dumps(obj):
                     if obj is None:
                         return None
@@ -983,8 +1485,7 @@ class ConversationStore:
                     interaction_id,
                     local_turn_number,
                     user_query,
-                    safe_json_dumps(llm_input),
-                    safe_json_dumps(llm_output),
+                    llm_payload,
                     response_text,
                     safe_json_dumps(tool_calls),
                     safe_json_dumps(tool_results),
@@ -996,9 +1497,17 @@ class ConversationStore:
                 )
                 
                 with conn.cursor() as cursor:
+                    if new_segments:
+                        cursor.executemany(
+                            "INSERT IGNORE INTO prompt_segments (seg_hash, content, raw_chars) VALUES (%s, %s, %s)",
+                            new_segments,
+                        )
                     cursor.execute(sql, values)
-                    conn.commit()
                     row_id = cursor.lastrowid
+                    if chat_id:
+                        cursor.execute(_UPSERT_CHAT_TURN_SQL, (chat_id, int(bool(response_suppressed))))
+                    conn.commit()
+                self._remember_segments(segments)
                 
                 logger.info(
                     f"Saved turn record: session={session_id}, "
@@ -1016,11 +1525,199 @@ class ConversationStore:
                 # Don't raise - turn logging should not break the agent flow
                 return -1
 
+    def _remember_segments(self, segments: Dict[str, str]) -> None:
+        """Record committed prompt_segments hashes so later turns skip re-inserting them."""
+        for digest in segments:
+            self._known_segments[digest] = None
+        while len(self._known_segments) > _KNOWN_SEGMENTS_MAX:
+            del self._known_segments[next(iter(self._known_segments))]
+
+    def save_profile(
+        self,
+        interaction_id: str,
+        speedscope: Dict[str, Any],
+        sample_count: int,
+        duration_ms: Optional[int],
+        interval_ms: Optional[float] = None,
+        session_id: Optional[str] = None,
+        chat_id: Optional[str] = None,
+    ) -> bool:
+        """
+        Save the sampling profile of one agent run next to its agent_turns rows.
+
+        Args:
+            interaction_id: interaction_id shared with the run's agent_turns rows
+            speedscope: Speedscope JSON document (``Profile.to_speedscope()``)
+            sample_count: Number of stack samples
+            duration_ms: Profiled wall time
+            interval_ms: Configured sampling interval
+            session_id: Agent session ID
+            chat_id: Xianyu chat ID
+
+        Returns:
+            True if stored, False on failure (profiling must not break the agent flow)
+        """
+        with self._lock:
+            conn = None
+            try:
+                conn = self._get_connection()
+                blob = compress_text(json.dumps(speedscope, ensure_ascii=False, separators=(",", ":")))
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        """
+                        INSERT INTO agent_turn_profiles (
+                            interaction_id, session_id, chat_id,
+                            sample_count, interval_ms, duration_ms, profile
+                        ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+                        ON DUPLICATE KEY UPDATE
+                            sample_count = VALUES(sample_count),
+                            interval_ms  = VALUES(interval_ms),
+                            duration_ms  = VALUES(duration_ms),
+                            profile      = VALUES(profile)
+                        """,
+                        (interaction_id, session_id, chat_id, sample_count, interval_ms, duration_ms, blob),
+                    )
+                    conn.commit()
+                logger.info(
+                    f"Saved profile: interaction_id={interaction_id}, samples={sample_count}, "
+                    f"duration_ms={duration_ms}, bytes={len(blob)}"
+                )
+                return True
+            except Exception as e:
+                logger.error(f"Failed to save profile for interaction_id={interaction_id}: {e}")
+                if conn:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        pass
+                return False
+
+    def get_profile(self, interaction_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the stored profile of one interaction.
+
+        Returns:
+            Row dict whose ``profile`` is the decoded speedscope document, or
+            None when that interaction was not profiled.
+        """
+        conn = self._get_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT * FROM agent_turn_profiles WHERE interaction_id = %s",
+                (interaction_id,),
+            )
+            row = cursor.fetchone()
+        if not row:
+            return None
+        row['profile'] = json.loads(decompress_text(row['profile']))
+        return row
+
+    def get_recent_profiles(self, chat_id: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        List stored profiles (newest first) without their payloads.
+
+        Args:
+            chat_id: Only profiles of this chat (optional)
+            limit: Maximum rows
+        """
+        conn = self._get_connection()
+        where, params = ("WHERE chat_id = %s", (chat_id,)) if chat_id else ("", ())
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT interaction_id, session_id, chat_id, sample_count,
+                       interval_ms, duration_ms, created_at
+                FROM agent_turn_profiles {where}
+                ORDER BY created_at DESC
+                LIMIT %s
+                """,
+                params + (limit,),
+            )
+            return list(cursor.fetchall())
+
+    def _decode_turn_rows(self, cursor, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Turn raw agent_turns / agent_turns_archive rows into API dicts.
+
+        Decompresses llm_payload and resolves its prompt segments with one
+        batched lookup; legacy rows keep their llm_input / llm_output JSON text.
+        """
+        decoded_inputs: Dict[int, Any] = {}
+        for index, row in enumerate(rows):
+            payload = row.pop('llm_payload', None)
+            row.setdefault('llm_input', None)
+            row.setdefault('llm_output', None)
+            if payload:
+                try:
+                    decoded_inputs[index], row['llm_output'] = decode_turn_payload(payload)
+                except Exception as e:
+                    logger.warning(f"Failed to decode llm_payload of turn id={row.get('id')}: {e}")
+                    row['llm_input'] = row['llm_output'] = None
+                continue
+            for json_field in ('llm_input', 'llm_output'):
+                if row.get(json_field):
+                    try:
+                        row[json_field] = json.loads(row[json_field])
+                    except Exception:
+                        pass
+
+        segments: Dict[str, str] = {}
+        refs = sorted(segment_refs(decoded_inputs.values()))
+        if refs:
+            placeholders = ", ".join(["%s"] * len(refs))
+            cursor.execute(
+                f"SELECT seg_hash, content FROM prompt_segments WHERE seg_hash IN ({placeholders})",
+                refs,
+            )
+            for seg in cursor.fetchall():
+                segments[seg['seg_hash']] = decompress_text(seg['content'])
+        for index, llm_input in decoded_inputs.items():
+            rows[index]['llm_input'] = resolve_segments(llm_input, segments)
+
+        for row in rows:
+            for json_field in ('tool_calls', 'tool_results'):
+                if row.get(json_field):
+                    try:
+                        row[json_field] = json.loads(row[json_field])
+                    except Exception:
+                        pass
+        return rows
+
+    def _select_turns(
+        self,
+        where: str,
+        params: tuple,
+        order_by: str,
+        sort_key,
+        limit: int,
+        offset: int,
+        include_archive: bool,
+    ) -> List[Dict[str, Any]]:
+        """Fetch a page of turns from agent_turns and, optionally, agent_turns_archive."""
+        conn = self._get_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT * FROM agent_turns WHERE {where} ORDER BY {order_by} LIMIT %s OFFSET %s",
+                params + (limit + offset if include_archive else limit, 0 if include_archive else offset),
+            )
+            rows = list(cursor.fetchall())
+            if include_archive:
+                cursor.execute(
+                    f"SELECT * FROM agent_turns_archive WHERE {where} ORDER BY {order_by} LIMIT %s",
+                    params + (limit + offset,),
+                )
+                archived = cursor.fetchall()
+                if archived:
+                    rows = sorted(rows + list(archived), key=sort_key)
+                rows = rows[offset:offset + limit]
+            return self._decode_turn_rows(cursor, rows)
+
     def get_turns_by_session(
         self,
         session_id: str,
         limit: int = 100,
-        offset: int = 0
+        offset: int = 0,
+        include_archive: bool = True,
     ) -> List[Dict[str, Any]]:
         """
         Get all turn records for a session.
@@ -1029,34 +1726,16 @@ class ConversationStore:
             session_id: Agent session ID
             limit: Maximum number of turns to return
             offset: Pagination offset
+            include_archive: Also read turns moved to agent_turns_archive
 
         Returns:
             List of turn records
         """
         try:
-            conn = self._get_connection()
-
-            sql = """
-                SELECT * FROM agent_turns
-                WHERE session_id = %s
-                ORDER BY turn_number ASC
-                LIMIT %s OFFSET %s
-            """
-
-            with conn.cursor() as cursor:
-                cursor.execute(sql, (session_id, limit, offset))
-                rows = cursor.fetchall()
-
-            turns = []
-            for row in rows:
-                for json_field in ('llm_input', 'llm_output', 'tool_calls', 'tool_results'):
-                    if row.get(json_field):
-                        try:
-                            row[json_field] = json.loads(row[json_field])
-                        except:
-                            pass
-                turns.append(row)
-
+            turns = self._select_turns(
+                "session_id = %s", (session_id,), "turn_number ASC",
+                lambda t: t['turn_number'], limit, offset, include_archive,
+            )
             logger.debug(f"Retrieved {len(turns)} turns for session={session_id}")
             return turns
 
@@ -1068,7 +1747,8 @@ class ConversationStore:
         self,
         chat_id: str,
         limit: int = 200,
-        offset: int = 0
+        offset: int = 0,
+        include_archive: bool = True,
     ) -> Dict[str, List[Dict[str, Any]]]:
         """
         Get all agent turn records associated with a chat_id, grouped by session_id.
@@ -1081,33 +1761,20 @@ class ConversationStore:
             chat_id: Xianyu chat ID
             limit: Maximum number of turns to return
             offset: Pagination offset
+            include_archive: Also read turns moved to agent_turns_archive
 
         Returns:
             Dict mapping session_id → list of turn dicts  (same shape as
             turns_by_session in get_conversation_detail)
         """
         try:
-            conn = self._get_connection()
-
-            sql = """
-                SELECT * FROM agent_turns
-                WHERE chat_id = %s
-                ORDER BY session_id, turn_number ASC
-                LIMIT %s OFFSET %s
-            """
-
-            with conn.cursor() as cursor:
-                cursor.execute(sql, (chat_id, limit, offset))
-                rows = cursor.fetchall()
+            rows = self._select_turns(
+                "chat_id = %s", (chat_id,), "session_id, turn_number ASC",
+                lambda t: (t['session_id'], t['turn_number']), limit, offset, include_archive,
+            )
 
             turns_by_session: Dict[str, List[Dict[str, Any]]] = {}
             for row in rows:
-                for json_field in ('llm_input', 'llm_output', 'tool_calls', 'tool_results'):
-                    if row.get(json_field):
-                        try:
-                            row[json_field] = json.loads(row[json_field])
-                        except Exception:
-                            pass
                 sid = row.get('session_id', '')
                 turns_by_session.setdefault(sid, []).append(row)
 
@@ -1151,17 +1818,7 @@ class ConversationStore:
                 total = cursor.fetchone()['total']
                 
                 cursor.execute(sql, (limit, offset))
-                rows = cursor.fetchall()
-            
-            turns = []
-            for row in rows:
-                for json_field in ('llm_input', 'llm_output', 'tool_calls', 'tool_results'):
-                    if row.get(json_field):
-                        try:
-                            row[json_field] = json.loads(row[json_field])
-                        except:
-                            pass
-                turns.append(row)
+                turns = self._decode_turn_rows(cursor, list(cursor.fetchall()))
             
             return {'items': turns, 'total': total}
             
@@ -1169,16 +1826,126 @@ class ConversationStore:
             logger.error(f"Failed to get recent turns: {e}")
             raise
 
+    def _ensure_archive_partitions(self, cursor, months: List[datetime]) -> None:
+        """Split pmax so each month being archived gets its own partition."""
+        if self._archive_partitions is None:
+            cursor.execute("""
+                SELECT PARTITION_NAME FROM INFORMATION_SCHEMA.PARTITIONS
+                WHERE TABLE_SCHEMA = DATABASE()
+                  AND TABLE_NAME = 'agent_turns_archive'
+                  AND PARTITION_NAME IS NOT NULL
+            """)
+            self._archive_partitions = {row['PARTITION_NAME'] for row in cursor.fetchall()}
+        if 'pmax' not in self._archive_partitions:
+            return  # plain (unpartitioned) archive table
+
+        existing = sorted(p for p in self._archive_partitions if p != 'pmax')
+        latest = existing[-1] if existing else ''
+        # Ranges only grow upwards: older rows land in the lowest partition
+        missing = sorted({m for m in months if _month_partition(m) > latest})
+        if not missing:
+            return
+        definitions = ", ".join(
+            f"PARTITION {_month_partition(m)} VALUES LESS THAN "
+            f"(UNIX_TIMESTAMP('{_next_month(m):%Y-%m-%d %H:%M:%S}'))"
+            for m in missing
+        )
+        cursor.execute(
+            f"ALTER TABLE agent_turns_archive REORGANIZE PARTITION pmax INTO "
+            f"({definitions}, PARTITION pmax VALUES LESS THAN MAXVALUE)"
+        )
+        self._archive_partitions.update(_month_partition(m) for m in missing)
+        logger.info(f"Added agent_turns_archive partitions: {[_month_partition(m) for m in missing]}")
+
+    def archive_old_turns(self, older_than_days: int, batch_size: int = 500) -> int:
+        """
+        Move agent_turns rows older than ``older_than_days`` into agent_turns_archive.
+
+        Rows are moved in id order, ``batch_size`` per transaction. Legacy rows
+        with plain-text llm_input / llm_output are compressed into llm_payload
+        on the way. chat_summaries counts are unaffected.
+
+        Args:
+            older_than_days: Age threshold in days (must be positive)
+            batch_size: Rows per transaction
+
+        Returns:
+            Number of turns archived
+        """
+        if older_than_days <= 0:
+            raise ValueError("older_than_days must be positive")
+        cutoff = datetime.now() - timedelta(days=older_than_days)
+        moved = 0
+
+        while True:
+            with self._lock:
+                conn = self._get_connection()
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute(
+                            "SELECT * FROM agent_turns WHERE created_at < %s ORDER BY id LIMIT %s",
+                            (cutoff, batch_size),
+                        )
+                        rows = cursor.fetchall()
+                        if not rows:
+                            break
+
+                        # DDL commits implicitly, so partitions are added before the batch
+                        months = {row['created_at'].replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+                                  for row in rows}
+                        self._ensure_archive_partitions(cursor, sorted(months))
+
+                        segments: Dict[str, str] = {}
+                        values = []
+                        for row in rows:
+                            if not row.get('llm_payload') and (row.get('llm_input') or row.get('llm_output')):
+                                llm_input, llm_output = (
+                                    _loads_or_text(row.get('llm_input')),
+                                    _loads_or_text(row.get('llm_output')),
+                                )
+                                row['llm_payload'], row_segments = encode_turn_payload(llm_input, llm_output)
+                                segments.update(row_segments)
+                            values.append(tuple(row.get(column) for column in _ARCHIVE_COLUMNS))
+
+                        if segments:
+                            cursor.executemany(
+                                "INSERT IGNORE INTO prompt_segments (seg_hash, content, raw_chars) VALUES (%s, %s, %s)",
+                                [(digest, compress_text(text), len(text)) for digest, text in segments.items()],
+                            )
+                        cursor.executemany(_INSERT_ARCHIVE_SQL, values)
+                        ids = [row['id'] for row in rows]
+                        cursor.execute(
+                            f"DELETE FROM agent_turns WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                            ids,
+                        )
+                        conn.commit()
+                except Exception as e:
+                    logger.error(f"Failed to archive agent turns: {e}")
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        pass
+                    raise
+
+            moved += len(rows)
+            if len(rows) < batch_size:
+                break
+
+        logger.info(f"Archived {moved} agent turns older than {cutoff:%Y-%m-%d %H:%M}")
+        return moved
+
     def close(self):
-        """Close the database connection."""
-        if self._connection:
+        """Close the database connections of all threads."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
             try:
-                self._connection.close()
-                logger.info("Closed MySQL connection")
+                conn.close()
             except Exception as e:
                 logger.warning(f"Error closing MySQL connection: {e}")
-            finally:
-                self._connection = None
+        if connections:
+            logger.info(f"Closed {len(connections)} MySQL connection(s)")
+        self._connection = None
 
     def save_review(
         self,
@@ -0,0 +1,415 @@
+"""
+CDP 帧分发队列
+
+CDP 事件回调只负责把帧放进有界队列，由固定数量的 worker 调用消息处理回调
+（解码 → POST /xianyu/inbound → 发送回复）。
+
+【为什么需要】
+过去 ``_on_frame_received`` 直接 await 回调，一次最长 130s 的
+/xianyu/inbound 请求会卡住该 CDP 会话后续所有事件。
+
+【设计】
+- 三级优先级：聊天帧（syncPushPackage）> 其他业务帧 > 心跳 / ACK
+- 队列满时先丢弃低优先级帧，再按溢出策略处理：
+    - ``drop_new``    丢弃新到的帧
+    - ``drop_oldest`` 丢弃同级或更低优先级中最旧的帧
+    - ``spill``       聊天帧写入磁盘 JSONL，队列回落后自动回放（默认）
+- ``stats()`` 提供队列深度、丢弃 / 溢写计数、回调耗时等指标
+- 多账号共享一个分发器：入队时带上 ``route``（账号 ID），按 ``register()``
+  注册的回调分发；溢写文件同样记录 route，回放后仍送回原账号
+- 同一会话串行：``lane_key`` 从聊天帧中取出会话键（通常是 chat_id），
+  ``(route, 会话键)`` 相同的帧同一时刻只会有一个在途，且按入队顺序处理；
+  worker 出队时跳过会话仍在处理中的帧，不同会话之间照常并行。
+  取不到会话键的帧不受限制
+- 溢写保序：某会话还有溢写帧未回放时，它的新聊天帧也直接溢写，排在旧帧之后，
+  避免回放的旧帧晚于同会话的新帧被处理
+"""
+
+import asyncio
+import base64
+import json
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+
+# 优先级（数值越小越先处理）
+PRIORITY_CHAT = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+_PRIORITY_NAMES = {PRIORITY_CHAT: "chat", PRIORITY_NORMAL: "normal", PRIORITY_LOW: "low"}
+
+OVERFLOW_POLICIES = ("drop_new", "drop_oldest", "spill")
+
+FrameCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+LaneKey = Callable[[Dict[str, Any]], Optional[str]]
+# (入队时间, route, 会话通道, 帧)
+QueuedFrame = Tuple[float, Optional[str], Optional[Tuple[Optional[str], str]], Dict[str, Any]]
+
+
+def classify_frame(message_data: Dict[str, Any]) -> int:
+    """
+    不解密的前提下估计帧的优先级。
+
+    - 心跳响应 ``{"code":200,"headers":{...}}``、心跳 ``/!``、ACK → LOW
+    - syncPushPackage 中能直接 base64 解出 JSON 的数据（非聊天，见
+      ``XianyuMessageCodec.decode_message``）→ LOW
+    - 其余 syncPushPackage（加密聊天帧）→ CHAT
+    - 其他带 body 的帧（历史消息响应等）→ NORMAL
+    """
+    if not isinstance(message_data, dict):
+        return PRIORITY_LOW
+    if "body" not in message_data:
+        return PRIORITY_LOW
+    if message_data.get("lwp") == "/!" or message_data.get("type") == "ACK":
+        return PRIORITY_LOW
+
+    body = message_data.get("body")
+    sync = body.get("syncPushPackage") if isinstance(body, dict) else None
+    if isinstance(sync, dict):
+        items = sync.get("data") or []
+        if not items:
+            return PRIORITY_LOW
+        data = items[0].get("data") if isinstance(items[0], dict) else None
+        if not data:
+            return PRIORITY_LOW
+        try:
+            json.loads(base64.b64decode(data).decode("utf-8"))
+            return PRIORITY_LOW
+        except Exception:
+            return PRIORITY_CHAT
+    return PRIORITY_NORMAL
+
+
+class FrameDispatcher:
+    """
+    有界、分优先级的 CDP 帧分发器。
+
+    所有方法都必须在同一个事件循环中调用（拦截器主循环）。
+    """
+
+    def __init__(
+        self,
+        callback: FrameCallback,
+        workers: int = 4,
+        max_queue: int = 500,
+        overflow_policy: str = "spill",
+        spill_dir: str = "./xianyu_spill",
+        lane_key: Optional[LaneKey] = None,
+    ):
+        """
+        Args:
+            callback: 处理单个帧的协程函数（通常是 run_xianyu.on_message）
+            workers: 并发 worker 数（同时在途的回调上限）
+            max_queue: 队列中等待处理的帧总数上限
+            overflow_policy: 队列满时的策略，见模块说明
+            spill_dir: spill 策略下溢写文件所在目录
+            lane_key: 从聊天帧取会话键的函数（如 ``XianyuMessageCodec.peek_chat_id``）；
+                None 表示不做会话串行
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"未知的溢出策略: {overflow_policy}（可选: {', '.join(OVERFLOW_POLICIES)}）"
+            )
+        self.callback = callback
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.overflow_policy = overflow_policy
+        self.spill_path = Path(spill_dir) / "frames.jsonl"
+        self.lane_key = lane_key
+
+        self._routes: Dict[str, FrameCallback] = {}
+        self._queues: List[Deque[QueuedFrame]] = [deque(), deque(), deque()]
+        # 正在处理中的会话通道
+        self._busy_lanes: Set[Tuple[Optional[str], str]] = set()
+        self._has_work: Optional[asyncio.Event] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._in_flight = 0
+        self._spilled_pending = 0
+        # 会话通道 -> 溢写文件中尚未回放的帧数
+        self._spilled_lanes: Dict[Tuple[Optional[str], str], int] = {}
+
+        self._enqueued = [0, 0, 0]
+        self._dropped = [0, 0, 0]
+        self._processed = 0
+        self._failed = 0
+        self._spilled = 0
+        self._replayed = 0
+        self._max_depth = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+        self._max_run = 0.0
+
+    def register(self, route: str, callback: FrameCallback) -> None:
+        """为某个 route（账号 ID）注册专用回调；未注册的 route 使用默认回调。"""
+        self._routes[route] = callback
+
+    def unregister(self, route: str) -> None:
+        self._routes.pop(route, None)
+
+    # ── 生命周期 ──────────────────────────────────────────────────────────────
+
+    async def start(self) -> None:
+        """启动 worker（幂等）。"""
+        if self._worker_tasks:
+            return
+        self._has_work = asyncio.Event()
+        if self.depth:
+            self._has_work.set()
+        if self.overflow_policy == "spill" and self.spill_path.exists():
+            self._spilled_lanes.clear()
+            self._spilled_pending = 0
+            with self.spill_path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    self._spilled_pending += 1
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._count_spilled(record.get("frame") or {}, record.get("route"), 1)
+            if self._spilled_pending:
+                logger.info(f"发现 {self._spilled_pending} 条未回放的溢写帧: {self.spill_path}")
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(), name=f"frame-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(
+            f"帧分发器已启动: workers={self.workers}, max_queue={self.max_queue}, "
+            f"overflow_policy={self.overflow_policy}"
+        )
+
+    async def close(self) -> None:
+        """停止 worker；队列中尚未处理的聊天帧在 spill 策略下落盘保存。"""
+        for task in self._worker_tasks:
+            task.cancel()
+        if self._worker_tasks:
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        if self.overflow_policy == "spill":
+            leftover = [(route, frame) for _, route, _, frame in self._queues[PRIORITY_CHAT]]
+            for route, frame in leftover:
+                self._spill(frame, route)
+        for q in self._queues:
+            q.clear()
+        self._busy_lanes.clear()
+
+    # ── 入队 ──────────────────────────────────────────────────────────────────
+
+    @property
+    def depth(self) -> int:
+        return sum(len(q) for q in self._queues)
+
+    def submit(self, message_data: Dict[str, Any], route: Optional[str] = None) -> bool:
+        """
+        非阻塞入队。CDP 事件回调中调用，立即返回。
+
+        Args:
+            message_data: 解析后的 WebSocket 帧
+            route: 帧所属账号 ID；None 表示默认回调
+
+        Returns:
+            bool: 帧是否进入了内存队列（被溢写到磁盘或丢弃时返回 False）
+        """
+        priority = classify_frame(message_data)
+        if priority == PRIORITY_CHAT and self._spilled_lanes:
+            lane = self._lane_of(priority, message_data, route)
+            if lane in self._spilled_lanes:
+                # 同会话还有溢写帧没回放，新帧跟在它们后面落盘
+                self._spill(message_data, route)
+                return False
+        if self.depth >= self.max_queue and not self._make_room(priority):
+            self._overflow(priority, message_data, route)
+            return False
+        self._push(priority, message_data, route)
+        return True
+
+    def _push(self, priority: int, message_data: Dict[str, Any], route: Optional[str]) -> None:
+        lane = self._lane_of(priority, message_data, route)
+        self._queues[priority].append((time.monotonic(), route, lane, message_data))
+        self._enqueued[priority] += 1
+        self._max_depth = max(self._max_depth, self.depth)
+        self._notify()
+
+    def _lane_of(
+        self, priority: int, message_data: Dict[str, Any], route: Optional[str]
+    ) -> Optional[Tuple[Optional[str], str]]:
+        """聊天帧的会话通道 ``(route, 会话键)``；其他帧或取不到会话键时为 None。"""
+        if self.lane_key is None or priority != PRIORITY_CHAT:
+            return None
+        try:
+            key = self.lane_key(message_data)
+        except Exception as e:
+            logger.debug(f"提取会话键失败，该帧不做会话串行: {e}")
+            return None
+        return (route, key) if key else None
+
+    def _notify(self) -> None:
+        if self._has_work is not None:
+            self._has_work.set()
+
+    def _make_room(self, priority: int) -> bool:
+        """队列满时丢弃一个比 priority 更低优先级的帧（最新的），成功返回 True。"""
+        for level in range(PRIORITY_LOW, priority, -1):
+            if self._queues[level]:
+                self._queues[level].pop()
+                self._dropped[level] += 1
+                return True
+        return False
+
+    def _overflow(
+        self, priority: int, message_data: Dict[str, Any], route: Optional[str]
+    ) -> None:
+        name = _PRIORITY_NAMES[priority]
+        if self.overflow_policy == "spill" and priority == PRIORITY_CHAT:
+            self._spill(message_data, route)
+            logger.warning(f"帧队列已满 (depth={self.depth})，聊天帧已溢写到磁盘")
+            return
+        if self.overflow_policy == "drop_oldest":
+            for level in range(PRIORITY_LOW, priority - 1, -1):
+                if self._queues[level]:
+                    self._queues[level].popleft()
+                    self._dropped[level] += 1
+                    self._push(priority, message_data, route)
+                    logger.warning(
+                        f"帧队列已满 (depth={self.depth})，丢弃最旧的 "
+                        f"{_PRIORITY_NAMES[level]} 帧"
+                    )
+                    return
+        self._dropped[priority] += 1
+        logger.warning(f"帧队列已满 (depth={self.depth})，丢弃新到的 {name} 帧")
+
+    # ── 溢写 / 回放 ───────────────────────────────────────────────────────────
+
+    def _spill(self, message_data: Dict[str, Any], route: Optional[str]) -> None:
+        record = {"route": route, "frame": message_data}
+        try:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.spill_path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._spilled += 1
+            self._spilled_pending += 1
+            self._count_spilled(message_data, route, 1)
+        except Exception as e:
+            self._dropped[PRIORITY_CHAT] += 1
+            logger.error(f"溢写帧失败，已丢弃: {e}")
+
+    def _count_spilled(self, message_data: Dict[str, Any], route: Optional[str], delta: int) -> None:
+        """维护各会话通道待回放的溢写帧数；取不到会话键的帧不计。"""
+        lane = self._lane_of(PRIORITY_CHAT, message_data, route)
+        if lane is None:
+            return
+        n = self._spilled_lanes.get(lane, 0) + delta
+        if n > 0:
+            self._spilled_lanes[lane] = n
+        else:
+            self._spilled_lanes.pop(lane, None)
+
+    def _maybe_replay_spill(self) -> None:
+        """队列回落到一半以下时，把溢写文件中的帧读回队列。"""
+        if not self._spilled_pending or self.depth >= self.max_queue // 2:
+            return
+        try:
+            lines = self.spill_path.read_text(encoding="utf-8").splitlines()
+        except FileNotFoundError:
+            self._spilled_pending = 0
+            self._spilled_lanes.clear()
+            return
+        room = self.max_queue // 2 - self.depth
+        batch, rest = lines[:room], lines[room:]
+        if rest:
+            self.spill_path.write_text("\n".join(rest) + "\n", encoding="utf-8")
+        else:
+            self.spill_path.unlink(missing_ok=True)
+        self._spilled_pending = len(rest)
+        for line in batch:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            frame, route = record.get("frame") or {}, record.get("route")
+            self._count_spilled(frame, route, -1)
+            self._push(PRIORITY_CHAT, frame, route)
+            self._replayed += 1
+        if batch:
+            logger.info(f"已回放 {len(batch)} 条溢写帧，剩余 {self._spilled_pending} 条")
+
+    # ── Worker ────────────────────────────────────────────────────────────────
+
+    def _pop(self) -> Optional[QueuedFrame]:
+        """按优先级取出第一个可处理的帧；所属会话仍在处理中的帧留在原位。"""
+        for q in self._queues:
+            for i, item in enumerate(q):
+                lane = item[2]
+                if lane is None or lane not in self._busy_lanes:
+                    del q[i]
+                    return item
+        return None
+
+    async def _worker(self) -> None:
+        assert self._has_work is not None
+        has_work = self._has_work
+        while True:
+            item = self._pop()
+            if item is None:
+                # pop 与 clear 之间没有 await，不会漏掉新入队的帧或刚释放的会话
+                has_work.clear()
+                await has_work.wait()
+                continue
+            enqueued_at, route, lane, message_data = item
+            if lane is not None:
+                self._busy_lanes.add(lane)
+            callback = self._routes.get(route, self.callback) if route else self.callback
+            started = time.monotonic()
+            wait = started - enqueued_at
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            self._in_flight += 1
+            try:
+                await callback(message_data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failed += 1
+                logger.error(f"帧处理回调失败: {e}")
+            finally:
+                if lane is not None:
+                    self._busy_lanes.discard(lane)
+                    # 同会话的后续帧可能正在等待
+                    self._notify()
+                self._in_flight -= 1
+                self._processed += 1
+                run = time.monotonic() - started
+                self._total_run += run
+                self._max_run = max(self._max_run, run)
+                self._maybe_replay_spill()
+
+    # ── 指标 ──────────────────────────────────────────────────────────────────
+
+    def stats(self) -> Dict[str, Any]:
+        """队列深度、吞吐、丢弃与耗时指标。"""
+        processed = self._processed or 1
+        return {
+            "depth": self.depth,
+            "depth_by_priority": {
+                _PRIORITY_NAMES[p]: len(q) for p, q in enumerate(self._queues)
+            },
+            "max_depth": self._max_depth,
+            "in_flight": self._in_flight,
+            "workers": self.workers,
+            "busy_lanes": len(self._busy_lanes),
+            "enqueued": {_PRIORITY_NAMES[p]: n for p, n in enumerate(self._enqueued)},
+            "dropped": {_PRIORITY_NAMES[p]: n for p, n in enumerate(self._dropped)},
+            "processed": self._processed,
+            "failed": self._failed,
+            "spilled": self._spilled,
+            "spill_pending": self._spilled_pending,
+            "replayed": self._replayed,
+            "avg_wait_ms": round(self._total_wait / processed * 1000, 1),
+            "max_wait_ms": round(self._max_wait * 1000, 1),
+            "avg_callback_ms": round(self._total_run / processed * 1000, 1),
+            "max_callback_ms": round(self._max_run * 1000, 1),
+        }
@@ -2,34 +2,85 @@
 图片处理模块
 
 用于提取、下载和保存闲鱼聊天中的图片
+
+- 下载在后台有界队列中进行，文本消息转发不再等待图片下载
+- 文件按内容哈希（sha256）存储，同一张截图/转发图片只落盘一次
+- 流式写入 + 单张大小上限，目录总占用超限时按最近使用时间淘汰
+- 写盘、rglob 扫描等文件操作都放到线程里执行，不阻塞拦截器事件循环
 """
 
 import os
 import asyncio
+import hashlib
+import time
+import uuid
 import aiohttp
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, Dict, Any, List
-from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
 from loguru import logger
 
 
+# 下载分块大小（流式写盘，不在内存中保留整张图片）
+_CHUNK_SIZE = 64 * 1024
+# URL → 已存储路径 的内存索引上限
+_URL_INDEX_SIZE = 2048
+
+
 class ImageHandler:
     """
     图片处理器
 
     负责从闲鱼消息中提取图片 URL，下载并保存图片
+
+    存储布局::
+
+        <save_dir>/objects/<hash[:2]>/<hash><ext>   # 内容寻址，跨会话复用
+        <save_dir>/.tmp/                            # 下载中的临时文件
     """
 
-    def __init__(self, save_dir: str = "./xianyu_images"):
+    def __init__(
+        self,
+        save_dir: str = "./xianyu_images",
+        max_bytes: int = 10 * 1024 * 1024,
+        max_disk_bytes: int = 1024 * 1024 * 1024,
+        queue_size: int = 100,
+        workers: int = 2,
+    ):
         """
         初始化图片处理器
 
         Args:
             save_dir: 图片保存目录
+            max_bytes: 单张图片大小上限（超过则放弃下载）
+            max_disk_bytes: 图片目录总占用上限（超过则淘汰最久未使用的文件）
+            queue_size: 后台下载队列长度（队列满时丢弃新任务）
+            workers: 后台下载并发数
         """
         self.save_dir = Path(save_dir)
         self.save_dir.mkdir(parents=True, exist_ok=True)
-        logger.info(f"图片保存目录: {self.save_dir.absolute()}")
+        self.objects_dir = self.save_dir / "objects"
+        self.tmp_dir = self.save_dir / ".tmp"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.queue_size = queue_size
+        self.workers = workers
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._url_index: "OrderedDict[str, str]" = OrderedDict()
+        self._evicting = False
+        self._disk_usage = self._scan_disk_usage()
+        self.stats = {"downloaded": 0, "deduplicated": 0, "dropped": 0, "oversized": 0, "evicted": 0}
+
+        logger.info(
+            f"图片保存目录: {self.save_dir.absolute()} "
+            f"(当前占用 {self._disk_usage / 1024 / 1024:.1f} MB)"
+        )
 
     def extract_image_urls(self, raw_data: Dict[str, Any]) -> List[str]:
         """
@@ -139,6 +190,102 @@ class ImageHandler:
 
         return urls
 
+    # ── 后台下载队列 ──────────────────────────────────────────────────────────
+
+    async def start(self) -> None:
+        """启动后台下载 worker（幂等）。需在事件循环内调用。"""
+        if self._worker_tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(i), name=f"image-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"图片下载 worker 已启动: workers={self.workers}, queue_size={self.queue_size}")
+
+    async def close(self) -> None:
+        """停止后台 worker 并关闭 HTTP 会话。"""
+        for task in self._worker_tasks:
+            task.cancel()
+        if self._worker_tasks:
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._queue = None
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def submit(
+        self,
+        raw_data: Dict[str, Any],
+        chat_id: str,
+        user_id: str,
+        timestamp: Optional[int] = None,
+    ) -> List[str]:
+        """
+        提取图片 URL 并放入后台下载队列，立即返回（不等待下载）。
+
+        Returns:
+            List[str]: 已入队的图片 URL（队列满时被丢弃的不包含在内）
+        """
+        urls = self.extract_image_urls(raw_data)
+        if not urls:
+            logger.debug("消息中未找到图片 URL")
+            return []
+        if self._queue is None:
+            logger.warning("图片下载 worker 未启动，跳过图片下载")
+            return []
+
+        queued = []
+        for url in urls:
+            try:
+                self._queue.put_nowait((url, chat_id, user_id, timestamp))
+                queued.append(url)
+            except asyncio.QueueFull:
+                self.stats["dropped"] += 1
+                logger.warning(f"图片下载队列已满，丢弃: {url}")
+        return queued
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _worker(self, index: int) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        while True:
+            url, chat_id, user_id, timestamp = await queue.get()
+            try:
+                filepath = await self.download_image(url, chat_id, user_id, timestamp)
+                if filepath:
+                    logger.info(f"图片已保存 (chat_id={chat_id}): {filepath}")
+            except Exception as e:
+                logger.error(f"后台下载图片失败 ({url}): {e}")
+            finally:
+                queue.task_done()
+
+    # ── 下载与内容寻址存储 ────────────────────────────────────────────────────
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+        return self._session
+
+    @staticmethod
+    def _guess_ext(url: str) -> str:
+        """从 URL 推断文件扩展名。"""
+        lowered = url.lower()
+        if ".png" in lowered:
+            return ".png"
+        if ".webp" in lowered:
+            return ".webp"
+        if ".gif" in lowered:
+            return ".gif"
+        return ".jpg"
+
+    def _object_path(self, digest: str, ext: str) -> Path:
+        return self.objects_dir / digest[:2] / f"{digest}{ext}"
+
     async def download_image(
         self,
         url: str,
@@ -147,7 +294,7 @@ class ImageHandler:
         timestamp: Optional[int] = None
     ) -> Optional[str]:
         """
-        下载图片
+        下载图片（流式写入临时文件，边写边计算 sha256，完成后按哈希落盘）
 
         Args:
             url: 图片 URL
@@ -158,44 +305,149 @@ class ImageHandler:
         Returns:
             Optional[str]: 保存的文件路径，失败返回 None
         """
+        # 同一 URL 已下载过且文件仍在：直接复用
+        known = self._url_index.get(url)
+        if known and await asyncio.to_thread(self._touch, Path(known)):
+            self._url_index.move_to_end(url)
+            self.stats["deduplicated"] += 1
+            return known
+
+        tmp_path = self.tmp_dir / f"{uuid.uuid4().hex}.part"
         try:
-            # 生成文件名
-            ts = timestamp or int(datetime.now().timestamp() * 1000)
-            dt_str = datetime.fromtimestamp(ts / 1000).strftime("%Y%m%d_%H%M%S")
-
-            # 从 URL 提取文件扩展名
-            ext = ".jpg"  # 默认
-            if ".png" in url.lower():
-                ext = ".png"
-            elif ".webp" in url.lower():
-                ext = ".webp"
-            elif ".gif" in url.lower():
-                ext = ".gif"
-
-            # 创建子目录：chat_id/user_id/
-            chat_dir = self.save_dir / chat_id / user_id
-            chat_dir.mkdir(parents=True, exist_ok=True)
-
-            filename = f"{dt_str}_{ts}{ext}"
-            filepath = chat_dir / filename
-
-            # 下载图片
-            logger.info(f"正在下载图片: {url}")
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                    if response.status == 200:
-                        content = await response.read()
-                        with open(filepath, "wb") as f:
-                            f.write(content)
-                        logger.info(f"图片已保存: {filepath}")
-                        return str(filepath)
-                    else:
-                        logger.warning(f"下载图片失败: HTTP {response.status}")
-                        return None
+            logger.info(f"正在下载图片: {url} (chat_id={chat_id}, user_id={user_id})")
+            result = await self._stream_to_file(url, tmp_path)
+            if result is None:
+                return None
+            digest, size = result
+
+            final_path = self._object_path(digest, self._guess_ext(url))
+            if await asyncio.to_thread(self._commit, tmp_path, final_path):
+                self._disk_usage += size
+                self.stats["downloaded"] += 1
+                await self._evict_if_needed()
+            else:
+                self.stats["deduplicated"] += 1
+                logger.debug(f"图片内容已存在，复用: {final_path}")
+
+            self._remember(url, str(final_path))
+            return str(final_path)
 
         except Exception as e:
             logger.error(f"下载图片失败 ({url}): {e}")
             return None
+        finally:
+            await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+
+    async def _stream_to_file(self, url: str, tmp_path: Path) -> Optional[Tuple[str, int]]:
+        """流式下载到 tmp_path，返回 (sha256, 字节数)；超限或非 200 返回 None。"""
+        hasher = hashlib.sha256()
+        size = 0
+        async with self._get_session().get(url) as response:
+            if response.status != 200:
+                logger.warning(f"下载图片失败: HTTP {response.status}")
+                return None
+            if response.content_length and response.content_length > self.max_bytes:
+                self.stats["oversized"] += 1
+                logger.warning(
+                    f"图片过大，跳过下载: {response.content_length} > {self.max_bytes} bytes ({url})"
+                )
+                return None
+            f = await asyncio.to_thread(open, tmp_path, "wb")
+            try:
+                async for chunk in response.content.iter_chunked(_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        self.stats["oversized"] += 1
+                        logger.warning(f"图片超过大小上限 {self.max_bytes} bytes，已中止: {url}")
+                        return None
+                    hasher.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+        return hasher.hexdigest(), size
+
+    def _commit(self, tmp_path: Path, final_path: Path) -> bool:
+        """把临时文件移到内容寻址路径（线程中执行）；内容已存在时只刷新 mtime，返回 False。"""
+        if self._touch(final_path):
+            return False
+        final_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, final_path)
+        return True
+
+    def _remember(self, url: str, path: str) -> None:
+        self._url_index[url] = path
+        self._url_index.move_to_end(url)
+        while len(self._url_index) > _URL_INDEX_SIZE:
+            self._url_index.popitem(last=False)
+
+    @staticmethod
+    def _touch(path: Path) -> bool:
+        """刷新 mtime，作为 LRU 淘汰的"最近使用"时间；文件不存在时返回 False。"""
+        try:
+            now = time.time()
+            os.utime(path, (now, now))
+            return True
+        except OSError:
+            return False
+
+    # ── 磁盘占用与淘汰 ────────────────────────────────────────────────────────
+
+    def _scan_disk_usage(self) -> int:
+        total = 0
+        for path in self.objects_dir.rglob("*"):
+            if path.is_file():
+                try:
+                    total += path.stat().st_size
+                except OSError:
+                    pass
+        return total
+
+    async def _evict_if_needed(self) -> None:
+        """占用超过 max_disk_bytes 时，按 mtime 从旧到新删除，直到降到上限的 90%。"""
+        if self.max_disk_bytes <= 0 or self._disk_usage <= self.max_disk_bytes:
+            return
+        if self._evicting:
+            return
+        self._evicting = True
+        try:
+            usage, removed = await asyncio.to_thread(
+                self._evict_files, int(self.max_disk_bytes * 0.9)
+            )
+        finally:
+            self._evicting = False
+        self._disk_usage = usage
+        if removed:
+            self.stats["evicted"] += len(removed)
+            for u in [u for u, p in self._url_index.items() if p in removed]:
+                del self._url_index[u]
+            logger.info(
+                f"图片目录超出上限，已淘汰 {len(removed)} 个文件，"
+                f"当前占用 {self._disk_usage / 1024 / 1024:.1f} MB"
+            )
+
+    def _evict_files(self, target: int) -> Tuple[int, set]:
+        """扫描 objects 目录并删除最旧的文件（线程中执行），返回 (剩余占用, 已删除路径)。"""
+        files = []
+        for path in self.objects_dir.rglob("*"):
+            if path.is_file():
+                try:
+                    st = path.stat()
+                    files.append((st.st_mtime, st.st_size, path))
+                except OSError:
+                    pass
+        files.sort()
+        usage = sum(size for _, size, _ in files)
+        removed = set()
+        for _, size, path in files:
+            if usage <= target:
+                break
+            try:
+                path.unlink()
+                usage -= size
+                removed.add(str(path))
+            except OSError:
+                pass
+        return usage, removed
 
     async def handle_image_message(
         self,
@@ -205,7 +457,9 @@ class ImageHandler:
         timestamp: Optional[int] = None
     ) -> List[str]:
         """
-        处理图片消息（提取 URL 并下载）
+        处理图片消息（提取 URL 并同步等待下载完成）
+
+        消息转发热路径请使用 ``submit()``；本方法保留给需要立即拿到文件路径的调用方。
 
         Args:
             raw_data: 消息原始数据
@@ -223,12 +477,11 @@ class ImageHandler:
             logger.debug("消息中未找到图片 URL")
             return []
 
-        # 下载所有图片
-        saved_files = []
-        for url in urls:
-            filepath = await self.download_image(url, chat_id, user_id, timestamp)
-            if filepath:
-                saved_files.append(filepath)
+        # 并发下载所有图片
+        results = await asyncio.gather(
+            *(self.download_image(url, chat_id, user_id, timestamp) for url in urls)
+        )
+        saved_files = [path for path in results if path]
 
         if saved_files:
             logger.info(f"成功保存 {len(saved_files)} 张图片")
@@ -240,17 +493,18 @@ class ImageHandler:
 _image_handler: Optional[ImageHandler] = None
 
 
-def get_image_handler(save_dir: str = "./xianyu_images") -> ImageHandler:
+def get_image_handler(save_dir: str = "./xianyu_images", **kwargs: Any) -> ImageHandler:
     """
     获取全局图片处理器实例
 
     Args:
         save_dir: 图片保存目录
+        **kwargs: 传给 ImageHandler 的其他参数（仅首次创建时生效）
 
     Returns:
         ImageHandler: 图片处理器实例
     """
     global _image_handler
     if _image_handler is None:
-        _image_handler = ImageHandler(save_dir=save_dir)
+        _image_handler = ImageHandler(save_dir=save_dir, **kwargs)
     return _image_handler
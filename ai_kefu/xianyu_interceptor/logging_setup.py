@@ -4,21 +4,18 @@ Logging setup for Xianyu Interceptor.
 Uses loguru with:
 - Console: colored text (dev) or JSON (LOG_FORMAT=json)
 - File:    always JSONL, daily rotation → logs/xianyu_YYYY-MM-DD.log
+- Both written asynchronously with per-call-site rate limiting
+  (shared with the API, see ai_kefu.utils.logging.install_handlers)
 - stdlib bridge so libraries using logging.getLogger() also go to loguru
 """
 
 import sys
 import logging
-from pathlib import Path
 
 from loguru import logger
-from .config import config
-
 
-# ── Log directory (relative to the ai_kefu package root) ──────────────────────
-_HERE = Path(__file__).parent          # xianyu_interceptor/
-LOG_DIR = _HERE.parent / "logs"        # ai_kefu/logs/
-LOG_DIR.mkdir(parents=True, exist_ok=True)
+from ai_kefu.utils.logging import LOG_DIR, install_handlers
+from .config import config
 
 
 # ── stdlib → loguru bridge ─────────────────────────────────────────────────────
@@ -55,41 +52,8 @@ def setup_logging() -> None:
     level = config.log_level.upper()
     log_format = config.log_format.lower()
 
-    # ── Remove default loguru handler ─────────────────────────────────────────
-    logger.remove()
-
-    # ── Console handler ───────────────────────────────────────────────────────
-    if log_format == "json":
-        logger.add(
-            sys.stderr,
-            level=level,
-            serialize=True,
-            colorize=False,
-        )
-    else:
-        logger.add(
-            sys.stderr,
-            level=level,
-            format=(
-                "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | "
-                "<level>{level: <8}</level> | "
-                "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> | "
-                "<level>{message}</level>"
-            ),
-            colorize=True,
-        )
-
-    # ── File handler – always JSONL, daily rotation, 30-day retention ─────────
-    logger.add(
-        str(LOG_DIR / "xianyu_{time:YYYY-MM-DD}.log"),
-        level=level,
-        rotation="00:00",         # rotate at midnight
-        retention="30 days",
-        compression="zip",
-        encoding="utf-8",
-        serialize=True,           # robust JSONL – no manual quote escaping
-        enqueue=True,             # async-safe
-    )
+    # ── Console (stderr) + daily JSONL file, both async with rate limiting ────
+    install_handlers(level, log_format, sys.stderr, "xianyu_{time:YYYY-MM-DD}.log")
 
     # ── Intercept stdlib logging (installed once per process) ─────────────────
     if not _INTERCEPT_INSTALLED:
@@ -17,6 +17,8 @@ from typing import Optional
 import httpx
 from loguru import logger
 
+from ai_kefu.utils.tracing import Span, inject_headers, start_span
+
 from .models import XianyuMessage, XianyuMessageType
 from .uid_mapper import record_uid_mapping
 
@@ -118,55 +120,69 @@ class MessageHandler:
             ):
                 return None
 
-            # POST to AI API
-            payload = message.model_dump()
-            logger.debug(
-                f"[relay] POSTing to {self.inbound_url}: "
-                f"chat_id={message.chat_id}, item_id={message.item_id}"
-            )
-            async with httpx.AsyncClient(timeout=130.0) as client:
-                resp = await client.post(self.inbound_url, json=payload)
+            # One trace per relayed message: the traceparent header carries it
+            # through /xianyu/inbound into the agent, tools and LLM calls
+            with start_span(
+                "interceptor.handle_message",
+                {"chat_id": message.chat_id, "message_id": message.message_id},
+            ) as span:
+                return await self._relay(message, span)
 
-            logger.info(
-                f"[relay] API response: status={resp.status_code}, "
-                f"chat_id={message.chat_id}"
-            )
-
-            if resp.status_code >= 400:
-                logger.error(
-                    f"[relay] API returned error {resp.status_code} for "
-                    f"chat_id={message.chat_id}: {resp.text[:500]}"
-                )
-                resp.raise_for_status()
+        except Exception as e:
+            logger.error(f"[relay] Error handling message: {e}", exc_info=True)
+            return None
 
-            data = resp.json()
-            logger.debug(
-                f"[relay] API response body: chat_id={message.chat_id}, data={data}"
+    async def _relay(self, message: XianyuMessage, span: Span) -> Optional[str]:
+        """POST one chat message to the AI API and send back its reply."""
+        # POST to AI API
+        payload = message.model_dump()
+        logger.debug(
+            f"[relay] POSTing to {self.inbound_url}: "
+            f"chat_id={message.chat_id}, item_id={message.item_id}"
+        )
+        with start_span("interceptor.post_inbound"):
+            async with httpx.AsyncClient(timeout=130.0) as client:
+                resp = await client.post(self.inbound_url, json=payload, headers=inject_headers())
+        span.set_attribute("status_code", resp.status_code)
+
+        logger.info(
+            f"[relay] API response: status={resp.status_code}, "
+            f"chat_id={message.chat_id}, trace_id={span.trace_id}"
+        )
+
+        if resp.status_code >= 400:
+            logger.error(
+                f"[relay] API returned error {resp.status_code} for "
+                f"chat_id={message.chat_id}: {resp.text[:500]}"
             )
+            resp.raise_for_status()
 
-            reply: Optional[str] = data.get("reply")
+        data = resp.json()
+        logger.debug(
+            f"[relay] API response body: chat_id={message.chat_id}, data={data}"
+        )
 
-            logger.info(
-                f"[relay] reply decision: chat_id={message.chat_id}, "
-                f"reply={'<none>' if reply is None else repr(reply[:80])}"
-            )
+        reply: Optional[str] = data.get("reply")
 
-            # Send reply via transport if one was returned
-            if reply and self.transport:
+        logger.info(
+            f"[relay] reply decision: chat_id={message.chat_id}, "
+            f"reply={'<none>' if reply is None else repr(reply[:80])}"
+        )
+
+        # Send reply via transport if one was returned
+        span.set_attribute("replied", bool(reply))
+        if reply and self.transport:
+            with start_span("interceptor.send_reply"):
                 await self.transport.send_message(
                     chat_id=message.chat_id,
                     user_id=message.user_id,
                     content=reply,
                 )
-                logger.info(f"[relay] Sent reply to chat {message.chat_id}")
-            elif reply and not self.transport:
-                logger.warning(
-                    f"[relay] Reply generated but no transport available: "
-                    f"chat_id={message.chat_id}"
-                )
-
-            return reply
+            logger.info(f"[relay] Sent reply to chat {message.chat_id}")
+        elif reply and not self.transport:
+            logger.warning(
+                f"[relay] Reply generated but no transport available: "
+                f"chat_id={message.chat_id}"
+            )
 
-        except Exception as e:
-            logger.error(f"[relay] Error handling message: {e}", exc_info=True)
-            return None
+        return reply
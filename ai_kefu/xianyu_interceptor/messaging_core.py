@@ -238,6 +238,25 @@ class XianyuMessageCodec:
             logger.error(f"消息解码失败: {e}")
             return None
 
+    @staticmethod
+    def peek_chat_id(raw_data: Dict[str, Any]) -> Optional[str]:
+        """
+        只取出聊天帧的 chat_id，供帧分发器按会话串行
+
+        Args:
+            raw_data: 原始消息数据
+
+        Returns:
+            Optional[str]: chat_id，非聊天帧或解码失败返回 None
+        """
+        message = XianyuMessageCodec.decode_message(raw_data)
+        if not message or not XianyuMessageCodec._is_chat_message(message):
+            return None
+        try:
+            return message["1"]["2"].split('@')[0] or None
+        except Exception:
+            return None
+
     @staticmethod
     def classify_message(message: Dict[str, Any]) -> MessageType:
         """
@@ -0,0 +1,115 @@
+"""
+agent_turns 的 LLM 载荷编码：内容寻址 + 压缩。
+
+每轮都会记录完整的 llm_input（system prompt + 历史消息）和 llm_output。
+同一个几 KB 的 system prompt、同一段历史消息在一天内会被重复写入上千次。
+
+编码方式：
+- llm_input 中长度 >= SEGMENT_MIN_CHARS 的消息 content 替换为 {"$seg": <sha256>}，
+  正文只在 prompt_segments 表中按哈希存一份（压缩）
+- 剩余的 {"input": ..., "output": ...} 文档整体 zlib 压缩后写入 agent_turns.llm_payload
+
+读取时 decode_turn_payload 解压，segment_refs 找出引用的哈希，
+resolve_segments 用批量查回的正文还原出与原来完全一致的消息数组。
+"""
+
+import hashlib
+import json
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# 短于该长度的 content 直接内联（引用本身也要占空间）
+SEGMENT_MIN_CHARS = 256
+
+_REF_KEY = "$seg"
+_COMPRESS_LEVEL = 6
+
+
+def segment_hash(text: str) -> str:
+    """Content address of a prompt segment."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compress_text(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), _COMPRESS_LEVEL)
+
+
+def decompress_text(blob: bytes) -> str:
+    return zlib.decompress(blob).decode("utf-8")
+
+
+def _dumps(obj: Any) -> str:
+    try:
+        return json.dumps(obj, ensure_ascii=False, default=str, separators=(",", ":"))
+    except Exception:
+        return json.dumps(str(obj), ensure_ascii=False)
+
+
+def encode_turn_payload(
+    llm_input: Optional[Any],
+    llm_output: Optional[Any],
+) -> Tuple[Optional[bytes], Dict[str, str]]:
+    """
+    Encode one turn's LLM input/output.
+
+    Returns:
+        (compressed payload or None when both are None,
+         {segment hash: segment text} to store in prompt_segments)
+    """
+    if llm_input is None and llm_output is None:
+        return None, {}
+
+    segments: Dict[str, str] = {}
+    encoded_input = llm_input
+    if isinstance(llm_input, list):
+        encoded_input = []
+        for message in llm_input:
+            content = message.get("content") if isinstance(message, dict) else None
+            if isinstance(content, str) and len(content) >= SEGMENT_MIN_CHARS:
+                digest = segment_hash(content)
+                segments[digest] = content
+                message = {**message, "content": {_REF_KEY: digest}}
+            encoded_input.append(message)
+
+    payload = compress_text(_dumps({"input": encoded_input, "output": llm_output}))
+    return payload, segments
+
+
+def decode_turn_payload(blob: bytes) -> Tuple[Any, Any]:
+    """Decompress a payload into (llm_input with segment refs, llm_output)."""
+    doc = json.loads(decompress_text(blob))
+    return doc.get("input"), doc.get("output")
+
+
+def _ref(content: Any) -> Optional[str]:
+    if isinstance(content, dict) and len(content) == 1 and isinstance(content.get(_REF_KEY), str):
+        return content[_REF_KEY]
+    return None
+
+
+def segment_refs(llm_inputs: Iterable[Any]) -> Set[str]:
+    """Segment hashes referenced by one or more decoded llm_input arrays."""
+    refs: Set[str] = set()
+    for llm_input in llm_inputs:
+        if not isinstance(llm_input, list):
+            continue
+        for message in llm_input:
+            if isinstance(message, dict):
+                digest = _ref(message.get("content"))
+                if digest:
+                    refs.add(digest)
+    return refs
+
+
+def resolve_segments(llm_input: Any, segments: Dict[str, str]) -> Any:
+    """Replace segment refs in a decoded llm_input with their text."""
+    if not isinstance(llm_input, list):
+        return llm_input
+    resolved: List[Any] = []
+    for message in llm_input:
+        digest = _ref(message.get("content")) if isinstance(message, dict) else None
+        if digest:
+            text = segments.get(digest)
+            message = {**message, "content": text if text is not None else f"[missing prompt segment {digest[:12]}]"}
+        resolved.append(message)
+    return resolved
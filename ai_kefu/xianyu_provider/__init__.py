@@ -13,10 +13,22 @@ xianyu_provider — 闲鱼 API 统一 provider 层
     item    = await provider.get_item_info("1234567")
     order   = await provider.get_order_detail("9876543210")
     await provider.send_message(ws, cid, toid, message)
+
+同步代码（如 Agent 工具函数）通过常驻运行时调用，避免每次 asyncio.run::
+
+    from ai_kefu.xianyu_provider import get_provider, run_sync
+    item = run_sync(get_provider().get_item_info("1234567"))
 """
 
 from ai_kefu.xianyu_provider.base import XianyuProvider
 from ai_kefu.xianyu_provider.goofish_provider import GoofishProvider
+from ai_kefu.xianyu_provider.cache import CachedXianyuProvider, wrap_with_cache
+from ai_kefu.xianyu_provider.runtime import (
+    ProviderRuntime,
+    get_runtime,
+    run_sync,
+    shutdown_runtime,
+)
 
 _provider_instance: XianyuProvider | None = None
 
@@ -43,20 +55,39 @@ def init_provider(provider: XianyuProvider | None = None) -> XianyuProvider:
     return _provider_instance
 
 
+def invalidate_order_cache(order_id: str) -> None:
+    """订单状态变化时清除该订单的缓存（provider 未初始化或未启用缓存时为 no-op）。"""
+    provider = _provider_instance
+    if isinstance(provider, CachedXianyuProvider):
+        provider.invalidate_order(order_id)
+
+
 def _build_default_provider() -> XianyuProvider:
-    """构造默认实现（GoofishProvider），从 settings 中读取 cookie。"""
+    """构造默认实现（GoofishProvider + 查询缓存层），从 settings 中读取 cookie。"""
     from ai_kefu.config.settings import settings
     cookie = getattr(settings, "xianyu_cookie", "")
     if not cookie:
         raise ValueError(
             "xianyu_cookie 未配置。请在 .env 文件中设置 XIANYU_COOKIE。"
         )
-    return GoofishProvider(cookies_str=cookie)
+    return wrap_with_cache(
+        GoofishProvider(
+            cookies_str=cookie,
+            pool_size=settings.xianyu_provider_max_workers,
+        )
+    )
 
 
 __all__ = [
     "XianyuProvider",
     "GoofishProvider",
+    "CachedXianyuProvider",
+    "wrap_with_cache",
     "get_provider",
     "init_provider",
+    "invalidate_order_cache",
+    "ProviderRuntime",
+    "get_runtime",
+    "run_sync",
+    "shutdown_runtime",
 ]
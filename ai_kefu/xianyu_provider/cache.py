@@ -0,0 +1,303 @@
+"""
+CachedXianyuProvider — 带 TTL 缓存与请求合并的 provider 装饰层
+==================================================================
+
+商品标题/价格、买家信息几乎不变，但 ``AgentExecutor._load_item_info_context``
+和 ``get_item_info`` / ``get_buyer_info`` / ``get_order_detail`` 工具每次都会
+请求闲鱼 API。本模块包装任意 ``XianyuProvider`` 实现：
+
+- 按方法设置 TTL（商品 / 买家 / 订单各自独立）；
+- 失败结果（``success=False``）做短 TTL 的负缓存，避免故障期间反复打上游；
+- 单飞（single-flight）合并：同一 key 的并发请求共享一次上游调用；
+- 命中 / 未命中 / 合并次数计数，``stats()`` 可直接返回给监控接口，
+  同时计入 /metrics 的 ``ai_kefu_xianyu_cache_lookups``；
+- ``invalidate_order()`` 等显式失效钩子，订单状态变化时调用。
+
+其余接口（发消息、WebSocket、登录态等）原样委托给被包装的 provider。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from ai_kefu.xianyu_provider.base import XianyuProvider
+from ai_kefu.utils.logging import logger
+from ai_kefu.utils.metrics import XIANYU_CACHE_LOOKUPS
+
+# 被缓存的方法名（同时作为 key 前缀与统计分组）
+ITEM_INFO = "get_item_info"
+BUYER_INFO = "get_buyer_info"
+ORDER_DETAIL = "get_order_detail"
+_CACHED_METHODS = (ITEM_INFO, BUYER_INFO, ORDER_DETAIL)
+
+
+class CachedXianyuProvider(XianyuProvider):
+    """
+    为商品 / 买家 / 订单查询增加 TTL 缓存与单飞合并的 provider 装饰器。
+
+    线程安全：缓存表由锁保护；单飞合并只在同一事件循环内生效
+    （通过 ``ProviderRuntime`` 调用时所有请求都在同一个循环上）。
+    """
+
+    def __init__(
+        self,
+        inner: XianyuProvider,
+        item_ttl: float = 600.0,
+        buyer_ttl: float = 300.0,
+        order_ttl: float = 60.0,
+        negative_ttl: float = 30.0,
+        max_entries: int = 1024,
+    ) -> None:
+        self._inner = inner
+        self._ttls = {
+            ITEM_INFO: item_ttl,
+            BUYER_INFO: buyer_ttl,
+            ORDER_DETAIL: order_ttl,
+        }
+        self._negative_ttl = negative_ttl
+        self._max_entries = max_entries
+
+        # (method, key) → (expires_at, result)
+        self._entries: OrderedDict[tuple[str, str], tuple[float, dict[str, Any]]] = OrderedDict()
+        # (method, key) → (loop, future)：进行中的上游请求
+        self._inflight: dict[tuple[str, str], tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            m: {"hits": 0, "misses": 0, "negative_hits": 0, "coalesced": 0}
+            for m in _CACHED_METHODS
+        }
+
+    @property
+    def inner(self) -> XianyuProvider:
+        """被包装的底层 provider。"""
+        return self._inner
+
+    # ── 缓存核心 ──────────────────────────────────────────────────────────────
+
+    def _lookup(self, entry_key: tuple[str, str]) -> dict[str, Any] | None:
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is None:
+                return None
+            expires_at, result = entry
+            if expires_at <= time.monotonic():
+                del self._entries[entry_key]
+                return None
+            self._entries.move_to_end(entry_key)
+            stats = self._stats[entry_key[0]]
+            stats["hits"] += 1
+            if not result.get("success"):
+                stats["negative_hits"] += 1
+        XIANYU_CACHE_LOOKUPS.inc(
+            method=entry_key[0], outcome="hit" if result.get("success") else "negative_hit"
+        )
+        return result
+
+    def _store(self, entry_key: tuple[str, str], result: dict[str, Any]) -> None:
+        ttl = self._ttls[entry_key[0]] if result.get("success") else self._negative_ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[entry_key] = (time.monotonic() + ttl, result)
+            self._entries.move_to_end(entry_key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    async def _cached(
+        self,
+        method: str,
+        key: str,
+        fetch: Callable[[], Awaitable[dict[str, Any]]],
+    ) -> dict[str, Any]:
+        entry_key = (method, key)
+        cached = self._lookup(entry_key)
+        if cached is not None:
+            return dict(cached)
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            inflight = self._inflight.get(entry_key)
+            if inflight is not None and inflight[0] is loop:
+                self._stats[method]["coalesced"] += 1
+                future = inflight[1]
+                owner = False
+            else:
+                self._stats[method]["misses"] += 1
+                future = loop.create_future()
+                self._inflight[entry_key] = (loop, future)
+                owner = True
+        XIANYU_CACHE_LOOKUPS.inc(method=method, outcome="miss" if owner else "coalesced")
+
+        if not owner:
+            return dict(await asyncio.shield(future))
+
+        try:
+            result = await fetch()
+        except asyncio.CancelledError:
+            if not future.done():
+                future.cancel()
+            raise
+        except Exception as exc:
+            if not future.done():
+                future.set_exception(exc)
+                # 没有其他等待者时避免 "exception was never retrieved" 警告
+                future.exception()
+            raise
+        else:
+            self._store(entry_key, result)
+            if not future.done():
+                future.set_result(result)
+            return dict(result)
+        finally:
+            with self._lock:
+                if self._inflight.get(entry_key, (None, None))[1] is future:
+                    del self._inflight[entry_key]
+
+    # ── 失效 / 统计 ───────────────────────────────────────────────────────────
+
+    def invalidate(self, method: str | None = None, key: str | None = None) -> int:
+        """
+        删除缓存条目。
+
+        Args:
+            method: 仅删除该方法的条目；None 表示所有方法。
+            key:    仅删除该 ID 的条目；None 表示该方法下全部。
+
+        Returns:
+            删除的条目数。
+        """
+        with self._lock:
+            doomed = [
+                k for k in self._entries
+                if (method is None or k[0] == method) and (key is None or k[1] == str(key))
+            ]
+            for k in doomed:
+                del self._entries[k]
+        return len(doomed)
+
+    def invalidate_order(self, order_id: str) -> int:
+        """订单状态变化（拍下 / 付款 / 发货等）时调用。"""
+        removed = self.invalidate(ORDER_DETAIL, order_id)
+        logger.debug(f"[CachedXianyuProvider] 订单缓存失效: order_id={order_id}, removed={removed}")
+        return removed
+
+    def invalidate_item(self, item_id: str) -> int:
+        """商品信息变化（改价 / 下架等）时调用。"""
+        return self.invalidate(ITEM_INFO, item_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        """返回各方法的命中 / 未命中计数及当前条目数。"""
+        with self._lock:
+            methods = {}
+            for m, s in self._stats.items():
+                lookups = s["hits"] + s["misses"] + s["coalesced"]
+                methods[m] = {
+                    **s,
+                    "hit_rate": round((s["hits"] + s["coalesced"]) / lookups, 4) if lookups else 0.0,
+                }
+            return {"entries": len(self._entries), "methods": methods}
+
+    # ── 缓存的查询接口 ────────────────────────────────────────────────────────
+
+    async def get_item_info(self, item_id: str) -> dict[str, Any]:
+        item_id = str(item_id)
+        return await self._cached(
+            ITEM_INFO, item_id, lambda: self._inner.get_item_info(item_id)
+        )
+
+    async def get_buyer_info(self, buyer_id: str) -> dict[str, Any]:
+        buyer_id = str(buyer_id)
+        return await self._cached(
+            BUYER_INFO, buyer_id, lambda: self._inner.get_buyer_info(buyer_id)
+        )
+
+    async def get_order_detail(self, order_id: str) -> dict[str, Any]:
+        order_id = str(order_id)
+        return await self._cached(
+            ORDER_DETAIL, order_id, lambda: self._inner.get_order_detail(order_id)
+        )
+
+    # ── 其余接口直接委托 ──────────────────────────────────────────────────────
+
+    async def get_token(self) -> dict[str, Any]:
+        return await self._inner.get_token()
+
+    async def refresh_token(self) -> dict[str, Any]:
+        return await self._inner.refresh_token()
+
+    async def send_message(
+        self,
+        websocket: Any,
+        cid: str,
+        toid: str,
+        message: dict[str, Any],
+    ) -> None:
+        await self._inner.send_message(websocket, cid, toid, message)
+
+    async def send_message_once(self, cid: str, buyer_id: str, text: str) -> dict[str, Any]:
+        return await self._inner.send_message_once(cid, buyer_id, text)
+
+    async def upload_media(self, media_path: str) -> dict[str, Any]:
+        return await self._inner.upload_media(media_path)
+
+    async def ws_init(self, websocket: Any) -> None:
+        await self._inner.ws_init(websocket)
+
+    async def ws_heartbeat(self, websocket: Any) -> None:
+        await self._inner.ws_heartbeat(websocket)
+
+    @property
+    def my_user_id(self) -> str:
+        return self._inner.my_user_id
+
+    @property
+    def device_id(self) -> str:
+        return self._inner.device_id
+
+    @property
+    def ws_url(self) -> str:
+        return self._inner.ws_url
+
+    def get_ws_headers(self) -> dict[str, str]:
+        return self._inner.get_ws_headers()
+
+    async def list_all_conversations(self, cid: str) -> list[dict[str, Any]]:
+        return await self._inner.list_all_conversations(cid)
+
+    async def create_chat(self, websocket: Any, toid: str, item_id: str) -> None:
+        await self._inner.create_chat(websocket, toid, item_id)
+
+    async def has_login(self) -> bool:
+        return await self._inner.has_login()
+
+    def update_env_cookies(self) -> None:
+        self._inner.update_env_cookies()
+
+
+def wrap_with_cache(provider: XianyuProvider) -> XianyuProvider:
+    """按 settings 为 provider 套上缓存层；已包装或关闭缓存时原样返回。"""
+    from ai_kefu.config.settings import settings
+
+    if isinstance(provider, CachedXianyuProvider) or not settings.xianyu_cache_enabled:
+        return provider
+    return CachedXianyuProvider(
+        provider,
+        item_ttl=settings.xianyu_cache_item_ttl,
+        buyer_ttl=settings.xianyu_cache_buyer_ttl,
+        order_ttl=settings.xianyu_cache_order_ttl,
+        negative_ttl=settings.xianyu_cache_negative_ttl,
+    )
+
+
+__all__ = [
+    "CachedXianyuProvider",
+    "wrap_with_cache",
+]
@@ -24,6 +24,8 @@ import sys
 import time
 from typing import Any
 
+from requests.adapters import HTTPAdapter
+
 try:
     import websockets
 except ImportError:
@@ -105,16 +107,21 @@ class GoofishProvider(XianyuProvider):
     - 所有 HTTP API 调用委托给上游 ``XianyuApis`` 实例。
     - 响应按 ``XianyuProvider`` ABC 约定的 dict 格式规范化后返回。
     - 订单详情（上游未实现）由本文件保留实现，复用上游的 session 和签名函数。
-    - 所有同步调用通过 ``run_in_executor`` 暴露为 async 接口。
+    - 所有同步调用通过 ``run_in_executor`` 暴露为 async 接口；
+      由 ``ProviderRuntime`` 驱动时使用其常驻循环和有界线程池。
     """
 
-    def __init__(self, cookies_str: str) -> None:
+    def __init__(self, cookies_str: str, pool_size: int = 4) -> None:
         self._cookies_str = cookies_str
         cookies_dict: dict[str, str] = trans_cookies(cookies_str)
         self._my_user_id_val: str = cookies_dict.get("unb", "")
         self._device_id_val: str = _upstream_generate_device_id(self._my_user_id_val)
         # 核心：上游 XianyuApis 管理 requests.Session + cookie 刷新
         self._apis = XianyuApis(cookies_dict, self._device_id_val)
+        # 连接池与运行时线程数对齐，并发请求可复用 keep-alive 连接
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._apis.session.mount("https://", adapter)
+        self._apis.session.mount("http://", adapter)
 
     # ── 只读属性 ──────────────────────────────────────────────────────────────
 
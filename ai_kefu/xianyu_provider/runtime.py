@@ -0,0 +1,199 @@
+"""
+ProviderRuntime — 闲鱼 provider 的常驻事件循环
+=================================================
+
+工具函数运行在 Agent 的同步工作线程里，过去每次调用都要 ``asyncio.run(...)``，
+即每次新建并销毁一个事件循环；provider 内部的 ``_sync_*`` 又通过默认 executor
+临时起线程。
+
+本模块提供一个进程级的后台运行时：
+
+- 一个专用守护线程，持有唯一的常驻事件循环；
+- 一个有界线程池作为该循环的默认 executor（``_sync_*`` 调用复用这些线程）；
+- 同步调用方通过 ``run_coroutine_threadsafe`` 提交协程，并带超时等待结果。
+
+用法::
+
+    from ai_kefu.xianyu_provider.runtime import run_sync
+    result = run_sync(provider.get_item_info(item_id), timeout=15)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import Awaitable, Optional, TypeVar
+
+from ai_kefu.utils.logging import logger
+
+T = TypeVar("T")
+
+# 默认等待超时（秒）；单个调用可通过 timeout 参数覆盖
+DEFAULT_TIMEOUT = 30.0
+# 默认 executor 线程数（同时进行的 _sync_* HTTP 请求上限）
+DEFAULT_MAX_WORKERS = 4
+
+
+class ProviderRuntime:
+    """
+    在独立线程中运行的常驻 asyncio 事件循环。
+
+    线程安全：``submit`` 可以从任意非运行时线程并发调用。
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        default_timeout: float = DEFAULT_TIMEOUT,
+        name: str = "xianyu-provider",
+    ) -> None:
+        self._max_workers = max_workers
+        self._default_timeout = default_timeout
+        self._name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    # ── 生命周期 ──────────────────────────────────────────────────────────────
+
+    @property
+    def is_running(self) -> bool:
+        return (
+            self._loop is not None
+            and self._thread is not None
+            and self._thread.is_alive()
+            and not self._loop.is_closed()
+        )
+
+    def start(self) -> "ProviderRuntime":
+        """启动后台循环（幂等）。"""
+        with self._lock:
+            if self.is_running:
+                return self
+            self._ready.clear()
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self._max_workers,
+                thread_name_prefix=f"{self._name}-io",
+            )
+            self._loop = asyncio.new_event_loop()
+            self._loop.set_default_executor(self._executor)
+            self._thread = threading.Thread(
+                target=self._run_loop, name=f"{self._name}-loop", daemon=True
+            )
+            self._thread.start()
+        self._ready.wait()
+        logger.info(
+            f"[ProviderRuntime] 事件循环已启动: thread={self._thread.name}, "
+            f"max_workers={self._max_workers}"
+        )
+        return self
+
+    def _run_loop(self) -> None:
+        loop = self._loop
+        assert loop is not None
+        asyncio.set_event_loop(loop)
+        loop.call_soon(self._ready.set)
+        try:
+            loop.run_forever()
+        finally:
+            try:
+                pending = asyncio.all_tasks(loop)
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    loop.run_until_complete(
+                        asyncio.gather(*pending, return_exceptions=True)
+                    )
+                loop.run_until_complete(loop.shutdown_asyncgens())
+            finally:
+                loop.close()
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """停止后台循环并释放线程池。"""
+        with self._lock:
+            loop, thread, executor = self._loop, self._thread, self._executor
+            self._loop = self._thread = self._executor = None
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join(timeout=timeout)
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        logger.info("[ProviderRuntime] 事件循环已停止")
+
+    # ── 提交协程 ──────────────────────────────────────────────────────────────
+
+    def submit(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """
+        在后台循环中执行协程并阻塞等待结果。
+
+        Args:
+            coro:    待执行的协程对象。
+            timeout: 等待上限（秒）；None 使用运行时默认值。
+
+        Raises:
+            TimeoutError: 超过 timeout 仍未完成（协程会被取消）。
+            RuntimeError: 在运行时自身的循环线程中调用（会死锁）。
+        """
+        if not self.is_running:
+            self.start()
+        if threading.current_thread() is self._thread:
+            # 协程尚未被调度，关闭它以免出现 "never awaited" 警告
+            if asyncio.iscoroutine(coro):
+                coro.close()
+            raise RuntimeError("ProviderRuntime.submit() 不能在运行时循环线程内调用")
+
+        deadline = self._default_timeout if timeout is None else timeout
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)  # type: ignore[arg-type]
+        try:
+            return future.result(timeout=deadline)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"provider 调用超时（>{deadline:.1f}s）") from None
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 全局单例
+# ──────────────────────────────────────────────────────────────────────────────
+
+_runtime_instance: ProviderRuntime | None = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime() -> ProviderRuntime:
+    """返回全局运行时单例（懒启动，参数取自 settings）。"""
+    global _runtime_instance
+    if _runtime_instance is None:
+        with _runtime_lock:
+            if _runtime_instance is None:
+                from ai_kefu.config.settings import settings
+                _runtime_instance = ProviderRuntime(
+                    max_workers=settings.xianyu_provider_max_workers,
+                    default_timeout=settings.xianyu_provider_timeout,
+                )
+    return _runtime_instance.start()
+
+
+def run_sync(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """在全局运行时上执行协程并返回结果（供同步工具函数使用）。"""
+    return get_runtime().submit(coro, timeout=timeout)
+
+
+def shutdown_runtime() -> None:
+    """停止全局运行时（进程退出或测试清理时调用）。"""
+    global _runtime_instance
+    with _runtime_lock:
+        runtime, _runtime_instance = _runtime_instance, None
+    if runtime is not None:
+        runtime.shutdown()
+
+
+__all__ = [
+    "ProviderRuntime",
+    "get_runtime",
+    "run_sync",
+    "shutdown_runtime",
+]